@@ -107,12 +107,13 @@ class Container(BasicLifecycleObject):
         """
         Container._started = True
 
-        yield self.interceptor_system.activate()
-
         yield self.exchange_manager.activate()
 
         yield self.proc_manager.activate()
 
+        # After the broker connection, as interceptors may subscribe to events
+        yield self.interceptor_system.activate()
+
         yield self.app_manager.activate()
 
 
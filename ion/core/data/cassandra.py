@@ -12,13 +12,15 @@
 @note Test cases for the cassandra backend are now in ion.data.test.test_store
 """
 import os
+import time
 
-from twisted.internet import defer, reactor
+from twisted.internet import defer, reactor, task
+from twisted.internet.protocol import ReconnectingClientFactory
 
 from zope.interface import implements
 
 from telephus.client import CassandraClient
-from telephus.protocol import ManagedCassandraClientFactory
+from telephus.protocol import ManagedCassandraClientFactory, ManagedThriftClientProtocol
 from telephus.cassandra.ttypes import NotFoundException, KsDef, CfDef
 from telephus.cassandra.ttypes import ColumnDef, IndexExpression, IndexOperator, InvalidRequestException
 
@@ -27,7 +29,7 @@ from ion.core.data.store import Query
 
 from ion.core.data.store import IndexStoreError
 
-from ion.util.tcp_connections import TCPConnection
+from ion.util.tcp_connections import TCPConnectionPool
 
 from ion.util.timeout import timeout
 
@@ -39,13 +41,230 @@ CONF = ioninit.config(__name__)
 
 
 cassandra_timeout = CONF.getValue('CassandraTimeout',10.0)
+# The maximum number of rows in a single multiget_slice or batch_mutate request
+cassandra_batch_size = CONF.getValue('CassandraBatchSize',500)
+# The number of rows in each get_indexed_slices request made by query
+cassandra_page_size = CONF.getValue('CassandraQueryPageSize',1000)
+# The number of connections each store or data manager opens to its cassandra node
+cassandra_pool_size = CONF.getValue('CassandraPoolSize',4)
+# Seconds between checks for connections stuck on a request for longer than CassandraTimeout
+cassandra_health_check_interval = CONF.getValue('CassandraHealthCheckInterval',5.0)
+
+def _batches(keys, size=None):
+    """
+    Split a list of keys into lists of at most size keys
+    """
+    size = size or cassandra_batch_size
+    keys = list(keys)
+    for i in xrange(0, len(keys), size):
+        yield keys[i:i + size]
+
 class CassandraError(Exception):
     """
     An exception class for ION Cassandra Client errors
     """
 
 
-class CassandraStore(TCPConnection):
+class MeteredThriftClientProtocol(ManagedThriftClientProtocol):
+    """
+    A thrift connection which tells its factory when it starts and finishes a request
+    """
+
+    request_started = None
+
+    def submitRequest(self, request):
+        d = ManagedThriftClientProtocol.submitRequest(self, request)
+
+        now = time.time()
+        self.factory.request_dispatched(request, now)
+        if self.deferred is not None:
+            self.request_started = now
+            self.factory.in_flight += 1
+        return d
+
+    def _complete(self, res=None):
+        self._finished()
+        return ManagedThriftClientProtocol._complete(self, res)
+
+    def _finished(self):
+        if self.request_started is not None:
+            self.request_started = None
+            self.factory.in_flight -= 1
+
+    def connectionLost(self, reason=None):
+        self._finished()
+        ManagedThriftClientProtocol.connectionLost(self, reason)
+
+
+class PooledConnectionFactory(ReconnectingClientFactory):
+    """
+    The factory given to the connector of one connection of a PooledCassandraClientFactory. The reconnect delay and
+    retries of a ReconnectingClientFactory belong to one connector, so each connection has a factory of its own;
+    the protocols it builds belong to the pool, which hands them the requests.
+    """
+    maxDelay = ManagedCassandraClientFactory.maxDelay
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def buildProtocol(self, addr):
+        self.resetDelay()
+        return self.pool.buildProtocol(addr)
+
+
+class PooledCassandraClientFactory(ManagedCassandraClientFactory):
+    """
+    A client factory for a pool of connections to one cassandra node.
+
+    Requests wait in the one queue of the factory and each connection takes the next request as soon as it is idle,
+    so a request goes to whichever connection is free first. The factory keeps metrics of the requests and a health
+    check drops connections which have been stuck on a request for too long - the request is retried elsewhere and
+    the connection is made again. Each connection is made through a factory of its own from connection_factory.
+    """
+    protocol = MeteredThriftClientProtocol
+
+    def __init__(self, *args, **kwargs):
+        ManagedCassandraClientFactory.__init__(self, *args, **kwargs)
+
+        self.in_flight = 0
+        self.dispatched = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.aborted = 0
+
+        self._health_check = None
+        self._request_timeout = None
+        self._connections = None
+
+        self._connection_factories = []
+
+    def connection_factory(self):
+        """
+        @retval a PooledConnectionFactory for one more connection of the pool
+        """
+        factory = PooledConnectionFactory(self)
+        self._connection_factories.append(factory)
+        return factory
+
+    def shutdown(self):
+        for factory in self._connection_factories:
+            factory.stopTrying()
+        return ManagedCassandraClientFactory.shutdown(self)
+
+    def pushRequest(self, request, *args, **kwargs):
+        request.queued_at = time.time()
+        return ManagedCassandraClientFactory.pushRequest(self, request, *args, **kwargs)
+
+    def request_dispatched(self, request, now):
+        wait = now - getattr(request, 'queued_at', now)
+        self.dispatched += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def clientIdle(self, proto, *args, **kwargs):
+        # An aborted connection must not take another request while it closes
+        if proto.aborted:
+            return
+        return ManagedCassandraClientFactory.clientIdle(self, proto, *args, **kwargs)
+
+    def start_health_check(self, interval, request_timeout, connections):
+        """
+        @param interval seconds between checks
+        @param request_timeout drop a connection which has been on one request for longer than this
+        @param connections the number of connections there should be
+        """
+        self._request_timeout = request_timeout
+        self._connections = connections
+        self._health_check = task.LoopingCall(self.check_health)
+        self._health_check.start(interval, now=False)
+
+    def stop_health_check(self):
+        if self._health_check is not None and self._health_check.running:
+            self._health_check.stop()
+        self._health_check = None
+
+    def check_health(self):
+        now = time.time()
+        for proto in list(self._protos):
+            if proto.request_started is None or now - proto.request_started <= self._request_timeout:
+                continue
+
+            log.warn('Dropping a cassandra connection stuck on a request for %.1f seconds' % (now - proto.request_started))
+            self.aborted += 1
+
+            d = proto.deferred
+            proto.abort()
+            if d is not None and not d.called:
+                # Hands the request back to the factory - it is retried or fails
+                d.errback(CassandraError('The cassandra request timed out on its connection'))
+            proto._finished()
+
+        if self._connections is not None and len(self._protos) < self._connections:
+            log.warn('Only %d of %d cassandra connections are up' % (len(self._protos), self._connections))
+
+    def stats(self):
+        """
+        @retval a dictionary of the pool metrics - connections, queued and in flight requests and the time requests
+        waited in the queue for a connection
+        """
+        mean_wait = 0.0
+        if self.dispatched:
+            mean_wait = self.total_wait / self.dispatched
+
+        return {'connections':len(self._protos),
+                'queued':len(self.queue.pending),
+                'in_flight':self.in_flight,
+                'requests':self.dispatched,
+                'mean_wait':mean_wait,
+                'max_wait':self.max_wait,
+                'aborted':self.aborted}
+
+
+class CassandraConnectionPool(TCPConnectionPool):
+    """
+    Base class of the objects which talk to cassandra - a CassandraClient on a pool of connections with the life
+    cycle of an ion process.
+    """
+
+    def __init__(self, host, port, pool_size=None, **factory_kwargs):
+        """
+        @param pool_size the number of connections - CassandraPoolSize by default
+        @param factory_kwargs keyspace and credentials for the client factory
+        """
+        self._manager = PooledCassandraClientFactory(**factory_kwargs)
+
+        TCPConnectionPool.__init__(self, host, port, self._manager, size=pool_size or cassandra_pool_size)
+        self.client = CassandraClient(self._manager)
+
+    def pool_stats(self):
+        """
+        @see PooledCassandraClientFactory.stats
+        """
+        return self._manager.stats()
+
+    def on_activate(self, *args, **kwargs):
+        TCPConnectionPool.on_activate(self)
+        self._manager.start_health_check(cassandra_health_check_interval, cassandra_timeout, self._size)
+
+    def _shutdown(self):
+        self._manager.stop_health_check()
+        self.disconnect()
+        self._manager.shutdown()
+
+    def on_deactivate(self, *args, **kwargs):
+        self._shutdown()
+        log.info('on_deactivate: Lose TCP Connections')
+
+    def on_terminate(self, *args, **kwargs):
+        self._shutdown()
+        log.info('on_terminate: Lose TCP Connections')
+
+    def on_error(self, *args, **kwargs):
+        self._shutdown()
+        log.info('on_error: Lose TCP Connections')
+
+
+class CassandraStore(CassandraConnectionPool):
     """
     An Adapter class that implements the IStore interface by way of a
     cassandra client connection. As an adapter, this assumes an active
@@ -84,12 +303,9 @@ class CassandraStore(TCPConnection):
         log.info("Connecting to %s on port %s " % (host,port))
         log.info("Using keyspace %s" % (self._keyspace,))
         log.info("authorization_dictionary; %s" % (str(authorization_dictionary),))
-        ### Create the twisted factory for the TCP connection  
-        self._manager = ManagedCassandraClientFactory(keyspace=self._keyspace, credentials=authorization_dictionary)
-        
-        # Call the initialization of the Managed TCP connection base class
-        TCPConnection.__init__(self,host, port, self._manager)
-        self.client = CassandraClient(self._manager)    
+
+        # Call the initialization of the pool of Managed TCP connections base class
+        CassandraConnectionPool.__init__(self, host, port, keyspace=self._keyspace, credentials=authorization_dictionary)
         
         self._cache = cache # Cassandra Column Family maps to an ION Cache resource
         self._cache_name = cache.name
@@ -154,29 +370,60 @@ class CassandraStore(TCPConnection):
         """
         yield self.client.remove(key, self._cache_name)
 
-    def on_deactivate(self, *args, **kwargs):
-        #self._connector.disconnect()
-        self._manager.shutdown()
-        log.info('on_deactivate: Lose TCP Connection')
-
-    def on_terminate(self, *args, **kwargs):
-        log.info("Called CassandraStore.on_terminate")
-        self._connector.disconnect()
-        self._manager.shutdown()
-        log.info('on_terminate: Lose TCP Connection')
-    
-    def on_error(self, *args, **kwargs):
-        log.info("Called CassandraStore.on_error")
-        self._connector.disconnect()
-        self._manager.shutdown()
-        log.info('on_error: Lose TCP Connection')
-
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def get_many(self, keys):
+        """
+        @brief Return the values for many keys using multiget_slice - one request per batch of keys
+        @param keys an iterable of keys
+        @retval Deferred that fires with a dictionary of key: value - None for keys that were not found
+        """
+        result = yield self._multiget_column(keys, 'value')
+        defer.returnValue(result)
 
+    @timeout(cassandra_timeout)
     @defer.inlineCallbacks
-    def on_activate(self, *args, **kwargs):
+    def put_many(self, items):
+        """
+        @brief Write many key/value pairs into cassandra using batch_mutate - one request per batch of keys
+        @param items a dictionary of key: value
+        @retval Deferred for success
+        """
+        for batch in _batches(items.keys()):
+            mutation_map = {}
+            for key in batch:
+                mutation_map[key] = {self._cache_name: {"value": items[key], "has_key":"1"}}
+            yield self.client.batch_mutate(mutation_map)
 
-        yield TCPConnection.on_activate(self)
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def has_keys(self, keys):
+        """
+        Checks to see if many keys exist in the column family
+        @param keys an iterable of keys to check in the column family
+        @retVal Returns a dictionary of key: bool in a deferred
+        """
+        values = yield self._multiget_column(keys, 'has_key')
+        result = {}
+        for key, value in values.iteritems():
+            result[key] = value is not None
+        defer.returnValue(result)
 
+    @defer.inlineCallbacks
+    def _multiget_column(self, keys, column):
+        """
+        Get the value of a single column from many rows
+        """
+        result = {}
+        for batch in _batches(keys):
+            rows = yield self.client.multiget_slice(batch, self._cache_name, names=[column])
+            for key in batch:
+                columns = rows.get(key)
+                if columns:
+                    result[key] = columns[0].column.value
+                else:
+                    result[key] = None
+        defer.returnValue(result)
 
 
 
@@ -218,6 +465,29 @@ class CassandraIndexedStore(CassandraStore):
         
         yield self.client.batch_insert(key, self._cache_name, index_cols)
 
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def put_many(self, items, index_attributes=None):
+        """
+        IIndexStore put_many - write many rows using batch_mutate
+
+        @param items a dictionary of key: value for the value column of each Cassandra row
+        @param index_attributes a dictionary mapping some or all of the keys to a dictionary of index column names and values
+        """
+        if index_attributes is None:
+            index_attributes = {}
+
+        for attributes in index_attributes.itervalues():
+            yield self._check_index(attributes)
+
+        for batch in _batches(items.keys()):
+            mutation_map = {}
+            for key in batch:
+                index_cols = dict(index_attributes.get(key, {}))
+                index_cols.update({"value":items[key], "has_key":"1"})
+                mutation_map[key] = {self._cache_name: index_cols}
+            yield self.client.batch_mutate(mutation_map)
+
     @timeout(cassandra_timeout)
     @defer.inlineCallbacks
     def update_index(self, key, index_attributes):
@@ -263,44 +533,102 @@ class CassandraIndexedStore(CassandraStore):
             raise IndexStoreError("Values for the indexed columns must be of type str.")
         
 
-    @timeout(cassandra_timeout)
     @defer.inlineCallbacks
-    def query(self, query_predicates, row_count=100):
+    def query(self, query_predicates, row_count=None):
         """
         Search for rows in the Cassandra instance.
     
         @param indexed_attributes is a dictionary with column:value mappings.
         Rows are returned that have columns set to the value specified in 
         the dictionary
+        @param row_count is the maximum number of rows to return - None for all of them. The rows are fetched in
+        pages of CassandraQueryPageSize rows.
         
         @retVal a dictionary containing the keys and values which match the query.
         
         raises a CassandraError if the query_predicate object is malformed.
         """
-        #log.info('Query against cache: %s' % self._cache_name)
+        result = {}
+        cursor = None
+        while True:
+            page_size = cassandra_page_size
+            if row_count is not None:
+                page_size = min(page_size, row_count - len(result))
+                if page_size <= 0:
+                    break
+
+            rows, cursor = yield self.query_page(query_predicates, page_size, cursor)
+            for key, row_vals in rows:
+                result[key] = row_vals
+
+            if cursor is None:
+                break
+
+        defer.returnValue(result)
+
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def query_page(self, query_predicates, page_size=None, cursor=None):
+        """
+        Get one page of the rows which match a query.
+
+        @param page_size is the maximum number of rows in the page - CassandraQueryPageSize by default
+        @param cursor is None for the first page, otherwise the cursor returned with the previous page
+        @retVal a tuple (rows, cursor). Rows is a list of (key, columns dictionary) tuples in the order of the
+        column family. The cursor is None when there are no more rows.
+
+        raises a CassandraError if the query_predicate object is malformed.
+        """
+        page_size = page_size or cassandra_page_size
+
+        # The start key is inclusive - ask for one more row to make up for the cursor row
+        start_key = ''
+        count = page_size
+        if cursor is not None:
+            start_key = cursor
+            count += 1
+
+        selection_predicates = self._index_expressions(query_predicates)
+        #log.debug("Calling get_indexed_slices selection_predicate %s " % (selection_predicates,))
+
+        slices = yield self.client.get_indexed_slices(self._cache_name, selection_predicates, start_key=start_key,
+                                                      count=count)
+
+        rows = []
+        for row in slices:
+            if row.key == cursor:
+                continue
+            row_vals = {}
+            for column in row.columns:
+                row_vals[column.column.name] = column.column.value
+            rows.append((row.key, row_vals))
+
+        # If the cursor row was deleted since the last page there is one extra row - it starts the next page
+        del rows[page_size:]
+
+        next_cursor = None
+        if len(slices) == count and rows:
+            next_cursor = rows[-1][0]
+
+        defer.returnValue((rows, next_cursor))
+
+    def _index_expressions(self, query_predicates):
+        """
+        Convert the predicates of a store.Query to thrift IndexExpressions
+        """
         predicates = query_predicates.get_predicates()
         def fix_preds(query_tuple):
             if query_tuple[2] == Query.EQ:
                 new_pred = IndexOperator.EQ
             elif query_tuple[2] == Query.GT:
                 new_pred = IndexOperator.GT
+            elif query_tuple[2] == Query.LT:
+                new_pred = IndexOperator.LT
             else:
                 raise CassandraError("Illegal predicate value")
             args = {'column_name':query_tuple[0], 'op':new_pred, 'value': query_tuple[1]}
             return IndexExpression(**args)
-        selection_predicates = map(fix_preds, predicates)
-        #log.debug("Calling get_indexed_slices selection_predicate %s " % (selection_predicates,))
-        
-        rows = yield self.client.get_indexed_slices(self._cache_name, selection_predicates, count=row_count)
-        #log.info("Got rows back")
-        result ={}
-        for row in rows:
-            row_vals = {}
-            for column in row.columns:
-                row_vals[column.column.name] = column.column.value
-            result[row.key] = row_vals
-
-        defer.returnValue(result)
+        return map(fix_preds, predicates)
         
     @timeout(cassandra_timeout)
     @defer.inlineCallbacks
@@ -347,7 +675,7 @@ class CassandraStorageResource:
         return authorization_dictionary
     
 
-class CassandraDataManager(TCPConnection):
+class CassandraDataManager(CassandraConnectionPool):
 
     #implements(store.IDataManager)
 
@@ -359,10 +687,8 @@ class CassandraDataManager(TCPConnection):
         port = storage_resource.get_port()
         authorization_dictionary = storage_resource.get_credentials()
         log.info("host: %s and port: %s" % (host,str(port)))
-        self._manager = ManagedCassandraClientFactory(credentials=authorization_dictionary)
-        
-        TCPConnection.__init__(self,host,port,self._manager)
-        self.client = CassandraClient(self._manager)    
+
+        CassandraConnectionPool.__init__(self, host, port, credentials=authorization_dictionary)
         
     @timeout(cassandra_timeout)
     @defer.inlineCallbacks
@@ -500,15 +826,6 @@ class CassandraDataManager(TCPConnection):
         make_cdefs = lambda d: ColumnDef(**d)
         cdefs = map(make_cdefs, cdefs_dicts)
         return cdefs
-        
-        
-    def on_deactivate(self, *args, **kwargs):
-        self._manager.shutdown()
-        log.info('on_deactivate: Lose Connection TCP')
-
-    def on_terminate(self, *args, **kwargs):
-        self._manager.shutdown()
-        log.info('on_terminate: Lose Connection TCP')
 
 
 
@@ -18,7 +18,8 @@ from ion.core.object import object_utils
 
 from ion.core.data.store import Query
 
-from ion.core.data.store import IIndexStore, IndexStore, IndexStoreError
+from ion.core.data.store import IIndexStore, IndexStore, IndexStoreError, create_local_store
+import ion.util.procutils as pu
 from zope.interface import implements
 
 from ion.core import ioninit
@@ -32,6 +33,10 @@ ROWS_TYPE = object_utils.create_type_identifier(object_id=19, version=1)
 INDEXED_ATTRIBUTES_TYPE = object_utils.create_type_identifier(object_id=20, version=1)
 ROW_INDEX_UPDATE_TYPE = object_utils.create_type_identifier(object_id=21, version=1)
 
+# Message headers which carry the paging state of op_query_page
+PAGE_SIZE_HEADER = 'query-page-size'
+CURSOR_HEADER = 'query-cursor'
+
 
 class IndexStoreServiceException(Exception):
     """
@@ -58,6 +63,10 @@ class IndexStoreService(ServiceProcess):
         log.info(self.spawn_args)
         self.indices = self.spawn_args.get('indices',  [])
         log.info(self.indices)
+
+        # The in memory IndexStore or a disk backed implementation such as the LogIndexStore
+        self._store_class = pu.get_class(self.spawn_args.get('index_store_class',
+                                            CONF.getValue('index_store_class', default='ion.core.data.store.IndexStore')))
         
     #@defer.inlineCallbacks
     def slc_activate(self, *args):
@@ -73,11 +82,14 @@ class IndexStoreService(ServiceProcess):
         system!
         
         """
-        IndexStore.kvs={}
-        IndexStore.indices={}
-        self._indexed_store = IndexStore(indices=self.indices)
+        # Each index store service has a store of its own - a log structured one is named after the process
+        self._indexed_store = create_local_store(self._store_class, self.spawn_args.get('cache_name', self.proc_name), indices=self.indices)
 
         log.info("Created Index Store Service")
+
+    def slc_terminate(self):
+        if getattr(self._indexed_store, 'log_structured', False):
+            self._indexed_store.close()
         
         
         
@@ -91,14 +103,7 @@ class IndexStoreService(ServiceProcess):
         """
         log.debug("In op_query: request %s" % request)
 
-        query_predicates = Query()    
-        for attr in request.attrs:
-            if attr.predicate_type == Query.EQ:
-                query_predicates.add_predicate_eq(attr.attribute_name, attr.attribute_value)
-            elif attr.predicate_type == Query.GT:
-                query_predicates.add_predicate_gt(attr.attribute_name, attr.attribute_value)
-            else:
-                raise IndexStoreServiceException("Unhandled predicate type: %s " % (attr.predicate_type,))
+        query_predicates = self._read_query(request)
                 
         results = yield self._indexed_store.query(query_predicates)
         #Now we have to put these back into a response
@@ -107,21 +112,71 @@ class IndexStoreService(ServiceProcess):
     
         #The GPB buffer object represents cassandra rows, we could probably get away with just making a dictionary like
         #object, since that's what query returns.
-        for key,row in results.items():
+        self._write_rows(response, results.items())
+        
+        log.debug("op_query Result %s" % response)
+
+        yield self.reply_ok(msg,response)
+
+    @defer.inlineCallbacks
+    def op_query_page(self, request, headers, msg):
+        """
+        @Note Return one page of the rows which match a query. The page size and the cursor are passed in the message
+        headers - the query message has no place for them. The cursor is hex encoded; an empty cursor in the reply
+        headers means there are no more rows.
+        @retval return a cassandra_rows type with the rows of the page in order
+        """
+        log.debug("In op_query_page: request %s" % request)
+
+        query_predicates = self._read_query(request)
+
+        page_size = int(headers.get(PAGE_SIZE_HEADER) or 0) or None
+        cursor = headers.get(CURSOR_HEADER) or None
+        if cursor is not None:
+            cursor = cursor.decode('hex')
+
+        rows, cursor = yield self._indexed_store.query_page(query_predicates, page_size, cursor)
+
+        response = yield self.message_client.create_instance(ROWS_TYPE)
+        self._write_rows(response, rows)
+
+        reply_headers = {CURSOR_HEADER:''}
+        if cursor is not None:
+            reply_headers[CURSOR_HEADER] = cursor.encode('hex')
+
+        yield self.reply_ok(msg, response, headers=reply_headers)
+
+    def _read_query(self, request):
+        """
+        Create a store.Query from a query attributes message
+        """
+        query_predicates = Query()    
+        for attr in request.attrs:
+            if attr.predicate_type == Query.EQ:
+                query_predicates.add_predicate_eq(attr.attribute_name, attr.attribute_value)
+            elif attr.predicate_type == Query.GT:
+                query_predicates.add_predicate_gt(attr.attribute_name, attr.attribute_value)
+            elif attr.predicate_type == Query.LT:
+                query_predicates.add_predicate_lt(attr.attribute_name, attr.attribute_value)
+            else:
+                raise IndexStoreServiceException("Unhandled predicate type: %s " % (attr.predicate_type,))
+        return query_predicates
+
+    def _write_rows(self, response, rows):
+        """
+        Add (key, columns dictionary) tuples to a rows message
+        """
+        for key,row in rows:
             r = response.rows.add()
             r.key = key
 
-
+            row = row.copy()
             r.value = row.pop('value')
 
             for name, val in row.items():
                 col = r.cols.add()
                 col.column_name = name
                 col.column_value = val
-        
-        log.debug("op_query Result %s" % response)
-
-        yield self.reply_ok(msg,response)
             
     @defer.inlineCallbacks
     def op_put(self, request, headers, msg):
@@ -231,6 +286,37 @@ class IndexStoreServiceClient(ServiceClient):
     def query(self, query_predicates):
         log.info("Called Index Store Service client: Query")
         
+        request = yield self._create_query(query_predicates)
+
+        (result, headers, msg) = yield self.rpc_send('query', request)
+
+        results = dict(self._read_rows(result))
+
+        defer.returnValue(results)
+
+    @defer.inlineCallbacks
+    def query_page(self, query_predicates, page_size=None, cursor=None):
+        log.info("Called Index Store Service client: query_page")
+
+        request = yield self._create_query(query_predicates)
+
+        page_headers = {}
+        if page_size:
+            page_headers[PAGE_SIZE_HEADER] = str(page_size)
+        if cursor is not None:
+            page_headers[CURSOR_HEADER] = cursor.encode('hex')
+
+        (result, headers, msg) = yield self.rpc_send('query_page', request, headers=page_headers)
+
+        cursor = headers.get(CURSOR_HEADER) or None
+        if cursor is not None:
+            cursor = cursor.decode('hex')
+
+        defer.returnValue((self._read_rows(result), cursor))
+
+    @defer.inlineCallbacks
+    def _create_query(self, query_predicates):
+
         request = yield self.mc.create_instance(QUERY_ATTRIBUTES_TYPE)
 
         for attr_key,attr_value,pred_type in query_predicates.get_predicates():
@@ -239,10 +325,11 @@ class IndexStoreServiceClient(ServiceClient):
             attr.attribute_value = str(attr_value)
             attr.predicate_type = str(pred_type)
 
-        (result, headers, msg) = yield self.rpc_send('query', request)
+        defer.returnValue(request)
 
+    def _read_rows(self, result):
 
-        results ={}
+        rows = []
         for row in result.rows:
 
             cols = {'value':row.value}
@@ -250,9 +337,9 @@ class IndexStoreServiceClient(ServiceClient):
             for col in row.cols:
                 cols[col.column_name] = col.column_value
 
-            results[row.key] = cols
+            rows.append((row.key, cols))
 
-        defer.returnValue(results)
+        return rows
         
     @defer.inlineCallbacks
     def put(self, key, value, index_attributes=None):
@@ -331,6 +418,33 @@ class IndexStoreServiceClient(ServiceClient):
         ret = bool(int(result.value))
         log.info("%s" % (ret,))
         defer.returnValue(ret)
+
+    @defer.inlineCallbacks
+    def get_many(self, keys):
+        """
+        The service messages hold a single row - one rpc per key
+        """
+        keys = list(keys)
+        values = yield defer.gatherResults([self.get(key) for key in keys])
+        defer.returnValue(dict(zip(keys, values)))
+
+    def put_many(self, items, index_attributes=None):
+        """
+        The service messages hold a single row - one rpc per key
+        """
+        if index_attributes is None:
+            index_attributes = {}
+        return defer.gatherResults([self.put(key, value, index_attributes.get(key))
+                                    for key, value in items.iteritems()])
+
+    @defer.inlineCallbacks
+    def has_keys(self, keys):
+        """
+        The service messages hold a single row - one rpc per key
+        """
+        keys = list(keys)
+        values = yield defer.gatherResults([self.has_key(key) for key in keys])
+        defer.returnValue(dict(zip(keys, values)))
         
     @defer.inlineCallbacks
     def get_query_attributes(self):
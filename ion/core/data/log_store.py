@@ -0,0 +1,517 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/data/log_store.py
+@brief Implementation of ion.core.data.store.IStore and IIndexStore on a local, append only log file.
+
+For a single node deployment which must survive a restart but does not warrant a cassandra cluster. Every put or
+remove appends a checksummed record to the log and an in memory index maps each key to the offset of its value.
+When enough of the file is dead records it is compacted into a new file which atomically replaces the old one.
+On startup the log is replayed to rebuild the index; a torn or corrupt record at the tail - a crash during a write -
+is discarded along with everything after it.
+"""
+
+import os
+import struct
+import zlib
+
+from zope.interface import implements
+
+from twisted.internet import defer
+
+from ion.core.data.store import IStore, IIndexStore, IndexStore, IndexStoreError
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+from ion.core import ioninit
+CONF = ioninit.config(__name__)
+
+
+# crc32, operation, key length, value length
+RECORD_HEADER = struct.Struct('!IBII')
+LENGTH = struct.Struct('!I')
+
+OP_PUT = 1
+OP_REMOVE = 2
+
+
+class LogStoreError(Exception):
+    """
+    An exception class for the log structured store
+    """
+
+
+class AppendLog(object):
+    """
+    An append only log of key/value records with an in memory index of the live values.
+    Not a store itself - LogStore and LogIndexStore provide the deferred interfaces on top of it.
+    """
+
+    def __init__(self, filename, fsync=False, compact_ratio=0.5, compact_min_bytes=2**20):
+        """
+        @param filename the log file - created if it does not exist
+        @param fsync if True every write is synced to disk before it returns
+        @param compact_ratio compact when more than this fraction of the file is dead records...
+        @param compact_min_bytes ...and the file is bigger than this
+        """
+        self.filename = filename
+        self.fsync = fsync
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+
+        # key: (offset of the value, length of the value)
+        self.index = {}
+        self.size = 0
+        self.live_bytes = 0
+        self.compactions = 0
+
+        self._file = None
+        self._recover()
+
+    def _recover(self):
+
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # A compaction that did not finish - the log itself is still intact
+        if os.path.exists(self.filename + '.compact'):
+            log.warn('Removing the remains of an interrupted compaction of "%s"' % self.filename)
+            os.remove(self.filename + '.compact')
+
+        if not os.path.exists(self.filename):
+            open(self.filename, 'wb').close()
+
+        self._file = open(self.filename, 'r+b')
+
+        end = 0
+        for offset, op, key, value_offset, value_length in self._scan(self._file):
+            record_length = value_offset + value_length - offset
+
+            old = self.index.pop(key, None)
+            if old is not None:
+                self.live_bytes -= self._record_length(key, old[1])
+
+            if op == OP_PUT:
+                self.index[key] = (value_offset, value_length)
+                self.live_bytes += record_length
+
+            end = offset + record_length
+
+        self._file.seek(0, os.SEEK_END)
+        file_size = self._file.tell()
+        if end < file_size:
+            log.warn('Discarding %d bytes of incomplete or corrupt records at the end of "%s"' %
+                     (file_size - end, self.filename))
+            self._file.truncate(end)
+            self._sync()
+
+        self.size = end
+
+    def _scan(self, f):
+        """
+        Iterate the valid records of the log from the start. Stops at the first torn or corrupt record.
+        """
+        f.seek(0)
+        offset = 0
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+
+            crc, op, key_length, value_length = RECORD_HEADER.unpack(header)
+            if op not in (OP_PUT, OP_REMOVE):
+                return
+
+            key = f.read(key_length)
+            if len(key) < key_length:
+                return
+
+            # Check the value without holding on to it
+            value = f.read(value_length)
+            if len(value) < value_length:
+                return
+
+            if self._crc(op, key, value) != crc:
+                return
+
+            value_offset = offset + RECORD_HEADER.size + key_length
+            yield offset, op, key, value_offset, value_length
+
+            offset = value_offset + value_length
+
+    def _crc(self, op, key, value):
+        crc = zlib.crc32(struct.pack('!BII', op, len(key), len(value)))
+        crc = zlib.crc32(key, crc)
+        return zlib.crc32(value, crc) & 0xffffffff
+
+    def _record_length(self, key, value_length):
+        return RECORD_HEADER.size + len(key) + value_length
+
+    def _record(self, op, key, value):
+        return RECORD_HEADER.pack(self._crc(op, key, value), op, len(key), len(value)) + key + value
+
+    def _sync(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _write(self, records):
+        """
+        Append records - a list of (op, key, value) - in a single write
+        """
+        if self._file is None:
+            raise LogStoreError('The log "%s" is closed' % self.filename)
+
+        chunks = []
+        offset = self.size
+        for op, key, value in records:
+            if not isinstance(key, str) or not isinstance(value, str):
+                raise LogStoreError('Keys and values of the log store must be of type str')
+
+            record = self._record(op, key, value)
+            chunks.append(record)
+
+            old = self.index.pop(key, None)
+            if old is not None:
+                self.live_bytes -= self._record_length(key, old[1])
+
+            if op == OP_PUT:
+                self.index[key] = (offset + len(record) - len(value), len(value))
+                self.live_bytes += len(record)
+
+            offset += len(record)
+
+        self._file.seek(self.size)
+        self._file.write(''.join(chunks))
+        self._sync()
+        self.size = offset
+
+        dead_bytes = self.size - self.live_bytes
+        if self.size > self.compact_min_bytes and dead_bytes > self.compact_ratio * self.size:
+            self.compact()
+
+    def put(self, key, value):
+        self._write([(OP_PUT, key, value)])
+
+    def put_many(self, items):
+        self._write([(OP_PUT, key, value) for key, value in items.iteritems()])
+
+    def remove(self, key):
+        if key in self.index:
+            self._write([(OP_REMOVE, key, '')])
+
+    def get(self, key):
+        location = self.index.get(key)
+        if location is None:
+            return None
+        offset, length = location
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def has_key(self, key):
+        return key in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    def compact(self):
+        """
+        Copy the live records to a new file and swap it in with an atomic rename
+        """
+        log.info('Compacting "%s": %d bytes, %d live' % (self.filename, self.size, self.live_bytes))
+
+        tmp_filename = self.filename + '.compact'
+        new_index = {}
+        offset = 0
+
+        tmp = open(tmp_filename, 'wb')
+        try:
+            # Keep the records in their original order
+            for key, (value_offset, value_length) in sorted(self.index.iteritems(), key=lambda item: item[1][0]):
+                value = self.get(key)
+                record = self._record(OP_PUT, key, value)
+                tmp.write(record)
+
+                new_index[key] = (offset + len(record) - value_length, value_length)
+                offset += len(record)
+
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        finally:
+            tmp.close()
+
+        self._file.close()
+        os.rename(tmp_filename, self.filename)
+        self._file = open(self.filename, 'r+b')
+
+        self.index = new_index
+        self.size = offset
+        self.live_bytes = offset
+        self.compactions += 1
+
+    def close(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+
+def _log_options(kwargs, default_filename):
+    """
+    Get the log file and its settings from the constructor keyword arguments or the configuration
+    """
+    filename = kwargs.get('filename') or os.path.join(CONF.getValue('directory', 'store'), default_filename)
+
+    return dict(filename=filename,
+                fsync=kwargs.get('fsync', CONF.getValue('fsync', False)),
+                compact_ratio=CONF.getValue('compact_ratio', 0.5),
+                compact_min_bytes=CONF.getValue('compact_min_bytes', 2**20))
+
+
+class LogStore(object):
+    """
+    Log structured, disk backed implementation of IStore.
+    """
+    implements(IStore)
+
+    # Tells the BackendBuilder the store keeps its state in a file
+    log_structured = True
+
+    def __init__(self, *args, **kwargs):
+        """
+        @param filename keyword argument - the log file. By default 'blobs.log' in the configured directory
+        """
+        self._log = AppendLog(**_log_options(kwargs, 'blobs.log'))
+
+    def get(self, key):
+        """
+        @see IStore.get
+        """
+        return defer.maybeDeferred(self._log.get, key)
+
+    def put(self, key, value):
+        """
+        @see IStore.put
+        """
+        return defer.maybeDeferred(self._log.put, key, value)
+
+    def remove(self, key):
+        """
+        @see IStore.remove
+        """
+        return defer.maybeDeferred(self._log.remove, key)
+
+    def has_key(self, key):
+        """
+        @see IStore.has_key
+        """
+        return defer.succeed(self._log.has_key(key))
+
+    def get_many(self, keys):
+        """
+        @see IStore.get_many
+        """
+        result = {}
+        for key in keys:
+            result[key] = self._log.get(key)
+        return defer.succeed(result)
+
+    def put_many(self, items):
+        """
+        @see IStore.put_many
+        All the items are appended in one write
+        """
+        return defer.maybeDeferred(self._log.put_many, items)
+
+    def has_keys(self, keys):
+        """
+        @see IStore.has_keys
+        """
+        result = {}
+        for key in keys:
+            result[key] = self._log.has_key(key)
+        return defer.succeed(result)
+
+    def close(self):
+        self._log.close()
+
+
+def _pack_row(row):
+    """
+    Serialize a dictionary of str column names and values as length prefixed strings
+    """
+    chunks = []
+    for name, value in row.iteritems():
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        if not isinstance(name, str) or not isinstance(value, str):
+            raise IndexStoreError('Column names and values of the log index store must be of type str.')
+        chunks.extend([LENGTH.pack(len(name)), name, LENGTH.pack(len(value)), value])
+    return ''.join(chunks)
+
+
+def _unpack_row(data):
+    row = {}
+    offset = 0
+    while offset < len(data):
+        length, = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        name = data[offset:offset + length]
+        offset += length
+
+        length, = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        row[name] = data[offset:offset + length]
+        offset += length
+    return row
+
+
+class LogIndexStore(IndexStore):
+    """
+    Log structured, disk backed implementation of IIndexStore.
+
+    The log holds each row - the value and the index attributes. The attributes of every row and the indices on them
+    are kept in memory as in the IndexStore; values are read from the log when they are asked for.
+    """
+    implements(IIndexStore)
+
+    # Tells the BackendBuilder the store keeps its state in a file
+    log_structured = True
+
+    def __init__(self, *args, **kwargs):
+        """
+        @param filename keyword argument - the log file. By default 'index.log' in the configured directory
+        @param indices keyword argument - the names of the indexed attributes
+        """
+        # Unlike the in memory store the state belongs to the instance
+        self.kvs = {}
+        self.indices = {}
+        IndexStore.__init__(self, *args, **kwargs)
+
+        self._log = AppendLog(**_log_options(kwargs, 'index.log'))
+
+        for key in self._log.keys():
+            row = _unpack_row(self._log.get(key))
+            del row['value']
+            self._update_index(key, row)
+            self.kvs[key] = row
+
+    def _write_row(self, key, value, index_attributes):
+        row = dict(index_attributes)
+        row['value'] = value
+        return _pack_row(row)
+
+    def get(self, key):
+        """
+        @see IStore.get
+        """
+        return defer.maybeDeferred(self._get_value, key)
+
+    def _get_value(self, key):
+        data = self._log.get(key)
+        if data is None:
+            return None
+        return _unpack_row(data)['value']
+
+    def put(self, key, value, index_attributes=None):
+        """
+        @see IIndexStore.put
+        """
+        return self.put_many({key:value}, {key:index_attributes or {}})
+
+    def put_many(self, items, index_attributes=None):
+        """
+        @see IIndexStore.put_many
+        All the rows are appended in one write
+        """
+        if index_attributes is None:
+            index_attributes = {}
+
+        # Fail before any index is updated or anything is written
+        rows = {}
+        try:
+            for key, value in items.iteritems():
+                attributes = index_attributes.get(key) or {}
+                self._check_indexed(attributes)
+                rows[key] = self._write_row(key, value, attributes)
+        except IndexStoreError:
+            return defer.fail()
+
+        for key in items:
+            self._update_index(key, index_attributes.get(key) or {})
+
+        self._log.put_many(rows)
+
+        for key in items:
+            self.kvs[key] = dict(index_attributes.get(key) or {})
+            self._notify(key)
+
+        return defer.succeed(None)
+
+    def remove(self, key):
+        """
+        @see IStore.remove
+        """
+        self._log.remove(key)
+        if self.kvs.has_key(key):
+            del self.kvs[key]
+            self._notify(key)
+        return defer.succeed(None)
+
+    def update_index(self, key, index_attributes):
+        """
+        @see IIndexStore.update_index
+        """
+        if 'value' in index_attributes:
+            raise IndexStoreError('Can not update the value column!')
+
+        row = dict(self.kvs[key])
+        row.update(index_attributes)
+        data = self._write_row(key, self._get_value(key), row)
+
+        self._update_index(key, index_attributes)
+        self._log.put(key, data)
+        self.kvs[key].update(index_attributes)
+        self._notify(key)
+        return defer.succeed(None)
+
+    def get_many(self, keys):
+        """
+        @see IStore.get_many
+        """
+        result = {}
+        for key in keys:
+            result[key] = self._get_value(key)
+        return defer.succeed(result)
+
+    def query(self, query_predicates):
+        """
+        @see IIndexStore.query
+        """
+        d = IndexStore.query(self, query_predicates)
+        d.addCallback(self._add_values)
+        return d
+
+    def _add_values(self, result):
+        for key, row in result.iteritems():
+            row['value'] = self._get_value(key)
+        return result
+
+    def query_page(self, query_predicates, page_size=None, cursor=None):
+        """
+        @see IIndexStore.query_page
+        """
+        d = IndexStore.query_page(self, query_predicates, page_size, cursor)
+        d.addCallback(self._add_page_values)
+        return d
+
+    def _add_page_values(self, page):
+        rows, cursor = page
+        for key, row in rows:
+            row['value'] = self._get_value(key)
+        return page
+
+    def close(self):
+        self._log.close()
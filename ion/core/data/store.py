@@ -9,6 +9,7 @@
         in memory implementation
 """
 import os
+from bisect import bisect_left, bisect_right, insort
 from zope.interface import Interface
 from zope.interface import implements
 
@@ -49,6 +50,31 @@ class IStore(Interface):
      
         """
 
+    def has_key(key):
+        """
+        Checks to see if the key exists in the column family
+        @param key is the key to check in the column family
+        @retVal Returns a bool in a deferred
+        """
+
+    def get_many(keys):
+        """
+        @param keys  an iterable of immutable keys
+        @retval Deferred, for a dictionary mapping each key to its value, or None if not existing.
+        """
+
+    def put_many(items):
+        """
+        @param items  a dictionary of immutable keys and the objects to be associated with them
+        @retval Deferred, for success of this operation
+        """
+
+    def has_keys(keys):
+        """
+        @param keys  an iterable of immutable keys
+        @retval Deferred, for a dictionary mapping each key to a bool - True if it exists
+        """
+
 class Store(object):
     """
     Memory implementation of an asynchronous key/value store, using a dict.
@@ -92,6 +118,30 @@ class Store(object):
         """ 
         return defer.maybeDeferred(self.kvs.has_key, key )
 
+    def get_many(self, keys):
+        """
+        @see IStore.get_many
+        """
+        result = {}
+        for key in keys:
+            result[key] = self.kvs.get(key, None)
+        return defer.succeed(result)
+
+    def put_many(self, items):
+        """
+        @see IStore.put_many
+        """
+        return defer.maybeDeferred(self.kvs.update, items)
+
+    def has_keys(self, keys):
+        """
+        @see IStore.has_keys
+        """
+        result = {}
+        for key in keys:
+            result[key] = self.kvs.has_key(key)
+        return defer.succeed(result)
+
 
 class IIndexStore(IStore):
     """
@@ -129,6 +179,16 @@ class IIndexStore(IStore):
         @param query_predicates is a store.Query object
         @retVal a thrift representation of the rows returned by the query.
         """
+
+    def query_page(query_predicates, page_size=None, cursor=None):
+        """
+        Get one page of the rows returned by a query.
+        @param query_predicates is a store.Query object
+        @param page_size is the maximum number of rows in the page
+        @param cursor is None for the first page, otherwise the cursor returned with the previous page
+        @retVal a tuple (rows, cursor) in a deferred. Rows is a list of (key, columns dictionary) tuples in the order
+        of the store. The cursor is None when there are no more rows.
+        """
         
     def update_index(key, index_attributes):
         """
@@ -148,11 +208,31 @@ class IIndexStore(IStore):
         Return the column names that are indexed.
         """
 
+    def put_many(items, index_attributes=None):
+        """
+        @param items  a dictionary of immutable keys and the objects to be associated with them
+        @param index_attributes a dictionary mapping some or all of the keys to a dictionary of attributes by which to
+        index the value of that key
+        @retval Deferred, for success of this operation
+        """
+
 class IndexStoreError(Exception):
     """
     An exception class for the index store
     """
 
+class AttributeIndex(dict):
+    """
+    The index of one attribute - {attr_value: set(keys)} - which also keeps its distinct values in order, so that
+    range predicates are answered by bisection rather than a scan of the index. The sorted values are built on the
+    first range query and kept up to date as values are added.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.sorted_values = None
+
+
 class IndexStore(object):
     """
     Memory implementation of an asynchronous key/value store, using a dict.
@@ -170,12 +250,29 @@ class IndexStore(object):
     
     self.indices is an index to map attribute names to attribute values to keys
         {attr_names:{attr_value: set( keys)}}.
+    The index of each attribute is an AttributeIndex, which keeps its values in order for range predicates.
+
+    Listeners are called with (key, row) each time a row is written or its index attributes are updated, and
+    with (key, None) when it is removed. A listener belongs to the rows of the store it was added to - it hears of
+    the writes through every store which shares those rows, and of no others.
     """
     implements(IIndexStore)
 
     kvs = {}
     indices = {}
 
+    # The listeners of each kvs dict - {id(kvs): (kvs, [listener, ...])}
+    _listeners = {}
+
+    # The number of writes to each kvs dict - {id(kvs): writes}
+    _writes = {}
+
+    # Default number of rows in a page returned by query_page
+    page_size = 1000
+
+    # The sorted keys of the last query paged by query_page - (kvs, writes, predicates, keys)
+    _paged = None
+
     def __init__(self, *args, **kwargs):
         #self.kvs = {}
         #self.indices = {}
@@ -183,7 +280,7 @@ class IndexStore(object):
         if kwargs.has_key('indices'):
             for name in kwargs.get('indices'):
                 if not self.indices.has_key(name):
-                    self.indices[name]={}
+                    self.indices[name]=AttributeIndex()
 
     def get(self, key):
         """
@@ -205,8 +302,10 @@ class IndexStore(object):
             index_attributes = {}
             
         self._update_index(key, index_attributes)
-                        
-        return defer.maybeDeferred(self.kvs.update, {key: dict({"value":value},**index_attributes)})        
+
+        self.kvs[key] = dict({"value":value},**index_attributes)
+        self._notify(key)
+        return defer.succeed(None)
     
     def remove(self, key):
         """
@@ -214,8 +313,35 @@ class IndexStore(object):
         """
         # could test for existence of key. this will error otherwise
         if self.kvs.has_key(key):
-            del self.kvs[key]            
+            del self.kvs[key]
+            self._notify(key)
         return defer.succeed(None)
+
+    def add_listener(self, listener):
+        """
+        @brief Call listener(key, row) for every change to a row from now on - row is None once it is removed
+        """
+        # The entry holds on to the kvs dict, so its id is not reused while it has listeners
+        entry = self._listeners.get(id(self.kvs))
+        if entry is None:
+            entry = (self.kvs, [])
+            self._listeners[id(self.kvs)] = entry
+        entry[1].append(listener)
+
+    def remove_listener(self, listener):
+        entry = self._listeners.get(id(self.kvs))
+        if entry is not None and listener in entry[1]:
+            entry[1].remove(listener)
+            if not entry[1]:
+                del self._listeners[id(self.kvs)]
+
+    def _notify(self, key):
+        self._writes[id(self.kvs)] = self._writes.get(id(self.kvs), 0) + 1
+        entry = self._listeners.get(id(self.kvs))
+        if entry is not None:
+            row = self.kvs.get(key)
+            for listener in list(entry[1]):
+                listener(key, row)
         
     def query(self, query_predicates):
         """
@@ -230,48 +356,140 @@ class IndexStore(object):
         """
         log.debug("In query: predicates %s" % query_predicates)
 
-        predicates = query_predicates.get_predicates()
-
-        eq_filter = lambda x: x[2] == Query.EQ
-        preds_eq = filter(eq_filter, predicates)
-        keys = set()
-        if len(preds_eq) == 0:
-            raise IndexStoreError('Invalid arguments to IndexStore - must provide at least one equal to operator for search!')
-        else:
-            k,v,pred = preds_eq.pop()
-            kindex = self.indices.get(k, None)
-            if kindex:
-                keys.update(kindex.get(v,set()))
-
-        for k,v,p in predicates:
-
-            kindex = self.indices.get(k,None)
-            if p == Query.EQ:
-                
-                if kindex:
-                    keys.intersection_update(kindex.get(v,set()))
-            elif p == Query.GT:
-                
-                matches = set()
-                for attr_val in kindex.keys():
-                    if attr_val > v:
-                        matches.update(kindex.get(attr_val,set()))
-                keys.intersection_update(matches)
-
-        #log.debug("keys: "+ str(keys))
         result = {}
-        for k in keys:
-            # This is stupid, but now remove effectively works - delete keys are no longer visible!
-            if self.kvs.has_key(k):
-                result[k] = self.kvs.get(k).copy()
+        for key in self._query_keys(query_predicates.get_predicates()):
+            result[key] = self.kvs[key].copy()
 
         log.debug("Query Results: %s" % result)
 
         return defer.succeed(result)                
+
+    def _query_keys(self, predicates):
+        """
+        @retval list of the keys of the rows which match all the predicates
+        """
+        if len(predicates) == 0:
+            raise IndexStoreError('Invalid arguments to IndexStore - must provide at least one predicate for search!')
+
+        # Find the most selective predicate - the smallest set of keys for an equal to predicate, or the fewest
+        # distinct values for a range predicate - then check the rows it selects against the rest.
+        best = None
+        for predicate in predicates:
+            size, matches = self._select(*predicate)
+            if best is None or size < best[0]:
+                best = (size, matches, predicate)
+
+        size, matches, seed = best
+        if callable(matches):
+            matches = matches()
+
+        others = [predicate for predicate in predicates if predicate is not seed]
+
+        keys = []
+        for key in matches:
+            row = self.kvs.get(key)
+            # This is stupid, but now remove effectively works - delete keys are no longer visible!
+            if row is None:
+                continue
+            for k,v,p in others:
+                if not self._row_matches(row, k, v, p):
+                    break
+            else:
+                keys.append(key)
+        return keys
+
+    def query_page(self, query_predicates, page_size=None, cursor=None):
+        """
+        @see IIndexStore.query_page
+        Rows are in key order - the cursor is the last key of the page. The sorted keys of the query are kept for
+        the next page, as long as the store is not written in between, so paging through a query runs it once.
+        """
+        page_size = page_size or self.page_size
+        predicates = list(query_predicates.get_predicates())
+        writes = self._writes.get(id(self.kvs), 0)
+
+        paged = self._paged
+        if cursor is None or paged is None or paged[0] is not self.kvs or paged[1] != writes or \
+                paged[2] != predicates:
+            keys = self._query_keys(predicates)
+            keys.sort()
+            paged = (self.kvs, writes, predicates, keys)
+            self._paged = paged
+        keys = paged[3]
+
+        start = 0
+        if cursor is not None:
+            start = bisect_right(keys, cursor)
+        page_keys = keys[start:start + page_size]
+
+        next_cursor = None
+        if start + page_size < len(keys):
+            next_cursor = page_keys[-1]
+        else:
+            self._paged = None
+
+        # A row may have gone with a reset of the store, which is not a write
+        rows = [(key, self.kvs.get(key)) for key in page_keys]
+        return defer.succeed(([(key, row.copy()) for key, row in rows if row is not None], next_cursor))
+
+    def _sorted_values(self, kindex):
+        """
+        Get the sorted list of values of an attribute index. It is rebuilt if the index was changed behind our back,
+        and kept with the index if it is an AttributeIndex.
+        """
+        values = getattr(kindex, 'sorted_values', None)
+        if values is None or len(values) != len(kindex):
+            values = sorted(kindex.keys())
+            if isinstance(kindex, AttributeIndex):
+                kindex.sorted_values = values
+        return values
+
+    def _select(self, name, value, predicate):
+        """
+        Find the keys selected by a single predicate.
+        @retval a tuple of the size of the selection and either the set of keys or a callable which returns it
+        """
+        kindex = self.indices.get(name,None)
+        if not kindex:
+            return 0, set()
+
+        if predicate == Query.EQ:
+            matches = kindex.get(value,set())
+            return len(matches), matches
+
+        values = self._sorted_values(kindex)
+        if predicate == Query.GT:
+            start, end = bisect_right(values, value), len(values)
+        elif predicate == Query.LT:
+            start, end = 0, bisect_left(values, value)
+        else:
+            raise IndexStoreError('Invalid arguments to IndexStore - unknown predicate "%s"' % predicate)
+
+        def collect():
+            matches = set()
+            for attr_val in values[start:end]:
+                matches.update(kindex[attr_val])
+            return matches
+
+        # The number of distinct values is a lower bound on the number of keys - good enough to pick a plan
+        return end - start, collect
+
+    def _row_matches(self, row, name, value, predicate):
+        if not row.has_key(name):
+            return False
+        attr_val = row[name]
+        if predicate == Query.EQ:
+            return attr_val == value
+        elif predicate == Query.GT:
+            return attr_val > value
+        elif predicate == Query.LT:
+            return attr_val < value
+        raise IndexStoreError('Invalid arguments to IndexStore - unknown predicate "%s"' % predicate)
     
-    def _update_index(self, key, index_attributes):
-        log.debug("In _update_index: key %s index_attributes %s" % (key,index_attributes))
-        #Ensure that we are updating attributes that are indexed.
+    def _check_indexed(self, index_attributes):
+        """
+        Raise an IndexStoreError if any of the attributes is not indexed
+        """
         query_attribute_names = set(self.indices.keys())
         index_attribute_names = set(index_attributes.keys())
         
@@ -279,6 +497,11 @@ class IndexStore(object):
             bad_attrs = index_attribute_names.difference(query_attribute_names)
             raise IndexStoreError("These attributes: %s %s %s"  % (",".join(bad_attrs),os.linesep,"are not indexed."))
 
+    def _update_index(self, key, index_attributes):
+        log.debug("In _update_index: key %s index_attributes %s" % (key,index_attributes))
+        #Ensure that we are updating attributes that are indexed.
+        self._check_indexed(index_attributes)
+
         current_attrs = self.kvs.get(key)
         if current_attrs is not None:
 
@@ -300,7 +523,12 @@ class IndexStore(object):
             #    kindex = {}
             #    self.indices[k] = kindex
             # Create a set of keys if it does not already exist
-            kindex[v] = kindex.get(v, set())
+            if not kindex.has_key(v):
+                kindex[v] = set()
+
+                values = getattr(kindex, 'sorted_values', None)
+                if values is not None and len(values) == len(kindex) - 1:
+                    insort(values, v)
             kindex[v].add(key)
     
 
@@ -316,6 +544,7 @@ class IndexStore(object):
         log.debug("In update_index")
         self._update_index(key, index_attributes)
         self.kvs[key].update(index_attributes)
+        self._notify(key)
         return defer.succeed(None)
     
     def has_key(self, key):
@@ -325,6 +554,48 @@ class IndexStore(object):
         @retVal Returns a bool in a deferred
         """
         return defer.maybeDeferred(self.kvs.has_key, key)
+
+    def get_many(self, keys):
+        """
+        @see IStore.get_many
+        """
+        result = {}
+        for key in keys:
+            row = self.kvs.get(key, None)
+            if row is None:
+                result[key] = None
+            else:
+                result[key] = row.get("value")
+        return defer.succeed(result)
+
+    def put_many(self, items, index_attributes=None):
+        """
+        @see IIndexStore.put_many
+        Fails with an IndexStoreError, and writes nothing, if any of the index_attibutes contain attributes that are
+        not indexed by the underlying store.
+        """
+        if index_attributes is None:
+            index_attributes = {}
+
+        try:
+            for attributes in index_attributes.itervalues():
+                self._check_indexed(attributes or {})
+        except IndexStoreError:
+            return defer.fail()
+
+        for key, value in items.iteritems():
+            self.put(key, value, index_attributes.get(key))
+
+        return defer.succeed(None)
+
+    def has_keys(self, keys):
+        """
+        @see IStore.has_keys
+        """
+        result = {}
+        for key in keys:
+            result[key] = self.kvs.has_key(key)
+        return defer.succeed(result)
     
     def get_query_attributes(self):
         """
@@ -339,6 +610,7 @@ class Query:
     
     EQ = "EQ"
     GT = "GT"
+    LT = "LT"
     def __init__(self):
         self._predicates = []
 
@@ -354,6 +626,9 @@ class Query:
     
     def add_predicate_gt(self, name, value):
         self._predicates.append((name,value,Query.GT))
+
+    def add_predicate_lt(self, name, value):
+        self._predicates.append((name,value,Query.LT))
         
     def get_predicates(self):
         return self._predicates    
@@ -480,8 +755,39 @@ class BackendBuilder(object):
         self.host = host
         self.port = port
         self.process = process
-        
-        
+
+
+def create_local_store(store_class, cache_name, process=None, shared=False, **kwargs):
+    """
+    Instantiate a store which does not need a backend connection - in memory or log structured.
+    A log structured store keeps its state in '<cache_name>.log' unless a filename is given. An in memory store
+    starts out empty.
+    @param store_class a class implementing IStore or IIndexStore
+    @param cache_name the name of the cache - used to name the log file
+    @param process passed on as the first argument, as for the other stores
+    @param shared if True an in memory store uses the state its class shares with every other instance in the
+    container, which is cleared; otherwise it has state of its own
+    """
+    if getattr(store_class, 'log_structured', False):
+        if not kwargs.get('filename'):
+            from ion.core.data import log_store
+            directory = log_store.CONF.getValue('directory', 'store')
+            kwargs['filename'] = os.path.join(directory, cache_name + '.log')
+        return store_class(process, **kwargs)
+
+    if shared:
+        store_class.kvs.clear()
+        if hasattr(store_class, 'indices'):
+            store_class.indices.clear()
+        return store_class(process, **kwargs)
+
+    # Fresh dictionaries on the instance, before the indices are created in them
+    instance = store_class.__new__(store_class)
+    instance.kvs = {}
+    if hasattr(store_class, 'indices'):
+        instance.indices = {}
+    instance.__init__(process, **kwargs)
+    return instance
 
 
 
@@ -206,4 +206,28 @@ class StoreServiceClient(ServiceClient):
         (result, headers, msg) = yield self.rpc_send('has_key', row)
         ret = bool(int(result.value))
         log.info("%s" % (ret,))
-        defer.returnValue(ret)
\ No newline at end of file
+        defer.returnValue(ret)
+
+    @defer.inlineCallbacks
+    def get_many(self, keys):
+        """
+        The service messages hold a single row - one rpc per key
+        """
+        keys = list(keys)
+        values = yield defer.gatherResults([self.get(key) for key in keys])
+        defer.returnValue(dict(zip(keys, values)))
+
+    def put_many(self, items):
+        """
+        The service messages hold a single row - one rpc per key
+        """
+        return defer.gatherResults([self.put(key, value) for key, value in items.iteritems()])
+
+    @defer.inlineCallbacks
+    def has_keys(self, keys):
+        """
+        The service messages hold a single row - one rpc per key
+        """
+        keys = list(keys)
+        values = yield defer.gatherResults([self.has_key(key) for key in keys])
+        defer.returnValue(dict(zip(keys, values)))
\ No newline at end of file
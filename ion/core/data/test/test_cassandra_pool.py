@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/data/test/test_cassandra_pool.py
+@test The pool of cassandra connections against a fake thrift server on localhost - no cassandra cluster is needed
+"""
+
+import time
+
+from zope.interface import implements
+
+from twisted.trial import unittest
+from twisted.internet import defer, reactor, task
+
+from thrift.transport import TTwisted
+from thrift.protocol import TBinaryProtocol
+
+from telephus.cassandra import Cassandra
+from telephus.protocol import ManagedThriftRequest
+
+from ion.core.data import cassandra
+from ion.util.tcp_connections import TCPConnectionPool
+
+
+class FakeCassandra(object):
+    """
+    Answers describe_version after a delay - or never, for the requests listed in hang
+    """
+    implements(Cassandra.Iface)
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.hang = set()
+        self.requests = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    def describe_version(self):
+        self.requests += 1
+        if self.requests in self.hang:
+            return defer.Deferred()
+
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+
+        d = task.deferLater(reactor, self.delay, lambda: '19.4.0')
+        def done(result):
+            self.concurrent -= 1
+            return result
+        return d.addCallback(done)
+
+
+class CountingServerProtocol(TTwisted.ThriftServerProtocol):
+
+    def connectionMade(self):
+        self.factory.connections += 1
+
+    def connectionLost(self, reason=None):
+        self.factory.connections -= 1
+
+
+def wait_for(condition, timeout=5.0):
+    """
+    Poll until the condition is true
+    """
+    start = time.time()
+    def check():
+        if condition():
+            return
+        if time.time() - start > timeout:
+            raise AssertionError('Timed out waiting for the condition')
+        return task.deferLater(reactor, 0.01, check)
+    return task.deferLater(reactor, 0, check)
+
+
+class CassandraPoolTest(unittest.TestCase):
+
+    DELAY = 0.1
+    REQUESTS = 8
+
+    def setUp(self):
+        self.handler = FakeCassandra(self.DELAY)
+
+        self.server_factory = TTwisted.ThriftServerFactory(Cassandra.Processor(self.handler),
+                                                           TBinaryProtocol.TBinaryProtocolFactory())
+        self.server_factory.protocol = CountingServerProtocol
+        self.server_factory.connections = 0
+        self.listener = reactor.listenTCP(0, self.server_factory, interface='127.0.0.1')
+
+        self.pools = []
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        for factory, pool in self.pools:
+            factory.stop_health_check()
+            factory.shutdown()
+            yield pool.terminate()
+
+        yield wait_for(lambda: self.server_factory.connections == 0)
+        yield self.listener.stopListening()
+
+    @defer.inlineCallbacks
+    def _make_pool(self, size):
+        factory = cassandra.PooledCassandraClientFactory()
+        pool = TCPConnectionPool('127.0.0.1', self.listener.getHost().port, factory, size=size)
+        self.pools.append((factory, pool))
+
+        yield pool.initialize()
+        yield pool.activate()
+        yield wait_for(lambda: len(factory._protos) == size)
+
+        defer.returnValue(factory)
+
+    @defer.inlineCallbacks
+    def _run_requests(self, factory):
+        start = time.time()
+        requests = [factory.pushRequest(ManagedThriftRequest('describe_version')) for i in range(self.REQUESTS)]
+        results = yield defer.gatherResults(requests)
+        elapsed = time.time() - start
+
+        self.assertEqual(results, ['19.4.0'] * self.REQUESTS)
+        defer.returnValue(elapsed)
+
+    @defer.inlineCallbacks
+    def test_concurrency_scaling(self):
+        single = yield self._make_pool(1)
+        single_elapsed = yield self._run_requests(single)
+        self.assertEqual(self.handler.max_concurrent, 1)
+
+        self.handler.max_concurrent = 0
+
+        pooled = yield self._make_pool(4)
+        pooled_elapsed = yield self._run_requests(pooled)
+        self.assertEqual(self.handler.max_concurrent, 4)
+
+        # One connection serializes the requests - four run them four at a time
+        self.assertTrue(single_elapsed >= self.REQUESTS * self.DELAY)
+        self.assertTrue(pooled_elapsed < single_elapsed / 2)
+
+    @defer.inlineCallbacks
+    def test_stats(self):
+        factory = yield self._make_pool(2)
+        d = self._run_requests(factory)
+
+        stats = factory.stats()
+        self.assertEqual(stats['connections'], 2)
+        self.assertEqual(stats['in_flight'], 2)
+        self.assertEqual(stats['queued'], self.REQUESTS - 2)
+
+        yield d
+
+        stats = factory.stats()
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(stats['requests'], self.REQUESTS)
+        # The last two requests waited for three rounds of requests ahead of them
+        self.assertTrue(stats['max_wait'] >= 3 * self.DELAY)
+        self.assertTrue(0 < stats['mean_wait'] < stats['max_wait'])
+
+    @defer.inlineCallbacks
+    def test_health_check(self):
+        self.handler.hang.add(1)
+
+        factory = yield self._make_pool(2)
+        factory.start_health_check(0.05, 0.2, 2)
+
+        try:
+            yield factory.pushRequest(ManagedThriftRequest('describe_version'))
+            self.fail('The request on the stuck connection should fail')
+        except cassandra.CassandraError:
+            pass
+
+        self.assertEqual(factory.aborted, 1)
+        self.assertEqual(factory.stats()['in_flight'], 0)
+
+        # Each connection reconnects through a factory of its own
+        connection_factories = [connector.factory for connector in self.pools[-1][1]._connectors]
+        self.assertEqual(len(set(connection_factories)), 2)
+        for connection_factory in connection_factories:
+            self.assertEqual(connection_factory.pool, factory)
+
+        # The other connection is still good and the dropped one is made again
+        result = yield factory.pushRequest(ManagedThriftRequest('describe_version'))
+        self.assertEqual(result, '19.4.0')
+
+        yield wait_for(lambda: len(factory._protos) == 2)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/data/test/test_cassandra_query.py
+@test Paged queries of the CassandraIndexedStore against a fake thrift client - no cassandra cluster is needed
+"""
+
+from bisect import bisect_left
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from telephus.cassandra.ttypes import IndexOperator, InvalidRequestException
+
+from ion.core.data import cassandra
+from ion.core.data.store import Query
+
+
+class FakeColumn(object):
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class FakeColumnOrSuperColumn(object):
+
+    def __init__(self, name, value):
+        self.column = FakeColumn(name, value)
+
+
+class FakeKeySlice(object):
+
+    def __init__(self, key, row):
+        self.key = key
+        self.columns = [FakeColumnOrSuperColumn(name, value) for name, value in row.items()]
+
+
+class FakeCassandraClient(object):
+    """
+    Serves get_indexed_slices from rows held in memory, in key order like an order preserving partitioner. It takes
+    the arguments of the telephus client, which builds the thrift IndexClause itself.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.keys = sorted(rows.keys())
+        self.requests = 0
+
+    def _match(self, row, expression):
+        value = row.get(expression.column_name)
+        if value is None:
+            return False
+        if expression.op == IndexOperator.EQ:
+            return value == expression.value
+        elif expression.op == IndexOperator.GT:
+            return value > expression.value
+        elif expression.op == IndexOperator.LT:
+            return value < expression.value
+        raise ValueError('Unexpected operator')
+
+    def get_indexed_slices(self, column_family, expressions, names=None, start_column='', reverse=False, count=100,
+                           column_count=100, start_key='', consistency=None, super_column=None):
+        self.requests += 1
+
+        # As cassandra, which needs an equality expression on an indexed column to search from
+        if not [expression for expression in expressions if expression.op == IndexOperator.EQ]:
+            return defer.fail(InvalidRequestException(why='No indexed columns present in index clause with operator EQ'))
+
+        slices = []
+        for key in self.keys[bisect_left(self.keys, start_key):]:
+            if len(slices) == count:
+                break
+
+            row = self.rows[key]
+            for expression in expressions:
+                if not self._match(row, expression):
+                    break
+            else:
+                slices.append(FakeKeySlice(key, row))
+
+        return defer.succeed(slices)
+
+
+class CassandraQueryTest(unittest.TestCase):
+
+    ROWS = 100003
+
+    def setUp(self):
+        rows = {}
+        for i in xrange(self.ROWS):
+            rows['key%06d' % i] = {'value':'value %d' % i, 'state':['UT', 'WI'][i % 2], 'number':'%06d' % i}
+
+        self.client = FakeCassandraClient(rows)
+
+        # No connection is made - the store just needs a client and a column family
+        self.store = cassandra.CassandraIndexedStore.__new__(cassandra.CassandraIndexedStore)
+        self.store.client = self.client
+        self.store._cache_name = 'fake_cache'
+        self.store._query_attribute_names = set(['state', 'number'])
+
+    @defer.inlineCallbacks
+    def test_query_all_pages(self):
+        q = Query()
+        q.add_predicate_eq('state', 'UT')
+
+        result = yield self.store.query(q)
+
+        self.assertEqual(len(result), (self.ROWS + 1) / 2)
+        self.assertEqual(result['key100002']['value'], 'value 100002')
+        self.assertEqual(self.client.requests, len(result) / cassandra.cassandra_page_size + 1)
+
+    @defer.inlineCallbacks
+    def test_query_row_count(self):
+        q = Query()
+        q.add_predicate_eq('state', 'WI')
+
+        result = yield self.store.query(q, row_count=2500)
+        self.assertEqual(len(result), 2500)
+
+    @defer.inlineCallbacks
+    def test_query_pages(self):
+        q = Query()
+        q.add_predicate_eq('state', 'UT')
+        q.add_predicate_gt('number', '099990')
+
+        keys = []
+        cursor = None
+        while True:
+            rows, cursor = yield self.store.query_page(q, page_size=2, cursor=cursor)
+            keys.extend([key for key, columns in rows])
+            if cursor is None:
+                break
+            self.assertEqual(cursor, rows[-1][0])
+
+        self.assertEqual(keys, ['key099992', 'key099994', 'key099996', 'key099998', 'key100000', 'key100002'])
+
+    @defer.inlineCallbacks
+    def test_query_page_deleted_cursor(self):
+        q = Query()
+        q.add_predicate_eq('state', 'UT')
+        q.add_predicate_lt('number', '000020')
+
+        rows, cursor = yield self.store.query_page(q, page_size=4)
+        self.assertEqual(cursor, 'key000006')
+
+        # The row at the cursor goes away before the next page is read
+        del self.client.rows['key000006']
+        self.client.keys.remove('key000006')
+
+        rows, cursor = yield self.store.query_page(q, page_size=4, cursor=cursor)
+        self.assertEqual([key for key, columns in rows], ['key000008', 'key000010', 'key000012', 'key000014'])
+
+        rows, cursor = yield self.store.query_page(q, page_size=4, cursor=cursor)
+        self.assertEqual([key for key, columns in rows], ['key000016', 'key000018'])
+        self.assertEqual(cursor, None)
+
+    def test_query_needs_eq(self):
+        q = Query()
+        q.add_predicate_lt('number', '000010')
+
+        return self.assertFailure(self.store.query_page(q), InvalidRequestException)
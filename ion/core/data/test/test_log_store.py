@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/data/test/test_log_store.py
+@test The log structured stores - the IStore and IIndexStore tests plus recovery and compaction
+"""
+
+import os
+import shutil
+import tempfile
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from ion.core.data import store
+from ion.core.data import log_store
+from ion.core.data.store import Query
+# Imported as a module so that trial does not run the in memory store tests again here
+from ion.core.data.test import test_store
+
+
+class LogStoreTest(test_store.IStoreTest):
+
+    def _setup_backend(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'blobs.log')
+        return defer.succeed(log_store.LogStore(filename=self.filename))
+
+    def tearDown(self):
+        self.ds.close()
+        shutil.rmtree(self.directory)
+        test_store.IStoreTest.tearDown(self)
+
+    def _reopen(self):
+        self.ds.close()
+        self.ds = log_store.LogStore(filename=self.filename)
+
+    @defer.inlineCallbacks
+    def test_reopen(self):
+        yield self.ds.put_many({'a':'1', 'b':'2', 'c':'3'})
+        yield self.ds.put('a', '4')
+        yield self.ds.remove('b')
+
+        self._reopen()
+
+        result = yield self.ds.get_many(['a', 'b', 'c'])
+        self.assertEqual(result, {'a':'4', 'b':None, 'c':'3'})
+
+    @defer.inlineCallbacks
+    def test_torn_write(self):
+        yield self.ds.put(self.key, self.value)
+        size = os.path.getsize(self.filename)
+
+        # A crash half way through the next record
+        yield self.ds.put('other', 'x' * 100)
+        self.ds.close()
+        f = open(self.filename, 'r+b')
+        f.truncate(size + 20)
+        f.close()
+
+        self.ds = log_store.LogStore(filename=self.filename)
+        self.assertEqual(os.path.getsize(self.filename), size)
+
+        b = yield self.ds.get(self.key)
+        self.assertEqual(b, self.value)
+        has_key = yield self.ds.has_key('other')
+        self.assertEqual(has_key, False)
+
+        # Still good for writing
+        yield self.ds.put('other', 'y')
+        self._reopen()
+        b = yield self.ds.get('other')
+        self.assertEqual(b, 'y')
+
+    @defer.inlineCallbacks
+    def test_corrupt_record(self):
+        yield self.ds.put('a', '1')
+        yield self.ds.put('b', '2')
+        self.ds.close()
+
+        # Flip the last byte of the value of 'b'
+        f = open(self.filename, 'r+b')
+        f.seek(-1, os.SEEK_END)
+        f.write('X')
+        f.close()
+
+        self.ds = log_store.LogStore(filename=self.filename)
+        result = yield self.ds.get_many(['a', 'b'])
+        self.assertEqual(result, {'a':'1', 'b':None})
+
+    @defer.inlineCallbacks
+    def test_compaction(self):
+        self.ds._log.compact_min_bytes = 1000
+
+        for i in range(200):
+            yield self.ds.put('a', 'value %d' % i)
+        yield self.ds.put(self.key, self.value)
+
+        self.assertTrue(self.ds._log.compactions > 0)
+        self.assertTrue(os.path.getsize(self.filename) < 1000)
+        self.assertFalse(os.path.exists(self.filename + '.compact'))
+
+        self._reopen()
+        b = yield self.ds.get('a')
+        self.assertEqual(b, 'value 199')
+        b = yield self.ds.get(self.key)
+        self.assertEqual(b, self.value)
+
+    @defer.inlineCallbacks
+    def test_interrupted_compaction(self):
+        yield self.ds.put(self.key, self.value)
+        self.ds.close()
+
+        open(self.filename + '.compact', 'wb').write('partial')
+
+        self.ds = log_store.LogStore(filename=self.filename)
+        self.assertFalse(os.path.exists(self.filename + '.compact'))
+        b = yield self.ds.get(self.key)
+        self.assertEqual(b, self.value)
+
+
+class LogIndexStoreTest(test_store.IndexStoreTest):
+
+    def _setup_backend(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'index.log')
+        return defer.succeed(log_store.LogIndexStore(filename=self.filename, indices=self.columns))
+
+    def tearDown(self):
+        self.ds.close()
+        shutil.rmtree(self.directory)
+        test_store.IndexStoreTest.tearDown(self)
+
+    @defer.inlineCallbacks
+    def test_reopen(self):
+        yield self.ds.update_index('htayler', {'state':'WI'})
+        yield self.ds.remove('prothfuss')
+
+        self.ds.close()
+        self.ds = log_store.LogIndexStore(filename=self.filename, indices=self.columns)
+
+        query = Query()
+        query.add_predicate_eq('state', 'WI')
+        rows = yield self.ds.query(query)
+        self.assertEqual(rows.keys(), ['htayler'])
+        self.assertEqual(rows['htayler']['value'], self.binary_value3)
+
+        query = Query()
+        query.add_predicate_gt('birth_date', '1970')
+        rows = yield self.ds.query(query)
+        self.assertEqual(rows.keys(), ['bsanderson'])
+
+    def test_separate_state(self):
+        # The in memory store shares its state at the class level - the log store must not touch it
+        self.assertEqual(store.IndexStore.kvs, {})
+
+
+class LogIndexStoreServiceTest(test_store.IndexStoreServiceTest):
+    """
+    The index store service on a log structured store, whose rows hold only the index columns in memory - the
+    values of the rows of query and query_page are read from the log
+    """
+
+    def _spawn_args(self):
+        self.directory = tempfile.mkdtemp()
+        # An absolute cache name puts the log in the temporary directory
+        return {'indices':self.columns, 'index_store_class':'ion.core.data.log_store.LogIndexStore',
+                'cache_name':os.path.join(self.directory, 'index')}
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield test_store.IndexStoreServiceTest.tearDown(self)
+        shutil.rmtree(self.directory)
+
+
+class CreateLocalStoreTest(unittest.TestCase):
+
+    def test_log_file_name(self):
+        directory = tempfile.mkdtemp()
+        try:
+            ds = store.create_local_store(log_store.LogStore, 'blobs', filename=os.path.join(directory, 'x.log'))
+            ds.close()
+            self.assertTrue(os.path.exists(os.path.join(directory, 'x.log')))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_in_memory_reset(self):
+        store.Store.kvs['stale'] = 'value'
+        ds = store.create_local_store(store.Store, 'blobs')
+        self.assertEqual(ds.kvs, {})
+
+        # Other instances keep their state
+        other = store.Store()
+        self.assertEqual(other.kvs, {'stale':'value'})
+        store.Store.kvs.clear()
+
+    @defer.inlineCallbacks
+    def test_in_memory_own_state(self):
+        ds = store.create_local_store(store.IndexStore, 'commits', indices=['state'])
+        yield ds.put('gwolfe', 'BinaryValue for Gene Wolfe', {'state':'IL'})
+
+        self.assertEqual(store.IndexStore.kvs, {})
+        self.failIf('state' in store.IndexStore.indices)
+
+    @defer.inlineCallbacks
+    def test_in_memory_shared(self):
+        store.IndexStore.kvs['stale'] = {'value':'value'}
+        ds = store.create_local_store(store.IndexStore, 'commits', shared=True, indices=['state'])
+        other = store.IndexStore(indices=['state'])
+        try:
+            self.failIf(other.kvs.has_key('stale'))
+
+            yield ds.put('gwolfe', 'BinaryValue for Gene Wolfe', {'state':'IL'})
+            value = yield other.get('gwolfe')
+            self.assertEqual(value, 'BinaryValue for Gene Wolfe')
+        finally:
+            store.IndexStore.kvs.clear()
+            store.IndexStore.indices.clear()
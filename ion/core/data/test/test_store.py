@@ -120,6 +120,29 @@ class IStoreTest(unittest.TestCase):
         has_key = yield self.ds.has_key(self.key)
         self.failUnlessEqual(has_key, False)
 
+    @defer.inlineCallbacks
+    def test_put_many_get_many(self):
+        items = {}
+        for i in range(10):
+            items[object_utils.sha1bin(str(uuid4()))] = object_utils.sha1bin(str(uuid4()))
+
+        yield self.ds.put_many(items)
+
+        missing = object_utils.sha1bin(str(uuid4()))
+        result = yield self.ds.get_many(items.keys() + [missing])
+
+        self.failUnlessEqual(result.pop(missing), None)
+        self.failUnlessEqual(result, items)
+
+        b = yield self.ds.get(items.keys()[0])
+        self.failUnlessEqual(b, items.values()[0])
+
+    @defer.inlineCallbacks
+    def test_has_keys(self):
+        yield self.ds.put(self.key, self.value)
+        result = yield self.ds.has_keys([self.key, "I don't exist"])
+        self.failUnlessEqual(result, {self.key:True, "I don't exist":False})
+
 
 class StoreServiceTest(IStoreTest, IonTestCase):
 
@@ -292,6 +315,102 @@ class IndexStoreTest(IStoreTest):
         for key in self.d3.keys():
             self.assertIn(key, rows['htayler'])
 
+    @defer.inlineCallbacks
+    def test_query_page(self):
+
+        query = Query()
+        query.add_predicate_eq('state','UT')
+
+        rows, cursor = yield self.ds.query_page(query, page_size=2)
+        self.assertEqual([key for key, columns in rows], ['bsanderson', 'htayler'])
+        self.assertEqual(rows[0][1]['value'], self.binary_value1)
+        self.assertEqual(cursor, 'htayler')
+
+        rows, cursor = yield self.ds.query_page(query, page_size=2, cursor=cursor)
+        self.assertEqual([key for key, columns in rows], ['jstewart'])
+        self.assertEqual(cursor, None)
+
+    @defer.inlineCallbacks
+    def test_query_page_written(self):
+
+        query = Query()
+        query.add_predicate_eq('state','UT')
+
+        rows, cursor = yield self.ds.query_page(query, page_size=1)
+        self.assertEqual([key for key, columns in rows], ['bsanderson'])
+
+        # Writes between pages show in the pages after the cursor
+        yield self.ds.put('abrown', 'BinaryValue for A Brown', {'full_name':'A Brown', 'state':'UT'})
+        yield self.ds.put('zstorm', 'BinaryValue for Z Storm', {'full_name':'Z Storm', 'state':'UT'})
+        yield self.ds.remove('jstewart')
+
+        keys = []
+        while cursor is not None:
+            rows, cursor = yield self.ds.query_page(query, page_size=1, cursor=cursor)
+            keys.extend([key for key, columns in rows])
+        self.assertEqual(keys, ['htayler', 'zstorm'])
+
+    # Tests less than 1974 and state == UT
+    @defer.inlineCallbacks
+    def test_query_less_and_eq(self):
+
+        query = Query()
+        query.add_predicate_lt('birth_date','1974')
+        query.add_predicate_eq('state','UT')
+        rows = yield self.ds.query(query)
+
+        self.assertEqual(rows.keys(), ['htayler'])
+        self.assertEqual(rows['htayler']['value'], self.binary_value3)
+
+    # Tests a range with no equal to predicate
+    @defer.inlineCallbacks
+    def test_query_range(self):
+
+        query = Query()
+        query.add_predicate_gt('birth_date','1970')
+        query.add_predicate_lt('birth_date','1975')
+        rows = yield self.ds.query(query)
+
+        self.assertEqual(rows.keys(), ['prothfuss'])
+
+        # New values go into the sorted index
+        yield self.ds.put('gwolfe', 'BinaryValue for Gene Wolfe', {'full_name':'Gene Wolfe', 'birth_date':'1971'})
+        rows = yield self.ds.query(query)
+
+        self.assertEqual(set(rows.keys()), set(['prothfuss', 'gwolfe']))
+
+        query = Query()
+        query.add_predicate_lt('birth_date','1970')
+        rows = yield self.ds.query(query)
+
+        self.assertEqual(rows.keys(), ['htayler'])
+
+    @defer.inlineCallbacks
+    def test_query_range_new_indices(self):
+        if type(self.ds) is not store.IndexStore:
+            raise unittest.SkipTest('Only the in memory store shares its indices at the class level')
+
+        query = Query()
+        query.add_predicate_gt('birth_date','1970')
+        rows = yield self.ds.query(query)
+        self.assertEqual(set(rows.keys()), set(['bsanderson', 'prothfuss']))
+
+        # New indices with as many values as the old ones - the sorted values go with them
+        store.IndexStore.kvs.clear()
+        store.IndexStore.indices.clear()
+        ds = store.IndexStore(indices=self.columns)
+        yield ds.put('jverne', 'BinaryValue for Jules Verne', {'birth_date':'1828'})
+        yield ds.put('hgwells', 'BinaryValue for H G Wells', {'birth_date':'1866'})
+        yield ds.put('aclarke', 'BinaryValue for Arthur C Clarke', {'birth_date':'1917'})
+
+        rows = yield ds.query(query)
+        self.assertEqual(rows, {})
+
+        query = Query()
+        query.add_predicate_gt('birth_date','1850')
+        rows = yield ds.query(query)
+        self.assertEqual(set(rows.keys()), set(['hgwells', 'aclarke']))
+
 
 
 
@@ -340,6 +459,44 @@ class IndexStoreTest(IStoreTest):
 
 
 
+    @defer.inlineCallbacks
+    def test_put_many_indexed(self):
+
+        items = {'gwolfe':self.binary_value1, 'ckeyes':self.binary_value2}
+        attributes = {'gwolfe':{'full_name':'Gene Wolfe', 'state':'IL', 'birth_date':'1931'}}
+
+        yield self.ds.put_many(items, attributes)
+
+        query = Query()
+        query.add_predicate_eq('birth_date', '1931')
+        rows = yield self.ds.query(query)
+        self.assertEqual(rows.keys(), ['gwolfe'])
+        self.assertEqual(rows['gwolfe']['value'], self.binary_value1)
+
+        values = yield self.ds.get_many(['gwolfe', 'ckeyes'])
+        self.assertEqual(values, items)
+
+    @defer.inlineCallbacks
+    def test_put_many_not_indexed(self):
+        if not isinstance(self.ds, store.IndexStore):
+            raise unittest.SkipTest('The error of a remote store is reported by the service')
+
+        items = {'gwolfe':self.binary_value1, 'ckeyes':self.binary_value2}
+        attributes = {'gwolfe':{'state':'IL'}, 'ckeyes':{'state':'NY', 'genre':'SF'}}
+
+        yield self.failUnlessFailure(self.ds.put_many(items, attributes), store.IndexStoreError)
+
+        # Nothing is written and no index is changed
+        values = yield self.ds.get_many(['gwolfe', 'ckeyes'])
+        self.assertEqual(values, {'gwolfe':None, 'ckeyes':None})
+
+        query = Query()
+        query.add_predicate_eq('state', 'IL')
+        rows = yield self.ds.query(query)
+        self.assertEqual(rows, {})
+        self.failIf(self.ds.indices['state'].has_key('IL'))
+
+
     @defer.inlineCallbacks
     def test_update_index_blank(self):
 
@@ -393,6 +550,56 @@ class IndexStoreTest(IStoreTest):
         self.fail('Did not raise Index Store Error')
 
 
+    @defer.inlineCallbacks
+    def test_listener(self):
+        if not hasattr(self.ds, 'add_listener'):
+            raise unittest.SkipTest('The backend does not report its writes')
+
+        changes = []
+        def listener(key, row):
+            changes.append((key, row and dict(row)))
+
+        self.ds.add_listener(listener)
+        try:
+            yield self.ds.put('gwolfe', 'BinaryValue for Gene Wolfe', {'full_name':'Gene Wolfe', 'state':'IL'})
+            yield self.ds.update_index('gwolfe', {'state':'MD'})
+            yield self.ds.remove('gwolfe')
+        finally:
+            self.ds.remove_listener(listener)
+
+        self.assertEqual([key for key, row in changes], ['gwolfe'] * 3)
+        self.assertEqual(changes[0][1]['state'], 'IL')
+        self.assertEqual(changes[1][1]['state'], 'MD')
+        self.assertEqual(changes[1][1]['full_name'], 'Gene Wolfe')
+        self.assertEqual(changes[2][1], None)
+
+        # No more calls once it is removed
+        yield self.ds.put('gwolfe', 'BinaryValue for Gene Wolfe', {'full_name':'Gene Wolfe'})
+        self.assertEqual(len(changes), 3)
+
+    @defer.inlineCallbacks
+    def test_listener_other_store(self):
+        if type(self.ds) is not store.IndexStore:
+            raise unittest.SkipTest('Only the in memory store shares its rows at the class level')
+
+        changes = []
+        def listener(key, row):
+            changes.append(key)
+
+        # A store with rows of its own, and one which shares the rows of this one
+        own = store.create_local_store(store.IndexStore, 'scheduler', indices=self.columns)
+        shared = store.IndexStore(indices=self.columns)
+
+        self.ds.add_listener(listener)
+        try:
+            yield own.put('gwolfe', 'BinaryValue for Gene Wolfe', {'state':'IL'})
+            yield shared.put('ckeyes', 'BinaryValue for Cassandra Keyes', {'state':'NY'})
+        finally:
+            self.ds.remove_listener(listener)
+
+        self.assertEqual(changes, ['ckeyes'])
+
+
 
 class IndexStoreServiceTest(IndexStoreTest, IonTestCase):
 
@@ -413,7 +620,7 @@ class IndexStoreServiceTest(IndexStoreTest, IonTestCase):
         self.timeout = 30
         services = [
             {'name':'index_store_service','module':'ion.core.data.index_store_service','class':'IndexStoreService',
-             'spawnargs':{'indices':self.columns}},
+             'spawnargs':self._spawn_args()},
 
         ]
         sup = yield self._spawn_processes(services)
@@ -421,6 +628,9 @@ class IndexStoreServiceTest(IndexStoreTest, IonTestCase):
 
         defer.returnValue(client)
 
+    def _spawn_args(self):
+        return {'indices':self.columns}
+
 
     @defer.inlineCallbacks
     def tearDown(self):
@@ -44,11 +44,15 @@ class InterceptorSystem(Interceptor):
         log.info("InterceptorSystem initialized: %s interceptors %s, %s paths loaded: %s" % (
             len(self.interceptors), self.interceptors.keys(), len(self.paths), self.paths.keys()))
 
+    @defer.inlineCallbacks
     def on_activate(self, *args, **kwargs):
         """
+        Activates the interceptors, which may now use the messaging of the
+        container.
         @retval Deferred
         """
-        return defer.succeed(None)
+        for intc in self.interceptors.values():
+            yield intc.activate()
 
     def on_terminate(self, *args, **kwargs):
         """
@@ -135,8 +139,7 @@ class InterceptorSystem(Interceptor):
         if not type(intcargs) is dict:
             raise ConfigurationError("Interceptor '%s' args must be dict %r" % (name, intcargs))
         yield intc.initialize(**intcargs)
-        yield intc.activate()
-        #log.debug("Interceptor '%s' created and activated: %r" % (name, intc))
+        #log.debug("Interceptor '%s' created and initialized: %r" % (name, intc))
         defer.returnValue(intc)
 
     def _create_intercept_path(self, config):
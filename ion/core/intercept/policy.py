@@ -18,6 +18,7 @@ from ion.core.intercept.interceptor import EnvelopeInterceptor
 from ion.core.messaging.message_client import MessageInstance
 
 from ion.core.process.cprocess import Invocation
+from ion.core.process.process import Process
 
 import time
 
@@ -27,6 +28,7 @@ from ion.services.coi.datastore_bootstrap.ion_preload_config import OWNED_BY_ID
 from ion.services.dm.inventory.association_service import AssociationServiceClient, ASSOCIATION_QUERY_MSG_TYPE
 from ion.services.dm.inventory.association_service import IDREF_TYPE
 from ion.core.messaging.message_client import MessageClient
+from ion.services.dm.distribution.events import OwnershipChangeEventSubscriber
 
 from google.protobuf.internal.containers import RepeatedScalarFieldContainer
 
@@ -144,7 +146,101 @@ def subject_has_early_adopter_role(subject):
 def user_has_early_adopter_role(ooi_id):
     return user_has_role(ooi_id, 'EARLY_ADOPTER')
 
+class PolicyDecisionCache(object):
+    """
+    Decisions of the association service on whether a user holds a role on a
+    resource, keyed by (user id, resource id, role). A decision is kept for ttl
+    seconds, or until the resource is invalidated - on an ownership change
+    event for it.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=10000, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+
+        # (user id, resource id, role) -> (decision, time it expires)
+        self.decisions = {}
+        # resource id -> set of keys in decisions
+        self.by_resource = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id, resource_id, role='OWNER'):
+        """
+        @retval The cached decision, or None if there is none or it has expired
+        """
+        key = (user_id, resource_id, role)
+        entry = self.decisions.get(key, None)
+        if entry is not None:
+            decision, expires = entry
+            if self.clock() < expires:
+                self.hits += 1
+                return decision
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def put(self, user_id, resource_id, decision, role='OWNER'):
+        if self.ttl <= 0:
+            return
+        if len(self.decisions) >= self.max_entries:
+            self._remove_expired()
+            if len(self.decisions) >= self.max_entries:
+                self.clear()
+
+        key = (user_id, resource_id, role)
+        self.decisions[key] = (decision, self.clock() + self.ttl)
+        self.by_resource.setdefault(resource_id, set()).add(key)
+
+    def invalidate(self, resource_id):
+        """
+        Forgets every decision on the resource
+        """
+        keys = self.by_resource.pop(resource_id, ())
+        for key in keys:
+            del self.decisions[key]
+        self.invalidations += 1
+
+    def clear(self):
+        self.decisions.clear()
+        self.by_resource.clear()
+
+    def stats(self):
+        return {'hits':self.hits, 'misses':self.misses, 'invalidations':self.invalidations,
+                'entries':len(self.decisions)}
+
+    def _remove(self, key):
+        del self.decisions[key]
+        keys = self.by_resource.get(key[1], None)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_resource[key[1]]
+
+    def _remove_expired(self):
+        now = self.clock()
+        for key, (decision, expires) in self.decisions.items():
+            if expires <= now:
+                self._remove(key)
+
+
 class PolicyInterceptor(EnvelopeInterceptor):
+    def __init__(self, name):
+        EnvelopeInterceptor.__init__(self, name)
+        self.decision_cache = PolicyDecisionCache(ttl=float(CONF.getValue('owner_cache_ttl', 60.0)),
+                                                  max_entries=int(CONF.getValue('owner_cache_size', 10000)))
+
+    def on_activate(self, *args, **kwargs):
+        """
+        Subscribes to ownership change events, once the container can send
+        and receive messages
+        @retval Deferred
+        """
+        return self.listen_for_ownership_changes()
+
     def before(self, invocation):
         msg = invocation.content
         return self.is_authorized(msg, invocation)
@@ -282,31 +378,80 @@ class PolicyInterceptor(EnvelopeInterceptor):
 
     @defer.inlineCallbacks
     def check_owner(self, user_id, uuid_list, invocation):
-        self.mc = MessageClient(proc=invocation.process)
-        self.asc = AssociationServiceClient(proc=invocation.process)
+        """
+        Drops the invocation unless user_id owns every resource in uuid_list.
+        Decisions come from the decision cache where it has them; the rest are
+        asked of the association service, one resource at a time, and cached.
+        The datastore publishes an ownership change event whenever an ownership
+        association is pushed or preloaded, which invalidates the decisions on
+        the resource.
+        """
+        checked = set()
+        for uuid in uuid_list:
+            if uuid in checked:
+                continue
+            checked.add(uuid)
+
+            owner = self.decision_cache.get(user_id, uuid)
+            if owner is None:
+                owner = yield self.query_owner(user_id, uuid, invocation)
+                self.decision_cache.put(user_id, uuid, owner)
+
+            if owner == False:
+                log.warn('Policy Interceptor: Authentication failed. User <%s> does not own resource <%s>.' % (user_id, uuid))
+                invocation.drop(note='Not authorized', code=Invocation.CODE_UNAUTHORIZED)
+                return
+            else:
+                log.debug('Policy Interceptor: User <%s> owns resource <%s>.', user_id, uuid)
 
-        for uuid in uuid_list:        
-            request = yield self.mc.create_instance(ASSOCIATION_QUERY_MSG_TYPE)
+    @defer.inlineCallbacks
+    def query_owner(self, user_id, uuid, invocation):
+        """
+        Asks the association service whether user_id owns the resource uuid.
+        @retval Deferred, True or False
+        """
+        mc = MessageClient(proc=invocation.process)
+        asc = AssociationServiceClient(proc=invocation.process)
 
-            request.object = request.CreateObject(IDREF_TYPE)
-            request.object.key = user_id
+        request = yield mc.create_instance(ASSOCIATION_QUERY_MSG_TYPE)
 
-            request.predicate = request.CreateObject(IDREF_TYPE)
-            request.predicate.key = OWNED_BY_ID
+        request.object = request.CreateObject(IDREF_TYPE)
+        request.object.key = user_id
 
-            request.subject = request.CreateObject(IDREF_TYPE)
-            request.subject.key = uuid
+        request.predicate = request.CreateObject(IDREF_TYPE)
+        request.predicate.key = OWNED_BY_ID
 
-            # make the request
-            log.warn('Calling association service for user id <%s> and uuid <%s>' % (user_id, uuid))
-            result = yield self.asc.association_exists(request)
-            log.warn('Return from association service call for user id <%s> and uuid <%s>' % (user_id, uuid))
-            if result.result == False:
-                log.warn('Policy Interceptor: Authentication failed. User <%s> does not own resource <%s>.' % (user_id, uuid))
-                invocation.drop(note='Not authorized', code=Invocation.CODE_UNAUTHORIZED)
-                return
-            else:
-                log.warn('Policy Interceptor: User <%s> owns resource <%s>.' % (user_id, uuid))
+        request.subject = request.CreateObject(IDREF_TYPE)
+        request.subject.key = uuid
+
+        # make the request
+        log.debug('Calling association service for user id <%s> and uuid <%s>', user_id, uuid)
+        result = yield asc.association_exists(request)
+        defer.returnValue(result.result == True)
+
+    @defer.inlineCallbacks
+    def listen_for_ownership_changes(self):
+        """
+        Subscribes to ownership change events, which invalidate the decisions
+        cached for their resource. The subscription belongs to a process of its
+        own, as the interceptor has none. Without it, decisions still expire
+        after the ttl of the cache.
+        @retval Deferred, fired once subscribed
+        """
+        try:
+            proc = Process(spawnargs={'proc-name':'policy_decision_cache'})
+            yield proc.spawn()
+
+            sub = OwnershipChangeEventSubscriber(process=proc)
+            sub.ondata = self._ownership_changed
+            yield proc.register_life_cycle_object(sub)
+        except Exception, ex:
+            log.exception('Policy Interceptor: Could not subscribe to ownership change events')
+
+    def _ownership_changed(self, data):
+        resource_id = data['content'].origin
+        log.debug('Policy Interceptor: Ownership of resource <%s> changed', resource_id)
+        self.decision_cache.invalidate(resource_id)
 
     def find_uuids(self, invocation, msg, user_id, resources):
         """
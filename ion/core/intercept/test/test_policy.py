@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/intercept/test/test_policy.py
+@test ion.core.intercept.policy decision cache of ownership checks, with the
+association service queries counted instead of sent
+"""
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from ion.core.intercept.policy import PolicyDecisionCache, PolicyInterceptor
+from ion.core.process.cprocess import Invocation
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeContent(object):
+    def __init__(self, origin):
+        self.origin = origin
+
+
+class CountingPolicyInterceptor(PolicyInterceptor):
+    """
+    Owns the resources in owned, for any user, without an association service
+    """
+    def __init__(self, owned):
+        PolicyInterceptor.__init__(self, 'policy')
+        self.owned = owned
+        self.queries = []
+        self.listening = False
+
+    def query_owner(self, user_id, uuid, invocation):
+        self.queries.append((user_id, uuid))
+        return defer.succeed(uuid in self.owned)
+
+    def listen_for_ownership_changes(self):
+        self.listening = True
+        return defer.succeed(None)
+
+
+class PolicyDecisionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = PolicyDecisionCache(ttl=10.0, max_entries=3, clock=self.clock)
+
+    def test_ttl(self):
+        self.assertEqual(self.cache.get('user', 'res1'), None)
+        self.cache.put('user', 'res1', True)
+        self.cache.put('user', 'res2', False)
+        self.assertEqual(self.cache.get('user', 'res1'), True)
+        self.assertEqual(self.cache.get('user', 'res2'), False)
+        self.assertEqual(self.cache.get('other', 'res1'), None)
+        self.assertEqual(self.cache.get('user', 'res1', role='ADMIN'), None)
+
+        self.clock.now += 10.0
+        self.assertEqual(self.cache.get('user', 'res1'), None)
+        self.assertEqual(self.cache.stats(), {'hits':2, 'misses':4, 'invalidations':0, 'entries':1})
+
+    def test_invalidate(self):
+        self.cache.put('user', 'res1', True)
+        self.cache.put('other', 'res1', False)
+        self.cache.put('user', 'res2', True)
+
+        self.cache.invalidate('res1')
+        self.assertEqual(self.cache.get('user', 'res1'), None)
+        self.assertEqual(self.cache.get('other', 'res1'), None)
+        self.assertEqual(self.cache.get('user', 'res2'), True)
+        self.assertEqual(self.cache.invalidations, 1)
+
+    def test_max_entries(self):
+        for i in xrange(3):
+            self.cache.put('user', 'res%d' % i, True)
+        self.clock.now += 5.0
+        self.cache.put('user', 'res3', True)
+        self.assertEqual(len(self.cache.decisions), 1)
+        self.assertEqual(self.cache.by_resource.keys(), ['res3'])
+
+
+class CheckOwnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.interceptor = CountingPolicyInterceptor(set(['res%d' % i for i in xrange(5)]))
+
+    @defer.inlineCallbacks
+    def test_cached(self):
+        uuids = ['res%d' % i for i in xrange(5)] + ['res0']
+
+        # Grants and denials are both cached
+        for i in xrange(2):
+            invocation = Invocation()
+            yield self.interceptor.check_owner('user', uuids, invocation)
+            self.assertEqual(invocation.status, Invocation.STATUS_PROCESS)
+        self.assertEqual(len(self.interceptor.queries), 5)
+
+        for i in xrange(2):
+            invocation = Invocation()
+            yield self.interceptor.check_owner('user', ['res9'], invocation)
+            self.assertEqual(invocation.status, Invocation.STATUS_DROP)
+        self.assertEqual(len(self.interceptor.queries), 6)
+
+        stats = self.interceptor.decision_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (6, 6, 6))
+
+    @defer.inlineCallbacks
+    def test_listen(self):
+        invocation = Invocation()
+        yield self.interceptor.check_owner('user', ['res0'], invocation)
+        self.failIf(self.interceptor.listening)
+
+        yield self.interceptor.initialize()
+        yield self.interceptor.activate()
+        self.failUnless(self.interceptor.listening)
+
+    @defer.inlineCallbacks
+    def test_ownership_change(self):
+        invocation = Invocation()
+        yield self.interceptor.check_owner('user', ['res9'], invocation)
+        self.assertEqual(invocation.status, Invocation.STATUS_DROP)
+
+        # The resource is given to the user
+        self.interceptor.owned.add('res9')
+        self.interceptor._ownership_changed({'content':FakeContent('res9')})
+
+        invocation = Invocation()
+        yield self.interceptor.check_owner('user', ['res9'], invocation)
+        self.assertEqual(invocation.status, Invocation.STATUS_PROCESS)
+        self.assertEqual(self.interceptor.queries, [('user', 'res9'), ('user', 'res9')])
+
+    @defer.inlineCallbacks
+    def test_ownership_revoked(self):
+        invocation = Invocation()
+        yield self.interceptor.check_owner('user', ['res0'], invocation)
+        self.assertEqual(invocation.status, Invocation.STATUS_PROCESS)
+
+        # The resource is taken from the user - the cached grant goes with the event
+        self.interceptor.owned.discard('res0')
+        self.interceptor._ownership_changed({'content':FakeContent('res0')})
+
+        invocation = Invocation()
+        yield self.interceptor.check_owner('user', ['res0'], invocation)
+        self.assertEqual(invocation.status, Invocation.STATUS_DROP)
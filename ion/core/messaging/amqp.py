@@ -9,6 +9,7 @@ from time import time
 
 from twisted.internet import defer
 from twisted.internet import protocol
+from twisted.internet import reactor
 from twisted.python import failure
 
 from txamqp import spec
@@ -35,6 +36,68 @@ class ChannelWithCallback(AMQChannel):
     def set_consumer_callback(self, callback):
         self.deliver_callback = callback
 
+class CoalescingTransport(object):
+    """
+    Wraps the transport of a connection and joins the frames written to it
+    within window seconds, or until max_bytes are held, into one write.
+
+    Twisted already joins the writes of one reactor turn into one send. This
+    also joins the frames of senders which publish over several turns, such
+    as a loop which yields on each send, and does the work of a transport
+    write once for all of them.
+    """
+
+    def __init__(self, transport, window, max_bytes, clock=None):
+        self.transport = transport
+        self.window = window
+        self.max_bytes = max_bytes
+        self.clock = clock or reactor
+
+        self._buffer = []
+        self._size = 0
+        self._call = None
+
+        # Frames written to this transport and writes to the one it wraps
+        self.frames = 0
+        self.writes = 0
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._size += len(data)
+        self.frames += 1
+        if self._size >= self.max_bytes:
+            self.flush()
+        elif self._call is None:
+            self._call = self.clock.callLater(self.window, self.flush)
+
+    def writeSequence(self, seq):
+        for data in seq:
+            self.write(data)
+
+    def flush(self):
+        """
+        Writes the frames held so far.
+        """
+        if self._call is not None:
+            if self._call.active():
+                self._call.cancel()
+            self._call = None
+
+        if self._buffer:
+            data = ''.join(self._buffer)
+            self._buffer = []
+            self._size = 0
+            self.writes += 1
+            self.transport.write(data)
+
+    def loseConnection(self, *args, **kwargs):
+        self.flush()
+        return self.transport.loseConnection(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
 class AMQPProtocol(AMQClient):
     """ Improvements to the txamqp implementation.
     """
@@ -43,6 +106,10 @@ class AMQPProtocol(AMQClient):
     next_channel_id = 0
     closed = True
 
+    # Frame coalescing - see CoalescingTransport. Off with a window of 0.
+    coalesce_window = 0
+    coalesce_bytes = 65536
+
     def channel(self, id=None):
         """Overrides AMQClient. Changes: 
             1) no need to return deferred. The channelLock doesn't protect
@@ -74,8 +141,26 @@ class AMQPProtocol(AMQClient):
 
     def connectionMade(self):
         self.closed = False
+        if self.coalesce_window > 0:
+            self.set_coalescing(self.coalesce_window)
         AMQClient.connectionMade(self)
 
+    def set_coalescing(self, window, max_bytes=None):
+        """
+        Joins the frames sent within window seconds, or up to max_bytes, into
+        one write to the broker. A window of 0 turns coalescing off.
+        """
+        if isinstance(self.transport, CoalescingTransport):
+            self.transport.flush()
+            self.transport = self.transport.transport
+
+        self.coalesce_window = window
+        if max_bytes:
+            self.coalesce_bytes = max_bytes
+
+        if window > 0:
+            self.transport = CoalescingTransport(self.transport, window, self.coalesce_bytes)
+
     def processFrame(self, frame):
         ch = self.channel(frame.channel)
         if frame.payload.type == Frame.HEARTBEAT:
@@ -112,7 +197,9 @@ class ConnectionCreator(object):
     def __init__(self, reactor, username='guest', password='guest',
                                 vhost='/', delegate=None,
                                 spec_path=SPEC_PATH,
-                                heartbeat=0):
+                                heartbeat=0,
+                                coalesce_window=0,
+                                coalesce_bytes=65536):
         self.reactor = reactor
         self.username = username
         self.password = password
@@ -126,6 +213,8 @@ class ConnectionCreator(object):
             self.spec = cache.setdefault(spec_path, spec.load(spec_path))
 
         self.heartbeat = heartbeat
+        self.coalesce_window = coalesce_window
+        self.coalesce_bytes = coalesce_bytes
         if delegate is None:
             delegate = TwistedDelegate()
         self.delegate = delegate
@@ -141,6 +230,8 @@ class ConnectionCreator(object):
                                     self.spec,
                                     heartbeat=self.heartbeat)
         p.factory = self
+        p.coalesce_window = self.coalesce_window
+        p.coalesce_bytes = self.coalesce_bytes
         f = protocol._InstanceFactory(self.reactor, p, d)
         self.connector = self.reactor.connectTCP(host, port, f, timeout=timeout,
                 bindAddress=bindAddress)
@@ -11,12 +11,15 @@ from twisted.internet import defer
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 
+from ion.core import ioninit
 from ion.core.messaging import messaging
 from ion.core.messaging.messaging import MessageSpace, ProcessExchangeSpace, Consumer
 from ion.util.state_object import BasicLifecycleObject
 
 DEFAULT_EXCHANGE_SPACE = 'magnet.topic'
 
+CONF = ioninit.config(__name__)
+
 class ExchangeManager(BasicLifecycleObject):
     """
     Manager class for capability container exchange management.
@@ -58,7 +61,9 @@ class ExchangeManager(BasicLifecycleObject):
                                 virtual_host=virtual_host,
                                 username=username,
                                 password=password,
-                                heartbeat=heartbeat)
+                                heartbeat=heartbeat,
+                                coalesce_window=CONF.getValue('coalesce_window', 0),
+                                coalesce_bytes=CONF.getValue('coalesce_bytes', 65536))
 
         return defer.succeed(None)
 
@@ -73,10 +73,15 @@ class MessageSpace(BasicLifecycleObject):
     """
 
     def __init__(self, exchange_manager, hostname='localhost', port=5672,
-            virtual_host='/', username='guest', password='guest', heartbeat=0):
+            virtual_host='/', username='guest', password='guest', heartbeat=0,
+            coalesce_window=0, coalesce_bytes=65536):
         """
         @param exchange_manager So we can link our states. If I'm in a bad
         state, then I need to notify ExchangeManager.
+        @param coalesce_window Seconds for which frames sent on the
+        connection are held and joined into one write; 0 for no coalescing.
+        @param coalesce_bytes Frames are written once this many bytes are
+        held, before the window ends.
         """
         BasicLifecycleObject.__init__(self)
         self.client = None
@@ -87,6 +92,11 @@ class MessageSpace(BasicLifecycleObject):
         self.username = username
         self.password = password # Code review...review me!
         self.heartbeat = heartbeat
+        self.coalesce_window = coalesce_window
+        self.coalesce_bytes = coalesce_bytes
+
+        # Channels and declared exchanges of the connection, reused by Publishers
+        self.channel_pool = None
 
         # Immediately transition to READY state
         self.initialize()
@@ -109,11 +119,14 @@ class MessageSpace(BasicLifecycleObject):
                                     delegate=amqpEvents,
                                     heartbeat=self.heartbeat,
                                     username=self.username,
-                                    password=self.password)
+                                    password=self.password,
+                                    coalesce_window=self.coalesce_window,
+                                    coalesce_bytes=self.coalesce_bytes)
         d = clientCreator.connectTCP(self.hostname, self.port)
         def connected(client):
             log.info('connected')
             self.client = client
+            self.channel_pool = ChannelPool(client)
         d.addCallback(connected)
         d.addErrback(self.connectionLost)
         return d
@@ -123,6 +136,8 @@ class MessageSpace(BasicLifecycleObject):
 
     def on_terminate(self, *args, **kwargs):
         self.closing = True
+        if self.channel_pool:
+            self.channel_pool.clear()
         return defer.maybeDeferred(self.close_connection)
 
     def close_connection(self):
@@ -159,6 +174,9 @@ class MessageSpace(BasicLifecycleObject):
         AMQP Client triggers this event when it has a conenctionLost event
         itself.
         """
+        # The channels and exchanges of the connection are gone with it
+        if self.channel_pool:
+            self.channel_pool.clear()
         if not self.closing: #only notify of unexpected closure
             self.exchange_manager.connectionLost(reason) # perpetuate the event
 
@@ -172,6 +190,88 @@ class MessageSpace(BasicLifecycleObject):
         s += ")"
         return s
 
+class ChannelPool(object):
+    """
+    Open AMQP channels of one broker connection, kept for reuse by Publishers,
+    and the exchanges which have been declared on the connection. Without it
+    every send opens a channel, declares the exchange and closes the channel
+    again - three broker round trips before the message goes out.
+
+    The pool is cleared when the connection is lost. The broker deletes an
+    auto delete exchange once its last queue is unbound, without telling the
+    publishers; a publish to it then fails with a 404 which closes the
+    channel, and no message is lost that would have been routed, as no queue
+    is bound. So a channel found closed by the broker, idle or given back to
+    the pool, clears the declared exchanges, and the next sends declare them
+    again.
+    """
+
+    def __init__(self, client, max_idle=16):
+        self.client = client
+        self.max_idle = max_idle
+        self.idle = []
+        self.declared = set()
+
+        # Broker round trips, for load tests
+        self.channels_opened = 0
+        self.exchange_declares = 0
+
+    @defer.inlineCallbacks
+    def get(self):
+        """
+        @retval Deferred that fires an open channel, from the pool if there is
+        one
+        """
+        while self.idle:
+            chan = self.idle.pop()
+            if not chan.closed:
+                defer.returnValue(chan)
+            self.declared.clear()
+
+        chan = self.client.channel()
+        yield chan.channel_open()
+        self.channels_opened += 1
+        defer.returnValue(chan)
+
+    def put(self, chan):
+        """
+        Returns a channel from get to the pool. Closes it if the pool is full.
+        """
+        if self.client.closed:
+            return defer.succeed(None)
+        if chan.closed:
+            self.declared.clear()
+            return defer.succeed(None)
+        if len(self.idle) >= self.max_idle:
+            return chan.channel_close()
+        self.idle.append(chan)
+        return defer.succeed(None)
+
+    @defer.inlineCallbacks
+    def declare_exchange(self, chan, exchange, type, durable, auto_delete):
+        """
+        Declares an exchange on the channel unless it has been declared on
+        the connection already.
+        """
+        key = (exchange, type, durable, auto_delete)
+        if key in self.declared:
+            return
+
+        yield chan.exchange_declare(exchange=exchange,
+                                    type=type,
+                                    durable=durable,
+                                    auto_delete=auto_delete)
+        self.exchange_declares += 1
+        self.declared.add(key)
+
+    def clear(self):
+        """
+        Forgets the idle channels and the declared exchanges.
+        """
+        self.idle = []
+        self.declared.clear()
+
+
 class ExchangeSpace(object):
     """
     give it a name and a connection
@@ -203,8 +303,10 @@ class ProcessExchangeSpace(ExchangeSpace):
         pub_config = {'routing_key' : str(to_name)}
         pub_config.update(publisher_config)
         publisher = yield Publisher.name(self, pub_config)
-        yield publisher.send(message_data)
-        publisher.close()
+        try:
+            yield publisher.send(message_data)
+        finally:
+            publisher.close()
 
 
 class TopicExchangeSpace(ExchangeSpace):
@@ -282,6 +384,8 @@ class Message(object):
         self.delivery_tag = amqp_message.delivery_tag
         self._decoded_cache = None
         self._state = "RECEIVED"
+        # The Consumer which counts this message as in flight until it is settled
+        self._consumer = kwargs.get('consumer', None)
         for attr_name in (
                           "content type",
                           "content encoding",
@@ -326,6 +430,7 @@ class Message(object):
                 "Message already acknowledged with state: %s" % self._state)
         d = self.channel.basic_ack(self.delivery_tag)
         self._state = "ACK"
+        self._settled()
         return d
 
     def reject(self):
@@ -342,6 +447,7 @@ class Message(object):
                 "Message already acknowledged with state: %s" % self._state)
         d = self.channel.basic_reject(self.delivery_tag, requeue=False)
         self._state = "REJECTED"
+        self._settled()
         return d
 
     def requeue(self):
@@ -359,12 +465,18 @@ class Message(object):
                 "Message already acknowledged with state: %s" % self._state)
         d = self.channel.basic_reject(self.delivery_tag, requeue=True)
         self._state = "REQUEUED"
+        self._settled()
         return d
 
     @property
     def acknowledged(self):
         return self._state in ACKNOWLEDGED_STATES
 
+    def _settled(self):
+        if self._consumer is not None:
+            self._consumer.settled(self)
+            self._consumer = None
+
 ##
 ##############################################################
 
@@ -392,7 +504,15 @@ class Consumer(object):
                              auto_delete=True,
                              no_ack=True,
                              binding_key=None,
+                             prefetch_count=1,
+                             prefetch_size=0,
                              **kwargs): # **kwargs is a sloppy hack
+        """
+        @param prefetch_count The number of deliveries the broker sends
+        before it waits for an ack (basic.qos); 0 for no limit. Does not
+        apply with no_ack.
+        @param prefetch_size The same as a number of bytes; 0 for no limit.
+        """
         self.channel = chan
         self.queue = queue
         self.exchange = exchange
@@ -407,6 +527,14 @@ class Consumer(object):
         self._closed = False # Assuming we were given an open channel
         self._consuming = False
 
+        self.prefetch_count = prefetch_count
+        self.prefetch_size = prefetch_size
+
+        # Deliveries received but not yet acked, rejected or requeued
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delivered = 0
+
     @classmethod
     def new(cls, client, **kwargs):
         """
@@ -457,8 +585,9 @@ class Consumer(object):
                                         routing_key=routing_key,
                                         arguments=arguments)
 
-        yield self.channel.basic_qos(prefetch_size=0, prefetch_count=1,
-                                                        global_=False)
+        yield self.channel.basic_qos(prefetch_size=self.prefetch_size,
+                                     prefetch_count=self.prefetch_count,
+                                     global_=False)
 
         defer.returnValue(self)
 
@@ -482,9 +611,32 @@ class Consumer(object):
         return d
 
     def receive(self, amqp_message):
-        message = Message(self.channel, amqp_message)
+        self.delivered += 1
+        if self.no_ack:
+            message = Message(self.channel, amqp_message)
+        else:
+            message = Message(self.channel, amqp_message, consumer=self)
+            self.in_flight += 1
+            if self.in_flight > self.max_in_flight:
+                self.max_in_flight = self.in_flight
         return self.callback(message)
 
+    def settled(self, message):
+        """
+        Called by a Message from this Consumer when it is acked, rejected or
+        requeued.
+        """
+        self.in_flight -= 1
+
+    def flow_stats(self):
+        """
+        @retval dict of the prefetch window and the deliveries in flight
+        """
+        return {'prefetch_count':self.prefetch_count,
+                'in_flight':self.in_flight,
+                'max_in_flight':self.max_in_flight,
+                'delivered':self.delivered}
+
     def consume(self, callback, limit=None):
         self._consuming = True
         self.callback = callback
@@ -542,13 +694,23 @@ class Publisher(object):
         self.immediate = immediate
         self._closed = False # Assuming we were given an open channel
 
+        # The ChannelPool the channel came from, if any
+        self.pool = None
+
     @defer.inlineCallbacks
     def declare(self):
 
-        yield self.channel.exchange_declare(exchange=self.exchange,
-                                      type=self.exchange_type,
-                                      durable=self.durable,
-                                      auto_delete=self.auto_delete)
+        if self.pool is not None:
+            yield self.pool.declare_exchange(self.channel,
+                                          exchange=self.exchange,
+                                          type=self.exchange_type,
+                                          durable=self.durable,
+                                          auto_delete=self.auto_delete)
+        else:
+            yield self.channel.exchange_declare(exchange=self.exchange,
+                                          type=self.exchange_type,
+                                          durable=self.durable,
+                                          auto_delete=self.auto_delete)
         defer.returnValue(self)
 
     @classmethod
@@ -561,16 +723,22 @@ class Publisher(object):
         full_config = ex_space.exchange.config_dict.copy()
         full_config.update(config)
 
-        client = ex_space.client # amqp client
-        full_config = ex_space.exchange.config_dict.copy()
-        full_config.update(config)
-        chan = client.channel()
-        d = chan.channel_open()
-        # Are we doing an exchange declare on every send???
-        def instantiate(result, chan, **kwargs):
+        # Channels and declared exchanges are reused through the pool of
+        # the connection, when there is one
+        pool = ex_space.message_space.channel_pool
+        if pool is None:
+            client = ex_space.client # amqp client
+            chan = client.channel()
+            d = chan.channel_open()
+            d.addCallback(lambda result: chan)
+        else:
+            d = pool.get()
+
+        def instantiate(chan, **kwargs):
             inst = cls(chan, **kwargs)
+            inst.pool = pool
             return inst.declare()
-        d.addCallback(instantiate, chan, **full_config)
+        d.addCallback(instantiate, **full_config)
         return d
 
     def create_message(self, message_data, delivery_mode=None, priority=None,
@@ -673,12 +841,14 @@ class Publisher(object):
 
     def close(self):
         """
-        Close the amqp channel, deactivating the Consumer.
+        Close the amqp channel, deactivating the Publisher. A channel from a
+        ChannelPool goes back to the pool instead.
         """
         if not self._closed:
-            d = self.channel.channel_close()
             self._closed = True
-            return d
+            if self.pool is not None:
+                return self.pool.put(self.channel)
+            return self.channel.channel_close()
         return defer.succeed(None)
 
 def worker(name):
@@ -6,6 +6,7 @@
 @author Michael Meisinger
 """
 
+import logging
 import os
 import types
 
@@ -29,6 +30,8 @@ from ion.core.exception import IonError
 # processing, eg. to retaining user-id from request message
 from ion.core.ioninit import request
 
+CONF = ioninit.config(__name__)
+
 
 class ReceiverError(IonError):
     """
@@ -63,7 +66,7 @@ class Receiver(BasicLifecycleObject):
     rec_messages = {}
     rec_shutoff = False
 
-    def __init__(self, name, scope='global', label=None, xspace=None, process=None, group=None, handler=None, error_handler=None, raw=False, consumer_config=None, publisher_config=None):
+    def __init__(self, name, scope='global', label=None, xspace=None, process=None, group=None, handler=None, error_handler=None, raw=False, consumer_config=None, publisher_config=None, prefetch_count=None):
         """
         @param label descriptive label for the receiver
         @param name the actual exchange name. Used for routing
@@ -76,6 +79,9 @@ class Receiver(BasicLifecycleObject):
         @param consumer_config  Additional Consumer configuration params. Used by _init_receiver, these params take precedence over any
                                 other config.
         @param publisher_config Additional Publisher configuration params, used by send()
+        @param prefetch_count   The number of messages the broker delivers to this receiver before it waits for an ack;
+                                0 for no limit. Defaults to the configured value for the process name, or for all
+                                receivers. A consumer_config prefetch_count takes precedence.
         """
         BasicLifecycleObject.__init__(self)
 
@@ -89,6 +95,7 @@ class Receiver(BasicLifecycleObject):
         self.raw = raw
         self.consumer_config  = consumer_config if consumer_config is not None else {}
         self.publisher_config = publisher_config if publisher_config is not None else {}
+        self.prefetch_count = prefetch_count
 
         self.handlers = []
         self.error_handlers = []
@@ -130,7 +137,7 @@ class Receiver(BasicLifecycleObject):
             raise RuntimeError("Messaging name undefined: "+self.xname)
 
         yield self._init_receiver(name_config)
-        log.debug("Receiver %s initialized (queue attached) cfg=%s" % (self.xname,name_config))
+        log.debug("Receiver %s initialized (queue attached) cfg=%s", self.xname,name_config)
 
     @defer.inlineCallbacks
     def _init_receiver(self, receiver_config, store_config=False):
@@ -138,6 +145,7 @@ class Receiver(BasicLifecycleObject):
 
         # copy and update receiver_config with the stored consumer_config
         receiver_config = receiver_config.copy()
+        receiver_config['prefetch_count'] = self.get_prefetch_count()
         receiver_config.update(self.consumer_config)
 
         if store_config:
@@ -146,6 +154,29 @@ class Receiver(BasicLifecycleObject):
 
         self.consumer = yield container.new_consumer(receiver_config)
 
+    def get_prefetch_count(self):
+        """
+        @retval The prefetch window of this receiver: set on the receiver, or configured for the name of its process,
+        or configured for all receivers
+        """
+        if self.prefetch_count is not None:
+            return self.prefetch_count
+
+        proc_name = getattr(self.process, 'proc_name', None)
+        by_process = CONF.getValue('process_prefetch_count', {})
+        if proc_name in by_process:
+            return by_process[proc_name]
+
+        return CONF.getValue('prefetch_count', 1)
+
+    def flow_stats(self):
+        """
+        @retval dict of the prefetch window and the deliveries in flight, or None before the consumer is declared
+        """
+        if self.consumer is None:
+            return None
+        return self.consumer.flow_stats()
+
     @defer.inlineCallbacks
     def on_activate(self, *args, **kwargs):
         """
@@ -154,7 +185,7 @@ class Receiver(BasicLifecycleObject):
         """
         #self.consumer.register_callback(self.receive)
         yield self.consumer.consume(self.receive)
-        log.debug("Receiver %s activated (consumer enabled)" % self.xname)
+        log.debug("Receiver %s activated (consumer enabled)", self.xname)
 
     #@defer.inlineCallbacks
     def on_deactivate(self, *args, **kwargs):
@@ -222,7 +253,7 @@ class Receiver(BasicLifecycleObject):
         @note is called from carrot as normal method; no return expected
         @param msg instance of carrot.backends.txamqp.Message
         """
-        log.info('Start Receiver.Receive on proc: %s' % str(self.process))
+        log.info('Start Receiver.Receive on proc: %s', self.process)
 
 
         if self.rec_shutoff:
@@ -252,7 +283,7 @@ class Receiver(BasicLifecycleObject):
 
             # Interceptor failed message.  Call error handler(s)
             if inv1.status != Invocation.STATUS_PROCESS:
-                log.info("Message error! to=%s op=%s" % (data.get('receiver',None), data.get('op',None)))
+                log.info("Message error! to=%s op=%s", data.get('receiver',None), data.get('op',None))
                 try:
                     for error_handler in self.error_handlers:
                         yield defer.maybeDeferred(error_handler, data, msg, inv1.code)
@@ -281,25 +312,26 @@ class Receiver(BasicLifecycleObject):
                 #request.performative = performative
 
 
-                log.debug( 'BEFORE YIELD to Message Handler')
-                log.debug('OP "%s"' % op)
-                log.debug('CONVID "%s"' %  convid)
-                log.debug('PERFORMATIVE "%s"' % performative)
-                log.debug('PROTOCOL "%s"' % protocol)
-                log.debug('Current Context "%s"' % str(current_context))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug( 'BEFORE YIELD to Message Handler')
+                    log.debug('OP "%s"', op)
+                    log.debug('CONVID "%s"', convid)
+                    log.debug('PERFORMATIVE "%s"', performative)
+                    log.debug('PROTOCOL "%s"', protocol)
+                    log.debug('Current Context "%s"', current_context)
 
-                log.debug("WORKBENCH STATE before incoming message is added:\n%s" % str(workbench))
+                    log.debug("WORKBENCH STATE before incoming message is added:\n%s", workbench)
 
                 if protocol != 'rpc':
                     # if it is not an rpc conversation - set the context
 
-                    log.info('Setting NON RPC request workbench_context: %s, in Proc: %s ' % (convid, self.process))
+                    log.info('Setting NON RPC request workbench_context: %s, in Proc: %s ', convid, self.process)
                     current_context.append( convid)
                     request.workbench_context = current_context
 
                 elif performative == 'request':
                     # if it is an rpc request - set the context
-                    log.info('Setting RPC request workbench_context: %s, in Proc: %s ' % (convid, self.process))
+                    log.info('Setting RPC request workbench_context: %s, in Proc: %s ', convid, self.process)
 
                     current_context.append( convid)
                     request.workbench_context = current_context
@@ -318,7 +350,7 @@ class Receiver(BasicLifecycleObject):
                     content = data.get('content')
                     workbench.put_repository(content.Repository)
 
-                    log.debug("WORKBENCH STATE after incoming message is added:\n%s" % str(workbench))
+                    log.debug("WORKBENCH STATE after incoming message is added:\n%s", workbench)
 
 
                 # Make the calls into the application code (e.g. process receive)
@@ -342,33 +374,34 @@ class Receiver(BasicLifecycleObject):
                     if protocol != 'rpc':
                         # if it is not an rpc conversation - set the context
                         workbench_context = current_context.pop()
-                        log.info('Popping Non RPC request workbench_context: %s, in Proc: %s ' % (workbench_context, self.process))
+                        log.info('Popping Non RPC request workbench_context: %s, in Proc: %s ', workbench_context, self.process)
 
                     elif performative == 'request':
                         # if it is an rpc request - set the context
 
                         workbench_context = current_context.pop()
-                        log.info('Popping RPC request workbench_context: %s, in Proc: %s ' % (workbench_context, self.process))
+                        log.info('Popping RPC request workbench_context: %s, in Proc: %s ', workbench_context, self.process)
 
                         # if it is an RPC result message - do not set the context!
 
                     else:
                         # @TODO - SHOULD THIS BE HERE?
                         workbench_context = pu.get_last_or_default(current_context, 'No Context Set!')
-                        log.info('Using last workbench_context: %s, in Proc: %s ' % (workbench_context, self.process))
+                        log.info('Using last workbench_context: %s, in Proc: %s ', workbench_context, self.process)
                         #print 'CONVID:', convid
                         #print 'CONTEXT:', workbench_context
 
 
                     if hasattr(self.process, 'workbench'):
 
-                        log.debug('AFTER YIELD to message handler')
-                        log.debug('OP "%s"' % op)
-                        log.debug('CONVID: %s' % convid)
-                        log.debug('PERFORMATIVE: %s',performative)
-                        log.debug('PROTOCOL "%s"' % protocol)
-                        log.debug('Current CONTXT: %s' % current_context)
-                        log.debug('WORKBENCH CONTXT: %s' % workbench_context)
+                        if log.isEnabledFor(logging.DEBUG):
+                            log.debug('AFTER YIELD to message handler')
+                            log.debug('OP "%s"', op)
+                            log.debug('CONVID: %s', convid)
+                            log.debug('PERFORMATIVE: %s',performative)
+                            log.debug('PROTOCOL "%s"', protocol)
+                            log.debug('Current CONTXT: %s', current_context)
+                            log.debug('WORKBENCH CONTXT: %s', workbench_context)
 
 
 
@@ -377,7 +410,7 @@ class Receiver(BasicLifecycleObject):
 
                             log.info('Receiver Process: Calling workbench clear:')
 
-                            log.debug("WORKBENCH STATE Before Clear:\n%s" % str(self.process.workbench))
+                            log.debug("WORKBENCH STATE Before Clear:\n%s", self.process.workbench)
 
                             self.process.workbench.manage_workbench_cache(workbench_context)
 
@@ -397,12 +430,12 @@ class Receiver(BasicLifecycleObject):
                                     # Print a warning if someone else is using the persistence tricks...
                                     log.warn('The "%s" process is holding persistent state in %d repository objects!' % (pname, count))
 
-                            log.debug("WORKBENCH STATE After Clear:\n%s" % str(self.process.workbench))
+                            log.debug("WORKBENCH STATE After Clear:\n%s", self.process.workbench)
 
                         else:
                             log.debug('Workbench context does not match the Convid - Do not clear anything from the workbench!')
 
-        log.info( 'End Receiver.Receive on proc: %s' % str(self.process))
+        log.info( 'End Receiver.Receive on proc: %s', self.process)
 
     @defer.inlineCallbacks
     def send(self, **kwargs):
@@ -430,7 +463,7 @@ class Receiver(BasicLifecycleObject):
             # TODO fix this
             # For now, silently dropping message
             if inv1.status == Invocation.STATUS_DROP:
-                log.info("Message dropped! to=%s op=%s" % (msg.get('receiver',None), msg.get('op',None)))
+                log.info("Message dropped! to=%s op=%s", msg.get('receiver',None), msg.get('op',None))
             else:
                 # call flow: Container.send -> ExchangeManager.send -> ProcessExchangeSpace.send
                 yield ioninit.container_instance.send(msg.get('receiver'), msg, publisher_config=self.publisher_config)
@@ -438,9 +471,9 @@ class Receiver(BasicLifecycleObject):
             log.exception("Send error")
         else:
             if inv1.status != Invocation.STATUS_DROP:
-                log.info("===Message SENT! >>>> %s -> %s: %s:%s:%s===" % (msg.get('sender',None),
+                log.info("===Message SENT! >>>> %s -> %s: %s:%s:%s===", msg.get('sender',None),
                                 msg.get('receiver',None), msg.get('protocol',None),
-                                msg.get('performative',None), msg.get('op',None)))
+                                msg.get('performative',None), msg.get('op',None))
                 defer.returnValue(msg)
                 #log.debug("msg"+str(msg))
 
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/messaging/test/test_amqp.py
+@test ion.core.messaging.amqp.CoalescingTransport against a transport which
+records its writes
+"""
+
+from twisted.internet import task
+from twisted.trial import unittest
+
+from ion.core.messaging.amqp import CoalescingTransport
+
+
+class RecordingTransport(object):
+    def __init__(self):
+        self.written = []
+        self.lost = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def loseConnection(self):
+        self.lost = True
+
+    def getPeer(self):
+        return 'peer'
+
+
+class CoalescingTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.transport = RecordingTransport()
+        self.coalescing = CoalescingTransport(self.transport, 0.001, 100, clock=self.clock)
+
+    def test_window(self):
+        self.coalescing.write('method')
+        self.coalescing.write('header')
+        self.coalescing.writeSequence(['bo', 'dy'])
+        self.assertEqual(self.transport.written, [])
+
+        self.clock.advance(0.001)
+        self.assertEqual(self.transport.written, ['methodheaderbody'])
+        self.assertEqual((self.coalescing.frames, self.coalescing.writes), (4, 1))
+
+        # Nothing is held, so nothing more is written
+        self.clock.advance(0.001)
+        self.assertEqual(len(self.transport.written), 1)
+
+    def test_max_bytes(self):
+        for i in xrange(4):
+            self.coalescing.write('x' * 30)
+        self.assertEqual(self.transport.written, ['x' * 120])
+        self.assertEqual(len(self.clock.getDelayedCalls()), 0)
+
+        self.coalescing.write('x' * 30)
+        self.clock.advance(0.001)
+        self.assertEqual(self.transport.written, ['x' * 120, 'x' * 30])
+
+    def test_lose_connection(self):
+        self.coalescing.write('close')
+        self.coalescing.loseConnection()
+        self.assertEqual(self.transport.written, ['close'])
+        self.assertTrue(self.transport.lost)
+        self.assertEqual(self.coalescing.getPeer(), 'peer')
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/messaging/test/test_messaging.py
+@test ion.core.messaging.messaging channel and exchange declare reuse of
+Publishers and the prefetch window of Consumers, against a stand in for the
+amqp client
+"""
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from ion.core.messaging.messaging import ChannelPool, ProcessExchangeSpace, Consumer
+
+
+class FakeChannel(object):
+    """
+    Records the amqp methods called on it
+    """
+    def __init__(self, client):
+        self.client = client
+        self.closed = False
+
+    def channel_open(self):
+        self.client.calls.append('channel_open')
+        return defer.succeed(None)
+
+    def channel_close(self):
+        self.client.calls.append('channel_close')
+        self.closed = True
+        return defer.succeed(None)
+
+    def exchange_declare(self, **kwargs):
+        self.client.calls.append('exchange_declare')
+        return defer.succeed(None)
+
+    def basic_publish(self, **kwargs):
+        self.client.calls.append('basic_publish')
+        self.client.published.append((self, kwargs))
+        return defer.succeed(None)
+
+    def queue_declare(self, **kwargs):
+        self.client.calls.append('queue_declare')
+        return defer.succeed(None)
+
+    def basic_qos(self, **kwargs):
+        self.client.calls.append('basic_qos')
+        self.client.qos = kwargs
+        return defer.succeed(None)
+
+    def basic_ack(self, delivery_tag):
+        self.client.calls.append('basic_ack')
+        return defer.succeed(None)
+
+    def basic_reject(self, delivery_tag, requeue=False):
+        self.client.calls.append('basic_reject')
+        return defer.succeed(None)
+
+
+class FakeClient(object):
+    closed = False
+
+    def __init__(self):
+        self.calls = []
+        self.published = []
+
+    def channel(self):
+        return FakeChannel(self)
+
+
+class FakeContent(object):
+    def __init__(self, body):
+        self.body = body
+        self.properties = {}
+
+
+class FakeDelivery(object):
+    def __init__(self, tag, body):
+        self.delivery_tag = tag
+        self.content = FakeContent(body)
+
+
+class FakeMessageSpace(object):
+    def __init__(self, client, pooled=True):
+        self.client = client
+        self.channel_pool = ChannelPool(client) if pooled else None
+
+
+class PublisherChannelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+
+    @defer.inlineCallbacks
+    def _send(self, exchange_space, count):
+        for i in xrange(count):
+            yield exchange_space.send('worker%d' % (i % 2), 'hello')
+
+    @defer.inlineCallbacks
+    def test_without_pool(self):
+        exchange_space = ProcessExchangeSpace(FakeMessageSpace(self.client, pooled=False), 'magnet.topic')
+        yield self._send(exchange_space, 3)
+
+        self.assertEqual(self.client.calls.count('channel_open'), 3)
+        self.assertEqual(self.client.calls.count('exchange_declare'), 3)
+        self.assertEqual(self.client.calls.count('channel_close'), 3)
+
+    @defer.inlineCallbacks
+    def test_pool(self):
+        message_space = FakeMessageSpace(self.client)
+        exchange_space = ProcessExchangeSpace(message_space, 'magnet.topic')
+        yield self._send(exchange_space, 10)
+
+        self.assertEqual(self.client.calls.count('basic_publish'), 10)
+        self.assertEqual(self.client.calls.count('channel_open'), 1)
+        self.assertEqual(self.client.calls.count('exchange_declare'), 1)
+        self.assertEqual(self.client.calls.count('channel_close'), 0)
+        self.assertEqual([kw['routing_key'] for chan, kw in self.client.published[:2]], ['worker0', 'worker1'])
+
+        # Another exchange is declared once too
+        config = {'exchange':'other.topic', 'auto_delete':False}
+        yield exchange_space.send('worker0', 'hello', publisher_config=config)
+        yield exchange_space.send('worker0', 'hello', publisher_config=config)
+        self.assertEqual(message_space.channel_pool.exchange_declares, 2)
+
+        # A channel closed by the broker is not reused, and exchanges are declared again
+        message_space.channel_pool.idle[0].closed = True
+        yield self._send(exchange_space, 1)
+        self.assertEqual(message_space.channel_pool.channels_opened, 2)
+        self.assertEqual(message_space.channel_pool.exchange_declares, 3)
+
+        # As when the broker closes a channel on a publish to an exchange which has been auto deleted
+        chan = yield message_space.channel_pool.get()
+        chan.closed = True
+        yield message_space.channel_pool.put(chan)
+        yield self._send(exchange_space, 1)
+        self.assertEqual(message_space.channel_pool.channels_opened, 3)
+        self.assertEqual(message_space.channel_pool.exchange_declares, 4)
+
+        # As after the connection is lost
+        message_space.channel_pool.clear()
+        yield self._send(exchange_space, 1)
+        self.assertEqual(message_space.channel_pool.channels_opened, 4)
+        self.assertEqual(message_space.channel_pool.exchange_declares, 5)
+
+    @defer.inlineCallbacks
+    def test_concurrent_sends(self):
+        pool = ChannelPool(self.client, max_idle=2)
+        chans = yield defer.DeferredList([pool.get() for i in xrange(4)])
+        chans = [chan for success, chan in chans]
+        self.assertEqual(len(set(chans)), 4)
+
+        for chan in chans:
+            yield pool.put(chan)
+        self.assertEqual(len(pool.idle), 2)
+        self.assertEqual(self.client.calls.count('channel_close'), 2)
+
+
+class ConsumerFlowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+        self.chan = self.client.channel()
+
+    @defer.inlineCallbacks
+    def test_prefetch(self):
+        consumer = Consumer(self.chan, queue='q', exchange='magnet.topic', no_ack=False, prefetch_count=16)
+        yield consumer.declare()
+        self.assertEqual(self.client.qos['prefetch_count'], 16)
+
+        # The default window is one message
+        yield Consumer(self.chan, queue='q', exchange='magnet.topic').declare()
+        self.assertEqual(self.client.qos['prefetch_count'], 1)
+
+    def test_in_flight(self):
+        consumer = Consumer(self.chan, queue='q', no_ack=False)
+        received = []
+        consumer.callback = received.append
+
+        for tag in xrange(3):
+            consumer.receive(FakeDelivery(tag, 'body%d' % tag))
+        self.assertEqual(consumer.in_flight, 3)
+
+        received[0].ack()
+        received[1].requeue()
+        self.assertEqual(consumer.in_flight, 1)
+        consumer.receive(FakeDelivery(3, 'body3'))
+        received[2].reject()
+        received[3].ack()
+
+        self.assertEqual(consumer.flow_stats(), {'prefetch_count':1, 'in_flight':0, 'max_in_flight':3,
+                                                 'delivered':4})
+
+    def test_no_ack(self):
+        consumer = Consumer(self.chan, queue='q', no_ack=True)
+        consumer.callback = lambda message: None
+        consumer.receive(FakeDelivery(0, 'body'))
+        self.assertEqual(consumer.in_flight, 0)
+        self.assertEqual(consumer.delivered, 1)
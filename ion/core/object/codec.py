@@ -6,13 +6,19 @@
 @brief Interceptor for encoding and decoding ION messages
 """
 
+import time
+
 from twisted.internet import defer
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 
+from ion.core import ioninit
+CONF = ioninit.config(__name__)
+
 from ion.core.intercept.interceptor import EnvelopeInterceptor
 from google.protobuf.internal import decoder
+from google.protobuf.internal import wire_format
 
 from ion.core.object import gpb_wrapper
 from ion.core.object import repository
@@ -27,6 +33,9 @@ STRUCTURE_TYPE = object_utils.create_type_identifier(object_id=2, version=1)
 
 ION_R1_GPB = 'ION R1 GPB'
 
+# Decode message content lazily - see unpack_structure
+LAZY_DECODE = CONF.getValue('lazy_decode', False)
+
 class CodecError(Exception):
     """
     An error class for problems that occur in the codec
@@ -39,12 +48,20 @@ class ObjectCodecInterceptor(EnvelopeInterceptor):
     The object returned is the root of a repository structure. It is not yet added to the workbench and completely
     separate from the process until it finishes the interceptor stack!
     """
+
+    decode_count = 0
+    decode_time = 0.0
+    decode_max = 0.0
+
     def before(self, invocation):
 
         # Only mess with ION_R1_GPB encoded objects...
         if isinstance(invocation.content, dict) and ION_R1_GPB == invocation.content['encoding']:
             raw_content = invocation.content['content']
+
+            t1 = time.time()
             unpacked_content = unpack_structure(raw_content)
+            self._record_decode(time.time() - t1)
                 
             if hasattr(unpacked_content, 'ObjectType') and unpacked_content.ObjectType == ION_MESSAGE_TYPE:
                 # If this content should be returned in a Message Instance
@@ -55,6 +72,21 @@ class ObjectCodecInterceptor(EnvelopeInterceptor):
 
         return invocation
 
+    def _record_decode(self, latency):
+        self.decode_count += 1
+        self.decode_time += latency
+        if latency > self.decode_max:
+            self.decode_max = latency
+
+    def decode_stats(self):
+        """
+        Per message decode latency in seconds
+        """
+        mean = 0.0
+        if self.decode_count:
+            mean = self.decode_time / self.decode_count
+        return {'count':self.decode_count, 'mean':mean, 'max':self.decode_max, 'lazy':LAZY_DECODE}
+
     def after(self, invocation):
         """
         Encode a Message Instance to a serialized form.
@@ -179,12 +211,24 @@ def _pack_container(head, objects):
     log.debug('_pack_container: Packed container!')
     return cs
 
-def unpack_structure(serialized_container):
+def unpack_structure(serialized_container, lazy=None):
     """
     Take a serialized container object and load a repository with its contents
+
+    In lazy mode the elements of the container are not parsed - they stay as spans of the serialized content keyed
+    by their sha1 until they are used. Only the root object is loaded, its children are loaded from the index hash
+    when they are first accessed, and the commit recording the message state is deferred until the history of the
+    repository is needed. The serialized content is held in memory until all of its elements are parsed or dropped.
+    @param lazy if None use the 'lazy_decode' setting in the codec config
     """
+    if lazy is None:
+        lazy = LAZY_DECODE
+
     log.debug('unpack_structure: Unpacking Structure!')
-    head, obj_dict = _unpack_container(serialized_container)
+    if lazy:
+        head, obj_dict = _scan_container(serialized_container)
+    else:
+        head, obj_dict = _unpack_container(serialized_container)
 
     assert len(obj_dict) > 0, 'There should be objects in the container!'
 
@@ -204,8 +248,9 @@ def unpack_structure(serialized_container):
         log.debug("Codec unpack_structure has %d excluded_object_types set in field" % len(root_obj.message_object.excluded_object_types))
         excluded_types = [x.GPBMessage for x in root_obj.message_object.excluded_object_types]
 
-    # Now load the rest of the linked objects - down to the leaf nodes.
-    repo.load_links(root_obj, excluded_types)
+    if not lazy:
+        # Now load the rest of the linked objects - down to the leaf nodes.
+        repo.load_links(root_obj, excluded_types)
 
     # append the excluded object types in the repo (load links no longer does this)
     for extype in excluded_types:
@@ -213,7 +258,10 @@ def unpack_structure(serialized_container):
             repo.excluded_types.append(extype)
 
     # Create a commit to record the state when the message arrived
-    cref = repo.commit(comment='Message for you Sir!')
+    if lazy:
+        repo.defer_commit(comment='Message for you Sir!')
+    else:
+        cref = repo.commit(comment='Message for you Sir!')
 
 
     log.debug('unpack_structure: returning root_obj')
@@ -252,4 +300,109 @@ def _unpack_container(serialized_container):
 
     log.debug('_unpack_container: returning head and dictionary of %d objects' % len(obj_dict))
 
-    return head, obj_dict
\ No newline at end of file
+    return head, obj_dict
+
+
+
+_field_numbers = None
+
+def _container_field_numbers():
+    """
+    The field numbers of the container head and items and of the structure element key - from the GPB descriptors
+    """
+    global _field_numbers
+    if _field_numbers is None:
+        container_fields = object_utils.get_gpb_class_from_type_id(STRUCTURE_TYPE).DESCRIPTOR.fields_by_name
+        element_fields = object_utils.get_gpb_class_from_type_id(STRUCTURE_ELEMENT_TYPE).DESCRIPTOR.fields_by_name
+        _field_numbers = (container_fields['head'].number,
+                          container_fields['items'].number,
+                          element_fields['key'].number)
+    return _field_numbers
+
+
+def _skip_field(buf, pos, wire_type):
+    """
+    Return the position after a field value which is not length delimited
+    """
+    if wire_type == wire_format.WIRETYPE_VARINT:
+        value, pos = decoder._DecodeVarint(buf, pos)
+        return pos
+    elif wire_type == wire_format.WIRETYPE_FIXED64:
+        return pos + 8
+    elif wire_type == wire_format.WIRETYPE_FIXED32:
+        return pos + 4
+
+    raise CodecError('Unexpected wire type %d in a GPB container structure!' % wire_type)
+
+
+def _scan_element_key(buf, start, end, key_field):
+    """
+    Find the key of a serialized structure element without parsing it
+    """
+    key = None
+    pos = start
+    while pos < end:
+        tag, pos = decoder._DecodeVarint(buf, pos)
+        wire_type = tag & 7
+        if wire_type == wire_format.WIRETYPE_LENGTH_DELIMITED:
+            length, pos = decoder._DecodeVarint(buf, pos)
+            if (tag >> 3) == key_field:
+                key = buf[pos:pos + length]
+            pos += length
+        else:
+            pos = _skip_field(buf, pos, wire_type)
+
+    if not key or pos != end:
+        raise CodecError('Could not find the key of a structure element in the GPB container structure!')
+    return key
+
+
+def _scan_container(serialized_container):
+    """
+    Helper for the receiver for unpacking message content lazily
+    Returns the head object and items as lazy structure elements which refer to the serialized content
+    """
+
+    log.debug('_scan_container: Scanning Container')
+    head_field, items_field, key_field = _container_field_numbers()
+
+    buf = serialized_container
+    end = len(buf)
+    pos = 0
+
+    head = None
+    obj_dict={}
+
+    try:
+        while pos < end:
+            tag, pos = decoder._DecodeVarint(buf, pos)
+            field_number = tag >> 3
+            wire_type = tag & 7
+
+            if wire_type == wire_format.WIRETYPE_LENGTH_DELIMITED:
+                length, pos = decoder._DecodeVarint(buf, pos)
+                start = pos
+                pos += length
+                if pos > end:
+                    raise CodecError('Truncated element in the GPB container structure!')
+
+                if field_number == head_field or field_number == items_field:
+                    key = _scan_element_key(buf, start, pos, key_field)
+                    wse = gpb_wrapper.LazyStructureElement(buf, start, pos, key)
+                    obj_dict[key] = wse
+
+                    if field_number == head_field:
+                        head = wse
+            else:
+                pos = _skip_field(buf, pos, wire_type)
+
+    except (IndexError, decoder._DecodeError), de:
+        log.debug('Received invalid content - decode error: "%s"' % str(de))
+        raise CodecError('Could not decode message content as a GPB container structure!')
+
+    if head is None or pos != end:
+        raise CodecError('Could not decode message content as a GPB container structure!')
+
+    log.debug('_scan_container: returning head and dictionary of %d objects' % len(obj_dict))
+
+    return head, obj_dict
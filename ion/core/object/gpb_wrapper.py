@@ -19,6 +19,8 @@ from ion.core.object.object_utils import CDM_GROUP_TYPE, CDM_DATASET_TYPE, CDM_A
 from ion.core.object.object_utils import _gpb_source, _gpb_source_root
 
 import struct
+import random
+import logging
 
 from google.protobuf import message
 from google.protobuf.internal import containers
@@ -30,8 +32,11 @@ from ion.core.object.cdm_methods import attribute
 from ion.core.object.cdm_methods import group
 from ion.core.object.cdm_methods import attribute_merge
 
+from ion.core.object import traversal
+
 import ion.util.ionlog
 from ion.core import ioninit
+from ion.util.cache import LRUDict
 
 CONF = ioninit.config(__name__)
 log = ion.util.ionlog.getLogger(__name__)
@@ -39,6 +44,9 @@ log = ion.util.ionlog.getLogger(__name__)
 STRUCTURE_ELEMENT_TYPE = create_type_identifier(object_id=1, version=1)
 LINK_TYPE = create_type_identifier(object_id=3, version=1)
 
+# Upper bound in bytes on sys.getsizeof for a single Wrapper instance (not counting the GPB message it wraps)
+WRAPPER_BYTE_BUDGET = 160
+
 class WrappedEnum(object):
     """ Data descriptor (like a property) for passing through GPB enums from the Wrapper. """
 
@@ -405,18 +413,12 @@ class WrapperType(type):
             # Special methods for certain object types:
             WrapperType._add_specializations(cls, obj_type, clsDict)
 
-            VALIDATE_ATTRS = CONF.getValue('VALIDATE_ATTRS', True)
-            if VALIDATE_ATTRS:
-                def obj_setter(self, k, v):
-                    if self._init and not hasattr(self, k):
-                        raise AttributeError(\
-                            '''Cant add properties to the ION object wrapper for object Class "%s".\n'''
-                            '''Unknown property name - "%s"; value - "%s"''' % (self._GPBClass, k, v))
-                    super(Wrapper, self).__setattr__(k, v)
-
-                clsDict['__setattr__'] = obj_setter
+            # Read the config once per type rather than once per instance
+            clsDict['_str_gpbs'] = CONF.getValue('STR_GPBS', False)
 
-            clsDict['_init'] = False
+            # Keep the generated class compact - no per instance __dict__. The slots declared in Wrapper are the only
+            # instance attributes, which also takes care of validating attribute names on set.
+            clsDict['__slots__'] = ()
 
             clsType = WrapperType.__new__(WrapperType, clsName, (cls,), clsDict)
 
@@ -571,6 +573,25 @@ class Wrapper(object):
 
     __metaclass__ = WrapperType
 
+    __slots__ = (
+        '_gpbMessage',
+        '_root',
+        '_invalid',
+        '_bytes',
+        '_parent_links',
+        '_child_links',
+        '_derived_wrappers',
+        '_myid',
+        '_modified',
+        '_read_only',
+        '_repository',
+        '_source',
+        '__weakref__',
+        )
+    """
+    The complete set of instance attributes. Wrappers are created in very large numbers when loading datasets - using
+    slots instead of a per instance dictionary keeps each one within WRAPPER_BYTE_BUDGET.
+    """
 
     def __init__(self, gpbMessage):
         """
@@ -657,10 +678,6 @@ class Wrapper(object):
         To avoid invalidating during when there is a hash conflict in the workspace - set the twin...
         """
 
-        self.__no_string = CONF.getValue('STR_GPBS', False)
-
-        # Hack to prevent setting properties in a class instance
-        self._init = True
 
         #frame = sys._getframe(2)
         #frames = []
@@ -969,60 +986,72 @@ class Wrapper(object):
     @GPBSource
     def RecurseCommit(self, structure):
         """
-        Recursively build up the serialized structure elements which are needed
+        Build up the serialized structure elements which are needed
         to commit this wrapper and reset all the links using its CAS name.
+        The structure is walked iteratively with an explicit stack - each modified
+        child is committed before its parents so that its key is known.
         """
 
         # Should this error if called on a non root object?
         if not self.IsRoot:
             raise OOIObjectError('Can not call Recurse Commit on a non root object wrapper.')
 
-        self.recurse_count.count += 1
-        local_cnt = self.recurse_count.count
-        log.debug('Entering Recurse Commit: recurse counter - %d, Object Type - %s, child links - %d, objects to commit - %d' %
-              (local_cnt, type(self), len(self.ChildLinks), len(structure)))
+        repo = self.Repository
 
-        if not  self.Modified:
-            # This object is already committed!
-            log.debug('Exiting Recurse Commit: recurse counter - %d' % local_cnt)
+        def modified_children(obj):
+            if not obj.Modified:
+                # This object is already committed!
+                return
 
-            return
+            obj.recurse_count.count += 1
 
-        # Create the Structure Element in which the binary blob will be stored
-        se = StructureElement()
-        repo = self.Repository
+            for link in obj.ChildLinks:
 
-        for link in  self.ChildLinks:
+                if link.Invalid:
+                    log.error('Link in child links is invalid!')
+                    if log.isEnabledFor(logging.DEBUG):
+                        log.debug('Current Wrapper: %s' % obj.Debug())
+                        log.debug('Invalid Link %s' % link.Debug())
 
-            if link.Invalid:
-                log.error('Link in child links is invalid!')
-                log.debug('Current Wrapper: %s' % self.Debug())
-                log.debug('Invalid Link %s' % link.Debug())
+                # Test to see if it is already serialized!
+                child_se = repo.index_hash.get(link.key, structure.get(link.key, None))
 
-            # Test to see if it is already serialized!
-            child_se = repo.index_hash.get(link.key, structure.get(link.key, None))
-            #child_se = repo.index_hash.get(link.key, None)
+                if child_se is not None:
+                    # Set the links is leaf property
+                    link.isleaf = child_se.isleaf
 
-            #print 'Setting child Link:', child_se
-            if  child_se is not None:
-                # Set the links is leaf property
-                link.isleaf = child_se.isleaf
+                else:
+                    child = repo.get_linked_object(link)
 
-            else:
-                #print 'SE for child not found - determining number of child links'
+                    # Determine whether this is a leaf node
+                    if len(child.ChildLinks) == 0:
+                        link.isleaf = True
+                    else:
+                        link.isleaf = False
 
-                child = repo.get_linked_object(link)
+                    yield child
 
-                # Determine whether this is a leaf node
-                if len(child.ChildLinks) == 0:
-                    link.isleaf = True
-                else:
-                    link.isleaf = False
+        def commit_modified(obj, parent):
+            if obj.Modified:
+                obj._commit_element(structure)
+
+        stats = traversal.walk([self], modified_children, post_visit=commit_modified)
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('Recurse Commit: Object Type - %s, %s, objects to commit - %d' % (type(self), stats, len(structure)))
 
+    @GPBSource
+    def _commit_element(self, structure):
+        """
+        Serialize this object into a structure element, once all of its children are committed.
+        Rename it in the workspace and set the key in all of its parent links.
+        """
 
-                #print 'Calling Recurse Commit on child'
-                child.RecurseCommit(structure)
+        # Create the Structure Element in which the binary blob will be stored
+        se = StructureElement()
+        repo = self.Repository
 
+        for link in self.ChildLinks:
             # Save the link info as a convience for sending!
             se.ChildLinks.add(link.key)
 
@@ -1096,15 +1125,14 @@ class Wrapper(object):
         for link in self.ParentLinks:
             if link.Invalid:
                 log.error('Link in parent links is invalid!')
-                log.debug('Current Wrapper: %s' % self.Debug())
-                log.debug('Invalid Link %s' % link.Debug())
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug('Current Wrapper: %s' % self.Debug())
+                    log.debug('Invalid Link %s' % link.Debug())
 
 
             if link.key != se.key:
                 link.key = se.key
 
-        log.debug('Exiting Recurse Commit: recurse counter - %d' % local_cnt)
-
 
     @GPBSource
     def FindChildLinks(self):
@@ -1246,7 +1274,7 @@ class Wrapper(object):
             msg = '\n' +self._gpbMessage.__str__()
         '''
 
-        if not self.__no_string:
+        if not self._str_gpbs:
             return 'GPB NO STRING!'
 
         #log.critical('HOLY SHIT STILL HERE!')
@@ -1946,6 +1974,108 @@ class StructureElementError(Exception):
     """
 
 
+class VerifiedContent(object):
+    """
+    The content of a verified element, as kept by the VerifiedElementCache - sized by its bytes for the LRUDict
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __sizeof__(self):
+        return len(self.value)
+
+
+class VerifiedElementCache(object):
+    """
+    @brief A content addressed record of structure elements whose sha1 key has already been checked against their
+    content. Loading the same element again - in another repository, after it arrived in a message or was read from
+    the datastore - does not need to hash it again. One instance is shared by every repository and workbench in the
+    process (see verified_element_cache below).
+
+    Verification policies:
+    ALWAYS - hash every element on every load (the original behavior)
+    FIRST_SEEN - hash an element the first time its key is seen, skip it afterwards
+    SAMPLED - like FIRST_SEEN but re-hash a random fraction (sample_rate) of the elements that were already seen
+
+    The verified content is kept with each key, and a check is only skipped for a value equal to it, so a value of
+    any other content for a known key is always hashed. The values are mostly the same string objects the
+    repositories already hold, which compare equal by identity. The cache is bounded by the bytes of content it
+    keeps, as it may be the last holder of an element once the repositories which loaded it are dropped.
+    """
+
+    ALWAYS = 'always'
+    FIRST_SEEN = 'first-seen'
+    SAMPLED = 'sampled'
+
+    POLICIES = (ALWAYS, FIRST_SEEN, SAMPLED)
+
+    def __init__(self, policy=FIRST_SEEN, sample_rate=0.01, limit_bytes=20 * 2**20):
+
+        if policy not in self.POLICIES:
+            raise StructureElementError('Invalid element verification policy "%s" - must be one of %s' % (policy, self.POLICIES))
+
+        self.policy = policy
+        self.sample_rate = sample_rate
+
+        self._verified = LRUDict(limit_bytes, use_size=True)
+
+        self.hashes_performed = 0
+        self.hashes_skipped = 0
+
+    def verify(self, element):
+        """
+        @brief Check that the key of a structure element matches the sha1 of its content, unless the policy allows a
+        previous check of the same key to be trusted.
+        @param element is a StructureElement
+        @retval True if the element is valid, False if the key does not match the content
+        """
+        key = element.key
+        value = element.value
+
+        verified = None
+        if self.policy != self.ALWAYS:
+            verified = self._verified.get(key)
+
+        if verified is not None and verified.value == value:
+            if self.policy == self.FIRST_SEEN or random.random() >= self.sample_rate:
+                self.hashes_skipped += 1
+                return True
+
+        self.hashes_performed += 1
+        if key != element.sha1:
+            return False
+
+        if self.policy != self.ALWAYS:
+            self._verified[key] = VerifiedContent(value)
+
+        return True
+
+    def is_verified(self, key):
+        return key in self._verified
+
+    def stats(self):
+        return {'policy':self.policy,
+                'hashes_performed':self.hashes_performed,
+                'hashes_skipped':self.hashes_skipped,
+                'verified_keys':len(self._verified.d),
+                'verified_bytes':self._verified.total_size}
+
+    def clear(self):
+        self._verified.clear()
+        self.hashes_performed = 0
+        self.hashes_skipped = 0
+
+
+verified_element_cache = VerifiedElementCache(policy=CONF.getValue('VERIFY_POLICY', VerifiedElementCache.FIRST_SEEN),
+                                              sample_rate=CONF.getValue('VERIFY_SAMPLE_RATE', 0.01),
+                                              limit_bytes=CONF.getValue('VERIFIED_CACHE_BYTES', 20 * 2**20))
+"""
+The process wide cache of verified structure elements
+"""
+
+
 class StructureElement(object):
     """
     @brief Wrapper for the container structure element. These are the objects
@@ -1968,7 +2098,7 @@ class StructureElement(object):
 
         instance = cls(se)
 
-        if instance.key != instance.sha1:
+        if not verified_element_cache.verify(instance):
             log.error('The sha1 key does not match the value. The data is corrupted! \n' +\
                       'Element key %s, Calculated key %s' % (sha1_to_hex(instance.key), sha1_to_hex(instance.sha1)))
             raise StructureElementError('Error reading serialized structure element. Sha1 value does not match.')
@@ -2068,3 +2198,53 @@ class StructureElement(object):
         #print 'GPB Size: ', self._element.ByteSize()
 
         return self._element.ByteSize()
+
+
+class LazyStructureElement(StructureElement):
+    """
+    @brief A structure element which is still serialized inside a larger buffer - usually the content of a message.
+    Only the key is known up front. The element is parsed from its span of the buffer the first time any other part
+    of it is used - no bytes are copied before that.
+    """
+
+    def __init__(self, buf, start, end, key):
+        self._buf = buf
+        self._start = start
+        self._end = end
+        self._key = key
+        self._parsed = None
+        self.ChildLinks = set()
+
+    @property
+    def _element(self):
+        if self._parsed is None:
+            se = get_gpb_class_from_type_id(STRUCTURE_ELEMENT_TYPE)()
+            se.ParseFromString(self._buf[self._start:self._end])
+            self._parsed = se
+            # Let go of the message buffer
+            self._buf = None
+        return self._parsed
+
+    @property
+    def parsed(self):
+        return self._parsed is not None
+
+    def _get_key(self):
+        return self._key
+
+    def _set_key(self, value):
+        self._element.key = value
+        self._key = value
+
+    key = property(_get_key, _set_key)
+
+    def serialize(self):
+        if self._parsed is None:
+            return self._buf[self._start:self._end]
+        return self._parsed.SerializeToString()
+
+    def __sizeof__(self):
+        if self._parsed is None:
+            return self._end - self._start
+        return self._parsed.ByteSize()
+
@@ -12,14 +12,21 @@ from net.ooici.core.type import type_pb2
 import hashlib
 import struct
 import os
+import sys
 from google.protobuf import message
 from google.protobuf.internal import containers
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
+from ion.core import ioninit
+from ion.util.config import Config
+
+CONF = ioninit.config(__name__)
+# Manifest of the type ids of the net package, written on first complete import
+CF_gpb_manifest = CONF.getValue('gpb_manifest', None)
 
 # Globals
-gpb_id_to_class = {}
+gpb_id_to_class = None
 
 class ObjectUtilException(Exception):
     """ Exceptions specific to Object Utilities. """
@@ -136,54 +143,218 @@ def create_type_identifier(object_id='', version=1):
         
     return ObjectType
 
+ENUM_NAME = '_MessageTypeIdentifier'
+ENUM_ID_NAME = '_ID'
+ENUM_VERSION_NAME = '_VERSION'
+
+class GPBTypeRegistry(object):
+    """
+    Maps _MessageTypeIdentifier ids to the Protocol Buffers classes of a
+    package, importing the proto module of a type on first lookup of its id.
+    Which module defines which id comes from a manifest, written out once all
+    proto modules of the package have been imported. Without a manifest, or
+    when the manifest does not match the package, the first lookup imports
+    all proto modules as build_gpb_lookup does.
+    Reads like the dict gpb_id_to_class used to be.
+    """
+
+    def __init__(self, rootpath, manifest_path=None):
+        """
+        @param rootpath The full path of the package to import the Protocol Buffers classes from.
+            It must include a list named "protos" specifying which protocol buffer files to import.
+        @param manifest_path File name of the manifest; None for no manifest
+        """
+        self.rootpath = rootpath
+        self.manifest_path = manifest_path
+
+        # Dict type id -> class, for the proto modules imported so far
+        self.classes = {}
+        # Dict type id -> (module name, class name), read on first lookup
+        self.manifest = None
+        # True once all proto modules of the package are imported
+        self.complete = False
+        # Number of proto modules imported by lookups
+        self.imports = 0
+
+    def __getitem__(self, typeid):
+        msg_class = self.classes.get(typeid)
+        if msg_class is None:
+            msg_class = self._load(typeid)
+            if msg_class is None:
+                raise KeyError(typeid)
+        return msg_class
+
+    def has_key(self, typeid):
+        return typeid in self.classes or self._load(typeid) is not None
+
+    __contains__ = has_key
+
+    def __len__(self):
+        self.load_all()
+        return len(self.classes)
+
+    def itervalues(self):
+        self.load_all()
+        return self.classes.itervalues()
+
+    def _load(self, typeid):
+        """
+        Imports the proto module which defines typeid, as named by the
+        manifest; or all of them if the manifest has no such id or names
+        the wrong module.
+        """
+        if self.complete:
+            return None
+
+        if self.manifest is None:
+            self.manifest = self.read_manifest()
+
+        entry = self.manifest.get(typeid)
+        if entry is not None:
+            module_name, class_name = entry
+            self._import(module_name)
+            msg_class = self.classes.get(typeid)
+            if msg_class is not None and msg_class.__name__ == class_name:
+                return msg_class
+            log.warn('GPB type manifest %s does not match %s for type id %s; importing all proto modules',
+                     self.manifest_path, module_name, typeid)
+
+        self.load_all()
+        return self.classes.get(typeid)
+
+    def load_all(self):
+        """
+        Imports all proto modules of the package and registers their classes,
+        and writes out the manifest if it does not list them all.
+        """
+        if self.complete:
+            return
+
+        root = __import__(self.rootpath)
+        for proto in root.protos:
+            self._import('%s.%s' % (self.rootpath, proto))
+        self.complete = True
+
+        if self.manifest_path and self.manifest != self._manifest_types():
+            self.write_manifest()
+
+    def _import(self, module_name):
+        if module_name not in sys.modules:
+            self.imports += 1
+        __import__(module_name)
+        self._register_classes()
+
+    def _register_classes(self):
+        """
+        Registers the Protocol Buffers classes of the package imported so far
+        """
+        for msg_class in message.Message.__subclasses__():
+            if msg_class.__module__.startswith(self.rootpath):
+                if hasattr(msg_class, 'DESCRIPTOR'):
+                    descriptor = msg_class.DESCRIPTOR
+                    if hasattr(descriptor, 'enum_types'):
+                        for enum_type in descriptor.enum_types:
+                            if enum_type.name == ENUM_NAME:
+                                for val in enum_type.values:
+                                    if val.name == ENUM_ID_NAME:
+                                        old_class = self.classes.get(val.number)
+                                        if old_class is msg_class:
+                                            continue
+                                        elif old_class is not None:
+                                            old_def = str(old_class.__module__)
+                                            new_def = str(msg_class.__module__)
+                                            gpb_num = str(val.number)
+                                            raise ObjectUtilException('Duplicate _MessageTypeIdentifier for '\
+                                                                          + 'ID# %s in %s; original definition in %s' \
+                                                                          % (gpb_num, new_def, old_def))
+
+                                        self.classes[val.number] = msg_class
+                                    elif val.name == ENUM_VERSION_NAME:
+                                        # Eventually this will implement versioning...
+                                        # For now return an error if the version is not 1
+                                        if val.number != 1:
+                                            msg = '''Protocol Buffer Object VERSION in the MessageTypeIdentifier should be 1. \n'''
+                                            msg += '''Explicit versioning is not yet supported.\n'''
+                                            msg +='''Invalid Object Class: "%s"'''\
+                                                % (str(msg_class.__name__))
+                                            raise ObjectUtilException(msg)
+
+    def _manifest_types(self):
+        return dict((typeid, (msg_class.__module__, msg_class.__name__))
+                    for typeid, msg_class in self.classes.iteritems())
+
+    def _package_path(self):
+        return os.path.dirname(os.path.abspath(__import__(self.rootpath).__file__))
+
+    def read_manifest(self):
+        """
+        @retval dict type id -> (module name, class name) from the manifest;
+            empty if there is none, or it was written for a different list of
+            protos of the package or for the package in another place
+        """
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            manifest = Config(self.manifest_path).getObject()
+            protos = list(__import__(self.rootpath).protos)
+            if manifest['root'] != self.rootpath or manifest['protos'] != protos or \
+                    manifest.get('path') != self._package_path():
+                log.info('GPB type manifest %s is out of date', self.manifest_path)
+                return {}
+            return manifest['types']
+        except Exception, ex:
+            log.warn('Cannot read GPB type manifest %s: %s', self.manifest_path, ex)
+            return {}
+
+    def write_manifest(self):
+        """
+        Writes the manifest of all types of the package, for the next startup.
+        It is written to a temporary file which is then renamed, so that a
+        process starting at the same time never reads half of it. Failing to
+        write it is logged only.
+        """
+        self.load_all()
+        types = self._manifest_types()
+        lines = ['# Type ids of %s and the proto modules which define them, written by' % self.rootpath,
+                 '# ion.core.object.object_utils.GPBTypeRegistry. Do not edit; delete to rebuild.',
+                 '{',
+                 "'root':%r," % self.rootpath,
+                 "'path':%r," % self._package_path(),
+                 "'protos':%r," % list(__import__(self.rootpath).protos),
+                 "'types':{"]
+        for typeid in sorted(types):
+            lines.append('    %d:%r,' % (typeid, types[typeid]))
+        lines.extend(['},', '}', ''])
+        tmp_path = '%s.%d.tmp' % (self.manifest_path, os.getpid())
+        try:
+            manifest_dir = os.path.dirname(self.manifest_path)
+            if manifest_dir and not os.path.isdir(manifest_dir):
+                os.makedirs(manifest_dir)
+            f = open(tmp_path, 'w')
+            try:
+                f.write('\n'.join(lines))
+            finally:
+                f.close()
+            os.rename(tmp_path, self.manifest_path)
+        except (IOError, OSError), ex:
+            log.warn('Cannot write GPB type manifest %s: %s', self.manifest_path, ex)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.manifest = types
+        log.info('Wrote GPB type manifest %s with %d types', self.manifest_path, len(types))
+
 def build_gpb_lookup(rootpath):
     """
-    To be called once on package initialization.
+    Imports all proto modules of a package and replaces gpb_id_to_class with
+    a complete lookup of their classes. Not needed on package initialization
+    any longer, which sets up a GPBTypeRegistry that imports on first use.
     The given package must include a list named "protos" specifying which protocol buffer files to import.
     @param rootpath The full path of the package to import the Protocol Buffers classes from.
     """
-
-    ENUM_NAME = '_MessageTypeIdentifier'
-    ENUM_ID_NAME = '_ID'
-    ENUM_VERSION_NAME = '_VERSION'
-    
     global gpb_id_to_class
-    gpb_id_to_class = {}
-
-    root = __import__(rootpath)
-    protos = root.protos
-    for proto in protos:
-        protopath = '%s.%s' % (rootpath, proto)
-        m = __import__(protopath)
-
-    msg_classes = message.Message.__subclasses__()
-    for msg_class in msg_classes:
-        if msg_class.__module__.startswith(rootpath):
-            if hasattr(msg_class, 'DESCRIPTOR'):
-                descriptor = msg_class.DESCRIPTOR
-                if hasattr(descriptor, 'enum_types'):
-                    for enum_type in descriptor.enum_types:
-                        if enum_type.name == ENUM_NAME:
-                            for val in enum_type.values:
-                                if val.name == ENUM_ID_NAME:
-                                    if gpb_id_to_class.has_key(val.number):
-                                        old_def = str(gpb_id_to_class[val.number].__module__)
-                                        new_def = str(msg_class.__module__)
-                                        gpb_num = str(val.number)
-                                        raise ObjectUtilException('Duplicate _MessageTypeIdentifier for '\
-                                                                      + 'ID# %s in %s; original definition in %s' \
-                                                                      % (gpb_num, new_def, old_def))
-
-                                    gpb_id_to_class[val.number] = msg_class
-                                elif val.name == ENUM_VERSION_NAME:
-                                    # Eventually this will implement versioning...
-                                    # For now return an error if the version is not 1
-                                    if val.number != 1:
-                                        msg = '''Protocol Buffer Object VERSION in the MessageTypeIdentifier should be 1. \n'''
-                                        msg += '''Explicit versioning is not yet supported.\n'''
-                                        msg +='''Invalid Object Class: "%s"'''\
-                                            % (str(msg_class.__name__))
-                                        raise ObjectUtilException(msg)
+    gpb_id_to_class = GPBTypeRegistry(rootpath)
+    gpb_id_to_class.load_all()
 
 def get_gpb_class_from_type_id(typeid):
     """
@@ -206,7 +377,7 @@ type_name_cache = None
 def find_type_ids(query):
     """
     Fuzzy search for a GPB-defined type with the given text in the name.
-    Assumes that build_gpb_lookup() was called on package init.
+    Imports all proto modules of gpb_id_to_class on first use.
     """
     import difflib
 
@@ -315,8 +486,9 @@ def _gpb_source_root(func):
 
 
 
-# Build the lookup table on first import
-build_gpb_lookup('net')
+# The lookup table imports the proto modules of a type on first use. The
+# manifest lives in the home directory of the user, not in the source tree
+gpb_id_to_class = GPBTypeRegistry('net', CF_gpb_manifest and os.path.expanduser(CF_gpb_manifest))
 
 # Build the CDM TYPES for import 
 CDM_GROUP_TYPE = create_type_identifier(object_id=10020, version=1)
@@ -20,6 +20,7 @@ from ion.core.object import gpb_wrapper
 from ion.core.object import object_utils
 
 from ion.core.object import association_manager
+from ion.core.object import traversal
 
 from ion.core.exception import ApplicationError, ReceivedApplicationError, ReceivedContainerError
 
@@ -369,13 +370,17 @@ class ObjectContainer(object):
 
     def load_links(self, obj, excluded_types=None):
         """
-        Load the child objects into the work space recursively
+        Load the child objects into the work space - an iterative walk of the whole structure below obj
         """
         excluded_types = excluded_types or []
-        for link in obj.ChildLinks:
-            if not link.type.GPBMessage in excluded_types:
-                child = self.get_linked_object(link)
-                self.load_links(child, excluded_types)
+
+        def load_children(parent):
+            for link in parent.ChildLinks:
+                if not link.type.GPBMessage in excluded_types:
+                    # Always get the linked object - it sets the parent link even if the child is already loaded
+                    yield self.get_linked_object(link)
+
+        traversal.walk([obj], load_children)
 
     def _checkout_local_commit(self, commit, excluded_types):
 
@@ -475,9 +480,9 @@ class ObjectContainer(object):
 
     def _load_element(self, element):
 
-        # check that the calculated value in element.sha1 matches the stored value
-        if not element.key == element.sha1:
-            #@TODO Consider removing this somewhat costly check - it is already done when an object is read from a message
+        # check that the calculated value in element.sha1 matches the stored value - the shared cache skips the
+        # hash when this element was already verified on the way in from a message or the datastore
+        if not gpb_wrapper.verified_element_cache.verify(element):
             raise RepositoryError('The sha1 key does not match the value. The data is corrupted! \n' +\
             'Element key %s, Calculated key %s' % (object_utils.sha1_to_hex(element.key), object_utils.sha1_to_hex(element.sha1)))
 
@@ -518,6 +523,11 @@ class Repository(ObjectContainer):
 
     MERGEREQUIRED = 'This repository is currently being merged!'
 
+    _deferred_commit = None
+    """
+    A (comment, root key) pair for a commit of the workspace which is only made when the history of the repository is
+    first needed. See defer_commit.
+    """
 
     def __init__(self, head=None, repository_key=None, persistent=False, cached=False):
         
@@ -632,7 +642,7 @@ class Repository(ObjectContainer):
             output += te
 
         output += '============== .git Object ==============\n'
-        output += str(self._dotgit) + '\n'
+        output += str(self._mutable_head) + '\n'
         output += '============== Root Object ==============\n'
         output += str(self._workspace_root) + '\n'
 
@@ -674,7 +684,28 @@ class Repository(ObjectContainer):
 
     @property
     def repository_key(self):
-        return self._dotgit.repositorykey
+        # The key does not depend on history - do not make a deferred commit
+        return self._mutable_head.repositorykey
+
+    def _get_dotgit(self):
+        if self._deferred_commit is not None:
+            self._commit_deferred()
+        return self._mutable_head
+
+    def _set_dotgit(self, value):
+        self._mutable_head = value
+
+    _dotgit = property(_get_dotgit, _set_dotgit)
+
+    def _get_current_branch(self):
+        if self._deferred_commit is not None:
+            self._commit_deferred()
+        return self._branch_head
+
+    def _set_current_branch(self, value):
+        self._branch_head = value
+
+    _current_branch = property(_get_current_branch, _set_current_branch)
 
     def _set_persistent(self, value):
         if not isinstance(value, bool):
@@ -740,7 +771,8 @@ class Repository(ObjectContainer):
         self.purge_associations()
 
 
-        self._dotgit.Invalidate()
+        self._deferred_commit = None
+        self._mutable_head.Invalidate()
 
         self._workspace.clear()
         self.index_hash.clear()
@@ -1208,12 +1240,51 @@ class Repository(ObjectContainer):
         return branch.commitrefs.GetLink(0).key
             
             
-    def _create_commit_ref(self, comment='', date=None):
+    def defer_commit(self, comment=''):
+        """
+        @brief Record a commit of the current workspace without making it. The commit is made - pointing at the
+        current root object even if the workspace is modified in the mean time - the first time the branches or
+        history of the repository are used. Most messages are read and dropped without anyone looking at their
+        history, so the codec uses this for the commit it makes on arrival.
+        @param comment a string that describes this commit
+        """
+        if self.status != self.UPTODATE:
+            raise RepositoryError('Can only defer the commit of an up to date workspace')
+
+        self._deferred_commit = (comment, self._workspace_root.MyId)
+
+    def _commit_deferred(self):
+        """
+        Make the deferred commit - the root object is the committed element recorded by defer_commit
+        """
+        comment, root_key = self._deferred_commit
+        self._deferred_commit = None
+
+        element = None
+        if self._workspace_root is None or self._workspace_root.MyId != root_key:
+            # The workspace has moved on - commit the recorded root element
+            element = self.index_hash.get(root_key)
+            if element is None:
+                raise RepositoryError('Could not get the root element for a deferred commit from the index hash.')
+
+        structure={}
+        cref = self._create_commit_ref(comment=comment, root_element=element)
+        cref.RecurseCommit(structure)
+
+        cref.ReadOnly = True
+        self._commit_index[cref.MyId] = cref
+        self.index_hash.update(structure)
+
+        log.debug('Made deferred commit - Comment: "%s"' % comment)
+
+    def _create_commit_ref(self, comment='', date=None, root_element=None):
         """
         @brief internal method to create commit references
         @param comment a string that describes this commit
         @param date the date to associate with this commit. If not given then 
         the current time is used.
+        @param root_element a structure element to use as the root object of the commit. If not given the current
+        workspace root is used.
         @retval a string which is the commit reference
         """
         # Now add a Commit Ref
@@ -1256,7 +1327,16 @@ class Repository(ObjectContainer):
                 pref.relationship = pref.Relationship.MERGEDFROM
             
         cref.comment = comment
-        cref.SetLinkByName('objectroot', self._workspace_root)            
+        if root_element is None:
+            cref.SetLinkByName('objectroot', self._workspace_root)
+        else:
+            # Link directly to the hashed element - the workspace may have moved on
+            link = cref.GetLink('objectroot')
+            link.key = root_element.key
+            link.type.object_id = root_element.type.object_id
+            link.type.version = root_element.type.version
+            link.isleaf = root_element.isleaf
+            link.ChildLinks.add(link)
         
         # Clear the merge root and merged from
         self.merge = None
@@ -1531,6 +1611,33 @@ class Repository(ObjectContainer):
             raise RepositoryError('You can not copy only part of a gpb composite, only the root!')
             
 
+        new_obj = self._copy_element(value)
+
+        if deep_copy:
+            # Deep copy from the original! Each node of the walk is a (link, copy) pair - the link in the parent copy
+            # is set to point at the child copy once the copy of the child's own structure is complete.
+            def copy_children(node):
+                link, copy = node
+                for child_link in copy.ChildLinks:
+                    # Use the copies link to get the child - possibly from a different repo!
+                    child = self.get_linked_object(child_link)
+                    yield (child_link, self._copy_element(child))
+
+            def set_copy_link(node, parent):
+                link, copy = node
+                if link is not None:
+                    link.SetLink(copy)
+
+            traversal.walk([(None, new_obj)], copy_children, post_visit=set_copy_link, unique=False)
+
+        log.debug('Copy Object: Complete')
+
+        return new_obj
+
+    def _copy_element(self, value):
+        """
+        Copy a single root object - the links in the copy still point at the original children
+        """
         if value.Modified:
             structure={}
             value_repo = value.Repository
@@ -1538,10 +1645,6 @@ class Repository(ObjectContainer):
             # Deal with the case where this serialization causes a hash conflict...
             value_repo.index_hash.update(structure)
 
-
-
-
-
         element = self.index_hash.get(value.MyId)
 
         if element is None:
@@ -1550,17 +1653,6 @@ class Repository(ObjectContainer):
 
         new_obj._set_parents_modified()
 
-        if deep_copy:
-            # Deep copy from the original!
-            for link in new_obj.ChildLinks:
-                # Use the copies link to get the child - possibly from a different repo!
-
-                child = self.get_linked_object(link)
-                new_child = self.copy_object(child, True)
-                link.SetLink(new_child)
-
-        log.debug('Copy Object: Complete')
-
         return new_obj
     
     
@@ -75,6 +75,50 @@ class CodecTest(unittest.TestCase):
         self.assertEqual(res.person[0],self.ab.person[0])
 
 
+    def test_lazy_unpack(self):
+
+        serialized = codec.pack_structure(self.ab)
+
+        res = codec.unpack_structure(serialized, lazy=True)
+        repo = res.Repository
+
+        # Only the root element has been parsed
+        parsed = [se for se in repo.index_hash.itervalues() if se.parsed]
+        self.assertEqual(len(parsed), 1)
+        self.assertEqual(repo._deferred_commit is not None, True)
+
+        self.assertEqual(res, self.ab)
+        self.assertEqual(res.person[0], self.ab.person[0])
+        self.assertEqual(res.owner.name, 'David')
+
+        # Using the history makes the deferred commit
+        cref = repo.commit_head
+        self.assertEqual(cref.comment, 'Message for you Sir!')
+        self.assertEqual(repo._deferred_commit, None)
+        self.assertEqual(cref.objectroot, res)
+
+    def test_lazy_unpack_modified(self):
+
+        serialized = codec.pack_structure(self.ab)
+
+        res = codec.unpack_structure(serialized, lazy=True)
+        repo = res.Repository
+        root_key = res.MyId
+
+        res.title = 'Changed'
+        repo.commit('After the message')
+
+        # The deferred message commit is the parent of the new one and points at the original content
+        cref = repo.commit_head
+        self.assertEqual(cref.comment, 'After the message')
+        parent = cref.parentrefs[0].commitref
+        self.assertEqual(parent.comment, 'Message for you Sir!')
+        self.assertEqual(parent.GetLink('objectroot').key, root_key)
+
+    def test_lazy_unpack_error(self):
+
+        self.assertRaises(codec.CodecError,codec.unpack_structure,'junk that is not a serialized container!', lazy=True)
+
     def test_unpack_error(self):
 
         self.assertRaises(codec.CodecError,codec.unpack_structure,'junk that is not a serialized container!')
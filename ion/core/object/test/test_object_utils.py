@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/object/test/test_object_utils.py
+@test ion.core.object.object_utils lazy lookup of Protocol Buffers classes by
+type id, on a package of stand in proto modules written for each test
+"""
+
+import gc
+import os
+import sys
+
+from twisted.trial import unittest
+
+from ion.core.object.object_utils import GPBTypeRegistry, ObjectUtilException
+
+PROTO_MODULE = '''
+from google.protobuf import message
+
+class EnumValue(object):
+    def __init__(self, name, number):
+        self.name = name
+        self.number = number
+
+class EnumType(object):
+    def __init__(self, name, values):
+        self.name = name
+        self.values = values
+
+class Descriptor(object):
+    def __init__(self, typeid):
+        self.enum_types = [EnumType('_MessageTypeIdentifier', [EnumValue('_ID', typeid), EnumValue('_VERSION', 1)])]
+
+%s
+'''
+
+PROTO_CLASS = '''
+class %s(message.Message):
+    DESCRIPTOR = Descriptor(%d)
+'''
+
+
+class GPBTypeRegistryTest(unittest.TestCase):
+
+    packages = 0
+
+    def setUp(self):
+        GPBTypeRegistryTest.packages += 1
+        self.rootpath = 'gpbtestroot%d' % self.packages
+        self.path = os.path.abspath(self.mktemp())
+        self.manifest_path = os.path.join(self.path, 'cache', 'manifest.cfg')
+
+        # Three proto modules, of two types each
+        self.protos = {'first_pb2':[('First', 1001), ('FirstItem', 1002)],
+                       'second_pb2':[('Second', 1003), ('SecondItem', 1004)],
+                       'third_pb2':[('Third', 1005), ('ThirdItem', 1006)]}
+        self._write_package(self.protos)
+        sys.path.insert(0, self.path)
+
+    def tearDown(self):
+        sys.path.remove(self.path)
+        for name in sys.modules.keys():
+            if name.startswith(self.rootpath):
+                del sys.modules[name]
+
+    def _write_package(self, protos):
+        package = os.path.join(self.path, self.rootpath)
+        if not os.path.exists(package):
+            os.makedirs(package)
+        self._write(os.path.join(package, '__init__.py'), 'protos = %r\n' % sorted(protos.keys()))
+        for name, classes in protos.items():
+            self._write(os.path.join(package, name + '.py'),
+                        PROTO_MODULE % ''.join([PROTO_CLASS % cls for cls in classes]))
+
+    def _write(self, filename, content):
+        # No stale .pyc of a module written within the same second
+        if os.path.exists(filename + 'c'):
+            os.remove(filename + 'c')
+        f = open(filename, 'w')
+        f.write(content)
+        f.close()
+
+    def _restart(self):
+        # As a new process: forget the proto modules and their classes
+        for name in self._imported() + [self.rootpath]:
+            del sys.modules[name]
+        gc.collect()
+
+    def _imported(self):
+        return sorted([name for name, module in sys.modules.items()
+                       if name.startswith(self.rootpath + '.') and module is not None])
+
+    def test_without_manifest(self):
+        registry = GPBTypeRegistry(self.rootpath)
+        self.assertEqual(registry[1003].__name__, 'Second')
+        self.assertEqual(registry.imports, 3)
+        self.assertEqual(len(registry), 6)
+        self.assertRaises(KeyError, registry.__getitem__, 2000)
+        self.failIf(registry.has_key(2000))
+
+    def test_manifest(self):
+        GPBTypeRegistry(self.rootpath, self.manifest_path).load_all()
+        self.failUnless(os.path.exists(self.manifest_path))
+        self._restart()
+
+        # The next startup imports only the module of the type it looks up
+        registry = GPBTypeRegistry(self.rootpath, self.manifest_path)
+        self.assertEqual(registry[1004].__name__, 'SecondItem')
+        self.assertEqual(registry[1003].__name__, 'Second')
+        self.assertEqual(registry.imports, 1)
+        self.assertEqual(self._imported(), [self.rootpath + '.second_pb2'])
+
+        # An id not in the manifest imports them all
+        self.failIf(registry.has_key(2000))
+        self.assertEqual(registry.imports, 3)
+
+    def test_manifest_written(self):
+        registry = GPBTypeRegistry(self.rootpath, self.manifest_path)
+        registry.load_all()
+
+        # Into a new directory, without leaving the temporary file behind
+        self.assertEqual(os.listdir(os.path.dirname(self.manifest_path)), ['manifest.cfg'])
+        self.assertEqual(len(registry.read_manifest()), 6)
+
+        # A manifest of the package in another place is not used
+        f = open(self.manifest_path)
+        content = f.read()
+        f.close()
+        self._write(self.manifest_path, content.replace(self.path, '/elsewhere'))
+        self.assertEqual(registry.read_manifest(), {})
+
+    def test_stale_manifest(self):
+        GPBTypeRegistry(self.rootpath, self.manifest_path).load_all()
+        self._restart()
+
+        # A new proto module makes the manifest out of date
+        self.protos['fourth_pb2'] = [('Fourth', 1007)]
+        self._write_package(self.protos)
+
+        registry = GPBTypeRegistry(self.rootpath, self.manifest_path)
+        self.assertEqual(registry[1007].__name__, 'Fourth')
+        self.assertEqual(registry.imports, 4)
+        self.assertEqual(registry.read_manifest()[1007], (self.rootpath + '.fourth_pb2', 'Fourth'))
+
+    def test_duplicate(self):
+        self.protos['third_pb2'] = [('Third', 1005), ('SecondAgain', 1003)]
+        self._write_package(self.protos)
+        registry = GPBTypeRegistry(self.rootpath)
+        self.assertRaises(ObjectUtilException, registry.load_all)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/object/test/test_traversal.py
+@test Iterative DAG traversal used by commit, load and copy
+"""
+
+import sys
+
+from twisted.trial import unittest
+
+from ion.core.object import traversal
+
+
+class Node(object):
+
+    def __init__(self, name, children=None):
+        self.name = name
+        self.children = children or []
+
+    def __repr__(self):
+        return self.name
+
+
+def get_children(node):
+    return node.children
+
+
+def make_chain(depth):
+    node = Node('n%d' % depth)
+    for i in xrange(depth - 1, 0, -1):
+        node = Node('n%d' % i, [node])
+    return node
+
+
+class WalkTest(unittest.TestCase):
+
+    def test_order(self):
+        d = Node('d')
+        b = Node('b', [d])
+        c = Node('c', [d])
+        a = Node('a', [b, c])
+
+        pre = []
+        post = []
+        stats = traversal.walk([a], get_children, pre_visit=lambda n, p: pre.append((n.name, p and p.name)),
+                               post_visit=lambda n, p: post.append(n.name))
+
+        # d is shared by b and c but only visited once
+        self.assertEqual(pre, [('a', None), ('b', 'a'), ('d', 'b'), ('c', 'a')])
+        self.assertEqual(post, ['d', 'b', 'c', 'a'])
+        self.assertEqual(stats.visited, 4)
+        self.assertEqual(stats.max_depth, 3)
+
+    def test_not_unique(self):
+        d = Node('d')
+        a = Node('a', [Node('b', [d]), Node('c', [d])])
+
+        post = []
+        stats = traversal.walk([a], get_children, post_visit=lambda n, p: post.append(n.name), unique=False)
+
+        self.assertEqual(post, ['d', 'b', 'd', 'c', 'a'])
+        self.assertEqual(stats.visited, 5)
+
+    def test_multiple_roots(self):
+        shared = Node('s')
+        r1 = Node('r1', [shared])
+        r2 = Node('r2', [shared])
+
+        post = []
+        traversal.walk([r1, r2, r1], get_children, post_visit=lambda n, p: post.append(n.name))
+        self.assertEqual(post, ['s', 'r1', 'r2'])
+
+    def test_lazy_children(self):
+        """
+        Children are consumed one at a time - side effects of walking the first child are visible to the generator
+        """
+        a = Node('a', [Node('b'), Node('c')])
+        done = []
+
+        def children(node):
+            for child in node.children:
+                yield child
+                # The child has been completely walked before the generator resumes
+                self.assertIn(child.name, done)
+
+        traversal.walk([a], children, post_visit=lambda n, p: done.append(n.name))
+        self.assertEqual(done, ['b', 'c', 'a'])
+
+    def test_deep_chain(self):
+        depth = sys.getrecursionlimit() * 5
+        root = make_chain(depth)
+
+        post = []
+        stats = traversal.walk([root], get_children, post_visit=lambda n, p: post.append(n))
+
+        self.assertEqual(stats.visited, depth)
+        self.assertEqual(stats.max_depth, depth)
+        self.assertEqual(post[-1], root)
+        self.assertEqual(post[0].name, 'n%d' % depth)
@@ -267,6 +267,47 @@ class WorkBenchTest(unittest.TestCase):
         self.assertIn(key, self.wb._repos)
         self.assertNotIn(key, self.wb._repo_cache)
 
+    def test_commit_checkpoints(self):
+
+        commits = []
+        for i in range(100):
+            self.ab.title = 'version %d' % i
+            commits.append(self.repo.commit('commit %d' % i))
+
+        checkpoints = self.wb.list_commit_checkpoints(self.repo)
+
+        # The head, 1, 3, 7, 15, 31, 63 commits back and the root
+        self.assertEqual(checkpoints, [commits[99], commits[98], commits[96], commits[92], commits[84], commits[68],
+                                       commits[36], commits[0]])
+
+        self.assertEqual(len(self.wb.list_repository_commits(self.repo)), 100)
+
+    def test_commits_needed(self):
+
+        commits = []
+        for i in range(20):
+            self.ab.title = 'version %d' % i
+            commits.append(self.repo.commit('commit %d' % i))
+
+        puller_has = self.wb.list_commit_checkpoints(self.repo)
+
+        for i in range(20, 30):
+            self.ab.title = 'version %d' % i
+            commits.append(self.repo.commit('commit %d' % i))
+
+        # Only the new commits are needed
+        self.assertEqual(self.wb.list_commits_needed(self.repo, puller_has), set(commits[20:]))
+
+        # The full list of commits used by older pullers gives the same answer
+        self.assertEqual(self.wb.list_commits_needed(self.repo, commits[:20]), set(commits[20:]))
+
+        # Keys which are not known - commits made only by the puller - are ignored
+        self.assertEqual(self.wb.list_commits_needed(self.repo, ['not a commit key'] + puller_has[1:]),
+                         set(commits[19:]))
+
+        # A new puller needs everything
+        self.assertEqual(self.wb.list_commits_needed(self.repo, []), set(commits))
+
 
 
 class WorkBenchProcess(Process):
@@ -534,6 +575,41 @@ class WorkBenchProcessTest(IonTestCase):
         self.assertEqual(self.repo1.root_object, repo2.root_object)
 
 
+    @defer.inlineCallbacks
+    def test_pull_long_history(self):
+
+        # Must make the repo persistent to compare the result
+        self.repo1.persistent = True
+
+        for i in range(50):
+            self.repo1.root_object.title = 'version %d' % i
+            self.repo1.commit('Update %d' % i)
+
+        result = yield self.proc2.workbench.pull(self.proc1.id.full, self.repo1.repository_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+        self.assertEqual(len(result.commit_elements), 51)
+
+        repo2 = self.proc2.workbench.get_repository(self.repo1.repository_key)
+
+        # The pull request carries a summary of the history, not the whole thing
+        self.assertEqual(len(self.proc2.workbench.list_commit_checkpoints(repo2)), 7)
+
+        self.repo1.root_object.title = 'New Addressbook'
+        self.repo1.commit('An updated addressbook')
+
+        result = yield self.proc2.workbench.pull(self.proc1.id.full, self.repo1.repository_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        # Only the new commit is sent
+        self.assertEqual(len(result.commit_elements), 1)
+
+        ab = yield repo2.checkout('master')
+
+        self.assertEqual(self.repo1.commit_head, repo2.commit_head)
+        self.assertEqual(self.repo1.root_object, repo2.root_object)
+        self.assertEqual(len(self.proc2.workbench.list_repository_commits(repo2)), 52)
+
+
     @defer.inlineCallbacks
     def test_pull_branch(self):
 
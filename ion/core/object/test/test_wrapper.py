@@ -6,6 +6,8 @@
 @test Service the protobuffers wrapper class
 """
 
+import sys
+
 import ion.util.ionlog
 from twisted.trial.unittest import SkipTest
 log = ion.util.ionlog.getLogger(__name__)
@@ -84,6 +86,23 @@ class WrapperMethodsTest(unittest.TestCase):
         #print s
 
 
+    def test_compact_instance(self):
+        """
+        Wrapper instances must not carry a per instance dictionary
+        """
+        ab = gpb_wrapper.Wrapper._create_object(ADDRESSBOOK_TYPE)
+
+        self.failIf(hasattr(ab, '__dict__'))
+        self.failUnless(sys.getsizeof(ab) <= gpb_wrapper.WRAPPER_BYTE_BUDGET)
+
+        # Unknown attributes can not be added to a wrapper
+        self.assertRaises(AttributeError, setattr, ab, 'not_a_field', 5)
+
+        # The derived wrappers are compact too
+        owner = ab.owner
+        self.failIf(hasattr(owner, '__dict__'))
+
+
     def test_field_enum(self):
         """
         """
@@ -419,6 +438,100 @@ class TestStructureElementWrapper(unittest.TestCase):
         self.assertEqual(se.__sizeof__(), 127)
 
 
+class TestVerifiedElementCache(unittest.TestCase):
+
+    def _make_element(self):
+        wb = workbench.WorkBench('no process test')
+        repo = wb.create_repository(PERSON_TYPE)
+        repo.root_object.name = 'David Stuebe'
+        repo.commit('committed...')
+
+        blob = repo.index_hash.get(repo.root_object.MyId).serialize()
+        return gpb_wrapper.StructureElement.parse_structure_element(blob)
+
+    def test_first_seen(self):
+        se = self._make_element()
+        cache = gpb_wrapper.VerifiedElementCache(policy=gpb_wrapper.VerifiedElementCache.FIRST_SEEN)
+
+        self.assertEqual(cache.verify(se), True)
+        self.assertEqual(cache.verify(se), True)
+        self.assertEqual(cache.verify(se), True)
+
+        self.assertEqual(cache.hashes_performed, 1)
+        self.assertEqual(cache.hashes_skipped, 2)
+        self.assertEqual(cache.is_verified(se.key), True)
+
+    def test_always(self):
+        se = self._make_element()
+        cache = gpb_wrapper.VerifiedElementCache(policy=gpb_wrapper.VerifiedElementCache.ALWAYS)
+
+        cache.verify(se)
+        cache.verify(se)
+
+        self.assertEqual(cache.hashes_performed, 2)
+        self.assertEqual(cache.hashes_skipped, 0)
+
+    def test_sampled(self):
+        se = self._make_element()
+        cache = gpb_wrapper.VerifiedElementCache(policy=gpb_wrapper.VerifiedElementCache.SAMPLED, sample_rate=1.0)
+
+        cache.verify(se)
+        cache.verify(se)
+        self.assertEqual(cache.hashes_performed, 2)
+
+        cache = gpb_wrapper.VerifiedElementCache(policy=gpb_wrapper.VerifiedElementCache.SAMPLED, sample_rate=0.0)
+        cache.verify(se)
+        cache.verify(se)
+        self.assertEqual(cache.hashes_performed, 1)
+        self.assertEqual(cache.hashes_skipped, 1)
+
+    def test_corrupt(self):
+        se = self._make_element()
+        cache = gpb_wrapper.VerifiedElementCache()
+
+        self.assertEqual(cache.verify(se), True)
+
+        # A changed value for a known key must be hashed again
+        se.value = se.value + 'junk'
+        self.assertEqual(cache.verify(se), False)
+        self.assertEqual(cache.hashes_performed, 2)
+
+    def test_corrupt_same_length(self):
+        se = self._make_element()
+        cache = gpb_wrapper.VerifiedElementCache()
+
+        self.assertEqual(cache.verify(se), True)
+
+        # So is a changed value of the same length
+        se.value = se.value[:-1] + chr((ord(se.value[-1]) + 1) % 256)
+        self.assertEqual(cache.verify(se), False)
+        self.assertEqual(cache.hashes_performed, 2)
+
+    def test_limit_bytes(self):
+        se = self._make_element()
+        cache = gpb_wrapper.VerifiedElementCache(limit_bytes=len(se.value) * 2)
+
+        cache.verify(se)
+        self.assertEqual(cache.stats()['verified_bytes'], len(se.value))
+
+        # The oldest content goes once the cache holds more bytes than its limit
+        other = gpb_wrapper.StructureElement.parse_structure_element(se.serialize())
+        other.value = se.value + 'more'
+        other.key = other.sha1
+        cache.verify(other)
+        third = gpb_wrapper.StructureElement.parse_structure_element(se.serialize())
+        third.value = se.value + 'less'
+        third.key = third.sha1
+        cache.verify(third)
+
+        self.assertEqual(cache.is_verified(se.key), False)
+        self.assertEqual(cache.is_verified(third.key), True)
+        self.failUnless(cache.stats()['verified_bytes'] <= len(se.value) * 2)
+
+    def test_bad_policy(self):
+        self.assertRaises(gpb_wrapper.StructureElementError, gpb_wrapper.VerifiedElementCache, policy='never')
+
+
 class TestSpecializedCdmMethods(unittest.TestCase):
     """
     """
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/object/traversal.py
+@brief Iterative depth first traversal of the object DAG - Wrappers, Links and StructureElements
+
+Commit, load and copy all walk the object graph. Doing it with recursive method calls costs a python frame per level
+and fails with a RuntimeError once a structure is deeper than the recursion limit. The walk function here keeps an
+explicit stack instead, so the depth of a structure is limited only by memory.
+"""
+
+
+class TraversalStats(object):
+    """
+    Counters for a single walk
+    """
+
+    def __init__(self):
+        self.visited = 0
+        self.max_depth = 0
+
+    def __str__(self):
+        return 'TraversalStats: visited - %d, max depth - %d' % (self.visited, self.max_depth)
+
+
+def walk(roots, children, pre_visit=None, post_visit=None, unique=True):
+    """
+    @brief Depth first walk of a DAG using an explicit work stack.
+    @param roots is an iterable of the nodes to start from
+    @param children is a callable, children(node), returning an iterable of the child nodes. It is called once per
+    node, right after the node is pre visited, and consumed lazily - a generator sees the side effects of walking the
+    earlier children exactly as a recursive implementation would.
+    @param pre_visit is an optional callable, pre_visit(node, parent), called before any child of node is visited
+    @param post_visit is an optional callable, post_visit(node, parent), called after all children of node are done
+    @param unique if True each node (by identity) is visited only once, even when it is reachable by more than one
+    path. If False every path is followed - use it only when the nodes produced by children are new objects.
+    @retval a TraversalStats object
+    """
+    stats = TraversalStats()
+
+    visited = set()
+    stack = []
+
+    for root in roots:
+
+        if unique:
+            if id(root) in visited:
+                continue
+            visited.add(id(root))
+
+        if pre_visit is not None:
+            pre_visit(root, None)
+        stats.visited += 1
+
+        stack.append((root, None, iter(children(root))))
+        if stats.max_depth == 0:
+            stats.max_depth = 1
+
+        while stack:
+            node, parent, child_iter = stack[-1]
+
+            for child in child_iter:
+                if unique:
+                    if id(child) in visited:
+                        continue
+                    visited.add(id(child))
+
+                if pre_visit is not None:
+                    pre_visit(child, node)
+                stats.visited += 1
+
+                stack.append((child, node, iter(children(child))))
+                if len(stack) > stats.max_depth:
+                    stats.max_depth = len(stack)
+                break
+
+            else:
+                # All children of the node at the top of the stack are done
+                stack.pop()
+                if post_visit is not None:
+                    post_visit(node, parent)
+
+    return stats
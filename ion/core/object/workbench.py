@@ -482,8 +482,9 @@ class WorkBench(object):
             self.put_repository(repo)
         else:
             cloning = False
-            # If we have a current version - get the list of commits
-            commit_list = self.list_repository_commits(repo)
+            # If we have a current version - send the heads and a few checkpoints from their history. The history of
+            # a repository is closed under ancestry so the puller implicitly has every ancestor of these commits.
+            commit_list = self.list_commit_checkpoints(repo)
 
         # set excluded types on this repository
         if excluded_types is not None:
@@ -590,11 +591,7 @@ class WorkBench(object):
         if repo.status != repo.UPTODATE:
             raise WorkBenchError('Invalid pull request. Requested Repository is in an invalid state.', request.ResponseCodes.BAD_REQUEST)
 
-        my_commits = self.list_repository_commits(repo)
-
-        puller_has = request.commit_keys
-
-        puller_needs = set(my_commits).difference(puller_has)
+        puller_needs = self.list_commits_needed(repo, request.commit_keys)
 
         response = yield self._process.message_client.create_instance(PULL_RESPONSE_MESSAGE_TYPE)
 
@@ -945,33 +942,106 @@ class WorkBench(object):
             repo.commit(comment=comment)
         '''
         
+        key_list = []
+        key_list.extend(self._commit_parents(repo))
+        return key_list
+
+    def _commit_parents(self, repo):
+        """
+        Walk the commit history of a repository from the head of each branch
+        The return value is a dictionary mapping the key of each commit to the list of its parent commit keys
+        """
         cref_set = set()
         for branch in repo.branches:
 
             for cref in branch.commitrefs:
                 cref_set.add(cref)
 
-        key_set = set()
+        parents = {}
 
         while len(cref_set)>0:
             new_set = set()
 
             for cref in cref_set:
 
-                if cref.MyId not in key_set:
-                    key_set.add(cref.MyId)
+                if cref.MyId not in parents:
+                    parent_keys = []
+                    parents[cref.MyId] = parent_keys
 
                     for prefs in cref.parentrefs:
-                        new_set.add(prefs.commitref)
+                        pref = prefs.commitref
+                        parent_keys.append(pref.MyId)
+                        new_set.add(pref)
 
 
             # Now recurse on the ancestors
             cref_set = new_set
 
+        return parents
+
+    def list_commit_checkpoints(self, repo):
+        """
+        Summarize the commit history of a repository for a pull request.
+        The return value is a list of binary SHA1 keys: the head commit of each branch followed by checkpoints at
+        exponentially increasing distance along its first parent chain - 1, 3, 7, 15... commits back - and the root
+        commit. The length of the list grows with the log of the history, not the history itself.
+
+        A repository always holds every ancestor of its commits, so the receiver of this list can treat all ancestors
+        of any key it recognizes as known. When the puller has commits the other side has never seen, the checkpoints
+        bound the number of commits resent to about twice the number since the histories diverged.
+        """
         key_list = []
-        key_list.extend(key_set)
+        walked = set()
+
+        for branch in repo.branches:
+
+            for cref in branch.commitrefs:
+
+                distance = 0
+                next_checkpoint = 0
+                step = 1
+                while cref.MyId not in walked:
+                    walked.add(cref.MyId)
+
+                    parentrefs = cref.parentrefs
+                    if distance == next_checkpoint or len(parentrefs) == 0:
+                        key_list.append(cref.MyId)
+                        next_checkpoint += step
+                        step *= 2
+
+                    if len(parentrefs) == 0:
+                        break
+
+                    # Only the first parent - the checkpoints of a merged branch are not worth their bytes
+                    cref = parentrefs[0].commitref
+                    distance += 1
+
         return key_list
 
+    def list_commits_needed(self, repo, known_keys):
+        """
+        Find the commits in a repository which are not known to a puller.
+        @param known_keys is an iterable of the commit keys the puller sent - either the full list of its commits or
+        the summary created by list_commit_checkpoints
+        The return value is a set of binary SHA1 keys
+        """
+        parents = self._commit_parents(repo)
+
+        known = set()
+        key_set = set(key for key in known_keys if key in parents)
+        # Everything reachable from a commit the puller has is also held by the puller
+        while len(key_set)>0:
+            new_set = set()
+
+            for key in key_set:
+                if key not in known:
+                    known.add(key)
+                    new_set.update(parents[key])
+
+            key_set = new_set
+
+        return set(parents).difference(known)
+
     def list_repository_blobs(self, repo):
         """
         This method creates a list of all the blobs that exist in a repository
@@ -6,9 +6,11 @@
 @brief Process Manager for capability container
 """
 
+import time
 import types
 
 from twisted.internet import defer
+from twisted.python import failure
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
@@ -21,6 +23,63 @@ from ion.core.data.store import Store
 from ion.util.state_object import BasicLifecycleObject
 import ion.util.procutils as pu
 
+CONF = ioninit.config(__name__)
+# Children spawned at once by spawn_processes; 1 spawns them in turn, in list order
+CF_spawn_concurrency = CONF.getValue('spawn_concurrency', 1)
+
+def process_declare(procdesc):
+    """
+    @retval the process class of procdesc, from the factory of its module,
+        and the declare dict of that class (empty if none)
+    """
+    pcls = None
+    if procdesc.proc_module:
+        factory = getattr(pu.get_module(procdesc.proc_module), 'factory', None)
+        pcls = getattr(factory, 'process_class', None)
+    declare = getattr(pcls, 'declare', None)
+    if not type(declare) is dict:
+        declare = {}
+    return pcls, declare
+
+def spawn_dependencies(procs, children):
+    """
+    @brief Works out which of children each child must wait for: those named by
+        the 'dependencies' of its process description or of the declare of its
+        process class. A child is named by its process name and by the declared
+        name and class name of its process class. Dependencies which are not
+        among children are taken to be running already.
+    @param procs  list of process description dicts
+    @param children  list of ProcessDesc instances for procs
+    @retval dict ProcessDesc -> set of ProcessDesc
+    @exception RuntimeError if the dependencies have a cycle
+    """
+    named = {}
+    declared = {}
+    for procDef, child in zip(procs, children):
+        pcls, declare = process_declare(child)
+        names = set([child.proc_name])
+        if pcls:
+            names.add(pcls.__name__)
+            names.add(declare.get('name', pcls.__name__))
+        for name in names:
+            named.setdefault(name, []).append(child)
+        declared[child] = set(declare.get('dependencies', ())) | set(procDef.get('dependencies', ()))
+
+    depends = {}
+    for child in children:
+        depends[child] = set([dep for name in declared[child] for dep in named.get(name, ()) if not dep is child])
+
+    # Check for cycles, taking away the children whose dependencies are met
+    started = set()
+    while len(started) < len(children):
+        ready = [child for child in children if not child in started and depends[child] <= started]
+        if not ready:
+            raise RuntimeError("Cyclic dependencies between processes %s" % (
+                [child.proc_name for child in children if not child in started]))
+        started.update(ready)
+
+    return depends
+
 class ProcessManager(BasicLifecycleObject):
     """
     Manager class for capability container process management.
@@ -35,6 +94,9 @@ class ProcessManager(BasicLifecycleObject):
         self.process_registry = Store()
         self.process_registry.kvs = {} # Give it its own backend...
 
+        # Dict proc name -> seconds its spawn took, for the last spawn_processes
+        self.spawn_timings = {}
+
     # Life cycle
 
     def on_initialize(self, config, *args, **kwargs):
@@ -64,11 +126,15 @@ class ProcessManager(BasicLifecycleObject):
     # API
 
     @defer.inlineCallbacks
-    def spawn_processes(self, procs, sup=None):
+    def spawn_processes(self, procs, sup=None, concurrency=None):
         """
-        Spawns a list of processes.
+        Spawns a list of processes. With a concurrency above 1, processes are
+        spawned at once as soon as the processes they depend on are spawned
+        - see spawn_dependencies.
         @param procs  list of processes (as description dict) to start up
         @param sup  spawned Process instance acting as supervisor
+        @param concurrency  the number of processes spawned at once; defaults
+            to the spawn_concurrency configuration
         @retval Deferred -> Process instance
         """
         children = []
@@ -76,6 +142,12 @@ class ProcessManager(BasicLifecycleObject):
             child = ProcessDesc(**procDef)
             children.append(child)
 
+        if concurrency is None:
+            concurrency = CF_spawn_concurrency
+        depends = None
+        if concurrency > 1:
+            depends = spawn_dependencies(procs, children)
+
         if sup == None:
             sup = yield self.create_supervisor()
 
@@ -83,13 +155,81 @@ class ProcessManager(BasicLifecycleObject):
         assert sup._get_state() in ("READY", "ACTIVE"), "Illegal parent process state"
 
         log.info("Spawning %s child processes for sup=[%s]" % (len(children), sup.proc_name))
-        for child in children:
-            child_id = yield sup.spawn_child(child)
+        self.spawn_timings = {}
+        t1 = time.time()
+        if depends is None:
+            for child in children:
+                child_id = yield self._spawn_child_timed(sup, child)
+        else:
+            yield self._spawn_concurrently(sup, children, depends, concurrency)
+
+        if children:
+            log.info("Spawned %s child processes for sup=[%s] in %.3f sec, %.3f sec of spawn time, slowest: %s",
+                     len(children), sup.proc_name, time.time() - t1, sum(self.spawn_timings.values()),
+                     ', '.join(['%s %.3f' % (name, secs) for secs, name in
+                                sorted([(secs, name) for name, secs in self.spawn_timings.items()], reverse=True)[:5]]))
 
         #log.debug("process_ids: "+ str(process.procRegistry.kvs))
 
         defer.returnValue(sup)
 
+    @defer.inlineCallbacks
+    def _spawn_child_timed(self, sup, child):
+        t1 = time.time()
+        child_id = yield sup.spawn_child(child)
+        secs = time.time() - t1
+        self.spawn_timings[child.proc_name] = secs
+        log.info("Spawned %s in %.3f sec", child.proc_name, secs)
+        defer.returnValue(child_id)
+
+    @defer.inlineCallbacks
+    def _spawn_concurrently(self, sup, children, depends, concurrency):
+        """
+        Spawns up to concurrency of children at once, each once all the
+        children it depends on are spawned, in the order of children otherwise.
+        Once a spawn fails, no more are started; the first failure is raised
+        when the running ones are done.
+        @exception RuntimeError if children are left which can not be spawned
+        """
+        waiting = list(children)
+        running = set()
+        spawned = set()
+        failures = []
+        wakeup = []
+
+        def finished(result, child):
+            running.discard(child)
+            if isinstance(result, failure.Failure):
+                failures.append(result)
+            else:
+                spawned.add(child)
+            if wakeup:
+                wakeup.pop().callback(None)
+
+        while waiting or running:
+            # A spawn which finishes at once makes more children ready
+            started = True
+            while started and not failures:
+                started = False
+                for child in [child for child in waiting if depends[child] <= spawned]:
+                    if len(running) >= concurrency:
+                        break
+                    waiting.remove(child)
+                    running.add(child)
+                    started = True
+                    self._spawn_child_timed(sup, child).addBoth(finished, child)
+            if not running:
+                break
+            d = defer.Deferred()
+            wakeup.append(d)
+            yield d
+
+        if failures:
+            failures[0].raiseException()
+        if waiting:
+            raise RuntimeError("Cannot spawn processes %s: their dependencies are not spawned" % (
+                [child.proc_name for child in waiting]))
+
     @defer.inlineCallbacks
     def spawn_process(self, procdesc, parent, node=None, activate=True):
         """
@@ -196,8 +196,8 @@ class Process(BasicLifecycleObject):
         self.op_cbs_before = {}
         self.op_cbs_after = {}
 
-        log.debug("NEW Process instance [%s]: id=%s, sup-id=%s, sys-name=%s" % (
-                self.proc_name, self.id, self.proc_supid, self.sys_name))
+        log.debug("NEW Process instance [%s]: id=%s, sup-id=%s, sys-name=%s",
+                self.proc_name, self.id, self.proc_supid, self.sys_name)
 
     def _sanitize_opname(self, opname):
         if opname.startswith('op_'): opname = opname[3:]
@@ -257,7 +257,7 @@ class Process(BasicLifecycleObject):
         @retval Deferred for the Id of the process (self.id)
         """
         assert not self.backend_receiver.consumer, "Process already initialized"
-        log.debug('Process [%s] id=%s initialize()' % (self.proc_name, self.id))
+        log.debug('Process [%s] id=%s initialize()', self.proc_name, self.id)
 
         # Create queue only for process receiver
         yield self.receiver.initialize()
@@ -277,7 +277,7 @@ class Process(BasicLifecycleObject):
         try:
             #import pdb; pdb.set_trace()
             yield defer.maybeDeferred(self.plc_init)
-            log.info('Process [%s] id=%s: INIT OK' % (self.proc_name, self.id))
+            log.info('Process [%s] id=%s: INIT OK', self.proc_name, self.id)
         except Exception, ex:
             log.exception('----- Process %s INIT ERROR -----' % (self.id))
             raise ex
@@ -316,7 +316,7 @@ class Process(BasicLifecycleObject):
         LifeCycleObject callback for activate
         @retval Deferred
         """
-        log.debug('Process [%s] id=%s activate()' % (self.proc_name, self.id))
+        log.debug('Process [%s] id=%s activate()', self.proc_name, self.id)
 
         # Create consumer for process receiver
         yield self.receiver.activate()
@@ -349,7 +349,7 @@ class Process(BasicLifecycleObject):
         """
 
     def shutdown(self):
-        log.debug("[%s] shutdown()" % self.proc_name)
+        log.debug("[%s] shutdown()", self.proc_name)
         return self.terminate()
 
     @defer.inlineCallbacks
@@ -410,7 +410,7 @@ class Process(BasicLifecycleObject):
         yield self.shutdown_child_procs()
 
         yield defer.maybeDeferred(self.plc_terminate)
-        log.info('----- Process %s TERMINATED -----' % (self.proc_name))
+        log.info('----- Process %s TERMINATED -----', self.proc_name)
 
     def plc_terminate(self):
         """
@@ -531,7 +531,7 @@ class Process(BasicLifecycleObject):
         transitions = [BasicStates.E_INITIALIZE,    BasicStates.E_ACTIVATE,     BasicStates.E_TERMINATE]
 
         curidx = states.index(curstate)
-        log.debug("_advance_lco owning process (%s) is in state %s" % (self.id.full, curstate))
+        log.debug("_advance_lco owning process (%s) is in state %s", self.id.full, curstate)
 
         @defer.inlineCallbacks
         def helper(idx, lco):
@@ -542,12 +542,12 @@ class Process(BasicLifecycleObject):
             LCOs that happen to be later in the registered list.
             """
             lcoidx = states.index(lco._get_state())
-            log.debug("_advance_lco cur lco #%d is in state %s" % (idx, lco._get_state()))
+            log.debug("_advance_lco cur lco #%d is in state %s", idx, lco._get_state())
 
             for i in range(lcoidx, curidx):
                 input = transitions[i]
 
-                log.debug("_advance_lco cur lco #%d about to put transition %s to %s" % (idx, input, str(lco)))
+                log.debug("_advance_lco cur lco #%d about to put transition %s to %s", idx, input, lco)
                 try:
                     yield defer.maybeDeferred(lco._so_process, input)
 
@@ -555,10 +555,10 @@ class Process(BasicLifecycleObject):
                     # @TODO: should not be catching this exception.
                     # This should cause the deferred gen'd by inlineCallbacks to errback, which then gets wrapped
                     # nicely by the deferred list. It should not throw an exception in the state object?!?
-                    log.debug("Exception occured in transition! Leaving this LCO as is. Ex: %s" % str(ex))
+                    log.debug("Exception occured in transition! Leaving this LCO as is. Ex: %s", ex)
                     break
 
-                log.debug("lco #%d is now at %s" % (idx, lco._get_state()))
+                log.debug("lco #%d is now at %s", idx, lco._get_state())
 
             defer.returnValue(None)
 
@@ -591,12 +591,13 @@ class Process(BasicLifecycleObject):
                 request.user_id = payload.get('user-id')
                 _action = 'set user_id'
             else:
-                log.debug('[%s] receive(): payload anonymous request' % (self.proc_name))
+                log.debug('[%s] receive(): payload anonymous request', self.proc_name)
                 if request.get('user_id', 'Not set') == 'Not set':
                     request.user_id = 'ANONYMOUS'
                     _action = 'set ANONYMOUS user_id'
                 else:
-                    _action = "keep stashed user_id='%s'" % request.get('user_id')
+                    # The stashed values are logged as the SET values below
+                    _action = 'keep stashed user_id'
             _post_uid = request.get('user_id')
 
             # User session expiry.
@@ -608,18 +609,18 @@ class Process(BasicLifecycleObject):
                     request.expiry = '0'
                     _action = _action + '/set 0 expiry'
                 else:
-                    _action = _action + "/keep stashed expiry='%s'" % request.get('expiry')
+                    _action = _action + '/keep stashed expiry'
             _post_exp = request.get('expiry')
 
-            log.debug("[%s] receive(): IN:user-id='%s',expiry='%s' ACTION:%s SET:user-id='%s',expiry='%s'" % (
-                self.proc_name, _pre_uid, _pre_exp, _action, _post_uid, _post_exp))
+            log.debug("[%s] receive(): IN:user-id='%s',expiry='%s' ACTION:%s SET:user-id='%s',expiry='%s'",
+                self.proc_name, _pre_uid, _pre_exp, _action, _post_uid, _post_exp)
 
             # Extract some headers and make log statement.
             fromname = payload['sender']
             if 'sender-name' in payload:
                 fromname = payload['sender-name']   # Legible sender alias
-            log.info('>>> [%s] receive(): Message from [%s] ... >>>' % (
-                     self.proc_name, fromname))
+            log.info('>>> [%s] receive(): Message from [%s] ... >>>',
+                     self.proc_name, fromname)
             convid = payload.get('conv-id', None)
             protocol = payload.get('protocol', None)
 
@@ -644,6 +645,11 @@ class Process(BasicLifecycleObject):
                 initiator = False
                 conv = self.conv_manager.get_or_create_conversation(convid,
                                                 message, initiator=initiator)
+                if conv is None:
+                    # The conversation has ended, e.g. a reply after an RPC timed out
+                    log.warn("[%s] Message for ended conversation conv-id=%s dropped: %s",
+                             self.proc_name, convid, payload.get('performative', None))
+                    return
                 message['conversation'] = conv
 
                 # Check some state conditions
@@ -795,8 +801,8 @@ class Process(BasicLifecycleObject):
         rpc_conv.bind_role_local(RpcType.ROLE_INITIATOR.role_id, self)
         rpc_conv.bind_role(RpcType.ROLE_PARTICIPANT.role_id, recv)
 
-        log.debug("[%s] request(): NEW conversation type=%s as initiator -> participant=%s" % (
-                self.proc_name, rpc_conv.protocol, recv))
+        log.debug("[%s] request(): NEW conversation type=%s as initiator -> participant=%s",
+                self.proc_name, rpc_conv.protocol, recv)
 
         if headers is None:
             headers = {}
@@ -820,8 +826,8 @@ class Process(BasicLifecycleObject):
         req_conv.bind_role_local(RequestType.ROLE_INITIATOR.role_id, self)
         req_conv.bind_role(RequestType.ROLE_PARTICIPANT.role_id, receiver)
 
-        log.debug("[%s] request(): NEW conversation type=%s as initiator -> participant=%s" % (
-                self.proc_name, req_conv.protocol, receiver))
+        log.debug("[%s] request(): NEW conversation type=%s as initiator -> participant=%s",
+                self.proc_name, req_conv.protocol, receiver)
 
         if headers is None:
             headers = {}
@@ -855,13 +861,14 @@ class Process(BasicLifecycleObject):
             p_headers = pu.pprint_to_string(headers)
             p_content = pu.pprint_to_string(content)
 
-            log.info('Timedout Message Receive: %s' % recv)
-            log.info('Timedout Message Headers: %s' % p_headers)
-            log.info('Timedout Message Operation: %s' % operation)
-            log.info('Timedout Message Content: %s' % p_content)
+            log.info('Timedout Message Receive: %s', recv)
+            log.info('Timedout Message Headers: %s', p_headers)
+            log.info('Timedout Message Operation: %s', operation)
+            log.info('Timedout Message Content: %s', p_content)
 
-            # Remove RPC. Delayed result will go to catch operation
+            # Remove RPC. A delayed result is dropped on the tombstone of the conversation
             conv.timeout = str(pu.currenttime_ms())
+            self.conv_manager.end_conversation(conv, 'TIMEOUT')
             conv.blocking_deferred.errback(defer.TimeoutError())
         if timeout:
             callto = reactor.callLater(timeout, _timeoutf)
@@ -907,14 +914,14 @@ class Process(BasicLifecycleObject):
 
         if not 'user-id' in msgheaders:
             msgheaders['user-id'] = request.get('user_id', 'ANONYMOUS')
-            log.debug('[%s] send(): set user id in msgheaders from stashed user_id [%s]' % (self.proc_name, msgheaders['user-id']))
+            log.debug('[%s] send(): set user id in msgheaders from stashed user_id [%s]', self.proc_name, msgheaders['user-id'])
         else:
-            log.debug('[%s] send(): using user id from msgheaders [%s]' % (self.proc_name, msgheaders['user-id']))
+            log.debug('[%s] send(): using user id from msgheaders [%s]', self.proc_name, msgheaders['user-id'])
         if not 'expiry' in msgheaders:
             msgheaders['expiry'] = request.get('expiry', '0')
-            log.debug('[%s] send(): set expiry in msgheaders from stashed expiry [%s]' % (self.proc_name, msgheaders['expiry']))
+            log.debug('[%s] send(): set expiry in msgheaders from stashed expiry [%s]', self.proc_name, msgheaders['expiry'])
         else:
-            log.debug('[%s] send(): using expiry from msgheaders [%s]' % (self.proc_name, msgheaders['expiry']))
+            log.debug('[%s] send(): using expiry from msgheaders [%s]', self.proc_name, msgheaders['expiry'])
 
         if quiet:
             msgheaders['quiet'] = True
@@ -1135,7 +1142,7 @@ class Process(BasicLifecycleObject):
     @defer.inlineCallbacks
     def shutdown_child_procs(self):
         if len(self.child_procs) > 0:
-            log.info("Shutting down %s child processes" % (len(self.child_procs)))
+            log.info("Shutting down %s child processes", len(self.child_procs))
         while len(self.child_procs) > 0:
             child = self.child_procs.pop()
             try:
@@ -1310,7 +1317,7 @@ class ProcessDesc(BasicLifecycleObject):
                 node=self.proc_node,
                 activate=activate)
 
-        log.info("Process %s ID: %s" % (self.proc_class, self.proc_id))
+        log.info("Process %s ID: %s", self.proc_class, self.proc_id)
 
         defer.returnValue(self.proc_id)
 
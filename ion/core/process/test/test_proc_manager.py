@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/process/test/test_proc_manager.py
+@test ion.core.process.proc_manager dependency order and concurrent spawning
+of child processes, against a supervisor which records its spawns
+"""
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from ion.core.process.process import ProcessDesc
+from ion.core.process.proc_manager import ProcessManager, spawn_dependencies
+
+
+class RecordingSupervisor(object):
+    """
+    Spawns a child when the test fires the deferred of its spawn
+    """
+    def __init__(self):
+        self.spawning = {}
+        self.started = []
+
+    def spawn_child(self, child):
+        self.started.append(child.proc_name)
+        d = defer.Deferred()
+        self.spawning[child.proc_name] = d
+        return d
+
+    def finish(self, name):
+        self.spawning.pop(name).callback(name)
+
+
+class ImmediateSupervisor(RecordingSupervisor):
+    """
+    Spawns a child at once
+    """
+    def spawn_child(self, child):
+        self.started.append(child.proc_name)
+        return defer.succeed(child.proc_name)
+
+
+class SpawnDependenciesTest(unittest.TestCase):
+
+    procs = [
+        {'name':'a'},
+        {'name':'b', 'dependencies':['a']},
+        {'name':'c', 'dependencies':['a']},
+        {'name':'d', 'dependencies':['b', 'c']},
+        {'name':'e', 'dependencies':['running_elsewhere']},
+    ]
+
+    def _children(self, procs):
+        return [ProcessDesc(**procDef) for procDef in procs]
+
+    def test_dependencies(self):
+        children = self._children(self.procs)
+        depends = spawn_dependencies(self.procs, children)
+        names = dict([(child.proc_name, sorted([dep.proc_name for dep in deps])) for child, deps in depends.items()])
+        self.assertEqual(names, {'a':[], 'b':['a'], 'c':['a'], 'd':['b', 'c'], 'e':[]})
+
+    def test_declared(self):
+        # Named by the declared name of the service, and its class name
+        procs = [{'name':'hello1', 'module':'ion.play.hello_service'},
+                 {'name':'user1', 'dependencies':['hello']},
+                 {'name':'user2', 'dependencies':['HelloService']}]
+        children = self._children(procs)
+        depends = spawn_dependencies(procs, children)
+        self.assertEqual(depends[children[1]], set([children[0]]))
+        self.assertEqual(depends[children[2]], set([children[0]]))
+
+    def test_cycle(self):
+        procs = [{'name':'a', 'dependencies':['b']}, {'name':'b', 'dependencies':['a']}, {'name':'c'}]
+        self.assertRaises(RuntimeError, spawn_dependencies, procs, self._children(procs))
+
+    @defer.inlineCallbacks
+    def test_concurrent(self):
+        children = self._children(self.procs)
+        depends = spawn_dependencies(self.procs, children)
+        sup = RecordingSupervisor()
+        pm = ProcessManager(None)
+
+        d = pm._spawn_concurrently(sup, children, depends, 2)
+        self.assertEqual(sup.started, ['a', 'e'])
+
+        sup.finish('a')
+        self.assertEqual(sup.started, ['a', 'e', 'b'])
+
+        sup.finish('e')
+        self.assertEqual(sup.started, ['a', 'e', 'b', 'c'])
+
+        # d waits for c as well as b
+        sup.finish('b')
+        self.assertEqual(sup.started, ['a', 'e', 'b', 'c'])
+
+        sup.finish('c')
+        self.assertEqual(sup.started, ['a', 'e', 'b', 'c', 'd'])
+
+        sup.finish('d')
+        yield d
+        self.assertEqual(sorted(pm.spawn_timings.keys()), ['a', 'b', 'c', 'd', 'e'])
+
+    @defer.inlineCallbacks
+    def test_failure(self):
+        children = self._children(self.procs)
+        depends = spawn_dependencies(self.procs, children)
+        sup = RecordingSupervisor()
+        pm = ProcessManager(None)
+
+        d = pm._spawn_concurrently(sup, children, depends, 4)
+        sup.finish('a')
+        self.assertEqual(sup.started, ['a', 'e', 'b', 'c'])
+
+        sup.spawning.pop('b').errback(RuntimeError('b failed'))
+        sup.finish('c')
+        sup.finish('e')
+        # d is not started once b has failed
+        self.assertEqual(sup.started, ['a', 'e', 'b', 'c'])
+        yield self.assertFailure(d, RuntimeError)
+
+    @defer.inlineCallbacks
+    def test_immediate(self):
+        children = self._children(self.procs)
+        depends = spawn_dependencies(self.procs, children)
+        sup = ImmediateSupervisor()
+        pm = ProcessManager(None)
+
+        # Children made ready by a spawn which finished at once are spawned too
+        yield pm._spawn_concurrently(sup, children, depends, 2)
+        self.assertEqual(sup.started, ['a', 'e', 'b', 'c', 'd'])
+
+    @defer.inlineCallbacks
+    def test_unspawnable(self):
+        children = self._children(self.procs[:2])
+        depends = {children[0]:set([children[1]]), children[1]:set([children[0]])}
+        sup = ImmediateSupervisor()
+        pm = ProcessManager(None)
+
+        yield self.assertFailure(pm._spawn_concurrently(sup, children, depends, 2), RuntimeError)
+        self.assertEqual(sup.started, [])
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+"""
+@file ion/integration/ais/common/bounds_index.py
+@brief An R-tree over the spatial and temporal extent of the cached data sets,
+so that findDataResources can find the data sets which may be in bounds
+without testing every one of them.
+
+Each data set is indexed by a box of eight floats:
+    (latMin, latMax, lonMin, lonMax, verticalMin, verticalMax, timeMin, timeMax)
+A query is a box of the same form; a data set matches if, for each dimension,
+its min is <= the query max and its max is >= the query min.  An extent that
+is missing from the metadata (or a time that does not parse) is unbounded, so
+the data set matches any query in that dimension.
+
+The tree is bulk loaded (sort-tile-recursive on latitude and longitude) and
+kept current between rebuilds: data sets added or changed since the last
+build are kept in a pending set that is scanned, and their old entries in the
+tree are skipped.  The tree is rebuilt at the next query once the pending and
+stale entries reach a fraction of the index.
+"""
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+import time, datetime, math
+
+INF = float('inf')
+
+#
+# An unbounded box - matches everything
+#
+UNBOUNDED = (-INF, INF) * 4
+
+LAT_MIN      = 'ion_geospatial_lat_min'
+LAT_MAX      = 'ion_geospatial_lat_max'
+LON_MIN      = 'ion_geospatial_lon_min'
+LON_MAX      = 'ion_geospatial_lon_max'
+VERT_MIN     = 'ion_geospatial_vertical_min'
+VERT_MAX     = 'ion_geospatial_vertical_max'
+TIME_START   = 'ion_time_coverage_start'
+TIME_END     = 'ion_time_coverage_end'
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def _overlaps(box, query):
+    return (box[0] <= query[1] and box[1] >= query[0] and
+            box[2] <= query[3] and box[3] >= query[2] and
+            box[4] <= query[5] and box[5] >= query[4] and
+            box[6] <= query[7] and box[7] >= query[6])
+
+
+def _union(boxes):
+    """
+    The bounding box of the given boxes: the least of the mins and the
+    greatest of the maxes.
+    """
+    columns = zip(*boxes)
+    return tuple([(i % 2 and max or min)(column) for i, column in enumerate(columns)])
+
+
+def _center(box, i):
+    lo, hi = box[i], box[i + 1]
+    if lo == -INF or hi == INF:
+        # Unbounded extents sort together at the end
+        return INF
+    return (lo + hi) / 2.0
+
+
+class BoundsIndex(object):
+
+    #
+    # The number of entries in a node of the tree
+    #
+    nodeSize = 16
+
+    #
+    # Rebuild the tree once the pending and stale entries are more than this
+    # fraction of the index (and more than minRebuild entries)
+    #
+    rebuildFraction = 0.1
+    minRebuild = 64
+
+    def __init__(self):
+        self.boxes = {}
+
+        self.__root = None
+        self.__treeIDs = set()
+        self.__pending = set()
+        self.__stale = set()
+
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+    def __contains__(self, dSetID):
+        return dSetID in self.boxes
+
+
+    @staticmethod
+    def getBox(dSetMetadata):
+        """
+        The box indexed for the given data set metadata.
+        """
+        box = []
+        for minKey, maxKey in ((LAT_MIN, LAT_MAX), (LON_MIN, LON_MAX), (VERT_MIN, VERT_MAX)):
+            try:
+                lo, hi = float(dSetMetadata[minKey]), float(dSetMetadata[maxKey])
+            except (KeyError, TypeError, ValueError):
+                lo, hi = -INF, INF
+            box.extend((lo, hi))
+
+        try:
+            start = time.mktime(datetime.datetime.strptime(dSetMetadata[TIME_START], TIME_FORMAT).timetuple())
+            end = time.mktime(datetime.datetime.strptime(dSetMetadata[TIME_END], TIME_FORMAT).timetuple())
+            #
+            # Coverage is tested by comparing both ends to both bounds, so
+            # index the span between them whichever way round they are
+            #
+            box.extend((min(start, end), max(start, end)))
+        except (KeyError, TypeError, ValueError):
+            box.extend((-INF, INF))
+
+        return tuple(box)
+
+
+    def putDSet(self, dSetID, dSetMetadata):
+        """
+        Index (or re-index) the data set with the given metadata.
+        """
+        box = self.getBox(dSetMetadata)
+        if self.boxes.get(dSetID) == box:
+            return
+
+        self.boxes[dSetID] = box
+        if dSetID in self.__treeIDs:
+            self.__stale.add(dSetID)
+        self.__pending.add(dSetID)
+
+
+    def deleteDSet(self, dSetID):
+        """
+        Remove the data set from the index, if it is indexed.
+        """
+        if self.boxes.pop(dSetID, None) is None:
+            return
+
+        self.__pending.discard(dSetID)
+        if dSetID in self.__treeIDs:
+            self.__stale.add(dSetID)
+
+
+    def findDSets(self, query):
+        """
+        Return the set of data set IDs whose box overlaps the query box.
+        """
+        changed = len(self.__pending) + len(self.__stale)
+        if changed > self.minRebuild and changed > self.rebuildFraction * len(self.boxes):
+            self.__build()
+
+        result = set()
+        for dSetID in self.__pending:
+            if _overlaps(self.boxes[dSetID], query):
+                result.add(dSetID)
+
+        if self.__root is not None:
+            stale = self.__stale
+            stack = [self.__root]
+            while stack:
+                box, children, isLeaf = stack.pop()
+                if not _overlaps(box, query):
+                    continue
+                if isLeaf:
+                    for childBox, dSetID in children:
+                        if _overlaps(childBox, query) and dSetID not in stale:
+                            result.add(dSetID)
+                else:
+                    stack.extend(children)
+
+        return result
+
+
+    def __build(self):
+        """
+        Bulk load the tree from the current boxes.
+        """
+        log.debug('BoundsIndex rebuilding tree of %d data sets' % len(self.boxes))
+
+        self.__treeIDs = set(self.boxes)
+        self.__pending = set()
+        self.__stale = set()
+
+        if not self.boxes:
+            self.__root = None
+            return
+
+        size = self.nodeSize
+
+        #
+        # Sort-tile-recursive: sort by latitude into vertical slices, then
+        # each slice by longitude, and pack runs of nodeSize into leaves
+        #
+        entries = [(box, dSetID) for dSetID, box in self.boxes.iteritems()]
+        entries.sort(key=lambda entry: _center(entry[0], 0))
+
+        numLeaves = int(math.ceil(len(entries) / float(size)))
+        sliceSize = size * int(math.ceil(math.sqrt(numLeaves)))
+
+        nodes = []
+        for i in xrange(0, len(entries), sliceSize):
+            tile = entries[i:i + sliceSize]
+            tile.sort(key=lambda entry: _center(entry[0], 2))
+            for j in xrange(0, len(tile), size):
+                children = tile[j:j + size]
+                nodes.append((_union([box for box, dSetID in children]), children, True))
+
+        #
+        # The leaves are in spatial order, so pack the upper levels in order
+        #
+        while len(nodes) > 1:
+            nodes = [(_union([node[0] for node in nodes[i:i + size]]), nodes[i:i + size], False)
+                     for i in xrange(0, len(nodes), size)]
+
+        self.__root = nodes[0]
@@ -13,10 +13,13 @@ resourceID.
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 import logging
-from twisted.internet import defer
+from twisted.internet import defer, task
 
+import time
 from decimal import Decimal
 
+from ion.core import ioninit
+
 from ion.core.object import object_utils
 from ion.core.messaging.message_client import MessageClient
 
@@ -28,6 +31,9 @@ from ion.services.dm.inventory.association_service import PREDICATE_OBJECT_QUERY
     SUBJECT_PREDICATE_QUERY_TYPE, IDREF_TYPE
 from ion.services.coi.datastore_bootstrap.ion_preload_config import TYPE_OF_ID, \
     DATASET_RESOURCE_TYPE_ID, DATASOURCE_RESOURCE_TYPE_ID, HAS_A_ID, OWNED_BY_ID
+from ion.integration.ais.common.bounds_index import BoundsIndex
+
+CONF = ioninit.config(__name__)
 
 PREDICATE_REFERENCE_TYPE = object_utils.create_type_identifier(object_id=25, version=1)
 
@@ -70,6 +76,41 @@ LCS = 'lcs'
 UPDATE_INTERVAL_SECONDS = 'update_interval_seconds'
 VISUALIZATION_URL = 'visualization_url'
 
+
+class WarmUpProgress(object):
+    """
+    Progress of a load of the cache: the number of resources to fetch, the
+    number fetched so far, how many of them were cached (the Private or Public
+    ones) and how many could not be fetched.
+    """
+
+    def __init__(self, name, total):
+        self.name = name
+        self.total = total
+        self.fetched = 0
+        self.cached = 0
+        self.failed = 0
+        self.startTime = time.time()
+        self.endTime = None
+
+    def elapsed(self):
+        return (self.endTime or time.time()) - self.startTime
+
+    def rate(self):
+        elapsed = self.elapsed()
+        if elapsed > 0:
+            return (self.fetched + self.failed) / elapsed
+        return 0.0
+
+    def isDone(self):
+        return self.endTime is not None
+
+    def __str__(self):
+        return '%s: %d of %d fetched (%d cached, %d failed) in %.2f sec, %.1f/sec' % \
+               (self.name, self.fetched + self.failed, self.total, self.cached, self.failed, self.elapsed(),
+                self.rate())
+
+
 class MetadataCache(object):
     
     #
@@ -83,6 +124,12 @@ class MetadataCache(object):
     
     __metadata = {}
 
+    #
+    # Index of the spatial and temporal bounds of the cached data sets; kept
+    # in step with __metadata
+    #
+    __boundsIndex = BoundsIndex()
+
     def __init__(self, ais):
         log.info('MetadataCache.__init__()')
 
@@ -97,6 +144,24 @@ class MetadataCache(object):
         self.cacheLock = {}
         self.cacheLock = defer.DeferredLock()
 
+        #
+        # The number of resources fetched at once while loading the cache,
+        # and how often (in resources) to log the progress of a load
+        #
+        self.warmUpConcurrency = CONF.getValue('warm_up_concurrency', 8)
+        self.warmUpProgressInterval = CONF.getValue('warm_up_progress_interval', 500)
+
+        #
+        # The progress of each load, by name ('datasets' or 'datasources')
+        #
+        self.warmUpProgress = {}
+
+        #
+        # Data sets being refreshed, and whether another update event came in
+        # for them while they were
+        #
+        self.__refreshing = {}
+
 
     @defer.inlineCallbacks
     def loadDataSets(self):
@@ -116,14 +181,8 @@ class MetadataCache(object):
         numDSets =  len(dSetResults.idrefs)          
         log.debug('Found ' + str(numDSets) + ' datasets.')
 
-        yield self.__lockCache()
-        
-        i = 0
-        while (i < numDSets):
-            yield self.__putDSetMetadata(dSetResults.idrefs[i].key)
-            i = i + 1
-
-        self.__unlockCache()
+        dSetIDs = [dSetResults.idrefs[i].key for i in xrange(numDSets)]
+        yield self.__warmUp('datasets', dSetIDs, self.__putDSetMetadata)
             
         defer.returnValue(True)
 
@@ -148,14 +207,8 @@ class MetadataCache(object):
         numDSources =  len(dSourceResults.idrefs)          
         log.debug('Found ' + str(numDSources) + ' datasources.')
 
-        yield self.__lockCache()
-        
-        i = 0
-        while (i < numDSources):
-            yield self.__putDSourceMetadata(dSourceResults.idrefs[i].key)
-            i = i + 1
-
-        self.__unlockCache()
+        dSourceIDs = [dSourceResults.idrefs[i].key for i in xrange(numDSources)]
+        yield self.__warmUp('datasources', dSourceIDs, self.__putDSourceMetadata)
             
         defer.returnValue(True)
 
@@ -208,21 +261,40 @@ class MetadataCache(object):
         defer.returnValue(returnValue)
 
 
+    def findDSetsInBounds(self, bounds):
+        """
+        Return the set of IDs of the cached data sets that may be within the
+        given SpatialTemporalBounds; each still needs to be tested with
+        bounds.isInBounds().  The index is updated synchronously with the
+        cache, so it does not take the cache lock.
+        """
+
+        log.debug('findDSetsInBounds')
+
+        return self.__boundsIndex.findDSets(bounds.getIndexQuery())
+
+
+    def isDSetIndexed(self, dSetID):
+        """
+        Return True if the data set is cached and therefore in the bounds
+        index.
+        """
+
+        return dSetID in self.__boundsIndex
+
+
     @defer.inlineCallbacks
     def putDSetMetadata(self, dSetID):
         """
         Get the instance of the data set represented by the given resource
         ID (dSetID) and call the private __loadDSetMetadata method with the
-        data set as an argument. 
+        data set as an argument. The cache is locked only while the metadata
+        is stored.
         """
         
         log.debug('putDSetMetadata')
 
-        yield self.__lockCache()
-
         yield self.__putDSetMetadata(dSetID)
-
-        self.__unlockCache()
                     
     
     @defer.inlineCallbacks
@@ -245,6 +317,7 @@ class MetadataCache(object):
             dSet.Repository.persistent = False
 
             self.__metadata.pop(dSetID)
+            self.__boundsIndex.deleteDSet(dSetID)
             returnValue = True
         except KeyError:
             log.error('deleteDSetMetadata: datasetID ' + dSetID + ' not cached')
@@ -309,16 +382,13 @@ class MetadataCache(object):
         """
         Get the instance of the data source represented by the given resource
         ID (dSourceID) and call the private __loadDSourceMetadata method with the
-        data source as an argument. 
+        data source as an argument. The cache is locked only while the metadata
+        is stored.
         """
         
         log.debug('putDSourceMetadata')
 
-        yield self.__lockCache()
-
-        dSource = yield self.__putDSourceMetadata(dSourceID)
-
-        self.__unlockCache()
+        yield self.__putDSourceMetadata(dSourceID)
                     
 
     @defer.inlineCallbacks
@@ -411,47 +481,228 @@ class MetadataCache(object):
         self.cacheLock.release()
 
 
+    @defer.inlineCallbacks
+    def refreshDSet(self, dSetID):
+        """
+        Refresh the metadata of the data set represented by the given resource
+        ID (dSetID) and of its associated data source, after an update event.
+        Both are fetched before the cache is locked and replaced under one
+        short hold of the lock, so the data set is not missing from the cache
+        while it is refreshed.  An event for a data set that is already being
+        refreshed makes the refresh run once more when it finishes, rather
+        than starting another one.
+        """
+
+        log.debug('refreshDSet')
+
+        if dSetID in self.__refreshing:
+            log.debug('refreshDSet: %s already being refreshed' %(dSetID))
+            self.__refreshing[dSetID] = True
+            return
+
+        self.__refreshing[dSetID] = False
+        try:
+            while True:
+                yield self.__refreshDSet(dSetID)
+                if not self.__refreshing[dSetID]:
+                    break
+                self.__refreshing[dSetID] = False
+        finally:
+            del self.__refreshing[dSetID]
+
+
+    @defer.inlineCallbacks
+    def __refreshDSet(self, dSetID):
+        #
+        # Get the associated source from the association service, which is the
+        # final authority, rather than from the cached metadata
+        #
+        dSourceID = yield self.getAssociatedSource(dSetID)
+
+        try:
+            dSetMetadata = yield self.__fetchDSetMetadata(dSetID)
+            if dSourceID is not None:
+                dSourceMetadata = yield self.__fetchDSourceMetadata(dSourceID)
+        except ResourceClientError:
+            log.error('refreshDSet: could not get data set %s or data source %s' %(dSetID, dSourceID))
+            return
+
+        yield self.__lockCache()
+        try:
+            self.__storeDSetMetadata(dSetID, dSetMetadata)
+            if dSourceID is not None:
+                self.__storeDSourceMetadata(dSourceID, dSourceMetadata)
+        finally:
+            self.__unlockCache()
+
+
+    @defer.inlineCallbacks
+    def __warmUp(self, name, resIDs, put):
+        """
+        Put the metadata for each of the given resource IDs in the cache with
+        the given put method, fetching up to warmUpConcurrency of them at once.
+        Each put locks the cache only while it stores its entry, so the cache
+        can be read while it loads.  The progress is kept in
+        self.warmUpProgress[name] and logged every warmUpProgressInterval
+        resources.
+        """
+
+        progress = WarmUpProgress(name, len(resIDs))
+        self.warmUpProgress[name] = progress
+
+        log.info('MetadataCache loading %d %s, %d at a time' %(len(resIDs), name, self.warmUpConcurrency))
+
+        def done(cached, resID):
+            if cached is None:
+                progress.failed += 1
+            else:
+                progress.fetched += 1
+                if cached:
+                    progress.cached += 1
+
+            if (progress.fetched + progress.failed) % self.warmUpProgressInterval == 0:
+                log.info('MetadataCache loading %s' %(progress))
+
+        def failed(reason, resID):
+            log.error('MetadataCache could not load %s: %s' %(resID, reason.getErrorMessage()))
+            progress.failed += 1
+
+        def work():
+            for resID in resIDs:
+                d = put(resID)
+                d.addCallback(done, resID)
+                d.addErrback(failed, resID)
+                yield d
+
+        #
+        # The workers share one iterator of puts; each waits for its put to
+        # finish before taking the next one
+        #
+        coop = task.Cooperator()
+        puts = work()
+        yield defer.DeferredList([coop.coiterate(puts) for i in xrange(max(1, self.warmUpConcurrency))])
+
+        progress.endTime = time.time()
+        log.info('MetadataCache loaded %s' %(progress))
+
+
     @defer.inlineCallbacks
     def __putDSetMetadata(self, dSetID):
         """
         Get the instance of the data set represented by the given resource
-        ID (dSetID) and call the private __loadDSetMetadata method with the
-        data set as an argument. 
+        ID (dSetID) and store the metadata from the private
+        __loadDSetMetadata method; the cache is locked only while it is
+        stored.
+        @retval True if the metadata is cached, False if the data set is not
+        Private or Public, None if the data set could not be fetched.
         """
         
         log.debug('__putDSetMetadata')
 
         try:
-            dSet = yield self.rc.get_instance(dSetID)
-            yield self.__loadDSetMetadata(dSet)
+            dSetMetadata = yield self.__fetchDSetMetadata(dSetID)
         except ResourceClientError:    
-            log.error('Data set %s (LCS: %s) being updated but was never cached!' %(dSetID, dSet.LifeCycleState))
+            log.error('Data set %s could not be fetched!' %(dSetID))
+            defer.returnValue(None)
+
+        yield self.__lockCache()
+        try:
+            self.__storeDSetMetadata(dSetID, dSetMetadata)
+        finally:
+            self.__unlockCache()
+
+        defer.returnValue(dSetMetadata is not None)
 
     
     @defer.inlineCallbacks
     def __putDSourceMetadata(self, dSourceID):
         """
         Get the instance of the data source represented by the given resource
-        ID (dSourceID) and call the private __loadDSourceMetadata method with the
-        data source as an argument. 
+        ID (dSourceID) and store the metadata from the private
+        __loadDSourceMetadata method; the cache is locked only while it is
+        stored.
+        @retval True if the metadata is cached, False if the data source is
+        not Private or Public, None if the data source could not be fetched.
         """
         
         log.debug('__putDSourceMetadata')
 
         try:
-            dSource = yield self.rc.get_instance(dSourceID)
-            self.__loadDSourceMetadata(dSource)
+            dSourceMetadata = yield self.__fetchDSourceMetadata(dSourceID)
         except ResourceClientError:    
-            log.error('Data source %s (LCS: %s) being updated but was never cached!' %(dSetID, dSource.LifeCycleState))
+            log.error('Data source %s could not be fetched!' %(dSourceID))
+            defer.returnValue(None)
+
+        yield self.__lockCache()
+        try:
+            self.__storeDSourceMetadata(dSourceID, dSourceMetadata)
+        finally:
+            self.__unlockCache()
+
+        defer.returnValue(dSourceMetadata is not None)
+
+
+    @defer.inlineCallbacks
+    def __fetchDSetMetadata(self, dSetID):
+        dSet = yield self.rc.get_instance(dSetID)
+        dSetMetadata = yield self.__loadDSetMetadata(dSet)
+        defer.returnValue(dSetMetadata)
+
+
+    @defer.inlineCallbacks
+    def __fetchDSourceMetadata(self, dSourceID):
+        dSource = yield self.rc.get_instance(dSourceID)
+        defer.returnValue(self.__loadDSourceMetadata(dSource))
+
+
+    def __storeDSetMetadata(self, dSetID, dSetMetadata):
+        """
+        Replace the dictionary entry for the data set with the given metadata,
+        or delete it if the metadata is None.  Call with the cache locked.
+        """
+        self.__storeMetadata(dSetID, dSetMetadata, DSET)
+
+        if dSetMetadata is None:
+            self.__boundsIndex.deleteDSet(dSetID)
+        else:
+            self.__boundsIndex.putDSet(dSetID, dSetMetadata)
+
+
+    def __storeDSourceMetadata(self, dSourceID, dSourceMetadata):
+        """
+        Replace the dictionary entry for the data source with the given
+        metadata, or delete it if the metadata is None.  Call with the cache
+        locked.
+        """
+        self.__storeMetadata(dSourceID, dSourceMetadata, DSOURCE)
+
+
+    def __storeMetadata(self, resID, metadata, resKey):
+        #
+        # Set the persistent flag of the replaced resource to False, unless
+        # the new metadata holds the same repository
+        #
+        old = self.__metadata.pop(resID, None)
+        if old is not None:
+            repository = old[resKey].Repository
+            if metadata is None or metadata[resKey].Repository is not repository:
+                repository.persistent = False
+
+        if metadata is not None:
+            res = metadata[resKey]
+            self.__metadata[resID] = metadata
+
+            if log.getEffectiveLevel() <= logging.DEBUG:
+                self.__printMetadata(res)
 
 
     @defer.inlineCallbacks
     def __loadDSetMetadata(self, dSet):
         """
         Create and load a dictionary entry with the metadata from the given
-        data set, and insert the entry into the __metadata dictionary (a
-        dictionary of dictionaries).  Only do this if the data set is Private
-        or Public.
+        data set, to be stored in the __metadata dictionary (a dictionary of
+        dictionaries).  Only do this if the data set is Private or Public;
+        return None otherwise.
         """
         
         #
@@ -509,23 +760,19 @@ class MetadataCache(object):
                 dSetMetadata[LCS] = self.PUBLIC
             
             log.debug('dSetMetadata keys: ' + str(dSetMetadata.keys()))
-            #
-            # Store this dSetMetadata in the dictionary, indexed by the resourceID
-            #
-            self.__metadata[dSet.ResourceIdentity] = dSetMetadata
-    
-            if log.getEffectiveLevel() <= logging.DEBUG:
-                self.__printMetadata(dSet)
+
+            defer.returnValue(dSetMetadata)
         else:
             log.info('data set ' + dSet.ResourceIdentity + ' is not Private or Public.')
+            defer.returnValue(None)
 
 
     def __loadDSourceMetadata(self, dSource):
         """
         Create and load a dictionary entry with the metadata from the given
-        data source, and insert the entry into the __metadata dictionary (a
-        dictionary of dictionaries).  Only do this if the data source is Private
-        or Public.
+        data source, to be stored in the __metadata dictionary (a dictionary of
+        dictionaries).  Only do this if the data source is Private or Public;
+        return None otherwise.
         """
         
         #
@@ -561,15 +808,11 @@ class MetadataCache(object):
             dSourceMetadata[VISUALIZATION_URL] = dSource.visualization_url
             
             log.debug('dSourceMetadata keys: ' + str(dSourceMetadata.keys()))
-            #
-            # Store this dSourceMetadata in the dictionary, indexed by the resourceID
-            #
-            self.__metadata[dSource.ResourceIdentity] = dSourceMetadata
-    
-            if log.getEffectiveLevel() <= logging.DEBUG:
-                self.__printMetadata(dSource)
+
+            return dSourceMetadata
         else:
             log.info('data source ' + dSource.ResourceIdentity + ' is not Private or Public.')
+            return None
 
 
     @defer.inlineCallbacks
@@ -28,6 +28,8 @@ POS_VERTICAL  = 'posVertical'
 MIN_TIME      = 'minTime'
 MIN_TIME      = 'maxTime'
 
+INF = float('inf')
+
 class SpatialTemporalBounds(object):
 
     #
@@ -191,6 +193,44 @@ class SpatialTemporalBounds(object):
             return False
 
 
+    def getIndexQuery(self):
+        """
+        Return the query box for the BoundsIndex of the metadata cache:
+        (latMin, latMax, lonMin, lonMax, verticalMin, verticalMax, timeMin, timeMax)
+        Every dataset that isInBounds overlaps the box; a dimension that is
+        not filtered is unbounded.  The datasets found still need to be
+        tested with isInBounds.
+        """
+        query = [-INF, INF] * 4
+
+        if self.filterByLatitude:
+            if self.bIsMaxLatitudeSet:
+                query[0] = float(self.bounds[MIN_LATITUDE])
+            if self.bIsMinLatitudeSet:
+                query[1] = float(self.bounds[MAX_LATITUDE])
+
+        if self.filterByLongitude:
+            if self.bIsMinLongitudeSet:
+                query[2] = float(self.bounds[MIN_LONGITUDE])
+            if self.bIsMaxLongitudeSet:
+                query[3] = float(self.bounds[MAX_LONGITUDE])
+
+        if self.filterByVertical:
+            query[4] = float(self.bounds[MIN_VERTICAL])
+            query[5] = float(self.bounds[MAX_VERTICAL])
+
+        #
+        # The time test only passes data that covers one of the bounds or
+        # lies between them, which overlaps the bounds as long as they are
+        # the right way round
+        #
+        if self.filterByTime and self.bounds['minTime'] <= self.bounds['maxTime']:
+            query[6] = self.bounds['minTime']
+            query[7] = self.bounds['maxTime']
+
+        return tuple(query)
+
+
     def __isInLatitudeBounds(self, minMetaData, bounds):
         """
         Determine if dataset resource is in latitude bounds.
@@ -60,47 +60,18 @@ class DataResourceUpdateEventSubscriber(DatasetSupplementAddedEventSubscriber):
         dSetResID = data['content'].additional_data.dataset_id
 
         #
-        # Get the associated source for the dataset (whether the dataset is
-        # cached or not).  If the dataset is cached, delete it and the
-        # associated source. In any case, add the dataset and the datasource
-        # to the cache.
+        # Refresh the dataset and its associated source in the cache (whether
+        # the dataset is cached or not).  The cache fetches both before it
+        # replaces the cached entries, so the dataset is not missing from the
+        # cache in the meantime.
         #
-        
-        #dSourceResID = data['content'].additional_data.datasource_id
-        #
-        # The above line is commented out for the following reason:
-        # Do not use the dataSourceID that is passed in with the event; rather
-        # get the dataSourceID from the association client.  The reason is that
-        # the the association is the final authority, rendering the passed in
-        # parameter as superfluous. 
-        #
-        dSourceResID = yield self.metadataCache.getAssociatedSource(dSetResID)
-
-        #
-        # Now check the cache to see if there's currently metadata for this
-        # datasetID
-        #
-        dSetMetadata = yield self.metadataCache.getDSetMetadata(dSetResID)
-
-        #
-        # If dataset does not exist, this must be a new dataset; skip the
-        # delete step.
-        #
-        if dSetMetadata is not None:
-            #
-            # Delete the dataset and datasource metadata
-            #
-            log.debug('DataResourceUpdateEventSubscriber deleting %s, %s from metadataCache' \
-                      %(dSetResID, dSourceResID))
-            yield self.metadataCache.deleteDSetMetadata(dSetResID)
-            yield self.metadataCache.deleteDSourceMetadata(dSourceResID)
-
+        # The dataSourceID that is passed in with the event is not used:
+        # the cache gets the dataSourceID from the association client.  The
+        # reason is that the association is the final authority,
+        # rendering the passed in parameter as superfluous.
         #
-        # Now  reload the dataset and datasource metadata
-        #
-        log.debug('DataResourceUpdateEventSubscriber putting new metadata in cache')
-        yield self.metadataCache.putDSetMetadata(dSetResID)
-        yield self.metadataCache.putDSourceMetadata(dSourceResID)
+        log.debug('DataResourceUpdateEventSubscriber refreshing %s in metadataCache' %(dSetResID))
+        yield self.metadataCache.refreshDSet(dSetResID)
 
     
 class FindDataResources(object):
@@ -127,6 +98,7 @@ class FindDataResources(object):
         self.nac = NotificationAlertServiceClient(proc=ais)
 
         self.__subscriptionList = None
+        self.__subscribedIDs = set()
         self.metadataCache = ais.getMetadataCache()
         self.bUseMetadataCache = True
 
@@ -337,11 +309,25 @@ class FindDataResources(object):
         #     - continue
         #   - if so:
         #     - add the metadata to the response GPB
-        #        
+        #
+        # With the metadata cache, only the datasets found in its bounds index
+        # can be in bounds; skip the cached datasets the index rules out.  A
+        # dataset that is not cached goes through the loop as before.
+        #
+        if self.bUseMetadataCache:
+            dSetsInBounds = self.metadataCache.findDSetsInBounds(bounds)
+            log.debug('bounds index found %d datasets' % len(dSetsInBounds))
+        
         i = 0
         j = 0
         while i < len(dSetList):
             dSetResID = dSetList[i].key
+
+            if self.bUseMetadataCache and dSetResID not in dSetsInBounds and \
+                   self.metadataCache.isDSetIndexed(dSetResID):
+                i = i + 1
+                continue
+
             log.debug('Working on dataset: ' + dSetResID)
 
             if self.bUseMetadataCache:            
@@ -819,21 +805,24 @@ class FindDataResources(object):
         reply = yield self.nac.getSubscriptionList(reqMsg)
         self.__subscriptionList = reply.message_parameters_reference[0].subscriptionListResults
 
+        #
+        # Keep the IDs of the subscribed datasets in a set for __isNotificationSet
+        #
+        self.__subscribedIDs = set()
+        for subscription in self.__subscriptionList:
+            self.__subscribedIDs.add(subscription.subscriptionInfo.data_src_id)
+
 
     def __isNotificationSet(self, dSetID):
         """
-        Iterate through the user's list of subscriptions and test for the given
-        dataset ID; it it's there, a subscription exists for the dataset.  The
-        user's list of subscriptions in loaded before this is called.
+        Test for the given dataset ID in the set of IDs from the user's list of
+        subscriptions; if it's there, a subscription exists for the dataset.
+        The user's list of subscriptions is loaded before this is called.
         """
         
         log.debug('__isNotificationSet()')
         
-        for subscription in self.__subscriptionList:
-            if dSetID == subscription.subscriptionInfo.data_src_id:
-                return True
-            
-        return False
+        return dSetID in self.__subscribedIDs
         
  
     @defer.inlineCallbacks
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+@file ion/integration/ais/test/test_bounds_index.py
+@test ion.integration.ais.common.bounds_index against a test of every dataset
+with SpatialTemporalBounds.isInBounds
+"""
+
+import random
+from decimal import Decimal
+
+from twisted.trial import unittest
+
+from ion.integration.ais.common.bounds_index import BoundsIndex, UNBOUNDED
+from ion.integration.ais.common.spatial_temporal_bounds import SpatialTemporalBounds
+
+
+class BoundsMsg(object):
+    """
+    Stands in for the bounds fields of a findDataResources request
+    """
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def IsFieldSet(self, name):
+        return name in self.__dict__
+
+
+def make_metadata(rand):
+    lat = rand.uniform(-90, 80)
+    lon = rand.uniform(-180, 170)
+    vert = rand.uniform(0, 900)
+    year = rand.randint(2000, 2010)
+    return {'ion_geospatial_lat_min':Decimal(str(lat)),
+            'ion_geospatial_lat_max':Decimal(str(lat + rand.uniform(0, 10))),
+            'ion_geospatial_lon_min':Decimal(str(lon)),
+            'ion_geospatial_lon_max':Decimal(str(lon + rand.uniform(0, 10))),
+            'ion_geospatial_vertical_min':Decimal(str(vert)),
+            'ion_geospatial_vertical_max':Decimal(str(vert + rand.uniform(0, 100))),
+            'ion_time_coverage_start':'%d-01-01T00:00:00Z' % year,
+            'ion_time_coverage_end':'%d-06-30T00:00:00Z' % rand.randint(year, 2011)}
+
+
+class BoundsIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rand = random.Random(7)
+        self.metadata = {}
+        self.index = BoundsIndex()
+        for i in xrange(2000):
+            dSetID = 'dset%d' % i
+            self.metadata[dSetID] = make_metadata(self.rand)
+            self.index.putDSet(dSetID, self.metadata[dSetID])
+
+    def _check(self, **fields):
+        """
+        The datasets in the index which are in bounds are the datasets which are in bounds
+        """
+        bounds = SpatialTemporalBounds()
+        bounds.loadBounds(BoundsMsg(**fields))
+
+        found = self.index.findDSets(bounds.getIndexQuery())
+        inBounds = set([dSetID for dSetID in found if bounds.isInBounds(self.metadata[dSetID])])
+        expected = set([dSetID for dSetID, md in self.metadata.items() if bounds.isInBounds(md)])
+
+        self.assertEqual(inBounds, expected)
+        return found, expected
+
+    def test_find(self):
+        found, expected = self._check(minLatitude=10.0, maxLatitude=20.0, minLongitude=-50.0, maxLongitude=-30.0)
+        self.assertTrue(0 < len(expected) <= len(found) < len(self.metadata) / 10)
+
+        self._check(minLatitude=45.0)
+        self._check(maxLongitude=-120.0)
+        self._check(minVertical=100.0, maxVertical=200.0, posVertical='down')
+        found, expected = self._check(minTime='2003-03-01T00:00:00Z', maxTime='2003-04-01T00:00:00Z')
+        self.assertTrue(len(found) < len(self.metadata))
+
+        self._check(minLatitude=-10.0, maxLatitude=10.0, minVertical=0.0, maxVertical=50.0, posVertical='up',
+                    minTime='2005-01-01T00:00:00Z', maxTime='2006-01-01T00:00:00Z')
+
+        # Nothing to filter by
+        found, expected = self._check()
+        self.assertEqual(len(found), len(self.metadata))
+
+    def test_updates(self):
+        self.index.minRebuild = 10
+
+        # Build the tree, then change it
+        self._check(minLatitude=0.0, maxLatitude=5.0)
+
+        for i in xrange(0, 300, 3):
+            dSetID = 'dset%d' % i
+            del self.metadata[dSetID]
+            self.index.deleteDSet(dSetID)
+
+        for i in xrange(1, 300, 3):
+            dSetID = 'dset%d' % i
+            self.metadata[dSetID] = make_metadata(self.rand)
+            self.index.putDSet(dSetID, self.metadata[dSetID])
+
+        self.assertEqual(len(self.index), len(self.metadata))
+        self.assertFalse('dset0' in self.index)
+
+        self._check(minLatitude=0.0, maxLatitude=5.0)
+        self._check(minLongitude=100.0, maxLongitude=120.0, minTime='2001-01-01T00:00:00Z',
+                    maxTime='2002-01-01T00:00:00Z')
+
+    def test_missing_bounds(self):
+        # A dataset without bounds can not be ruled out
+        self.index.putDSet('nobounds', {'title':'no bounds'})
+        self.assertEqual(self.index.boxes['nobounds'], UNBOUNDED)
+
+        bounds = SpatialTemporalBounds()
+        bounds.loadBounds(BoundsMsg(minLatitude=10.0, maxLatitude=20.0))
+        self.assertTrue('nobounds' in self.index.findDSets(bounds.getIndexQuery()))
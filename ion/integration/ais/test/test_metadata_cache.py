@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+"""
+@file ion/integration/ais/test/test_metadata_cache.py
+@test ion.integration.ais.common.metadata_cache loading and refreshing, against
+an in process stand in for the resource registry and association service
+"""
+
+from twisted.internet import defer, reactor
+from twisted.trial import unittest
+
+from ion.integration.ais.common.metadata_cache import MetadataCache, DSET
+from ion.services.coi.resource_registry.resource_client import ResourceClientError
+from ion.services.coi.datastore_bootstrap.ion_preload_config import DATASET_RESOURCE_TYPE_ID
+
+ACTIVE = 'Active'
+COMMISSIONED = 'Commissioned'
+RETIRED = 'Retired'
+
+
+class Obj(object):
+    """
+    A bag of attributes
+    """
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Attribute(object):
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def GetValue(self):
+        return self.value
+
+
+class Pairs(list):
+    def add(self):
+        pair = Obj()
+        self.append(pair)
+        return pair
+
+
+class Request(object):
+    """
+    Stands in for a predicate object or subject predicate query message
+    """
+    def __init__(self):
+        self.pairs = Pairs()
+
+    def CreateObject(self, type):
+        return Obj()
+
+
+class StandInProcess(object):
+    """
+    Just enough of a process to create the clients of the cache, which are then replaced
+    """
+    def __init__(self):
+        self.workbench = Obj(op_fetch_blobs=None)
+
+    def get_scoped_name(self, scope, name):
+        return name
+
+
+class StandInRegistry(object):
+    """
+    The resource client, association client, association service client and message client of the cache, with a data
+    set and a data source for each given state. Each call answers from the next turn of the reactor. Every get_instance
+    returns a new instance, as the resource client does; the instances of each resource are kept in order.
+    """
+
+    def __init__(self, states):
+        self.states = {}
+        self.instances = {}
+        self.missing = set()
+        self.broken = set()
+        self.dSetIDs = []
+        self.dSourceIDs = []
+
+        for i, state in enumerate(states):
+            dSetID, dSourceID = 'test_dataset%d' % i, 'test_datasource%d' % i
+            self.dSetIDs.append(dSetID)
+            self.dSourceIDs.append(dSourceID)
+            self.states[dSetID] = self.states[dSourceID] = state
+            self.instances[dSetID] = []
+            self.instances[dSourceID] = []
+
+    def _later(self, value):
+        d = defer.Deferred()
+        reactor.callLater(0, d.callback, value)
+        return d
+
+    def _instance(self, resID):
+        i = int(resID[-1])
+        state = self.states[resID]
+        if resID in self.dSetIDs:
+            attributes = [Attribute('title', 'Dataset %d' % i),
+                          Attribute('ion_geospatial_lat_min', -10.0 * i),
+                          Attribute('ion_geospatial_lat_max', -10.0 * i + 5),
+                          Attribute('ion_geospatial_lon_min', 10.0 * i),
+                          Attribute('ion_geospatial_lon_max', 10.0 * i + 5)]
+            return Obj(ResourceIdentity=resID, ResourceLifeCycleState=state, ACTIVE=ACTIVE,
+                       COMMISSIONED=COMMISSIONED, Repository=Obj(persistent=False),
+                       root_group=Obj(attributes=attributes), source=self.dSourceIDs[i])
+        return Obj(ResourceIdentity=resID, ResourceLifeCycleState=state, ACTIVE=ACTIVE,
+                   COMMISSIONED=COMMISSIONED, Repository=Obj(persistent=False), property=['sea_water_temperature'],
+                   station_id=['station%d' % i], registration_datetime_millis=i, request_type=0,
+                   base_url='http://example.org/%d' % i, max_ingest_millis=10000, ion_title='Source %d' % i,
+                   update_interval_seconds=3600, visualization_url='')
+
+    def fetches(self, resID):
+        return len(self.instances[resID])
+
+    # The message client
+    def create_instance(self, type):
+        return defer.succeed(Request())
+
+    # The resource client
+    def get_instance(self, resID):
+        if resID in self.missing:
+            return defer.fail(ResourceClientError('Resource Not Found!'))
+        instance = self._instance(resID)
+        self.instances[resID].append(instance)
+        return self._later(instance)
+
+    # The association client
+    def find_associations(self, obj=None, predicate_or_predicates=None):
+        association = Obj(SubjectReference=Obj(key=obj.source), ObjectReference=Obj(key=obj.ResourceIdentity))
+        return self._later([association])
+
+    # The association service client
+    def get_subjects(self, request):
+        if request.pairs[0].object.key == DATASET_RESOURCE_TYPE_ID:
+            keys = self.dSetIDs
+        else:
+            keys = self.dSourceIDs
+        return self._later(Obj(idrefs=[Obj(key=key) for key in keys]))
+
+    def get_objects(self, request):
+        if request.pairs[0].subject.key in self.broken:
+            return defer.fail(RuntimeError('Association service gone'))
+        return self._later(Obj(idrefs=[Obj(key='owner')]))
+
+
+class BrokenBoundsIndex(object):
+    def putDSet(self, dSetID, dSetMetadata):
+        raise ValueError('Bad bounds')
+
+
+class MetadataCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = StandInRegistry([ACTIVE, COMMISSIONED, ACTIVE, RETIRED, ACTIVE])
+        self.cache = MetadataCache(StandInProcess())
+        self.cache.rc = self.cache.ac = self.cache.asc = self.cache.mc = self.registry
+        self.cache.warmUpConcurrency = 2
+
+    def tearDown(self):
+        # The cache and its bounds index are shared by all instances
+        for resID in self.registry.states:
+            MetadataCache._MetadataCache__metadata.pop(resID, None)
+            MetadataCache._MetadataCache__boundsIndex.deleteDSet(resID)
+
+    def _persistent(self, resID):
+        return [res for res in self.registry.instances[resID] if res.Repository.persistent]
+
+    @defer.inlineCallbacks
+    def test_warm_up(self):
+        self.registry.missing.update(self.registry.dSetIDs[:1])
+        self.registry.broken.update(self.registry.dSetIDs[1:2])
+
+        loaded = yield self.cache.loadDataSets()
+        self.failUnless(loaded)
+        progress = self.cache.warmUpProgress['datasets']
+        self.failUnless(progress.isDone())
+        self.assertEqual(progress.total, 5)
+        self.assertEqual((progress.fetched, progress.cached, progress.failed), (3, 2, 2))
+
+        # The retired data set is fetched but not cached
+        for dSetID, cached in zip(self.registry.dSetIDs, [False, False, True, False, True]):
+            metadata = yield self.cache.getDSetMetadata(dSetID)
+            self.assertEqual(metadata is not None, cached)
+            self.assertEqual(self.cache.isDSetIndexed(dSetID), cached)
+
+        yield self.cache.loadDataSources()
+        progress = self.cache.warmUpProgress['datasources']
+        self.assertEqual((progress.fetched, progress.cached, progress.failed), (5, 4, 0))
+
+    @defer.inlineCallbacks
+    def test_refresh_coalesced(self):
+        dSetID, dSourceID = self.registry.dSetIDs[0], self.registry.dSourceIDs[0]
+
+        # Events for a data set being refreshed make one more refresh, after it
+        first = self.cache.refreshDSet(dSetID)
+        for i in xrange(5):
+            self.cache.refreshDSet(dSetID)
+        yield first
+        self.assertEqual(self.registry.fetches(dSourceID), 2)
+
+        metadata = yield self.cache.getDSetMetadata(dSetID)
+        self.assertEqual(self._persistent(dSetID), [metadata[DSET]])
+
+        # Once done, an event refreshes it again
+        yield self.cache.refreshDSet(dSetID)
+        self.assertEqual(self.registry.fetches(dSourceID), 3)
+
+    @defer.inlineCallbacks
+    def test_put_and_refresh(self):
+        dSetID = self.registry.dSetIDs[2]
+        dSourceID = self.registry.dSourceIDs[2]
+
+        put = self.cache.putDSetMetadata(dSetID)
+        refresh = self.cache.refreshDSet(dSetID)
+        self.registry.states[dSetID] = COMMISSIONED
+        yield defer.DeferredList([put, refresh])
+        self.failIf(self.cache.cacheLock.locked)
+
+        # Whichever stored last, only the data set in the cache is persistent
+        metadata = yield self.cache.getDSetMetadata(dSetID)
+        self.assertEqual(self._persistent(dSetID), [metadata[DSET]])
+        self.failUnless(self.cache.isDSetIndexed(dSetID))
+        dSourceMetadata = yield self.cache.getDSourceMetadata(dSourceID)
+        self.failIf(dSourceMetadata is None)
+
+        # The data set retires while it is refreshed
+        refresh = self.cache.refreshDSet(dSetID)
+        self.registry.states[dSetID] = RETIRED
+        yield refresh
+        metadata = yield self.cache.getDSetMetadata(dSetID)
+        self.assertEqual(metadata, None)
+        self.failIf(self.cache.isDSetIndexed(dSetID))
+        self.assertEqual(self._persistent(dSetID), [])
+
+    @defer.inlineCallbacks
+    def test_store_error_unlocks(self):
+        dSetID = self.registry.dSetIDs[0]
+        self.cache._MetadataCache__boundsIndex = BrokenBoundsIndex()
+
+        yield self.assertFailure(self.cache.putDSetMetadata(dSetID), ValueError)
+        self.failIf(self.cache.cacheLock.locked)
+        yield self.assertFailure(self.cache.refreshDSet(dSetID), ValueError)
+        self.failIf(self.cache.cacheLock.locked)
+
+        # The cache can still be read, and refreshed once the index works again
+        yield self.cache.getDSetMetadata(dSetID)
+        del self.cache._MetadataCache__boundsIndex
+        yield self.cache.refreshDSet(dSetID)
+        self.failUnless(self.cache.isDSetIndexed(dSetID))
@@ -7,6 +7,9 @@
     interaction patterns)
 """
 
+import time
+from collections import deque
+
 from twisted.python import failure
 from twisted.python.reflect import namedAny
 from zope.interface import implements, Interface
@@ -21,6 +24,15 @@ import ion.util.procutils as pu
 
 CONF = ioninit.config(__name__)
 CF_basic_conv_types = CONF['basic_conv_types']
+# Messages kept in the log of each conversation
+CF_conv_log_size = CONF.getValue('conv_log_size', 100)
+# Seconds without a message after which a conversation is dropped
+CF_idle_timeout = CONF.getValue('idle_timeout', 120.0)
+# Seconds and number for which ended conversations are remembered
+CF_tombstone_ttl = CONF.getValue('tombstone_ttl', 60.0)
+CF_max_tombstones = CONF.getValue('max_tombstones', 10000)
+# Seconds between collections of idle conversations and old tombstones
+CF_gc_interval = CONF.getValue('gc_interval', 30.0)
 
 # Conversation type id for no conversation use.
 CONV_TYPE_NONE = "none"
@@ -89,7 +101,11 @@ class Conversation(object):
         self.blocking_deferred = None
         # Marks a timeout in the conversation processing
         self.timeout = None
-        self.conv_log = []
+        # The last CF_conv_log_size messages of the conversation
+        self.conv_log = deque()
+        self.message_count = 0
+        # Time of the last message, for idle timeouts
+        self.last_active = None
 
     def bind_role_local(self, role_id, process):
         self.bind_role(role_id, process.id)
@@ -112,7 +128,7 @@ class Conversation(object):
 
     def get_conv_log_str(self):
         res = "CONV_LOG[type=%s, id=%s, state=%s, @process=%s, #messages=%s:\n" % (
-            self.protocol, self.conv_id, self.local_fsm._get_state(), self.local_process.proc_name, len(self.conv_log))
+            self.protocol, self.conv_id, self.local_fsm._get_state(), self.local_process.proc_name, self.message_count)
         for msg_rec in self.conv_log:
             (ts, mtype, cstate, mhdrs) = msg_rec
             hstr = "%s -> %s %s:%s:%s; uid=%s, status=%s" % (mhdrs.get('sender',None),
@@ -159,7 +175,7 @@ class ConversationRole(StateObject):
         self._so_set_fsm(fsm)
 
     def _so_process(self, event, *args, **kwargs):
-        log.debug("Processing Conversation event='%s' in state='%s'" % (event,self._get_state()))
+        log.debug("Processing Conversation event='%s' in state='%s'", event,self._get_state())
         d = StateObject._so_process(self, event, *args, **kwargs)
         return d
 
@@ -223,8 +239,8 @@ class ConversationManager(object):
             ct_inst = self.load_conversation_type(ctid, ctcls)
             self.conv_types[ctid] = ct_inst
 
-        log.debug("Loaded and instantiated %s conversation types: %s" % (
-                    len(self.conv_types),self.conv_types.keys()))
+        log.debug("Loaded and instantiated %s conversation types: %s",
+                    len(self.conv_types),self.conv_types.keys())
 
     def load_conversation_type(self, ct_id, ct_cls_name):
         ct_class = namedAny(ct_cls_name)
@@ -268,14 +284,39 @@ conv_mgr_instance = ConversationManager()
 
 class ProcessConversationManager(object):
     """
-    @brief Oversees a set of conversations, e.g. within a process instance
+    @brief Oversees a set of conversations, e.g. within a process instance.
+        Ended conversations leave a tombstone, so that late messages for them
+        (e.g. the reply to a timed out RPC) are dropped rather than start a new
+        conversation. Conversations idle for longer than idle_timeout and
+        tombstones older than tombstone_ttl are collected every gc_interval
+        seconds, as new conversations are created.
     """
 
-    def __init__(self, process):
+    def __init__(self, process, idle_timeout=CF_idle_timeout, tombstone_ttl=CF_tombstone_ttl,
+                 max_tombstones=CF_max_tombstones, gc_interval=CF_gc_interval, clock=time.time):
         self.process = process
         self.conversations = {}
         self.conv_mgr = conv_mgr_instance
 
+        self.idle_timeout = idle_timeout
+        self.tombstone_ttl = tombstone_ttl
+        self.max_tombstones = max_tombstones
+        self.gc_interval = gc_interval
+        self.clock = clock
+
+        # Dict conv_id -> (time ended, final state)
+        self.tombstones = {}
+        # Deque of (conv_id, tombstone) in the order they were left, oldest
+        # first; an entry is stale if its tombstone has been replaced since
+        self.tombstone_order = deque()
+        self.last_gc = clock()
+
+        # Counters of conversations over the life of the process
+        self.created = 0
+        self.ended = 0
+        self.reaped = 0
+        self.late_messages = 0
+
     def msg_send(self, message):
         """
         @brief Trigger the FSM for a to-be-sent message and delegate all checking
@@ -285,10 +326,10 @@ class ProcessConversationManager(object):
         conv = self.get_conversation(message['headers']['conv-id'])
         perf = message['performative']
         if conv and conv.local_fsm:
-            log.debug("msg_send(): Processing performative '%s'" % perf)
+            log.debug("msg_send(): Processing performative '%s'", perf)
             return conv.local_fsm._so_process(perf, message)
         else:
-            log.debug("msg_send(): NO FSM. Ignoring performative '%s'" % perf)
+            log.debug("msg_send(): NO FSM. Ignoring performative '%s'", perf)
 
     def msg_received(self, message):
         """
@@ -306,9 +347,15 @@ class ProcessConversationManager(object):
         return self.conv_mgr.create_conversation_id(prefix=self.process.id.full)
 
     def new_conversation(self, conv_type_id, conv_id=None):
+        now = self.clock()
+        if now - self.last_gc >= self.gc_interval:
+            self.collect(now)
+
         conv_id = conv_id or self.create_conversation_id()
         conv_inst = self.conv_mgr.new_conversation(conv_type_id, conv_id)
+        conv_inst.last_active = now
         self.conversations[conv_inst.conv_id] = conv_inst
+        self.created += 1
         return conv_inst
 
     def get_conversation(self, conv_id):
@@ -321,15 +368,20 @@ class ProcessConversationManager(object):
         @param conv_id the conversation id extracted from a message
         @param message the standard message callback object
         @param initiator True of this message is being sent, False if received
+        @retval the Conversation, or None if the conversation has ended
         """
         conv = self.conversations.get(conv_id, None)
 
+        if not conv and conv_id in self.tombstones:
+            self.late_messages += 1
+            return None
+
         # If not existing, create new Conversation instance based on protocol header
         if not conv:
             conv_type = message['headers'].get('protocol', 'generic')
 
-            log.debug("[%s] NEW local conversation from conv-id=%s: type=%s" % (
-                    self.process.proc_name, conv_id, conv_type))
+            log.debug("[%s] NEW local conversation from conv-id=%s: type=%s",
+                    self.process.proc_name, conv_id, conv_type)
             conv = self.new_conversation(conv_type, conv_id)
 
             # Bind roles
@@ -337,11 +389,11 @@ class ProcessConversationManager(object):
             if initiator:
                 conv.bind_role_local(conv.conv_type.DEFAULT_ROLE_INITIATOR, self.process)
                 conv.bind_role(conv.conv_type.DEFAULT_ROLE_PARTICIPANT, sender)
-                log.debug("Binding roles initiator(local)=%s, participant=%s" % (self.process.id, sender))
+                log.debug("Binding roles initiator(local)=%s, participant=%s", self.process.id, sender)
             else:
                 conv.bind_role(conv.conv_type.DEFAULT_ROLE_INITIATOR, sender)
                 conv.bind_role_local(conv.conv_type.DEFAULT_ROLE_PARTICIPANT, self.process)
-                log.debug("Binding roles initiator=%s, participant(local)=%s" % (sender, self.process.id))
+                log.debug("Binding roles initiator=%s, participant(local)=%s", sender, self.process.id)
 
         return conv
 
@@ -358,6 +410,10 @@ class ProcessConversationManager(object):
             mhdrs = {}
         msg_rec = (pu.currenttime_ms(), msgtype, conv.local_fsm._get_state(), mhdrs)
         conv.conv_log.append(msg_rec)
+        if len(conv.conv_log) > CF_conv_log_size:
+            conv.conv_log.popleft()
+        conv.message_count += 1
+        conv.last_active = self.clock()
 
     def check_conversation_state(self, conv):
         """
@@ -369,12 +425,75 @@ class ProcessConversationManager(object):
         conv_id = conv.conv_id
         #log.debug("check_conversation_state(), conv=%s, conv_id=%s, state=%s" % (conv, conv_id, conv.local_fsm._get_state()))
         # Check for final state
-        if conv.local_fsm._get_state() in conv.conv_type.FINAL_STATES:
-            del self.conversations[conv_id]
-            log.info("Conversation FINAL: id=%s. Active conversations: %s" % (
-                conv_id, len(self.conversations)))
-            log.info("Conversation FINAL log:\n%s" % (conv.get_conv_log_str()))
+        state = conv.local_fsm._get_state()
+        if state in conv.conv_type.FINAL_STATES and conv_id in self.conversations:
+            self.end_conversation(conv, state)
+            log.info("Conversation FINAL: id=%s. Active conversations: %s",
+                conv_id, len(self.conversations))
+            log.info("Conversation FINAL log:\n%s", ion.util.ionlog.lazy(conv.get_conv_log_str))
+
+    def end_conversation(self, conv, state):
+        """
+        @brief Removes a conversation and leaves a tombstone for later messages
+            and timeouts with its conv_id.
+        """
+        conv_id = conv.conv_id
+        if self.conversations.pop(conv_id, None) is None:
+            return
+        self.ended += 1
+
+        tombstone = (self.clock(), state)
+        self.tombstones[conv_id] = tombstone
+        self.tombstone_order.append((conv_id, tombstone))
+        while len(self.tombstones) > self.max_tombstones:
+            self._drop_oldest_tombstone()
 
-        # Create a tombstone for later messages and timeouts with this conv_id
+    def _drop_oldest_tombstone(self):
+        conv_id, tombstone = self.tombstone_order.popleft()
+        if self.tombstones.get(conv_id, None) is tombstone:
+            del self.tombstones[conv_id]
 
-        # GC tombstones and conversations
+    def collect(self, now=None):
+        """
+        @brief Drops tombstones older than tombstone_ttl and conversations
+            without a message for idle_timeout. Conversations blocked on a
+            reply which has not timed out are kept.
+        @retval number of conversations dropped
+        """
+        now = now or self.clock()
+        self.last_gc = now
+
+        while self.tombstone_order and now - self.tombstone_order[0][1][0] >= self.tombstone_ttl:
+            self._drop_oldest_tombstone()
+
+        if not self.idle_timeout:
+            return 0
+
+        idle = []
+        for conv_id, conv in self.conversations.iteritems():
+            if now - conv.last_active < self.idle_timeout:
+                continue
+            d = conv.blocking_deferred
+            if d is not None and not d.called and conv.timeout is None:
+                continue
+            idle.append(conv_id)
+
+        for conv_id in idle:
+            del self.conversations[conv_id]
+        self.reaped += len(idle)
+        if idle:
+            log.info("[%s] Dropped %s idle conversations. Active conversations: %s",
+                self.process.proc_name, len(idle), len(self.conversations))
+        return len(idle)
+
+    def stats(self):
+        """
+        @retval dict with the number of live conversations by protocol,
+            tombstones and the counters of the manager
+        """
+        live = {}
+        for conv in self.conversations.itervalues():
+            live[conv.protocol] = live.get(conv.protocol, 0) + 1
+        return {'live':len(self.conversations), 'live_by_protocol':live, 'tombstones':len(self.tombstones),
+                'created':self.created, 'ended':self.ended, 'reaped':self.reaped,
+                'late_messages':self.late_messages}
@@ -118,7 +118,7 @@ class RequestInitiator(ConversationRole):
         process = message['process']
         msg = message['msg']
 
-        log.info('>>> [%s] Received Request inform_result <<<' % (process.proc_name))
+        log.info('>>> [%s] Received Request inform_result <<<', process.proc_name)
 
         rpc_deferred = conv.blocking_deferred
         if conv.timeout:
@@ -167,7 +167,7 @@ class RequestInitiator(ConversationRole):
                 log.error("ERROR. Do not support non-blocking RPC yet")
 
 
-        log.debug('[%s] RPC inform_result done.' % (process.proc_name))
+        log.debug('[%s] RPC inform_result done.', process.proc_name)
 
 class RequestParticipant(ConversationRole):
     """
@@ -186,11 +186,11 @@ class RequestParticipant(ConversationRole):
         process = message['process']
         msg = message['msg']
 
-        log.info('>>> [%s] Received Request request for op=%s<<<' % (process.proc_name, headers['op']))
+        log.info('>>> [%s] Received Request request for op=%s<<<', process.proc_name, headers['op'])
 
         # Send an agree if a request message
         yield process.reply_agree(msg)
-        log.debug("[%s] send of agree message done" % (process.proc_name))
+        log.debug("[%s] send of agree message done", process.proc_name)
 
         # Note: We are NOW in a different conversation state: AGREED/REFUSED
 
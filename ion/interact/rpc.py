@@ -110,7 +110,7 @@ class RpcInitiator(ConversationRole):
         process = message['process']
         msg = message['msg']
 
-        log.info('>>> [%s] Received RPC inform_result <<<' % (process.proc_name))
+        log.info('>>> [%s] Received RPC inform_result <<<', process.proc_name)
 
         rpc_deferred = conv.blocking_deferred
         if conv.timeout:
@@ -159,7 +159,7 @@ class RpcInitiator(ConversationRole):
                 log.error("ERROR. Do not support non-blocking RPC yet")
 
 
-        log.debug('[%s] RPC inform_result done.' % (process.proc_name))
+        log.debug('[%s] RPC inform_result done.', process.proc_name)
 
 class RpcParticipant(ConversationRole):
     """
@@ -178,7 +178,7 @@ class RpcParticipant(ConversationRole):
         process = message['process']
         msg = message['msg']
 
-        log.info('>>> [%s] Received RPC request for op=%s<<<' % (process.proc_name, headers['op']))
+        log.info('>>> [%s] Received RPC request for op=%s<<<', process.proc_name, headers['op'])
 
         # Invoke operation/action
         try:
@@ -7,6 +7,7 @@
 """
 
 from twisted.internet import defer
+from twisted.trial import unittest
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
@@ -15,7 +16,7 @@ from ion.core import ioninit
 from ion.core.process.process import Process, ProcessDesc, ProcessFactory
 from ion.core.cc.container import Container
 from ion.core.exception import ReceivedError, ConversationError
-from ion.interact.conversation import Conversation, ConversationType, conv_mgr_instance
+from ion.interact.conversation import Conversation, ConversationType, conv_mgr_instance, ProcessConversationManager
 from ion.interact.request import RequestType, Request
 from ion.interact.rpc import RpcType, Rpc
 from ion.test.iontest import IonTestCase, ReceiverProcess
@@ -73,3 +74,92 @@ class ConversationTest(IonTestCase):
         req_conv = conv_mgr.new_conversation(RequestType.CONV_TYPE_REQUEST)
         req_conv.bind_role_local(RequestType.ROLE_INITIATOR.role_id, proc1)
         req_conv.bind_role(RequestType.ROLE_PARTICIPANT.role_id, pid2)
+
+
+class FakeProcessId(object):
+    full = 'host.1'
+
+
+class FakeProcess(object):
+    id = FakeProcessId()
+    proc_name = 'fake'
+
+
+class ConversationLifecycleTest(unittest.TestCase):
+    """
+    Tests ending and collection of conversations, without a container
+    """
+
+    def setUp(self):
+        self.now = 1000.0
+        self.conv_mgr = ProcessConversationManager(FakeProcess(), idle_timeout=60.0, tombstone_ttl=30.0,
+                                                   max_tombstones=2, gc_interval=10.0, clock=lambda: self.now)
+
+    def _receive(self, conv_id, protocol='rpc'):
+        message = {'headers':{'protocol':protocol, 'sender':'other', 'conv-id':conv_id}}
+        conv = self.conv_mgr.get_or_create_conversation(conv_id, message)
+        if conv is not None:
+            self.conv_mgr.log_conv_message(conv, message, msgtype='RECV')
+        return conv
+
+    def test_tombstones(self):
+        for conv_id in ('c1', 'c2', 'c3'):
+            conv = self._receive(conv_id)
+            self.conv_mgr.end_conversation(conv, 'DONE')
+
+        # Only the last max_tombstones are kept
+        self.assertEqual(sorted(self.conv_mgr.tombstones.keys()), ['c2', 'c3'])
+        self.assertEqual(self._receive('c3'), None)
+        self.assertEqual(self.conv_mgr.late_messages, 1)
+        self.assertEqual(len(self.conv_mgr.conversations), 0)
+
+        self.now += 30.0
+        self.conv_mgr.collect()
+        self.assertEqual(len(self.conv_mgr.tombstones), 0)
+        self.assertNotEqual(self._receive('c3'), None)
+
+    def test_tombstone_again(self):
+        self.conv_mgr.end_conversation(self._receive('c1'), 'DONE')
+        self.now += 20.0
+        self.conv_mgr.end_conversation(self.conv_mgr.new_conversation('rpc', 'c1'), 'DONE')
+        self.conv_mgr.end_conversation(self._receive('c2'), 'DONE')
+
+        # The first tombstone of c1 has been replaced, and does not expire the second one
+        self.now += 15.0
+        self.conv_mgr.collect()
+        self.assertEqual(sorted(self.conv_mgr.tombstones.keys()), ['c1', 'c2'])
+
+        self.conv_mgr.end_conversation(self._receive('c3'), 'DONE')
+        self.assertEqual(sorted(self.conv_mgr.tombstones.keys()), ['c2', 'c3'])
+
+    def test_idle(self):
+        rpc = self._receive('c1')
+        generic = self._receive('c2', protocol='generic')
+        blocked = self.conv_mgr.new_conversation('rpc', 'c3')
+        blocked.blocking_deferred = defer.Deferred()
+
+        stats = self.conv_mgr.stats()
+        self.assertEqual(stats['live'], 3)
+        self.assertEqual(stats['live_by_protocol'], {'rpc':2, 'generic':1})
+
+        self.now += 30.0
+        self._receive('c1')
+        self.now += 30.0
+
+        # Collected as new conversations are made
+        self._receive('c4')
+        self.assertEqual(sorted(self.conv_mgr.conversations.keys()), ['c1', 'c3', 'c4'])
+
+        # A blocked RPC is kept until it times out
+        blocked.timeout = 'now'
+        self.assertEqual(self.conv_mgr.collect(), 1)
+        self.assertEqual(self.conv_mgr.reaped, 2)
+        self.assertEqual(sorted(self.conv_mgr.conversations.keys()), ['c1', 'c4'])
+
+    def test_conv_log(self):
+        conv = self._receive('c1')
+        for i in xrange(150):
+            self.conv_mgr.log_conv_message(conv, {'headers':{'seq':i}}, msgtype='RECV')
+        self.assertEqual(len(conv.conv_log), 100)
+        self.assertEqual(conv.message_count, 151)
+        self.assertEqual(conv.conv_log[-1][3], {'seq':149})
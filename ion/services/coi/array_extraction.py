@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/coi/array_extraction.py
+@brief Vectorized extraction of a strided subset of a variable stored as bounded arrays
+
+Used by the datastore's op_extract_data. A request selects, in each dimension of the variable, the indices
+origin, origin + stride, ... below origin + size. The result - the target - is a dense array with one element for each
+selected index, delivered in chunks of contiguous elements. The variable is stored as bounded arrays, each holding a
+box of it. Every chunk is a box of the target, so its part in each bounded array is a box as well and is copied with a
+single strided numpy slice assignment.
+"""
+
+import numpy
+
+from twisted.internet import defer
+
+
+class ExtractionError(Exception):
+    """
+    An exception class for array extraction errors
+    """
+
+
+def _ceil_div(a, b):
+    return -((-a) // b)
+
+
+class ExtractionPlan(object):
+    """
+    The shape of the target of an extraction request and the mapping between target, variable and bounded array
+    indices.
+    """
+
+    def __init__(self, origins, sizes, strides):
+        """
+        @param origins the first index of the variable requested in each dimension
+        @param sizes the extent of the request in each dimension
+        @param strides the step in each dimension - 0 or None for 1
+        """
+        self.origins = list(origins)
+        self.sizes = list(sizes)
+        self.strides = [stride or 1 for stride in strides]
+
+        if min(self.strides + [1]) < 1:
+            raise ExtractionError('Strides must be positive')
+
+        # Selected indices per dimension - origin + k * stride for k * stride < size
+        self.shape = [_ceil_div(size, stride) for size, stride in zip(self.sizes, self.strides)]
+
+        # The number of target elements spanned by one step in each dimension
+        self._inner = [1] * len(self.shape)
+        for dim in range(len(self.shape) - 2, -1, -1):
+            self._inner[dim] = self._inner[dim + 1] * self.shape[dim + 1]
+
+        self.size = reduce(lambda x, y: x * y, self.shape, 1)
+
+    def match(self, ba_origins, ba_sizes):
+        """
+        Find the target indices which come from a bounded array.
+        @param ba_origins the origin of the bounded array in each dimension
+        @param ba_sizes the size of the bounded array in each dimension
+        @retval a list with a (start, end) range of target indices for each dimension, or None if the bounded array
+        holds none of the requested elements
+        """
+        if len(ba_origins) != len(self.origins):
+            raise ExtractionError('Bounds dimensionality mismatch: the bounded array has %d dims, the request has %d' %
+                                  (len(ba_origins), len(self.origins)))
+
+        ranges = []
+        for origin, stride, count, ba_origin, ba_size in zip(self.origins, self.strides, self.shape, ba_origins, ba_sizes):
+            start = max(0, _ceil_div(ba_origin - origin, stride))
+            end = min(count, _ceil_div(ba_origin + ba_size - origin, stride))
+            if start >= end:
+                return None
+            ranges.append((start, end))
+        return ranges
+
+    def chunks(self, chunk_elements):
+        """
+        Split the target into chunks of at most chunk_elements contiguous elements.
+        Each chunk is a box: a single index in the outer dimensions, a range in one dimension and everything in the
+        inner dimensions.
+        @retval a generator of (region, start index, number of elements) where region is a (start, end) range of
+        target indices for each dimension
+        """
+        if self.size == 0:
+            return
+
+        rank = len(self.shape)
+        if rank == 0:
+            yield [], 0, 1
+            return
+
+        # The outermost dimension whose inner dimensions fit in a chunk
+        split = 0
+        while self._inner[split] > chunk_elements:
+            split += 1
+        step = max(1, chunk_elements // self._inner[split])
+
+        for outer in numpy.ndindex(*self.shape[:split]):
+            outer_start = sum([index * inner for index, inner in zip(outer, self._inner)])
+            outer_region = [(index, index + 1) for index in outer]
+
+            for start in xrange(0, self.shape[split], step):
+                end = min(start + step, self.shape[split])
+                region = outer_region + [(start, end)] + [(0, count) for count in self.shape[split + 1:]]
+                yield region, outer_start + start * self._inner[split], (end - start) * self._inner[split]
+
+    def intersects(self, region, ranges):
+        """
+        @retval True if the target ranges of a bounded array, as returned by match, overlap the region of a chunk
+        """
+        for (region_start, region_end), (start, end) in zip(region, ranges):
+            if start >= region_end or end <= region_start:
+                return False
+        return True
+
+    def copy(self, target, region, ranges, ba_origins, source):
+        """
+        Copy the part of a chunk which comes from one bounded array.
+        @param target the ndarray of the chunk, in the shape of the region
+        @param region the region of the chunk, as returned by chunks
+        @param ranges the target ranges of the bounded array, as returned by match
+        @param ba_origins the origin of the bounded array in each dimension
+        @param source the ndarray of the bounded array, in its shape
+        @retval the number of elements copied
+        """
+        target_slices = []
+        source_slices = []
+        for (region_start, region_end), (start, end), origin, stride, ba_origin in \
+                zip(region, ranges, self.origins, self.strides, ba_origins):
+            start = max(start, region_start)
+            end = min(end, region_end)
+            if start >= end:
+                return 0
+
+            target_slices.append(slice(start - region_start, end - region_start))
+
+            first = origin + start * stride - ba_origin
+            source_slices.append(slice(first, first + (end - start - 1) * stride + 1, stride))
+
+        block = source[tuple(source_slices)]
+        target[tuple(target_slices)] = block
+        return block.size
+
+    def chunk_array(self, region, dtype):
+        """
+        Allocate the ndarray for a chunk
+        """
+        return numpy.empty([end - start for start, end in region], dtype)
+
+
+# Estimated encoding overhead per element of a chunk message - the field tag, and the length of a string
+ELEMENT_OVERHEAD = 2
+
+
+def chunk_elements(byte_budget, dtype, sample=None):
+    """
+    The number of elements in a chunk of about byte_budget bytes.
+    @param dtype the numpy type of the elements - object for strings and opaques
+    @param sample for object types, an ndarray of some of the values, used to estimate their size
+    """
+    if dtype is object:
+        item_bytes = 64
+        if sample is not None and sample.size > 0:
+            values = sample.ravel()[:1000]
+            item_bytes = sum([len(value) for value in values]) / float(len(values))
+    else:
+        item_bytes = numpy.dtype(dtype).itemsize
+
+    return max(1, int(byte_budget / (item_bytes + ELEMENT_OVERHEAD)))
+
+
+class SendWindow(object):
+    """
+    Lets a producer have up to size sends in flight. Once the window is full, a send first waits for the oldest one
+    to complete, so the producer prepares the next message while earlier ones are on their way.
+
+    The first send to fail breaks the window: its failure is kept and every later send or flush fails with it.
+    """
+
+    def __init__(self, size):
+        self.size = max(1, size)
+        self._pending = []
+        self._failure = None
+        self.max_in_flight = 0
+
+    @defer.inlineCallbacks
+    def send(self, func, *args, **kwargs):
+        """
+        Start func(*args, **kwargs), after waiting for room in the window. Fails, without starting it, if a send
+        has failed.
+        """
+        while len(self._pending) >= self.size:
+            yield self._pending.pop(0)
+        self._check()
+
+        d = defer.maybeDeferred(func, *args, **kwargs)
+        d.addErrback(self._failed)
+        self._pending.append(d)
+        self.max_in_flight = max(self.max_in_flight, len(self._pending))
+
+    @defer.inlineCallbacks
+    def flush(self):
+        """
+        Wait for all the sends in flight - fails with the first failure
+        """
+        pending, self._pending = self._pending, []
+        yield defer.DeferredList(pending)
+        self._check()
+
+    def _failed(self, reason):
+        # Handled here, and reported to the callers of send and flush
+        if self._failure is None:
+            self._failure = reason
+
+    def _check(self):
+        if self._failure is not None:
+            self._failure.raiseException()
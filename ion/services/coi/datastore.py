@@ -10,8 +10,11 @@ there but resource types are not...
 
 """
 import math
+import numpy
 from ion.core.object.object_utils import CDM_ARRAY_INT32_TYPE, CDM_ARRAY_INT64_TYPE, CDM_ARRAY_UINT64_TYPE, CDM_ARRAY_FLOAT32_TYPE, CDM_ARRAY_FLOAT64_TYPE, CDM_ARRAY_STRING_TYPE, CDM_ARRAY_OPAQUE_TYPE, CDM_ARRAY_UINT32_TYPE, ARRAY_STRUCTURE_TYPE
 from ion.util.cache import LRUDict
+from ion.services.coi import array_extraction
+from ion.services.coi.array_extraction import ExtractionPlan
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
@@ -23,6 +26,7 @@ from ion.core.process.service_process import ServiceProcess, ServiceClient
 from ion.core.exception import ReceivedError, ApplicationError
 
 from ion.services.coi.resource_registry import resource_client
+from ion.services.dm.distribution.events import OwnershipChangeEventPublisher
 
 from types import FunctionType
 
@@ -69,6 +73,14 @@ RESOURCE_TYPE = object_utils.create_type_identifier(object_id=1102, version=1)
 
 CDM_BOUNDED_ARRAY_TYPE = object_utils.create_type_identifier(object_id=10021, version=1)
 
+# numpy element types of the array objects - anything else (strings, opaques) is extracted as python objects
+EXTRACT_DTYPES = {CDM_ARRAY_INT32_TYPE.object_id: numpy.int32,
+                  CDM_ARRAY_UINT32_TYPE.object_id: numpy.uint32,
+                  CDM_ARRAY_INT64_TYPE.object_id: numpy.int64,
+                  CDM_ARRAY_UINT64_TYPE.object_id: numpy.uint64,
+                  CDM_ARRAY_FLOAT32_TYPE.object_id: numpy.float32,
+                  CDM_ARRAY_FLOAT64_TYPE.object_id: numpy.float64}
+
 class NDArrayWrap(object):
     """
     Helper object which wraps an ndarray GPB object.
@@ -91,7 +103,9 @@ class NDArrayWrap(object):
         self._getblobs = getblobs
 
         self._ndarray = None
-        self._size = reduce(lambda x,y:x*y, [x.size for x in bounds]) * itembytes
+        self._array = None
+        self._shape = [x.size for x in bounds]
+        self._size = reduce(lambda x,y:x*y, self._shape, 1) * itembytes
 
     def __sizeof__(self):
         """
@@ -105,6 +119,7 @@ class NDArrayWrap(object):
         Removes this ndarray from the associated repo to free memory.
         """
         log.debug("NDArrayWrap object clearing")
+        self._array = None
         # remove from repo's index_hash if it exists
         if self._repo.index_hash.has_key(self._key):
             del self._repo.index_hash[self._key]
@@ -125,6 +140,22 @@ class NDArrayWrap(object):
 
     value = property(_get_value)
 
+    @defer.inlineCallbacks
+    def get_array(self, dtype):
+        """
+        Loads/retrieves the ndarray as a numpy array of the given type in the shape of its bounds.
+        The values are converted once and kept until the wrap is cleared.
+        """
+        if self._array is None:
+            value = yield self.value
+            if dtype is object:
+                array = numpy.array(list(value), dtype=object)
+            else:
+                array = numpy.fromiter(value, dtype, len(value))
+            self._array = array.reshape(self._shape)
+
+        defer.returnValue(self._array)
+
 class NDArrayLRUDict(LRUDict):
     """
     Custom least-recently-used dictionary cache object for holding NDarrays.
@@ -158,6 +189,21 @@ class NDArrayLRUDict(LRUDict):
         value = yield ndarray.value
         defer.returnValue(value)
 
+    @defer.inlineCallbacks
+    def get_ndarray_array(self, key, bounds, dtype, getblobs):
+        """
+        Like get_ndarray_value, but gets the ndarray as a numpy array of the given type in the shape of its bounds.
+        """
+        if not self.has_key(key):
+            ndarray = NDArrayWrap(key, self._repo, bounds, numpy.dtype(dtype).itemsize, getblobs)
+            self[key] = ndarray
+            log.debug("LRUDict loading, item size %d, lru now %d items %d bytes total" % (ndarray._size, len(self.keys()), self.total_size))
+        else:
+            ndarray = self.get(key)
+
+        array = yield ndarray.get_array(dtype)
+        defer.returnValue(array)
+
 class DataStoreWorkBenchError(WorkBenchError):
     """
     An Exception class for errors in the data store workbench
@@ -204,7 +250,7 @@ class DataStoreWorkbench(WorkBench):
         while len(keys_to_get) > 0:
             new_links_to_get = set()
 
-            def_list = []
+            fetch_keys = []
             #@TODO - put some error checking here so that we don't overflow due to a stupid request!
             for key in keys_to_get:
                 # Short cut if we have already got it!
@@ -218,15 +264,16 @@ class DataStoreWorkbench(WorkBench):
                     # only add new items to get if they meet our criteria, meaning they are not in the excluded type list
                     new_links_to_get.update(obj.ChildLinks)
                 else:
-                    def_list.append(self._blob_store.get(key))
+                    fetch_keys.append(key)
 
 
-            result_list = []
-            if def_list:
-                result_list = yield defer.DeferredList(def_list)
+            # One backend call for each level of the structure
+            fetched = {}
+            if fetch_keys:
+                fetched = yield self._blob_store.get_many(fetch_keys)
 
-            for result, blob in result_list:
-                assert result==True, 'Error getting link from blob store!'
+            for key, blob in fetched.iteritems():
+                assert blob is not None, 'Error getting link from blob store!'
                 wse = gpb_wrapper.StructureElement.parse_structure_element(blob)
                 blobs[wse.key]=wse
 
@@ -355,11 +402,7 @@ class DataStoreWorkbench(WorkBench):
         # Back to boiler plate op_pull
         ####
 
-        my_commits = self.list_repository_commits(repo)
-
-        puller_has = request.commit_keys
-
-        puller_needs = set(my_commits).difference(puller_has)
+        puller_needs = self.list_commits_needed(repo, request.commit_keys)
 
         response = yield self._process.message_client.create_instance(PULL_RESPONSE_MESSAGE_TYPE)
 
@@ -501,8 +544,6 @@ class DataStoreWorkbench(WorkBench):
             local_keys = workbench_keys.intersection(need_keys)
 
 
-            def_commit_list = []
-            def_blob_list = []
             key_list = []
             for key in local_keys:
                 try:
@@ -514,17 +555,15 @@ class DataStoreWorkbench(WorkBench):
 
                 # @TODO Assumption is that this check is less costly than getting it from the remote service
                 key_list.append(key)
-                def_commit_list.append(self._commit_store.has_key(key))
-                def_blob_list.append(self._blob_store.has_key(key))
 
             if key_list:
-                result_commit_list = yield defer.DeferredList(def_commit_list)
-                result_blob_list = yield defer.DeferredList(def_blob_list)
+                have_commits = yield self._commit_store.has_keys(key_list)
+                have_blobs = yield self._blob_store.has_keys(key_list)
 
                 # Remove
-                for key, res1, have_blob, res2, have_commit in zip(key_list, result_blob_list, result_commit_list):
+                for key in key_list:
 
-                    if have_blob or have_commit:
+                    if have_blobs[key] or have_commits[key]:
                         need_keys.remove(key)
 
             if len(need_keys) > 0:
@@ -560,24 +599,29 @@ class DataStoreWorkbench(WorkBench):
             self._update_repo_to_head(repo,new_head)
 
         # Put any new blobs
-        def_list = []
+        new_blobs = {}
         for key in new_blob_keys:
 
             element = self._workbench_cache.get(key)
 
-            def_list.append(self._blob_store.put(key, element.serialize()))
-        yield defer.DeferredList(def_list)
+            new_blobs[key] = element.serialize()
+        if new_blobs:
+            yield self._blob_store.put_many(new_blobs)
         # @TODO - check the results - for what?
 
 
         # now put any new commits that are not at the head
-        def_list = []
+        commits = {}
+        commit_attributes = {}
 
         # list of the keys which are no longer heads
         clear_head_list=[]
 
         # list of the new heads to push at the same time
         new_head_list=[]
+
+        # The subjects of the ownership associations which are new heads or are no longer heads
+        ownership_changes = set()
         for repo_key, commit_keys in new_commits.items():
             # Get the updated repository
             repo = self.get_repository(repo_key)
@@ -643,10 +687,8 @@ class DataStoreWorkbench(WorkBench):
 
                 if key not in head_keys:
 
-                    defd = self._commit_store.put(key = key,
-                                       value = wse.serialize(),
-                                       index_attributes = attributes)
-                    def_list.append(defd)
+                    commits[key] = wse.serialize()
+                    commit_attributes[key] = attributes
 
                 else:
 
@@ -664,6 +706,9 @@ class DataStoreWorkbench(WorkBench):
 
                     new_head_list.append({'key':key, 'value':wse.serialize(), 'index_attributes':attributes})
 
+                    if attributes.get(PREDICATE_KEY) == OWNED_BY_ID:
+                        ownership_changes.add(attributes[SUBJECT_KEY])
+
             # Get the current head list
             q = Query()
             q.add_predicate_eq(REPOSITORY_KEY, repo_key)
@@ -675,19 +720,25 @@ class DataStoreWorkbench(WorkBench):
                 if key not in head_keys:
                     clear_head_list.append(key)
 
+                    # An ownership association which is replaced or set to null
+                    if columns.get(PREDICATE_KEY) == OWNED_BY_ID:
+                        ownership_changes.add(columns[SUBJECT_KEY])
+
                     # Any commit which is currently a head will have the correct branch names set.
                     # Just delete the branch names for the ones that are no longer heads.
 
-        yield defer.DeferredList(def_list)
-        #@TODO - check the return vals?
+        if commits:
+            yield self._commit_store.put_many(commits, commit_attributes)
 
-        def_list = []
+        # The heads go in after the rest of the history
+        commits = {}
+        commit_attributes = {}
         for new_head in new_head_list:
+            commits[new_head['key']] = new_head['value']
+            commit_attributes[new_head['key']] = new_head['index_attributes']
 
-            def_list.append(self._commit_store.put(**new_head))
-
-        yield defer.DeferredList(def_list)
-        #@TODO - check the return vals?
+        if commits:
+            yield self._commit_store.put_many(commits, commit_attributes)
 
         def_list = []
         for key in clear_head_list:
@@ -700,6 +751,10 @@ class DataStoreWorkbench(WorkBench):
         #print 'After update to heads'
         #pprint.pprint(self._commit_store.kvs)
 
+        # Before the reply, so that the policy interceptors hear of it as soon as they can
+        if ownership_changes:
+            yield self._process.publish_ownership_changes(ownership_changes)
+
 
         response = yield self._process.message_client.create_instance(MessageContentTypeID=None)
         response.MessageResponseCode = response.ResponseCodes.OK
@@ -714,11 +769,11 @@ class DataStoreWorkbench(WorkBench):
         if not hasattr(request, 'MessageType') or request.MessageType != BLOBS_MESSAGE_TYPE:
             raise DataStoreWorkBenchError('Invalid put blobs request. Bad Message Type!', request.ResponseCodes.BAD_REQUEST)
 
-        def_list = []
+        new_blobs = {}
         for blob in request.blob_elements:
-            def_list.append(self._blob_store.put(blob.key, blob.SerializeToString() ))
+            new_blobs[blob.key] = blob.SerializeToString()
 
-        yield defer.DeferredList(def_list)
+        yield self._blob_store.put_many(new_blobs)
 
         yield self._process.reply_ok(message)
         log.info("op_put_blobs: Complete!")
@@ -737,7 +792,7 @@ class DataStoreWorkbench(WorkBench):
 
         response = yield self._process.message_client.create_instance(BLOBS_MESSAGE_TYPE)
 
-        def_list = []
+        fetch_keys = []
         for key in request.blob_keys:
             element = self._workbench_cache.get(key)
 
@@ -749,11 +804,14 @@ class DataStoreWorkbench(WorkBench):
 
                 continue
 
-            def_list.append(self._blob_store.get(key))
+            fetch_keys.append(key)
 
-        res_list = yield defer.DeferredList(def_list)
+        fetched = {}
+        if fetch_keys:
+            fetched = yield self._blob_store.get_many(fetch_keys)
 
-        for result, blob in res_list:
+        for key in fetch_keys:
+            blob = fetched[key]
 
             if blob is None:
                 raise DataStoreWorkBenchError('Invalid fetch objects request. Key Not Found!', request.ResponseCodes.NOT_FOUND)
@@ -802,10 +860,10 @@ class DataStoreWorkbench(WorkBench):
         """
 
         # This is simpler than a push - all of these are guaranteed to be new objects!
-        def_list = []
+        blobs = {}
         for key, element in repo.index_hash.items():
 
-            def_list.append(self._blob_store.put(key, element.serialize()))
+            blobs[key] = element.serialize()
 
 
         # any objects in the data structure that were transmitted have already
@@ -823,6 +881,8 @@ class DataStoreWorkbench(WorkBench):
         for cref in repo.current_heads():
             head_keys.append( cref.MyId )
 
+        commits = {}
+        commit_attributes = {}
         for key in commit_keys:
 
             # Set the repository name for the commit
@@ -861,14 +921,7 @@ class DataStoreWorkbench(WorkBench):
             wse = self._workbench_cache.get(key)
 
 
-            if key not in head_keys:
-
-                defd = self._commit_store.put(key = key,
-                                   value = wse.serialize(),
-                                   index_attributes = attributes)
-                def_list.append(defd)
-
-            else:
+            if key in head_keys:
 
                 # We know it is a head - but we need to get the branch name again
                 for branch in  repo.branches:
@@ -881,11 +934,12 @@ class DataStoreWorkbench(WorkBench):
                             attributes[BRANCH_NAME] = ','.join([attributes[BRANCH_NAME],branch.branchkey])
 
 
-                # Now commit it!
-                defd = self._commit_store.put(key = key,
-                                   value = wse.serialize(),
-                                   index_attributes = attributes)
-                def_list.append(defd)
+            commits[key] = wse.serialize()
+            commit_attributes[key] = attributes
+
+        # Now put it all - one batch for the blobs and one for the commits
+        def_list = [self._blob_store.put_many(blobs),
+                    self._commit_store.put_many(commits, commit_attributes)]
         return defer.DeferredList(def_list)
 
 
@@ -957,235 +1011,89 @@ class DataStoreWorkbench(WorkBench):
         # get the type of bounded array we have here
         assert len(obj.bounded_arrays) > 0
 
-        # a list of matching bounded arrays
-        bounded_includes_list = []
-        targetshape = [x.size for x in request.request_bounds]
+        plan = ExtractionPlan([x.origin for x in request.request_bounds],
+                              [x.size for x in request.request_bounds],
+                              [x.stride for x in request.request_bounds])
 
         # ===================================================================
         # STEP 1: Match bounded arrays
         # ===================================================================
 
-        # iterate bounded arrays in this object
+        # format: (bounded array, range of target indices in each dimension, origin of the bounded array in each dimension)
+        bounded_includes_list = []
         for ba in obj.bounded_arrays:
 
             # need to be the same rank
             if not len(ba.bounds) == len(request.request_bounds):
                 raise DataStoreWorkBenchError("Bounds dimensionality mismatch: this ba has %d dims, our request has %d" % (len(ba.bounds), len(request.request_bounds)))
 
-            target_range = []
-            src_range = []
-
-            # this for loop is doing a few things:
-            # - checking to see if the ranges intersect for each dimension.  If one does not intersect, the whole array
-            #   is rejected.
-            # - computing the intersection slices for each of those dimensions if they do intersect.
-            # - if we make it through the for without a rejection on a dimension, the else: clause is run, which marks
-            #   an array as being a required to copy array along with the ranges in both target and source.
-            for reqbounds, babounds in zip(request.request_bounds, ba.bounds):
-
-                #log.debug("Cur bounds: %d+%d, Req bounds: %d+%d" % (babounds.origin, babounds.size, reqbounds.origin, reqbounds.size))
-
-                # this bounds is below our target range
-                # requested end is lower than this bounds start (exclusive)
-                if reqbounds.origin + reqbounds.size <= babounds.origin:
-                    break
-
-                # this bounds is above our target range
-                # requested start is higher than this bounds end (exclusive)
-                if reqbounds.origin >= babounds.origin + babounds.size:
-                    break
-
-                # compute intersections and offsets into request and src bounded arrays
-                isec_start = max(babounds.origin, reqbounds.origin)
-                isec_end = min(babounds.origin + babounds.size, reqbounds.origin + reqbounds.size)
-
-                effective_start = isec_start - reqbounds.origin
-                effective_end = isec_end - reqbounds.origin
-
-                ba_start = isec_start - babounds.origin
-                ba_end = isec_end - babounds.origin
-
-                # append those intersections - each entry represents a range into a dimension
-                target_range.append((effective_start, effective_end))
-                src_range.append((ba_start, ba_end))
-
-            else:
-                # all bounds are included, this bounded array is good to go
-                # format: (bounded array, target range of data (multidim), source bounded array range (multidim))
-                bounded_includes_list.append((ba, target_range, src_range))
-
-        # sidestep: figure out size of each item in a BA, and set chunk factor to 5mb (default, configurable)
-
-        # our default, safe assumptions say to expect the biggest
-        # we don't actually know what to put for CDM_ARRAY_STRING_TYPE as that varies and CDM_ARRAY_OPAQUE_TYPE,
-        # could be many things.
-        ITEM_SIZE = 8
+            # if one dimension does not intersect the request, the whole array is rejected
+            target_ranges = plan.match([x.origin for x in ba.bounds], [x.size for x in ba.bounds])
+            if target_ranges is not None:
+                bounded_includes_list.append((ba, target_ranges, [x.origin for x in ba.bounds]))
 
+        # sidestep: figure out the element type of the arrays - we don't know what to expect for strings and opaques,
+        # those are kept as python objects
+        dtype = object
         if len(bounded_includes_list) > 0:
             ndarray_type = bounded_includes_list[0][0].GetLink('ndarray').type
-            # @TODO: cmon, the in syntax doesn't use the correct __eq__ overload or whatever? this is silly.
-            if ndarray_type.object_id in [CDM_ARRAY_INT32_TYPE.object_id, CDM_ARRAY_UINT32_TYPE.object_id, CDM_ARRAY_FLOAT32_TYPE.object_id]:
-                ITEM_SIZE = 4
-            elif ndarray_type.object_id in [CDM_ARRAY_INT64_TYPE.object_id, CDM_ARRAY_UINT64_TYPE.object_id, CDM_ARRAY_FLOAT64_TYPE.object_id]:
-                ITEM_SIZE = 8
+            dtype = EXTRACT_DTYPES.get(ndarray_type.object_id, object)
 
-        # max size for a data chunk AND the LRU dict
+        # max size for the LRU dict
         LRU_DICT_LIMIT = int(CONF.getValue('extract_cache_size', 5 * 1024 * 1024))
 
-        # @TODO: Bug OOIION-159 is preventing us from setting a proper chunk limit of 5mb.
-        #                       The overflow point appears to be 16482 -> 16483, which in bytes, looks suspiciously
-        #                       like an arithmetic overflow somewhere.
-
-        CHUNK_FACTOR = 15000 #LRU_DICT_LIMIT / ITEM_SIZE       # chunk factor is expressed in # of items, not bytes
-        log.debug("LRU Cache Limit set at %d bytes, CHUNK_FACTOR is %d elements" % (LRU_DICT_LIMIT, CHUNK_FACTOR))
-
-        # ===================================================================
-        # STEP 2: Compress/Optimize bounded_includes_list for overlap
-        # ===================================================================
-        # @TODO: not needed for R1
-
-        # ===================================================================
-        # STEP 3: Generate a list of matching strips from each BA
-        # ===================================================================
-        striplist = []
-        strides = [x.stride or 1 for x in request.request_bounds]
-
-        for batuple in bounded_includes_list:
-            ba, targetranges, srcranges = batuple
-
-            # is this a scalar? is there anything to slice?
-            if len(targetshape) == 0:
-                striplist.append((ba, (0, 1), (0, 1), 1, 1))
-            else:
-                # get slices out of it
-                # get dims of this bounded array
-                ba_shape = [x.size for x in ba.bounds]
+        # Bytes per chunk message. Bug OOIION-159 - messages of more than about 128kb overflow somewhere - keeps the
+        # default below that.
+        CHUNK_BYTES = int(CONF.getValue('extract_chunk_bytes', 120 * 1024))
 
-                for targetslice, srcslice, laststridelen in self._get_slices(targetshape, ba_shape, targetranges, srcranges, strides):
-                    striplist.append((ba, targetslice, srcslice, targetslice[1]-targetslice[0], laststridelen))
+        # Chunk messages being sent at once
+        SEND_WINDOW = int(CONF.getValue('extract_send_window', 4))
 
-        log.debug("Number of uncompressed strips: %d" % len(striplist))
-
-        # ===================================================================
-        # STEP 4: Sort that list of matching strips by start index in target array to start index + length
-        # ===================================================================
-
-        sorted_striplist = sorted(striplist, lambda x, y: x[1][1] < y[1][0])
+        # create a least-recently-used cache for ndarrays, using 5mb as the default max size
+        ndarray_cache = NDArrayLRUDict(LRU_DICT_LIMIT, repo)
 
         # ===================================================================
-        # STEP 5: Compress any contiguous strips from the same BAs
+        # STEP 2: Generate the chunks - each is a box of contiguous elements of the target
         # ===================================================================
-        compressed_striplist = []
-        accumstrip = None
-        for stripitem in sorted_striplist:
-            ba, targetslice, srcslice, leng, laststridelen = stripitem
-
-            # check for end condition
-            if accumstrip and ba != accumstrip[0]:
-                # push current strip into compressed striplist
-                compressed_striplist.append(accumstrip)
-                accumstrip = None
-
-            # brand new strip, either after we just pushed or starting this loop
-            if accumstrip is None:
-                accumstrip = stripitem[:]
-                continue
 
-            # see if we have a contiguous strip
-            # - current item's source slice start index is the same as the accumulated strip's source end index
-            # - strides are the same (should always be, this is more sanity check)
-            # - the possible accumulated strip's total length is over the max size for chunking messages
-            if srcslice[0] == accumstrip[2][1] and \
-               laststridelen == accumstrip[4] and \
-               accumstrip[3] + leng <= CHUNK_FACTOR:
-                # update accumstrip
-                accumstrip = (accumstrip[0], (accumstrip[1][0], targetslice[1]), (accumstrip[2][0], srcslice[1]), srcslice[1] - accumstrip[2][0], accumstrip[4])
-            else:
-                # not contiguous?  push into list and forget it
-                compressed_striplist.append(accumstrip)
-                accumstrip = stripitem[:]
+        # the size of strings and opaques is estimated from the first array
+        sample = None
+        if dtype is object and len(bounded_includes_list) > 0:
+            ba = bounded_includes_list[0][0]
+            sample = yield ndarray_cache.get_ndarray_array(ba.GetLink('ndarray').key, ba.bounds, dtype, self._get_blobs)
 
-        # catch the last one
-        if accumstrip is not None:
-            compressed_striplist.append(accumstrip)
+        chunk_elements = array_extraction.chunk_elements(CHUNK_BYTES, dtype, sample)
+        extraction_plan = list(plan.chunks(chunk_elements))
 
-        log.debug("Number of compressed strips: %d" % len(compressed_striplist))
+        log.debug("Extracting %d elements in %d chunks of up to %d elements, LRU Cache Limit set at %d bytes" %
+                  (plan.size, len(extraction_plan), chunk_elements, LRU_DICT_LIMIT))
 
         # ===================================================================
-        # STEP 6: Generate a list of extractions using heuristics, an "extraction plan"
+        # STEP 3: Perform extractions
         # ===================================================================
 
-        # list of [list of indicies into compressed_striplist]
-        extraction_plan = []
+        window = array_extraction.SendWindow(SEND_WINDOW)
 
-        # simple: relying on the LRU cache to free up BAs when done, and that datasets will be laid out in a sane
-        # variety fastest varying dimension will never be broken up over multiple BAs unless dimensionality is one,
-        # we can just assemble each step of the plan to be the maximum chunk size we can fit.
-        curstep = []
-        curlen = 0
-        for csidx, cstrip in enumerate(compressed_striplist):
+        for exidx, (region, targetstartidx, elemcount) in enumerate(extraction_plan):
 
-            # always need at least one strip
-            if len(curstep) == 0:
-                curstep.append(csidx)
-                curlen += cstrip[3]
-                continue
-
-            # can we fit the new strip?
-            if curlen + cstrip[3] <= CHUNK_FACTOR:
-                curstep.append(csidx)
-            else:
-                extraction_plan.append(curstep)
-                curstep = [csidx]
-                curlen = cstrip[3]
-
-        # catch any leftovers
-        if len(curstep) > 0:
-            extraction_plan.append(curstep)
+            targetndarray = plan.chunk_array(region, dtype)
+            filled = 0
 
-        # ===================================================================
-        # STEP 7: Perform extractions
-        # ===================================================================
+            log.debug("Extraction step %d, element count: %d, start index: %d" % (exidx, elemcount, targetstartidx))
 
-        # create a least-recently-used cache for ndarrays, using 5mb as the default max size
-        ndarray_cache = NDArrayLRUDict(LRU_DICT_LIMIT, repo)
+            for ba, target_ranges, ba_origins in bounded_includes_list:
 
-        for exidx, exstep in enumerate(extraction_plan):
-            curstrips = []
-            for sidx in exstep:
-                curstrips.append(compressed_striplist[sidx])
-
-            # get the start index.. should be in the first item
-            targetstartidx = curstrips[0][1][0]
-
-            # calculate number of elements we are going to output in this chunk, create temp storage for it
-            elemcount = reduce(lambda x, y: x+y, [x[3] for x in curstrips])
-            targetndarray = [None] * elemcount
-
-            log.debug("Extraction step %d, # strips: %d, element count: %d, start index: %d" % (exidx, len(curstrips), elemcount, targetstartidx))
-
-            # ok, now we can perform the extractions on this step
-            for csidx, curstrip in enumerate(curstrips):
-                ba, targetidxs, srcidxs, leng, stride = curstrip
-
-                # index into the current chunk data
-                striplen = leng
-                targetoffset = csidx * striplen
+                # skip the arrays which have nothing for this chunk before loading them
+                if not plan.intersects(region, target_ranges):
+                    continue
 
                 # get/possibly load from ndarray_cache
-                ndobjval = yield ndarray_cache.get_ndarray_value(ba.GetLink('ndarray').key, ba.bounds, ITEM_SIZE, self._get_blobs)
-
-                srcslice = ndobjval[srcidxs[0]:srcidxs[1]]
-                if stride == 1:
-                    targetslice = srcslice
-                else:
-                    targetslice = [d for i, d in enumerate(srcslice) if i % stride == 0]
+                srcndarray = yield ndarray_cache.get_ndarray_array(ba.GetLink('ndarray').key, ba.bounds, dtype, self._get_blobs)
 
-                targetndarray[targetoffset:targetoffset+striplen] = targetslice
+                filled += plan.copy(targetndarray, region, target_ranges, ba_origins, srcndarray)
 
             # ensure we filled this chunk
-            nonelist = [i for i,d in enumerate(targetndarray) if d is None]
-            if len(nonelist) > 0:
+            if filled != elemcount:
                 raise DataStoreWorkBenchError("Data extraction did not properly fill in all members of response ndarray!")
 
             # SEND THIS CHUNK
@@ -1200,16 +1108,20 @@ class DataStoreWorkbench(WorkBench):
             chunkmsg.done = exidx == len(extraction_plan) - 1       # last chunk message?  set the done flag
 
             # create the ndarray in this chunk
-            chunkndarray = chunkmsg.CreateObject(curstrips[0][0].GetLink('ndarray').type)
+            chunkndarray = chunkmsg.CreateObject(bounded_includes_list[0][0].GetLink('ndarray').type)
 
-            # these lines blow up with a TypeError if we screwed up the bounds and didn't fill in the targetarray fully,
-            # aka it contains Nones
-            chunkndarray.value[0:elemcount] = targetndarray[:]
+            chunkndarray.value.extend(targetndarray.ravel().tolist())
             chunkmsg.ndarray = chunkndarray
 
-            # send this message to the passed in routing key
-            yield self._send_data_chunk(request.data_routing_key, chunkmsg)
-            
+            # the last chunk goes after all the others are through - its done flag ends the stream
+            if chunkmsg.done:
+                yield window.flush()
+
+            # send this message to the passed in routing key - extraction of the next chunk goes on while it is sent
+            yield window.send(self._send_data_chunk, request.data_routing_key, chunkmsg)
+
+        yield window.flush()
+
         self._process.reply_ok(message, response)
         log.info("/op_extract_data")
         
@@ -1223,115 +1135,6 @@ class DataStoreWorkbench(WorkBench):
         yield self._process.send(data_routing_key, 'noop', chunkmsg)
 
 
-    def _double_xrange(self, start1, end1, start2, end2):
-        """
-        This is a method just like xrange, but it operates on two diff ranges at once.
-        Used by extract_data when mapping slice ranges for data extraction.
-
-        @NOTE: This is a generator method, not to be confused with one that needs defer.inlineCallbacks decoration!
-        """
-        counter1 = start1
-        counter2 = start2
-        while counter1 < end1 and counter2 < end2:
-            yield (counter1, counter2)
-
-            counter1 += 1
-            counter2 += 1
-
-    def _get_slices(self, targetdimextents, srcdimextents, targetranges, srcranges, strides, targetidx=0, srcidx=0):
-        """
-        Returns a tuple of slice ranges (as tuples) that you can use to extract data from slices
-        inside an ndarray. This is used by extract_data.
-
-        @NOTE: This is a generator method, not to be confused with one that needs defer.inlineCallbacks decoration!
-
-        @param  targetdimextents    The dimensional extents of the target bounded array.
-        @param  srcdimextents       The dimensional extents of the source bounded array.
-        @param  targetranges        A list of tuples (one tuple per dimension), specifying a range in each
-                                    dimension that we are storing into.
-        @param  srcranges           A list of tuples (one tuple per dimension), specifying a range in each
-                                    dimension that we are pulling data out of.
-        @param  strides             A list of stride amounts for each dimension. Should be the same length
-                                    as targetranges/srcranges. The last dimension is not factored in here, but is
-                                    returned as the last member of the return tuple.
-        @param  targetidx           An accumulated index value into the target bounded array which gives the
-                                    current index calculated on each recursive call.
-        @param  srcidx              An accumulated index value into the source bounded array which gives the
-                                    current index calculated on each recursive call.
-
-        @returns                    On each yield, a tuple containing two tuples and an integer: a range to the target WITH
-                                    striding applied to all but the last dimension, a range to copy from the source WITHOUT
-                                    striding applied, and the stride length of the last dimension. 
-        """
-
-        # make sure we have sane things here
-        assert len(targetdimextents) == len(srcdimextents)
-        assert len(strides) == len(targetdimextents)
-
-        # build index extent arrays
-        targetidxextents = [None] * len(targetdimextents)
-        srcidxextents = [None] * len(srcdimextents)
-
-        targetidxextents[-1] = 1
-        srcidxextents[-1] = 1
-
-        # reduce target dim extents to extents after applying stride
-        striddentargetextents = [targetdimextents[i]/strides[i] for i in xrange(len(targetdimextents))]
-
-        # calculate index extents into target array, using stridden extents
-        for x in range(len(targetidxextents)-2, -1, -1):
-            targetidxextents[x] = reduce(lambda x,y: x*y, striddentargetextents[x+1:])
-
-        # calculate index extents into source array
-        for x in range(len(srcidxextents)-2, -1, -1):
-            srcidxextents[x] = reduce(lambda x, y: x*y, srcdimextents[x+1:])
-
-        def recslice(trs, srs, ts, ss, tstrides, cts=0, css=0, rc=0):
-            """
-            Recursive slice finder.
-            @param  trs     Target ranges.
-            @param  srs     Source ranges.
-            @param  ts      Target slice (last dimension).
-            @param  ss      Source slice (last dimension).
-            @param  tstrides List of strides in all dimensions.
-            @param  cts     Current target sum, aka index into target array.
-            @param  css     Current source sum, aka index into source array.
-            @param  rc      Recursion count, used to index into targetidxextents/srcidxextents.
-            """
-            if len(trs) == 0:
-                # exit case: traversed all dimensions, we're on the last dimension, extract our slices
-                yield ((cts+ts[0]/tstrides[0], cts+ts[1]/tstrides[0]),
-                       (css+ss[0], css+ss[1]),
-                       tstrides[0])
-            else:
-                # iterative case: look at current dimension, co-iterate over the ranges in target/src,
-                #                 recurse into recslice again one dimension up until we run out.
-                ctr = trs[0]
-                csr = srs[0]
-                cstride = tstrides[0]
-
-                for tv, sv in self._double_xrange(ctr[0], ctr[1], csr[0], csr[1]):
-                    if tv % cstride == 0:
-                        for xx in recslice(trs[1:],
-                                           srs[1:],
-                                           ts,
-                                           ss,
-                                           tstrides[1:],
-                                           cts+(tv * targetidxextents[rc]),     # calculate actual index offset here and pass it
-                                           css+(sv * srcidxextents[rc]),        # calculate actual index offset here and pass it
-                                           rc+1):
-                            yield xx
-                    else:
-                        log.debug("IGNOREING STRIDED OUT DIM tv/sv %d,%d len dims %d" % (tv, sv, len(trs)))
-
-        # iterate through all recslice generated slicepairs
-        for x in recslice(targetranges[:-1],
-                          srcranges[:-1],
-                          targetranges[-1],
-                          srcranges[-1],
-                          strides[:]):
-            yield x
-
     @defer.inlineCallbacks
     def op_get_object(self, request, headers, message):
         log.info('op_get_object')
@@ -1454,6 +1257,13 @@ class DataStoreService(ServiceProcess):
         self.preload.update(CONF.getValue(PRELOAD_CFG, {}))
         self.preload.update(self.spawn_args.get(PRELOAD_CFG, {}))
 
+        # Tells the policy interceptors to forget what they know of the owner of a resource, whenever an ownership
+        # association is pushed or preloaded
+        self.ownership_pub = OwnershipChangeEventPublisher(process=self)
+        self.add_life_cycle_object(self.ownership_pub)
+
+        # The resources given an owner by the preload, announced once the publisher is active
+        self._preloaded_owned = []
 
 
         log.info('DataStoreService.__init__()')
@@ -1482,14 +1292,10 @@ class DataStoreService(ServiceProcess):
             
         else:
 
-            log.info("Clearing The In Memeory Index Store")
-
-            self._backend_classes[COMMIT_CACHE].indices.clear()
-            self._backend_classes[COMMIT_CACHE].kvs.clear()
-
-            log.info("Instantiating In Memeory Index Store")
-            # Pass self for index store service implementation
-            self.c_store = self._backend_classes[COMMIT_CACHE](self, indices=COMMIT_INDEXED_COLUMNS )
+            log.info("Instantiating Local Index Store: %s" % self._backend_classes[COMMIT_CACHE])
+            # Pass self for index store service implementation. An in memory store is shared with the association
+            # service, which reads the commits through an instance of its own
+            self.c_store = store.create_local_store(self._backend_classes[COMMIT_CACHE], COMMIT_CACHE, self, shared=True, indices=COMMIT_INDEXED_COLUMNS)
 
         if issubclass(self._backend_classes[BLOB_CACHE], cassandra.CassandraStore):
             #raise NotImplementedError('Startup for cassandra store is not yet complete')
@@ -1506,13 +1312,9 @@ class DataStoreService(ServiceProcess):
             yield self.register_life_cycle_object(self.b_store)
         else:
 
-            log.info("Clearing The In Memeory Store")
-
-            self._backend_classes[BLOB_CACHE].kvs.clear()
-
-            log.info("Instantiating In Memory Store")
+            log.info("Instantiating Local Store: %s" % self._backend_classes[BLOB_CACHE])
             # Pass self for store service implementation
-            self.b_store = self._backend_classes[BLOB_CACHE](self)
+            self.b_store = store.create_local_store(self._backend_classes[BLOB_CACHE], BLOB_CACHE, self, shared=True)
 
         
         log.info("Created stores")
@@ -1521,6 +1323,7 @@ class DataStoreService(ServiceProcess):
         yield self.initialize_datastore()
 
 
+    @defer.inlineCallbacks
     def slc_activate(self):
 
 
@@ -1532,6 +1335,16 @@ class DataStoreService(ServiceProcess):
         self.op_get_object = self.workbench.op_get_object
         self.op_extract_data = self.workbench.op_extract_data
 
+        preloaded_owned, self._preloaded_owned = self._preloaded_owned, []
+        yield self.publish_ownership_changes(preloaded_owned)
+
+    def slc_terminate(self):
+
+        # Log structured stores hold an open file - the others are closed by their life cycle
+        for backend in (self.b_store, self.c_store):
+            if getattr(backend, 'log_structured', False):
+                backend.close()
+
 
     @defer.inlineCallbacks
     def initialize_datastore(self):
@@ -1802,6 +1615,19 @@ class DataStoreService(ServiceProcess):
 
 
 
+    @defer.inlineCallbacks
+    def publish_ownership_changes(self, resource_ids):
+        """
+        Publishes an ownership change event for each resource. A failure is logged - the ownership decisions cached
+        by the policy interceptors still expire.
+        """
+        for resource_id in resource_ids:
+            try:
+                yield self.ownership_pub.create_and_publish_event(origin=resource_id,
+                                                                  description='ownership association written')
+            except Exception, ex:
+                log.exception('Could not publish the ownership change of resource %s' % resource_id)
+
     def _create_ownership_association(self, repo_object, user_id):
 
         association_repo = self.workbench.create_repository(ASSOCIATION_TYPE)
@@ -1831,6 +1657,7 @@ class DataStoreService(ServiceProcess):
 
         association_repo.commit('Ownership association created for preloaded object.')
 
+        self._preloaded_owned.append(repo_object.repository_key)
 
         return association_repo
 
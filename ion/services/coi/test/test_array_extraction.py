@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/coi/test/test_array_extraction.py
+@test The extraction plan used by the datastore's op_extract_data, against numpy slicing of the whole variable
+"""
+
+import numpy
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from ion.services.coi.array_extraction import ExtractionPlan, ExtractionError, SendWindow, chunk_elements
+
+
+class ExtractionPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        # A 4 x 20 x 30 variable stored as bounded arrays of 1 x 10 x 30
+        self.variable = numpy.arange(4 * 20 * 30, dtype=numpy.float64).reshape(4, 20, 30)
+
+        self.bounded_arrays = []
+        for i in range(4):
+            for j in (0, 10):
+                self.bounded_arrays.append(([i, j, 0], [1, 10, 30], self.variable[i:i + 1, j:j + 10, :].copy()))
+
+    def _extract(self, origins, sizes, strides, chunk_elements):
+        plan = ExtractionPlan(origins, sizes, strides)
+
+        matches = []
+        for ba_origins, ba_sizes, array in self.bounded_arrays:
+            ranges = plan.match(ba_origins, ba_sizes)
+            if ranges is not None:
+                matches.append((ranges, ba_origins, array))
+
+        result = []
+        for region, start, count in plan.chunks(chunk_elements):
+            self.assertEqual(start, len(result))
+            self.assertTrue(count <= chunk_elements or len(region) == 0)
+
+            target = plan.chunk_array(region, numpy.float64)
+            filled = 0
+            for ranges, ba_origins, array in matches:
+                if plan.intersects(region, ranges):
+                    filled += plan.copy(target, region, ranges, ba_origins, array)
+            self.assertEqual(filled, count)
+
+            result.extend(target.ravel().tolist())
+
+        self.assertEqual(len(result), plan.size)
+        return result
+
+    def _check(self, origins, sizes, strides, chunk_elements=15000):
+        result = self._extract(origins, sizes, strides, chunk_elements)
+
+        slices = tuple([slice(o, o + s, st) for o, s, st in zip(origins, sizes, strides)])
+        self.assertEqual(result, self.variable[slices].ravel().tolist())
+
+    def test_full(self):
+        self._check([0, 0, 0], [4, 20, 30], [1, 1, 1])
+
+    def test_partial_crossing_arrays(self):
+        self._check([1, 5, 3], [2, 10, 20], [1, 1, 1])
+
+    def test_strides(self):
+        self._check([0, 0, 5], [4, 20, 20], [1, 5, 10])
+        self._check([1, 3, 0], [3, 17, 30], [2, 3, 7])
+
+    def test_small_chunks(self):
+        self._check([0, 0, 0], [4, 20, 30], [1, 1, 1], chunk_elements=7)
+        self._check([0, 2, 1], [4, 15, 29], [1, 2, 3], chunk_elements=100)
+        self._check([0, 0, 0], [4, 20, 30], [1, 1, 1], chunk_elements=600)
+
+    def test_no_match(self):
+        plan = ExtractionPlan([2, 0, 0], [1, 20, 30], [1, 1, 1])
+        self.assertEqual(plan.match([0, 0, 0], [1, 10, 30]), None)
+        self.assertEqual(plan.match([2, 10, 0], [1, 10, 30]), [(0, 1), (10, 20), (0, 30)])
+
+        # A stride which steps over the whole bounded array
+        plan = ExtractionPlan([0, 0, 0], [4, 20, 30], [1, 15, 1])
+        self.assertEqual(plan.match([0, 10, 0], [1, 5, 30]), None)
+
+    def test_outside_variable(self):
+        plan = ExtractionPlan([0, 0, 25], [1, 10, 10], [1, 1, 1])
+        region, start, count = list(plan.chunks(15000))[0]
+
+        target = plan.chunk_array(region, numpy.float64)
+        ba_origins, ba_sizes, array = self.bounded_arrays[0]
+        ranges = plan.match(ba_origins, ba_sizes)
+
+        # Only the first 5 of each 10 requested in the last dimension exist
+        self.assertEqual(plan.copy(target, region, ranges, ba_origins, array), 50)
+        self.assertEqual(count, 100)
+
+    def test_rank(self):
+        plan = ExtractionPlan([0, 0], [4, 20], [1, 1])
+        self.assertRaises(ExtractionError, plan.match, [0, 0, 0], [1, 10, 30])
+
+    def test_scalar(self):
+        plan = ExtractionPlan([], [], [])
+        chunks = list(plan.chunks(15000))
+        self.assertEqual(chunks, [([], 0, 1)])
+
+        target = plan.chunk_array([], numpy.float64)
+        self.assertEqual(plan.copy(target, [], plan.match([], []), [], numpy.array(42.0)), 1)
+        self.assertEqual(target.ravel().tolist(), [42.0])
+
+
+class ChunkSizeTest(unittest.TestCase):
+
+    def test_fixed_size(self):
+        self.assertEqual(chunk_elements(100 * 1024, numpy.float64), 100 * 1024 / 10)
+        self.assertEqual(chunk_elements(100 * 1024, numpy.int32), 100 * 1024 / 6)
+        self.assertEqual(chunk_elements(4, numpy.float64), 1)
+
+    def test_sampled_strings(self):
+        sample = numpy.array(['x' * 18, 'y' * 38], dtype=object)
+        self.assertEqual(chunk_elements(3000, object, sample), 100)
+
+        # No sample - a guess
+        self.assertTrue(chunk_elements(3000, object) > 0)
+
+
+class SendWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+
+    def _send(self, value):
+        d = defer.Deferred()
+        self.sent.append((value, d))
+        return d
+
+    def test_window(self):
+        window = SendWindow(2)
+
+        window.send(self._send, 1)
+        window.send(self._send, 2)
+        self.assertEqual(len(self.sent), 2)
+
+        # The window is full - the third send waits for the first
+        d = window.send(self._send, 3)
+        self.assertFalse(d.called)
+        self.assertEqual(len(self.sent), 2)
+
+        self.sent[0][1].callback(None)
+        self.assertTrue(d.called)
+        self.assertEqual([value for value, d in self.sent], [1, 2, 3])
+        self.assertEqual(window.max_in_flight, 2)
+
+        flushed = window.flush()
+        self.assertFalse(flushed.called)
+        self.sent[1][1].callback(None)
+        self.sent[2][1].callback(None)
+        self.assertTrue(flushed.called)
+
+    def test_failure(self):
+        window = SendWindow(4)
+        window.send(self._send, 1)
+        self.sent[0][1].errback(ExtractionError('broken'))
+
+        d = window.flush()
+        return self.assertFailure(d, ExtractionError)
+
+    @defer.inlineCallbacks
+    def test_failure_in_window(self):
+        window = SendWindow(2)
+        window.send(self._send, 1)
+        window.send(self._send, 2)
+
+        # The send waiting for room fails with the failure of the second send, and is not started
+        d = window.send(self._send, 3)
+        self.sent[1][1].errback(ExtractionError('broken'))
+        self.sent[0][1].callback(None)
+        yield self.assertFailure(d, ExtractionError)
+        self.assertEqual(len(self.sent), 2)
+
+        # So does every flush after it - nothing is left in flight
+        yield self.assertFailure(window.flush(), ExtractionError)
+        yield self.assertFailure(window.flush(), ExtractionError)
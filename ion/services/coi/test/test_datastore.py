@@ -38,6 +38,7 @@ from ion.services.coi.datastore import ION_DATASETS_CFG, PRELOAD_CFG, ID_CFG, Da
 from ion.services.coi.datastore_bootstrap.ion_preload_config import HAS_A_ID, DATASET_RESOURCE_TYPE_ID, ROOT_USER_ID, NAME_CFG, CONTENT_ARGS_CFG, PREDICATE_CFG, ION_RESOURCE_TYPES_CFG, ION_PREDICATES_CFG, ION_IDENTITIES_CFG
 
 from ion.services.coi.datastore_bootstrap.ion_preload_config import ION_DATASETS, ION_PREDICATES, ION_RESOURCE_TYPES, ION_IDENTITIES, ION_AIS_RESOURCES_CFG, ION_AIS_RESOURCES, SAMPLE_PROFILE_DATASET_ID, HAS_A_ID
+from ion.services.coi.datastore_bootstrap.ion_preload_config import OWNED_BY_ID
 
 from ion.core.object.workbench import REQUEST_COMMIT_BLOBS_MESSAGE_TYPE, BLOBS_MESSAGE_TYPE, IDREF_TYPE, GET_OBJECT_REQUEST_MESSAGE_TYPE, GPBTYPE_TYPE, DATA_REQUEST_MESSAGE_TYPE
 from ion.core.object.gpb_wrapper import StructureElement
@@ -142,6 +143,38 @@ class DataStoreTest(IonTestCase):
 
         log.info('DataStore1 Push addressbook to DataStore1: complete')
 
+    @defer.inlineCallbacks
+    def test_push_ownership(self):
+
+        published = []
+        def publish(resource_ids):
+            published.append(set(resource_ids))
+            return defer.succeed(None)
+        self.ds1.publish_ownership_changes = publish
+
+        yield self.wb1.workbench.pull('datastore', OWNED_BY_ID)
+        owned_by = self.wb1.workbench.get_repository(OWNED_BY_ID)
+        owned_by.checkout('master')
+
+        yield self.wb1.workbench.pull('datastore', ROOT_USER_ID)
+        root = self.wb1.workbench.get_repository(ROOT_USER_ID)
+        root.checkout('master')
+
+        repo = self.wb1.workbench.get_repository(self.repo_key)
+        association = self.wb1.workbench.create_association(repo, owned_by, root)
+
+        yield self.wb1.workbench.push('datastore', [repo, association.Repository])
+        self.assertEqual(published, [set([self.repo_key])])
+
+        # The ownership goes when the association is set to null
+        association.SetNull()
+        yield self.wb1.workbench.push('datastore', association.Repository)
+        self.assertEqual(published[1:], [set([self.repo_key])])
+
+        # Other pushes leave the ownership as it is
+        yield self.wb1.workbench.push_by_name('datastore', self.repo_key)
+        self.assertEqual(len(published), 2)
+
 
     @defer.inlineCallbacks
     def test_existence(self):
@@ -479,6 +512,44 @@ class DataStoreTest(IonTestCase):
         self.assertEqual(ab.title,'Datastore Addressbook')
 
 
+    @defer.inlineCallbacks
+    def test_pull_only_missing_commits(self):
+
+        repo = self.wb1.workbench.get_repository(self.repo_key)
+        for i in range(20):
+            repo.root_object.title = 'version %d' % i
+            repo.commit('Update %d' % i)
+
+        result = yield self.wb1.workbench.push_by_name('datastore',self.repo_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        tp = Process()
+        yield tp.spawn()
+
+        result = yield tp.workbench.pull('datastore',self.repo_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+        self.assertEqual(len(result.commit_elements), 21)
+
+        repo.root_object.title = 'New Addressbook'
+        repo.commit('An updated addressbook')
+
+        result = yield self.wb1.workbench.push_by_name('datastore',self.repo_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        # Answered from the persistent store, not the datastore workbench
+        self.ds1.workbench.clear()
+
+        result = yield tp.workbench.pull('datastore',self.repo_key)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        # Only the new commit is sent
+        self.assertEqual(len(result.commit_elements), 1)
+
+        repo2 = tp.workbench.get_repository(self.repo_key)
+        ab = yield repo2.checkout('master')
+        self.assertEqual(ab.title, 'New Addressbook')
+        self.assertEqual(len(tp.workbench.list_repository_commits(repo2)), 22)
+
     @defer.inlineCallbacks
     def test_push_clear_pull_branched(self):
 
@@ -8,7 +8,7 @@
 
 from ion.core.object import object_utils
 from ion.core.messaging.message_client import MessageClient
-from twisted.internet import defer
+from twisted.internet import defer, reactor
 from ion.services.dm.distribution.publisher_subscriber import Publisher, Subscriber
 from ion.core import ioninit
 
@@ -44,6 +44,7 @@ DATASOURCE_UPDATE_EVENT_ID = 1101
 DATASOURCE_UNAVAILABLE_EVENT_ID = 1102
 DATASET_SUPPLEMENT_ADDED_EVENT_ID = 1111
 BUSINESS_STATE_MODIFICATION_EVENT_ID = 1112
+OWNERSHIP_CHANGE_EVENT_ID = 1113
 NEW_SUBSCRIPTION_EVENT_ID = 1201
 DEL_SUBSCRIPTION_EVENT_ID = 1202
 SCHEDULE_EVENT_ID = 2001
@@ -52,6 +53,52 @@ LOGGING_ERROR_EVENT_ID = 3002
 LOGGING_CRITICAL_EVENT_ID = 3001
 DATABLOCK_EVENT_ID = 4001
 
+# The batch window used when only a batch size is given to an EventPublisher
+DEFAULT_BATCH_WINDOW = 0.1
+
+class EventTemplate(object):
+    """
+    The fields of an event message and of its additional_data message, worked out once for each type of event so
+    that create_event does not need to look them up on every message.
+
+    Each field name maps to whether it belongs to the additional_data message and, for enum fields, the enum used
+    to translate the name of a member into its value. Names in both messages belong to the event message, as
+    they did when the fields were looked up on each message in turn.
+    """
+
+    def __init__(self, event_msg, additional_event_msg):
+        self.fields = {}
+        for is_additional, msg in ((True, additional_event_msg), (False, event_msg)):
+            for name, prop in msg._Properties.iteritems():
+                field_enum = None
+                if prop.field_type == "TYPE_ENUM":
+                    field_enum = prop.field_enum
+                self.fields[name] = (is_additional, field_enum)
+
+    def fill(self, event_msg, additional_event_msg, msgargs, msg_type=None):
+        """
+        Sets the fields of the two messages from the dict msgargs. Raises an Exception naming any keys which are not
+        fields of either message.
+        """
+        fields = self.fields
+        unused = [k for k in msgargs if not k in fields]
+        if unused:
+            raise Exception("create_event: unused kwargs remaining (%s), unused by base event message and msg type id %s" % (str(dict([(k, msgargs[k]) for k in unused])), str(msg_type)))
+
+        for k,v in msgargs.iteritems():
+            is_additional, field_enum = fields[k]
+
+            # is this an enum field and we've passed a string that looks like it could be a name?
+            if field_enum is not None and isinstance(v, str):
+                # translate v into the real value
+                assert hasattr(field_enum, v)
+                v = getattr(field_enum, v)
+
+            if is_additional:
+                setattr(additional_event_msg, k, v)
+            else:
+                setattr(event_msg, k, v)
+
 
 class EventPublisher(Publisher):
     """
@@ -98,6 +145,9 @@ class EventPublisher(Publisher):
     msg_type = None
     event_id = None
 
+    # EventTemplates by EventPublisher class, shared by all instances
+    _templates = {}
+
     class Status:
         """
         The enum Status as defined in the EventMessage object.
@@ -123,38 +173,29 @@ class EventPublisher(Publisher):
 
         @param origin   Sets the origin used in the topic when publishing the event.
                         This can be overridden when calling publish.
+        @param batch_size   Keyword only. If set, publish_event queues events and sends them together once this many
+                            are queued, or when the batch window ends - whichever comes first. Each event is still
+                            published as a message of its own; the sends of a batch just do not wait for each other.
+        @param batch_window Keyword only. If set, publish_event queues events and sends them together at most this
+                            many seconds after the first of them was queued. Defaults to DEFAULT_BATCH_WINDOW if only
+                            batch_size is set.
         """
         self._origin = origin
         self._mc = MessageClient(proc=process)
 
+        self._batch_size = kwargs.pop('batch_size', None)
+        self._batch_window = kwargs.pop('batch_window', None)
+        if self._batch_size and not self._batch_window:
+            self._batch_window = DEFAULT_BATCH_WINDOW
+
+        self._batch = []
+        self._batch_call = None
+
         xp_name = xp_name or get_events_exchange_point()
         routing_key = routing_key or "unknown"
 
         Publisher.__init__(self, xp_name=xp_name, routing_key=routing_key, process=process, *args, **kwargs)
 
-    def _set_msg_fields(self, msg, msgargs):
-        """
-        Helper method to set fields of a Message instance. Used by create_event.
-
-        @param msg      The Message instance to set fields on.
-        @param msgargs  The dict of field -> values to set fields on the msg with. As fields are found in
-                        the message and set, they are removed from the msgarms param. Passed by ref from
-                        create_event. When an Enum field is discovered that we are trying to set, this method
-                        attempts to find the real enum value by the name of the enum member passed in.
-        """
-        for k,v in msgargs.items():
-            if hasattr(msg, k):
-                log.debug("_set_msg_fields: setting field %s" % k)
-                # is this an enum field and we've passed a string that looks like it could be a name?
-                if msg._Properties[k].field_type == "TYPE_ENUM" and isinstance(v, str):
-                    # translate v into the real value
-                    assert hasattr(msg._Properties[k].field_enum, v)
-                    v = getattr(msg._Properties[k].field_enum, v)
-                    log.debug("Setting enum field %s to %s" % (str(k), str(v)))
-
-                setattr(msg, k, v)
-                msgargs.pop(k)
-
     @defer.inlineCallbacks
     def create_event(self, **kwargs):
         """
@@ -169,23 +210,21 @@ class EventPublisher(Publisher):
             log.debug("Automatically setting 'datetime' field")
             kwargs['datetime'] = time.time()
 
-        # copy kwargs into local list
-        msgargs = kwargs.copy()
-        log.debug("create_event has %d kwargs to set" % len(msgargs))
+        log.debug("create_event has %d kwargs to set" % len(kwargs))
 
-        # create base event message, assign values from kwargs
+        # create base event message and the additional event msg (specific to this event notification)
+        # each event is a repository of its own: its identity is the repository key, and the caller may change it
+        # before it is published, so it is created here rather than copied from the template
         event_msg = yield self._mc.create_instance(EVENT_MESSAGE_TYPE)
-        self._set_msg_fields(event_msg, msgargs)
-
-        # create additional event msg (specific to this event notification), assign values from kwargs
         additional_event_msg = event_msg.CreateObject(self.msg_type)
-        self._set_msg_fields(additional_event_msg, msgargs)
 
-        # error checking: see if we have any remaining kwargs
-        if len(msgargs) > 0:
-            raise Exception("create_event: unused kwargs remaining (%s), unused by base event message and msg type id %s" % (str(msgargs), str(self.msg_type)))
+        # assign values from kwargs, through the fields of this type of event
+        template = self._templates.get(self.__class__, None)
+        if template is None:
+            template = EventTemplate(event_msg, additional_event_msg)
+            self._templates[self.__class__] = template
 
-        # TODO: perhaps check to make sure additional_event_msg and event_msg have exclusive attribute names, or we'll assign to one and not the other
+        template.fill(event_msg, additional_event_msg, kwargs, self.msg_type)
 
         # link them
         event_msg.additional_data = additional_event_msg
@@ -203,9 +242,60 @@ class EventPublisher(Publisher):
         assert origin and origin != "unknown", 'Error - No origin publishing event message:\n %s' % str(event_msg)
 
         routing_key=self.topic(origin)
-        log.debug("Publishing message to %s" % routing_key)
 
-        yield self.publish(event_msg, routing_key=routing_key)
+        if self._batch_window:
+            yield self._queue_event(event_msg, routing_key)
+        else:
+            log.debug("Publishing message to %s" % routing_key)
+            yield self.publish(event_msg, routing_key=routing_key)
+
+    def _queue_event(self, event_msg, routing_key):
+        """
+        Adds an event to the batch. Sends the batch if it is full, and returns the deferred of the send so that a
+        fast publisher waits for it; otherwise makes sure the batch is sent when the window ends.
+        """
+        self._batch.append((event_msg, routing_key))
+
+        if self._batch_size and len(self._batch) >= self._batch_size:
+            return self.flush()
+
+        if self._batch_call is None:
+            self._batch_call = reactor.callLater(self._batch_window, self.flush)
+
+        return defer.succeed(None)
+
+    def flush(self):
+        """
+        Sends the events queued by publish_event in batched mode, one publish for each, all at once.
+
+        @returns A deferred which fires once all of them are sent.
+        """
+        if self._batch_call is not None:
+            if self._batch_call.active():
+                self._batch_call.cancel()
+            self._batch_call = None
+
+        batch, self._batch = self._batch, []
+        if not batch:
+            return defer.succeed(None)
+
+        log.debug("Publishing batch of %d events" % len(batch))
+
+        def check(results):
+            for success, result in results:
+                if not success:
+                    log.error("Error publishing batched event: %s" % result.getErrorMessage())
+
+        d = defer.DeferredList([self.publish(event_msg, routing_key=routing_key) for event_msg, routing_key in batch],
+                               consumeErrors=True)
+        d.addCallback(check)
+        return d
+
+    def on_terminate(self, *args, **kwargs):
+        """
+        Sends any events still queued in batched mode.
+        """
+        return self.flush()
 
     @defer.inlineCallbacks
     def create_and_publish_event(self, **kwargs):
@@ -323,6 +413,14 @@ class BusinessStateModificationEventPublisher(ResourceModifiedEventPublisher):
     The "origin" parameter in this class' initializer should be the process' exchange name (TODO: correct?)
     """
     event_id = BUSINESS_STATE_MODIFICATION_EVENT_ID
+
+class OwnershipChangeEventPublisher(ResourceModifiedEventPublisher):
+    """
+    Event Notification Publisher for a change of the owner of a resource.
+
+    The "origin" parameter in this class' initializer should be the resource id (UUID).
+    """
+    event_id = OWNERSHIP_CHANGE_EVENT_ID
     
 class NewSubscriptionEventPublisher(EventPublisher):
     """
@@ -540,6 +638,14 @@ class BusinessStateChangeSubscriber(ResourceModifiedEventSubscriber):
     The "origin" parameter in this class' initializer should be the process' exchagne name (TODO: correct?)
     """
     event_id = BUSINESS_STATE_MODIFICATION_EVENT_ID
+
+class OwnershipChangeEventSubscriber(ResourceModifiedEventSubscriber):
+    """
+    Event Notification Subscriber for a change of the owner of a resource.
+
+    The "origin" parameter in this class' initializer should be the resource id (UUID).
+    """
+    event_id = OWNERSHIP_CHANGE_EVENT_ID
     
 class NewSubscriptionEventSubscriber(EventSubscriber):
     """
@@ -276,7 +276,7 @@ class Subscriber(BasicLifecycleObject, PSCRegisterable):
     @todo Need a subscriber receiver that can hook into the topic xchg mechanism
     """
 
-    def __init__(self, xp_name=None, binding_key=None, queue_name=None, credentials=None, process=None, durable=False, auto_delete=True, *args, **kwargs):
+    def __init__(self, xp_name=None, binding_key=None, queue_name=None, credentials=None, process=None, durable=False, auto_delete=True, prefetch_count=None, *args, **kwargs):
         """
         Initializer for Subscribers.
 
@@ -291,6 +291,8 @@ class Subscriber(BasicLifecycleObject, PSCRegisterable):
                             restarts. This should not be specified with an anonymous queue name.
         @param  auto_delete If the queue has the auto_delete setting (AMQP), which means that on last consumer detatch
                             from that queue, the queue is deleted.
+        @param  prefetch_count  The number of messages the broker delivers before waiting for an ack. Defaults to the
+                                receiver configuration - see Receiver.
         """
         BasicLifecycleObject.__init__(self)
 
@@ -329,7 +331,8 @@ class Subscriber(BasicLifecycleObject, PSCRegisterable):
                             str(len(process._registered_life_cycle_objects))
         self._recv = WorkerReceiver(self._sub_name, process=process,
                                     handler=self._receive_handler,
-                                    consumer_config=consumer_config)
+                                    consumer_config=consumer_config,
+                                    prefetch_count=prefetch_count)
 
 
     def on_initialize(self, *args, **kwargs):
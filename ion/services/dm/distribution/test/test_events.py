@@ -203,6 +203,81 @@ class TestEventPublisher(IonTestCase):
         self.failUnlessEquals(self.lastmsg.name, "bram")
         self.failUnlessEquals(self.lastmsg.origin, "zxy-402")   # both set in the msg field named "origin" and used for routing key. interesting quirk. 
 
+    @defer.inlineCallbacks
+    def test_event_template(self):
+        """
+        create_event works out the fields of a type of event once and shares them between publishers.
+        """
+        pub1 = ResourceLifecycleEventPublisher(process=self._proc)
+        yield pub1.initialize()
+        yield pub1.activate()
+
+        msg1 = yield pub1.create_event(name="bram", state='ACTIVE')
+        template = EventPublisher._templates[ResourceLifecycleEventPublisher]
+        self.failUnlessEqual(msg1.name, "bram")
+        self.failUnlessEqual(msg1.additional_data.state, msg1.additional_data.State.ACTIVE)
+
+        pub2 = ResourceLifecycleEventPublisher(process=self._proc)
+        yield pub2.initialize()
+        yield pub2.activate()
+
+        msg2 = yield pub2.create_event(name="stoker")
+        self.failUnless(EventPublisher._templates[ResourceLifecycleEventPublisher] is template)
+        self.failUnlessEqual(msg2.name, "stoker")
+
+        # fields set on one message are not carried over to the next
+        self.failIf(msg2.additional_data.IsFieldSet('state'))
+
+        yield self.failUnlessFailure(pub2.create_event(name="bram", nofield=1), Exception)
+
+    @defer.inlineCallbacks
+    def test_batch_publish_event(self):
+        """
+        With a batch size, publish_event holds events until the batch is full, the window ends or the publisher
+        is flushed.
+        """
+        pub1 = ResourceLifecycleEventPublisher(process=self._proc, origin="species", batch_size=3, batch_window=0.5)
+        yield pub1.initialize()
+        yield pub1.activate()
+
+        self.sent = []
+        def fake_publish(data, routing_key=""):
+            self.sent.append((data, routing_key))
+            return defer.succeed(True)
+
+        pub1.publish = fake_publish
+
+        msgs = []
+        for name in ("bram", "stoker", "dracula", "harker"):
+            msg = yield pub1.create_event(name=name)
+            msgs.append(msg)
+
+        # the batch is sent once it is full
+        yield pub1.publish_event(msgs[0])
+        yield pub1.publish_event(msgs[1])
+        self.failUnlessEqual(len(self.sent), 0)
+        yield pub1.publish_event(msgs[2])
+        self.failUnlessEqual([m.name for m, k in self.sent], ["bram", "stoker", "dracula"])
+        self.failUnlessEqual(self.sent[0][1], "%s.species" % str(RESOURCE_LIFECYCLE_EVENT_ID))
+
+        # or when flushed
+        yield pub1.publish_event(msgs[3])
+        self.failUnlessEqual(len(self.sent), 3)
+        yield pub1.flush()
+        self.failUnlessEqual(self.sent[-1][0].name, "harker")
+
+        # or when the window ends
+        yield pub1.publish_event(msgs[0], "other")
+        self.failUnlessEqual(len(self.sent), 4)
+        yield pu.asleep(1.0)
+        self.failUnlessEqual(len(self.sent), 5)
+        self.failUnlessEqual(self.sent[-1][1], "%s.other" % str(RESOURCE_LIFECYCLE_EVENT_ID))
+
+        # anything left is sent when the publisher terminates
+        yield pub1.publish_event(msgs[1])
+        yield pub1.terminate()
+        self.failUnlessEqual(len(self.sent), 6)
+
     @defer.inlineCallbacks
     def test_topic_extension(self):
         """
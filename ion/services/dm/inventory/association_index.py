@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/dm/inventory/association_index.py
+@brief An in memory index of the head commits of associations and resources, kept by the association service
+
+The datastore writes index attributes with every commit it stores: the repository and branch of the commit, the
+subject, predicate and object of an association, the type and life cycle state of a resource. The branch name is set
+only while the commit is the head of its branch. The index holds the attributes of the head commits and looks them up
+by the combinations of attributes the association service searches on, so that each search is a dictionary lookup
+rather than a query of the commit store.
+"""
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+from ion.core.data.storage_configuration_utility import REPOSITORY_KEY, BRANCH_NAME, SUBJECT_KEY, PREDICATE_KEY
+from ion.core.data.storage_configuration_utility import OBJECT_KEY, RESOURCE_OBJECT_TYPE, RESOURCE_LIFE_CYCLE_STATE
+from ion.core.data.storage_configuration_utility import COMMIT_INDEXED_COLUMNS
+
+
+class AssociationIndex(object):
+    """
+    Head commit rows - their index attributes - by key, and indices from combinations of attribute values to keys.
+    Feed it with update(key, row) for every row written to the commit store, for instance as a listener of the store.
+    """
+
+    # The combinations of attributes which are indexed - most specific first
+    VIEWS = [(SUBJECT_KEY, PREDICATE_KEY, OBJECT_KEY),
+             (PREDICATE_KEY, OBJECT_KEY),
+             (SUBJECT_KEY, PREDICATE_KEY),
+             (RESOURCE_OBJECT_TYPE, RESOURCE_LIFE_CYCLE_STATE),
+             (REPOSITORY_KEY,),
+             (SUBJECT_KEY,),
+             (OBJECT_KEY,),
+             (PREDICATE_KEY,),
+             (RESOURCE_OBJECT_TYPE,)]
+
+    def __init__(self):
+        self.rows = {}
+        self._views = dict([(view, {}) for view in self.VIEWS])
+
+        self.lookups = 0
+        self.scans = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def load(self, rows):
+        """
+        Add the result of a query of the commit store for the head commits
+        """
+        for key, row in rows.iteritems():
+            self.update(key, row)
+
+        log.info('Association index loaded %d head commits' % len(self.rows))
+
+    def update(self, key, row):
+        """
+        The row of a commit has been written - or removed if row is None. Only head commits are kept.
+        """
+        self._discard(key)
+
+        if row is None or not row.get(BRANCH_NAME):
+            return
+
+        row = dict([(name, row[name]) for name in COMMIT_INDEXED_COLUMNS if row.has_key(name)])
+        self.rows[key] = row
+
+        for view, index in self._views.iteritems():
+            values = self._values(view, row)
+            if values is not None:
+                index.setdefault(values, set()).add(key)
+
+    def _discard(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+
+        for view, index in self._views.iteritems():
+            values = self._values(view, row)
+            if values is None:
+                continue
+            keys = index[values]
+            keys.discard(key)
+            if not keys:
+                del index[values]
+
+    def _values(self, view, row):
+        values = []
+        for name in view:
+            value = row.get(name)
+            if value is None:
+                return None
+            values.append(value)
+        return tuple(values)
+
+    def find(self, attributes):
+        """
+        @param attributes a dictionary of the attribute values to match
+        @retval a dictionary of the matching head commit rows by key - as a query of the commit store with an equal
+        to predicate for each attribute and branch name greater than ''
+        """
+        names = set(attributes.keys())
+
+        for view in self.VIEWS:
+            if names.issuperset(view):
+                self.lookups += 1
+                keys = self._views[view].get(tuple([attributes[name] for name in view]), ())
+                others = names.difference(view)
+                break
+        else:
+            self.scans += 1
+            keys = self.rows.keys()
+            others = names
+
+        result = {}
+        for key in keys:
+            row = self.rows[key]
+            for name in others:
+                if row.get(name) != attributes[name]:
+                    break
+            else:
+                result[key] = row.copy()
+        return result
@@ -26,6 +26,7 @@ from ion.core.data.storage_configuration_utility import get_cassandra_configurat
 from ion.services.coi.datastore_bootstrap.ion_preload_config import HAS_LIFE_CYCLE_STATE_ID, TYPE_OF_ID
 
 from ion.core.data import store
+from ion.services.dm.inventory.association_index import AssociationIndex
 
 from ion.core.object import object_utils
 
@@ -83,6 +84,10 @@ class AssociationService(ServiceProcess):
         # Get the configuration for cassandra - may or may not be used depending on the backend class
         self._storage_conf = get_cassandra_configuration()
 
+        # Keep an in memory index of the head commits - if the index store tells us about the rows written to it
+        self._use_index = self.spawn_args.get('association_index', CONF.getValue('association_index', True))
+        self.index = None
+
 
 
     @defer.inlineCallbacks
@@ -101,8 +106,42 @@ class AssociationService(ServiceProcess):
         else:
             self.index_store = self.index_store_class(self, indices=COMMIT_INDEXED_COLUMNS )
 
+        if self._use_index and hasattr(self.index_store, 'add_listener'):
+            self.index = AssociationIndex()
+
+            # Listen first so that no commit written during the query is missed
+            self.index_store.add_listener(self.index.update)
+
+            q = store.Query()
+            q.add_predicate_gt(BRANCH_NAME,'')
+            rows = yield self.index_store.query(q)
+            self.index.load(rows)
+
         log.info('SLC_INIT Association Service: index store class - %s' % self.index_store_class)
 
+    def slc_terminate(self):
+        if self.index is not None:
+            self.index_store.remove_listener(self.index.update)
+            self.index = None
+
+    def _find_heads(self, attributes):
+        """
+        Find the head commits with these attribute values - from the association index if there is one, otherwise by
+        a query of the index store.
+        @retval a deferred dictionary of the commit rows by key
+        """
+        if self.index is not None:
+            return defer.succeed(self.index.find(attributes))
+
+        q = store.Query()
+        # Get only the latest version!
+        q.add_predicate_gt(BRANCH_NAME,'')
+
+        for name, value in attributes.items():
+            q.add_predicate_eq(name, value)
+
+        return self.index_store.query(q)
+
     @defer.inlineCallbacks
     def op_get_subjects(self, predicate_object_query, headers, msg):
         """
@@ -129,11 +168,6 @@ class AssociationService(ServiceProcess):
 
         for pair in predicate_object_query.pairs:
 
-
-            q = store.Query()
-            # Get only the latest version of the association!
-            q.add_predicate_gt(BRANCH_NAME,'')
-
             # Build a query for the predicate of the search
             if pair.predicate.ObjectType != PREDICATE_REFERENCE_TYPE:
                 raise AssociationServiceError('Invlalid predicate type in predicate object pairs request to get_subjects.', predicate_object_query.ResponseCodes.BAD_REQUEST)
@@ -162,11 +196,8 @@ class AssociationService(ServiceProcess):
                     raise AssociationServiceError('Invalid search by type - two predicate object pairs in the query specify type_of. There can be only One!', predicate_object_query.ResponseCodes.BAD_REQUEST)
                 continue
 
-            q.add_predicate_eq(PREDICATE_KEY, pair.predicate.key)
-
-            q.add_predicate_eq(OBJECT_KEY, pair.object.key)
-
-            rows = yield self.index_store.query(q)
+            # Get only the latest version of the association!
+            rows = yield self._find_heads({PREDICATE_KEY:pair.predicate.key, OBJECT_KEY:pair.object.key})
 
             # subject_pointers is the resulting set of pointers to the current state of the association subject
             subjects_pointers = set()
@@ -183,11 +214,8 @@ class AssociationService(ServiceProcess):
                 current_keys.add(row[SUBJECT_KEY])
 
                 # Get the latest commits for the Subject_Key
-                subject_query = store.Query()
                 # Get only the head or get all? Hmmm not sure...
-                subject_query.add_predicate_gt(BRANCH_NAME,'')
-                subject_query.add_predicate_eq(REPOSITORY_KEY,row[SUBJECT_KEY])
-                subject_heads = yield self.index_store.query(subject_query)
+                subject_heads = yield self._find_heads({REPOSITORY_KEY:row[SUBJECT_KEY]})
 
                 branches = []
                 for commit_key, commit_row in subject_heads.items():
@@ -228,20 +256,15 @@ class AssociationService(ServiceProcess):
                 raise AssociationServiceError('Illegal request to association service. Can not return all subjects by life cycle - there are too many!')
 
             # Now we are not searching for associations - we are taking a shortcut - straight to the denormalized row for a resource commit!
-            q = store.Query()
-            q.add_predicate_gt(BRANCH_NAME,'')
-
 
             # This is by definition a search for a Resource
-            q.add_predicate_eq(RESOURCE_OBJECT_TYPE, type_of_pair.object.key)
-
+            attributes = {RESOURCE_OBJECT_TYPE:type_of_pair.object.key}
 
             if life_cycle_pair:
-                q.add_predicate_eq(RESOURCE_LIFE_CYCLE_STATE, str(life_cycle_pair.object.lcs))
-
+                attributes[RESOURCE_LIFE_CYCLE_STATE] = str(life_cycle_pair.object.lcs)
 
             # Get all the results that meet the type / state query
-            rows = yield self.index_store.query(q)
+            rows = yield self._find_heads(attributes)
 
             # This is a simple search - just add the results!
             for key, row in rows.items():
@@ -259,22 +282,18 @@ class AssociationService(ServiceProcess):
             for subject in subjects:
 
                 # There for, for each result - check and see if it meets the criteria by type and state...
-                q = store.Query()
-
-                # Test this repository key
-                q.add_predicate_eq(REPOSITORY_KEY, subject[0])
 
-                # Latest state
-                q.add_predicate_gt(BRANCH_NAME,'')
+                # Test this repository key - latest state
+                attributes = {REPOSITORY_KEY:subject[0]}
 
                 if life_cycle_pair:
-                    q.add_predicate_eq(RESOURCE_LIFE_CYCLE_STATE, str(life_cycle_pair.object.lcs))
+                    attributes[RESOURCE_LIFE_CYCLE_STATE] = str(life_cycle_pair.object.lcs)
 
                 if type_of_pair:
-                    q.add_predicate_eq(RESOURCE_OBJECT_TYPE, type_of_pair.object.key)
+                    attributes[RESOURCE_OBJECT_TYPE] = type_of_pair.object.key
 
                 # Get all the results that meet the type / state query
-                rows = yield self.index_store.query(q)
+                rows = yield self._find_heads(attributes)
 
                 for key, row in rows.items():
 
@@ -330,21 +349,13 @@ class AssociationService(ServiceProcess):
 
         for pair in subject_predicate_query.pairs:
 
-
-            q = store.Query()
-            # Get only the latest version of the association!
-            q.add_predicate_gt(BRANCH_NAME,'')
-
             # Build a query for the predicate of the search
             if pair.predicate.ObjectType != PREDICATE_REFERENCE_TYPE:
                 raise AssociationServiceError('Invlalid predicate type in subject predicate pairs request to get_objects.', subject_predicate_query.ResponseCodes.BAD_REQUEST)
 
 
-            q.add_predicate_eq(PREDICATE_KEY, pair.predicate.key)
-
-            q.add_predicate_eq(SUBJECT_KEY, pair.subject.key)
-
-            rows = yield self.index_store.query(q)
+            # Get only the latest version of the association!
+            rows = yield self._find_heads({PREDICATE_KEY:pair.predicate.key, SUBJECT_KEY:pair.subject.key})
 
             # subject_pointers is the resulting set of pointers to the current state of the association subject
             objects_pointers = set()
@@ -359,11 +370,8 @@ class AssociationService(ServiceProcess):
                 current_keys.add(row[OBJECT_KEY])
 
                 # Get the latest commits for the Subject_Key
-                object_query = store.Query()
                 # Get only the head or get all? Hmmm not sure...
-                object_query.add_predicate_gt(BRANCH_NAME,'')
-                object_query.add_predicate_eq(REPOSITORY_KEY,row[OBJECT_KEY])
-                object_heads = yield self.index_store.query(object_query)
+                object_heads = yield self._find_heads({REPOSITORY_KEY:row[OBJECT_KEY]})
 
                 branches = []
                 for commit_key, commit_row in object_heads.items():
@@ -425,13 +433,8 @@ class AssociationService(ServiceProcess):
             raise AssociationServiceError('Unexpected type received \n %s' % str(object_reference), object_reference.ResponseCodes.BAD_REQUEST)
 
 
-        q = store.Query()
         # Get only the latest version of the association!
-        q.add_predicate_gt(BRANCH_NAME,'')
-
-        q.add_predicate_eq(OBJECT_KEY, object_reference.key)
-
-        rows = yield self.index_store.query(q)
+        rows = yield self._find_heads({OBJECT_KEY:object_reference.key})
 
 
         list_of_associations = yield self.message_client.create_instance(QUERY_RESULT_TYPE)
@@ -482,13 +485,8 @@ class AssociationService(ServiceProcess):
         if subject_reference.MessageType != IDREF_TYPE:
             raise AssociationServiceError('Unexpected type received \n %s' % str(subject_reference), subject_reference.ResponseCodes.BAD_REQUEST)
 
-        q = store.Query()
         # Get only the latest version of the association!
-        q.add_predicate_gt(BRANCH_NAME,'')
-
-        q.add_predicate_eq(SUBJECT_KEY, subject_reference.key)
-
-        rows = yield self.index_store.query(q)
+        rows = yield self._find_heads({SUBJECT_KEY:subject_reference.key})
 
         list_of_associations = yield self.message_client.create_instance(QUERY_RESULT_TYPE)
 
@@ -583,17 +581,10 @@ class AssociationService(ServiceProcess):
         if association_query.MessageType != ASSOCIATION_QUERY_MSG_TYPE:
             raise AssociationServiceError('Unexpected type received \n %s' % str(association_query), association_query.ResponseCodes.BAD_REQUEST)
 
-        q = store.Query()
         # Get only the latest version of the association!
-        q.add_predicate_gt(BRANCH_NAME,'')
-
-        q.add_predicate_eq(SUBJECT_KEY, association_query.subject.key)
-
-        q.add_predicate_eq(PREDICATE_KEY, association_query.predicate.key)
-
-        q.add_predicate_eq(OBJECT_KEY, association_query.object.key)
-
-        return self.index_store.query(q)
+        return self._find_heads({SUBJECT_KEY:association_query.subject.key,
+                                 PREDICATE_KEY:association_query.predicate.key,
+                                 OBJECT_KEY:association_query.object.key})
 
 
     @defer.inlineCallbacks
@@ -606,20 +597,19 @@ class AssociationService(ServiceProcess):
         if association_query.MessageType != ASSOCIATION_QUERY_MSG_TYPE:
             raise AssociationServiceError('Unexpected type received \n %s' % str(association_query), association_query.ResponseCodes.BAD_REQUEST)
 
-        q = store.Query()
-        # Get only the latest version of the association!
-        q.add_predicate_gt(BRANCH_NAME,'')
+        attributes = {}
 
         if association_query.IsFieldSet('subject'):
-            q.add_predicate_eq(SUBJECT_KEY, association_query.subject.key)
+            attributes[SUBJECT_KEY] = association_query.subject.key
 
         if association_query.IsFieldSet('predicate'):
-            q.add_predicate_eq(PREDICATE_KEY, association_query.predicate.key)
+            attributes[PREDICATE_KEY] = association_query.predicate.key
 
         if association_query.IsFieldSet('object'):
-            q.add_predicate_eq(OBJECT_KEY, association_query.object.key)
+            attributes[OBJECT_KEY] = association_query.object.key
 
-        rows = yield self.index_store.query(q)
+        # Get only the latest version of the association!
+        rows = yield self._find_heads(attributes)
 
         response = yield self.message_client.create_instance(QUERY_RESULT_TYPE)
 
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/dm/inventory/test/test_association_index.py
+@test The association index against queries of the in memory index store it listens to
+"""
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from ion.core.data import store
+from ion.core.data.storage_configuration_utility import COMMIT_INDEXED_COLUMNS, REPOSITORY_KEY, BRANCH_NAME
+from ion.core.data.storage_configuration_utility import SUBJECT_KEY, SUBJECT_BRANCH, PREDICATE_KEY, OBJECT_KEY
+from ion.core.data.storage_configuration_utility import OBJECT_BRANCH, RESOURCE_OBJECT_TYPE, RESOURCE_LIFE_CYCLE_STATE
+
+from ion.services.dm.inventory.association_index import AssociationIndex
+
+
+class AssociationIndexTest(unittest.TestCase):
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.index_store = store.create_local_store(store.IndexStore, 'commits', indices=COMMIT_INDEXED_COLUMNS)
+
+        # Two resources - one of them has an older commit - and a commit which is not yet a head
+        yield self._put('r1_old', 'resource1', '', type='dataset', lcs='New')
+        yield self._put('r1', 'resource1', 'master', type='dataset', lcs='Active')
+        yield self._put('r2', 'resource2', 'master', type='user', lcs='Active')
+
+        # Associations between them
+        yield self._put('a1', 'assoc1', 'master', subject='resource1', predicate='owned_by', object='resource2')
+        yield self._put('a2', 'assoc2', 'master', subject='resource2', predicate='type_of', object='user_type')
+
+        self.index = AssociationIndex()
+        self.index_store.add_listener(self.index.update)
+
+        q = store.Query()
+        q.add_predicate_gt(BRANCH_NAME, '')
+        rows = yield self.index_store.query(q)
+        self.index.load(rows)
+
+    def tearDown(self):
+        self.index_store.remove_listener(self.index.update)
+
+    def _put(self, key, repository, branch, type=None, lcs=None, subject=None, predicate=None, object=None):
+        attributes = {REPOSITORY_KEY:repository, BRANCH_NAME:branch}
+        if type is not None:
+            attributes[RESOURCE_OBJECT_TYPE] = type
+            attributes[RESOURCE_LIFE_CYCLE_STATE] = lcs
+        if subject is not None:
+            attributes.update({SUBJECT_KEY:subject, SUBJECT_BRANCH:'master', PREDICATE_KEY:predicate,
+                               OBJECT_KEY:object, OBJECT_BRANCH:'master'})
+        return self.index_store.put(key, 'value of %s' % key, attributes)
+
+    @defer.inlineCallbacks
+    def _check(self, attributes):
+        """
+        The index finds what a query of the store finds - without the values
+        """
+        q = store.Query()
+        q.add_predicate_gt(BRANCH_NAME, '')
+        for name, value in attributes.items():
+            q.add_predicate_eq(name, value)
+        rows = yield self.index_store.query(q)
+        for row in rows.values():
+            del row['value']
+
+        self.assertEqual(self.index.find(attributes), rows)
+        defer.returnValue(sorted(rows.keys()))
+
+    @defer.inlineCallbacks
+    def test_find(self):
+        self.assertEqual(len(self.index), 4)
+
+        keys = yield self._check({PREDICATE_KEY:'owned_by', OBJECT_KEY:'resource2'})
+        self.assertEqual(keys, ['a1'])
+
+        keys = yield self._check({REPOSITORY_KEY:'resource1'})
+        self.assertEqual(keys, ['r1'])
+
+        keys = yield self._check({SUBJECT_KEY:'resource2', PREDICATE_KEY:'type_of', OBJECT_KEY:'user_type'})
+        self.assertEqual(keys, ['a2'])
+
+        keys = yield self._check({RESOURCE_OBJECT_TYPE:'dataset', RESOURCE_LIFE_CYCLE_STATE:'Active'})
+        self.assertEqual(keys, ['r1'])
+
+        keys = yield self._check({REPOSITORY_KEY:'resource2', RESOURCE_LIFE_CYCLE_STATE:'New'})
+        self.assertEqual(keys, [])
+
+        keys = yield self._check({})
+        self.assertEqual(keys, ['a1', 'a2', 'r1', 'r2'])
+
+        self.assertEqual(self.index.scans, 1)
+
+    @defer.inlineCallbacks
+    def test_updates(self):
+        # A new head replaces the old one - as op_push does it
+        yield self._put('r2_new', 'resource2', 'master', type='user', lcs='Retired')
+        yield self.index_store.update_index('r2', {BRANCH_NAME:''})
+
+        keys = yield self._check({REPOSITORY_KEY:'resource2'})
+        self.assertEqual(keys, ['r2_new'])
+
+        keys = yield self._check({RESOURCE_OBJECT_TYPE:'user', RESOURCE_LIFE_CYCLE_STATE:'Active'})
+        self.assertEqual(keys, [])
+
+        # A removed association
+        yield self.index_store.remove('a1')
+        self.assertEqual(self.index.find({PREDICATE_KEY:'owned_by', OBJECT_KEY:'resource2'}), {})
+
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(len(self.index._views[(PREDICATE_KEY, OBJECT_KEY)]), 1)
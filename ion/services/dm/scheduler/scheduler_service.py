@@ -15,7 +15,7 @@ from ion.core.object.repository import ObjectContainer
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
-from twisted.internet import defer, reactor
+from twisted.internet import defer
 import re
 from uuid import uuid4
 
@@ -29,12 +29,17 @@ from ion.services.dm.distribution.events import TriggerEventPublisher, ScheduleE
 from ion.core.data.storage_configuration_utility import get_cassandra_configuration, STORAGE_PROVIDER, PERSISTENT_ARCHIVE
 
 from ion.util.iontime import IonTime
+from ion.services.dm.scheduler.timer_wheel import TimerWheel, PeriodicTasks
 
 import ion.util.procutils as pu
 
 # get configuration
 from ion.core import ioninit
 CONF = ioninit.config(__name__)
+# Seconds between ticks of the timer wheel; tasks due within a tick fire together
+CF_timer_tick = CONF.getValue('timer_tick', 0.1)
+# Tasks read from the store at a time on activation
+CF_reload_page_size = CONF.getValue('reload_page_size', 1000)
 
 # constants from https://confluence.oceanobservatories.org/display/syseng/Scheduler+Events
 # import these and use them to schedule your events, they should be in the "desired origin" field
@@ -198,8 +203,8 @@ class SchedulerService(ServiceProcess):
 
         self.mc = MessageClient(proc=self)
 
-        # maps task_ids to IDelayedCall objects, popped off when callback is called, used to cancel tasks
-        self._callback_tasks = {}
+        # Scheduled tasks, by task_id; tasks of an interval due at the same tick share a timer
+        self._tasks = PeriodicTasks(TimerWheel(tick=CF_timer_tick), self._send_events)
 
         # will move pub through the lifecycle states with the service
         self.pub = ScheduleEventPublisher(process=self)
@@ -220,14 +225,21 @@ class SchedulerService(ServiceProcess):
 
     @defer.inlineCallbacks
     def slc_activate(self):
-        # get all items from the store
+        # get all items from the store, a page at a time
         query = Query()
         query.add_predicate_eq('constant', '1')
-        rows = yield self.scheduled_events.query(query)
-
-        for task_id, tdef in rows.iteritems():
-            log.debug("slc_activate: scheduling %s" % task_id)
-            self._schedule_event(int(tdef['start_time']), int(tdef['interval_seconds']), task_id)
+        cursor = None
+        while True:
+            rows, cursor = yield self.scheduled_events.query_page(query, CF_reload_page_size, cursor)
+            for task_id, tdef in rows:
+                starttime = tdef['start_time']
+                if starttime == 'None':
+                    starttime = None
+                self._schedule_event(starttime and int(starttime), int(tdef['interval_seconds']), task_id)
+            if cursor is None:
+                break
+
+        log.info('slc_activate: scheduled %d tasks' % len(self._tasks))
 
     def slc_terminate(self):
         """
@@ -236,9 +248,7 @@ class SchedulerService(ServiceProcess):
         foreach task in op_query:
           rm_task(task)
         """
-        for k, v in self._callback_tasks.iteritems():
-            if v.active():
-                v.cancel()
+        self._tasks.stop()
 
     def _schedule_event(self, starttime, interval, task_id):
         """
@@ -258,20 +268,19 @@ class SchedulerService(ServiceProcess):
         curtime = IonTime().time_ms
         starttime = starttime or curtime
 
-        # determine first callback time
+        # determine first callback time: the first whole interval after starttime which is after now
         diff = curtime - starttime
         if diff > 0:
-            # we started a while ago, so just find what is remaining of the interval from now
-            lefttimems = diff % (interval * 1000)
-            calctime = interval - int(lefttimems / 1000)
+            # we started a while ago, so skip the intervals which have passed
+            calctime = starttime + (int(diff / (interval * 1000)) + 1) * interval * 1000
         else:
             # start time is in THE FUTURE
-            calctime = 0 - int(diff/1000) + interval
+            calctime = starttime + interval * 1000
 
-        log.debug("_schedule_event: calculated next callback time of %d" % calctime)
+        log.debug("_schedule_event: calculated next callback in %.3f sec", (calctime - curtime) / 1000.0)
 
-        ccl = reactor.callLater(calctime, self._send_and_reschedule, task_id)
-        self._callback_tasks[task_id] = ccl
+        # Tasks of the same start time and interval share a timer
+        self._tasks.add(task_id, interval, calctime / 1000.0)
 
     @defer.inlineCallbacks
     def op_add_task(self, content, headers, msg):
@@ -363,8 +372,7 @@ class SchedulerService(ServiceProcess):
     @defer.inlineCallbacks
     def op_rm_task(self, content, headers, msg):
         """
-        Remove a task from the list/store. Will be dropped from the reactor
-        when the timer fires and _send_and_reschedule checks the registry.
+        Remove a task from the list/store, and from the timer wheel.
         """
         task_id = content.task_id
 
@@ -375,9 +383,7 @@ class SchedulerService(ServiceProcess):
             return
 
         # if the task is active, remove it
-        if self._callback_tasks.has_key(task_id):
-            self._callback_tasks[task_id].cancel()
-            del self._callback_tasks[task_id]
+        self._tasks.remove(task_id)
 
         log.debug('Removing task_id %s from store...' % task_id)
         yield self.scheduled_events.remove(task_id)
@@ -391,8 +397,20 @@ class SchedulerService(ServiceProcess):
     ##################################################
     # Internal methods
 
+    def _send_events(self, task_ids):
+        """
+        Called by the timer wheel with the tasks due at a tick, which stay
+        scheduled for their next interval.
+        """
+        for task_id in task_ids:
+            d = self._send_event(task_id)
+            d.addErrback(self._send_failed, task_id)
+
+    def _send_failed(self, failure, task_id):
+        log.error('Sending the event of task %s failed: %s' % (task_id, failure.getErrorMessage()))
+
     @defer.inlineCallbacks
-    def _send_and_reschedule(self, task_id):
+    def _send_event(self, task_id):
         """
         Check to see if we're still in the store - if not, we've been removed
         and should abort the run.
@@ -403,14 +421,13 @@ class SchedulerService(ServiceProcess):
         q.add_predicate_eq('task_id', task_id)
 
         tdefs = yield self.scheduled_events.query(q)
-        assert len(tdefs) == 1
+        if len(tdefs) != 1:
+            log.warn('Task %s is no longer in the store, unscheduling it' % task_id)
+            self._tasks.remove(task_id)
+            return
 
         tdef = tdefs.values()[0]
 
-        # pop callback object off of scheduled items
-        assert self._callback_tasks.has_key(task_id)
-        del self._callback_tasks[task_id]
-
         # deserialize and objectify payload
         log.debug('Time to send to "%s", id "%s"' % (tdef['desired_origin'], task_id))
 
@@ -429,12 +446,7 @@ class SchedulerService(ServiceProcess):
 
         yield self.pub.publish_event(msg, origin=tdef['desired_origin'])
 
-        log.debug('Send completed, rescheduling %s' % task_id)
-
-        # start time of None is fine, we just happened so we can be sure interval_seconds is just about right
-        self._schedule_event(None, int(tdef['interval_seconds']), task_id)
-
-        log.debug('Task %s rescheduled for %s seconds OK' % (task_id, tdef['interval_seconds']))
+        log.debug('Send completed for %s' % task_id)
 
 class SchedulerServiceClient(ServiceClient):
     """
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/dm/scheduler/test/test_timer_wheel.py
+@test ion.services.dm.scheduler.timer_wheel timers and periodic tasks, on a
+simulated clock
+"""
+
+from twisted.internet import task
+from twisted.trial import unittest
+
+from ion.services.dm.scheduler.timer_wheel import TimerWheel, PeriodicTasks
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.clock.advance(1000.0)
+        self.wheel = TimerWheel(tick=0.1, clock=self.clock)
+        self.called = []
+
+    def _call_at(self, seconds, name):
+        return self.wheel.call_at(seconds, self.called.append, name)
+
+    def test_order(self):
+        # In level 0, in levels above, and beyond the top level
+        for seconds in (1000.5, 1030.0, 1000.05, 1000.0, 9000.0, 1000.0 + 20 * 2**24 * 0.1):
+            self._call_at(seconds, seconds)
+        self.assertEqual(len(self.wheel), 6)
+
+        # Both at the next tick, in no order
+        self.clock.advance(0.1)
+        self.assertEqual(sorted(self.called), [1000.0, 1000.05])
+        self.clock.pump([0.1] * 4)
+        self.assertEqual(self.called[2:], [1000.5])
+
+        self.clock.advance(29.5)
+        self.assertEqual(self.called[2:], [1000.5, 1030.0])
+        self.clock.advance(8000.0)
+        self.assertEqual(self.called[-1], 9000.0)
+
+        # The reactor has a delayed call for the next tick with timers only
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(20 * 2**24 * 0.1)
+        self.assertEqual(len(self.called), 6)
+        self.assertEqual(len(self.wheel), 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_cancel(self):
+        timers = [self._call_at(1000.0 + i, i) for i in xrange(1, 6)]
+        timers[1].cancel()
+        timers[3].cancel()
+        timers[3].cancel()
+        self.failIf(timers[1].active())
+        self.assertEqual(len(self.wheel), 3)
+
+        self.clock.pump([1.0] * 5)
+        self.assertEqual(self.called, [1, 3, 5])
+        self.failIf(timers[0].active())
+
+    def test_batch(self):
+        for i in xrange(100):
+            self._call_at(1000.95 + (i % 10) * 0.005, i)
+        self.clock.advance(0.9)
+        self.assertEqual(self.called, [])
+        self.clock.advance(0.1)
+        self.assertEqual(sorted(self.called), range(100))
+
+    def test_stop(self):
+        self._call_at(1001.0, 'a')
+        self.wheel.stop()
+        self.clock.advance(2.0)
+        self.assertEqual(self.called, [])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+
+class PeriodicTasksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.clock.advance(1000.0)
+        self.fired = []
+        self.tasks = PeriodicTasks(TimerWheel(tick=0.1, clock=self.clock), self.fired.append)
+
+    def test_coalesce(self):
+        for i in xrange(10):
+            self.tasks.add('task%d' % i, 5, 1001.0)
+        self.tasks.add('other', 7, 1001.0)
+        self.assertEqual(len(self.tasks.groups), 2)
+        self.assertEqual(len(self.tasks.wheel), 2)
+
+        self.clock.advance(1.0)
+        self.assertEqual(len(self.fired), 2)
+        self.assertEqual(sorted([len(ids) for ids in self.fired]), [1, 10])
+
+        # Every interval after the first time, without drift
+        self.clock.pump([1.0] * 14)
+        self.assertEqual([len(ids) for ids in self.fired[2:]], [10, 1, 10, 1])
+
+    def test_join(self):
+        self.tasks.add('a', 5, 1001.0)
+        self.tasks.add('b', 5, 1006.0)
+        self.clock.advance(1.0)
+        self.assertEqual(self.fired, [['a']])
+
+        # a is due at 1006 again, with b
+        self.assertEqual(len(self.tasks.groups), 1)
+        self.clock.advance(5.0)
+        self.assertEqual(sorted(self.fired[1]), ['a', 'b'])
+
+    def test_remove(self):
+        self.tasks.add('a', 5, 1001.0)
+        self.tasks.add('b', 5, 1001.0)
+        self.failUnless(self.tasks.remove('a'))
+        self.failIf(self.tasks.remove('a'))
+        self.clock.advance(1.0)
+        self.assertEqual(self.fired, [['b']])
+
+        self.tasks.remove('b')
+        self.assertEqual(len(self.tasks.wheel), 0)
+        self.clock.advance(10.0)
+        self.assertEqual(self.fired, [['b']])
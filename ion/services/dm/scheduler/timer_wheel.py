@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/dm/scheduler/timer_wheel.py
+@package ion.services.dm.scheduler.timer_wheel Hierarchical timer wheel, and
+periodic tasks on top of it, for the scheduler service
+"""
+
+import math
+
+from twisted.internet import reactor
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+
+class Timer(object):
+    """
+    A call of func(*args) at a tick of a TimerWheel. Like the IDelayedCall of
+    reactor.callLater, it can be cancelled until it is called.
+    """
+    __slots__ = ('wheel', 'tick', 'func', 'args', 'slot')
+
+    def __init__(self, wheel, tick, func, args):
+        self.wheel = wheel
+        self.tick = tick
+        self.func = func
+        self.args = args
+        # The set of the wheel it is in; None once called or cancelled
+        self.slot = None
+
+    def active(self):
+        return self.slot is not None
+
+    def cancel(self):
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+            self.wheel.count -= 1
+
+
+class TimerWheel(object):
+    """
+    Calls timers at ticks of a fixed length, from a single delayed call of the
+    reactor, instead of a delayed call each. Timers go into the slots of
+    levels of wheels; level 0 has a slot for each of the next 256 ticks, each
+    level above a slot for each 256 slots of the level below. As the wheel
+    turns, the timers of the next slot of a level are moved down to the level
+    below, until they are called from level 0. Adding and cancelling a timer
+    is O(1), and all timers due at a tick are called from one reactor call.
+    Timers are called at the first tick at or after their time, so up to a
+    tick late.
+    """
+    SLOT_BITS = 8
+    SLOTS = 1 << SLOT_BITS
+    LEVELS = 4
+
+    def __init__(self, tick=0.1, clock=None):
+        """
+        @param tick  seconds between ticks
+        @param clock  provider of IReactorTime (seconds, callLater); the reactor by default
+        """
+        self.tick = float(tick)
+        self.clock = clock or reactor
+        self.levels = [[set() for i in xrange(self.SLOTS)] for level in xrange(self.LEVELS)]
+        # Timers beyond the reach of the top level
+        self.overflow = set()
+        # The last tick which was run
+        self.current = self._tick_at(self.clock.seconds())
+        self.count = 0
+        self.delayed_call = None
+        self.stopped = False
+
+    def __len__(self):
+        return self.count
+
+    def _tick_at(self, seconds):
+        # Allows for rounding of a delayed call due at the tick
+        return int(math.floor(seconds / self.tick + 1e-6))
+
+    def tick_for(self, seconds):
+        """
+        @retval the tick at which a timer for the given time is called
+        """
+        return int(math.ceil(seconds / self.tick - 1e-6))
+
+    def call_at(self, seconds, func, *args):
+        """
+        @brief Calls func(*args) at the given time
+        @param seconds  epoch time, as from the seconds() of the clock
+        @retval Timer, which can be cancelled
+        """
+        return self.call_at_tick(self.tick_for(seconds), func, *args)
+
+    def call_later(self, delay, func, *args):
+        return self.call_at(self.clock.seconds() + delay, func, *args)
+
+    def call_at_tick(self, tick, func, *args):
+        if self.count == 0 and self.delayed_call is None:
+            # Nothing to catch up on
+            self.current = self._tick_at(self.clock.seconds())
+
+        timer = Timer(self, tick, func, args)
+        self._insert(timer)
+        self.count += 1
+        self._wake()
+        return timer
+
+    def _insert(self, timer):
+        # Past timers are called at the next tick
+        tick = max(timer.tick, self.current + 1)
+        delta = tick - self.current
+        for level in xrange(self.LEVELS):
+            if delta < 1 << (self.SLOT_BITS * (level + 1)):
+                slot = self.levels[level][(tick >> (self.SLOT_BITS * level)) & (self.SLOTS - 1)]
+                break
+        else:
+            slot = self.overflow
+        slot.add(timer)
+        timer.slot = slot
+
+    def _cascade(self, level, tick):
+        """
+        Moves the timers of the slot of the given level at tick down a level
+        @retval True if the level above is due to cascade as well
+        """
+        index = (tick >> (self.SLOT_BITS * level)) & (self.SLOTS - 1)
+        slot = self.levels[level][index]
+        if slot:
+            self.levels[level][index] = set()
+            for timer in slot:
+                self._insert(timer)
+        return index == 0
+
+    def advance(self, tick):
+        """
+        Turns the wheel on to the given tick, skipping the ticks at which
+        there is nothing to call or cascade
+        @retval list of the timers due, in the order of their ticks
+        """
+        due = []
+        while True:
+            next_tick = self._next_tick()
+            if next_tick is None or next_tick > tick:
+                self.current = max(self.current, tick)
+                return due
+            self.current = next_tick
+
+            if next_tick & (self.SLOTS - 1) == 0:
+                level = 1
+                while level < self.LEVELS and self._cascade(level, next_tick):
+                    level += 1
+                if level == self.LEVELS and self.overflow:
+                    overflow, self.overflow = self.overflow, set()
+                    for timer in overflow:
+                        self._insert(timer)
+
+            index = next_tick & (self.SLOTS - 1)
+            slot = self.levels[0][index]
+            if slot:
+                self.levels[0][index] = set()
+                for timer in slot:
+                    timer.slot = None
+                self.count -= len(slot)
+                due.extend(slot)
+
+    def _next_tick(self):
+        """
+        @retval the next tick with timers in level 0, or with timers to
+            cascade from a level above; None if there are no timers
+        """
+        next_tick = None
+        for level in xrange(self.LEVELS):
+            shift = self.SLOT_BITS * level
+            base = self.current >> shift
+            slots = self.levels[level]
+            for i in xrange(base + 1, base + self.SLOTS + 1):
+                if next_tick is not None and i << shift >= next_tick:
+                    break
+                if slots[i & (self.SLOTS - 1)]:
+                    next_tick = i << shift
+                    break
+        if self.overflow:
+            shift = self.SLOT_BITS * self.LEVELS
+            overflow_tick = ((self.current >> shift) + 1) << shift
+            if next_tick is None or overflow_tick < next_tick:
+                next_tick = overflow_tick
+        return next_tick
+
+    def _wake(self):
+        if self.count and not self.stopped:
+            seconds = self._next_tick() * self.tick
+            if self.delayed_call is not None:
+                if self.delayed_call.getTime() <= seconds:
+                    return
+                self.delayed_call.cancel()
+            self.delayed_call = self.clock.callLater(max(seconds - self.clock.seconds(), 0), self._run)
+
+    def _run(self):
+        self.delayed_call = None
+        for timer in self.advance(self._tick_at(self.clock.seconds())):
+            try:
+                timer.func(*timer.args)
+            except Exception:
+                log.exception('Error in timer %s', timer.func)
+        self._wake()
+
+    def stop(self):
+        """
+        Stops calling timers; the timers are kept
+        """
+        self.stopped = True
+        if self.delayed_call is not None and self.delayed_call.active():
+            self.delayed_call.cancel()
+        self.delayed_call = None
+
+
+class PeriodicTasks(object):
+    """
+    Fires tasks at their interval, on a TimerWheel. Tasks of the same
+    interval which are due at the same tick share one timer, and are fired
+    with one call of fire(task_ids). A task is fired at its first time, then
+    every interval seconds after it, until it is removed.
+    """
+
+    class Group(object):
+        __slots__ = ('interval', 'seconds', 'tick', 'task_ids', 'timer')
+
+    def __init__(self, wheel, fire):
+        """
+        @param wheel  TimerWheel
+        @param fire  callable, called with the list of task ids due at a tick
+        """
+        self.wheel = wheel
+        self.fire = fire
+        # (interval, tick) -> Group of the tasks of that interval due at that tick
+        self.groups = {}
+        # task id -> Group
+        self.tasks = {}
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self.tasks
+
+    def add(self, task_id, interval, seconds):
+        """
+        @brief Fires the task first at the given time, then every interval
+        @param interval  seconds
+        @param seconds  epoch time of the first firing
+        """
+        self.remove(task_id)
+        group = self._group(interval, seconds)
+        group.task_ids.add(task_id)
+        self.tasks[task_id] = group
+
+    def remove(self, task_id):
+        """
+        @retval True if the task was there
+        """
+        group = self.tasks.pop(task_id, None)
+        if group is None:
+            return False
+        group.task_ids.discard(task_id)
+        if not group.task_ids:
+            group.timer.cancel()
+            del self.groups[(group.interval, group.tick)]
+        return True
+
+    def stop(self):
+        self.wheel.stop()
+
+    def _group(self, interval, seconds):
+        tick = self.wheel.tick_for(seconds)
+        group = self.groups.get((interval, tick))
+        if group is None:
+            group = self.Group()
+            group.interval = interval
+            group.seconds = seconds
+            group.tick = tick
+            group.task_ids = set()
+            group.timer = self.wheel.call_at_tick(tick, self._fire, group)
+            self.groups[(interval, tick)] = group
+        return group
+
+    def _fire(self, group):
+        del self.groups[(group.interval, group.tick)]
+        task_ids = list(group.task_ids)
+
+        # Due again one interval on; joins a group already due at that tick
+        seconds = group.seconds + group.interval
+        tick = self.wheel.tick_for(seconds)
+        other = self.groups.get((group.interval, tick))
+        if other is None:
+            group.seconds = seconds
+            group.tick = tick
+            group.timer = self.wheel.call_at_tick(tick, self._fire, group)
+            self.groups[(group.interval, tick)] = group
+        else:
+            for task_id in group.task_ids:
+                self.tasks[task_id] = other
+            other.task_ids.update(group.task_ids)
+
+        self.fire(task_ids)
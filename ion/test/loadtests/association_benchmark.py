@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/association_benchmark.py
+@brief Searches of the association service answered by queries of the commit index store against the association index
+
+The commit store holds resources and the associations between them, as the datastore writes them: one head commit
+row per resource and association. The searches follow op_get_subjects - find the associations with a predicate and
+object, then the head of each subject, then check the type and life cycle state of each subject - and
+op_association_exists. Each query of the store is a round trip to cassandra in a deployment; use -l to add that
+latency to every query.
+
+Run it like this:
+bin/python ion/test/loadtests/association_benchmark.py -n 100000 -s 200 -l 0.0005
+"""
+
+import random
+import time
+from optparse import OptionParser
+
+from ion.core.data import store
+from ion.core.data.storage_configuration_utility import COMMIT_INDEXED_COLUMNS, REPOSITORY_KEY, BRANCH_NAME
+from ion.core.data.storage_configuration_utility import SUBJECT_KEY, SUBJECT_BRANCH, PREDICATE_KEY, OBJECT_KEY
+from ion.core.data.storage_configuration_utility import OBJECT_BRANCH, RESOURCE_OBJECT_TYPE, RESOURCE_LIFE_CYCLE_STATE
+
+from ion.services.dm.inventory.association_index import AssociationIndex
+
+from ion.test.loadtests.benchutil import report, current_rss_kb, sync_result
+
+PREDICATES = ['owned_by', 'has_a', 'type_of']
+TYPES = ['dataset', 'data_source', 'user']
+STATES = ['New', 'Active', 'Retired']
+
+
+class StoreFinder(object):
+    """
+    Find head commits with a query of the store for each search, as the association service did
+    """
+
+    def __init__(self, index_store, latency):
+        self.index_store = index_store
+        self.latency = latency
+        self.calls = 0
+
+    def find(self, attributes):
+        q = store.Query()
+        q.add_predicate_gt(BRANCH_NAME, '')
+        for name, value in attributes.items():
+            q.add_predicate_eq(name, value)
+
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return sync_result(self.index_store.query(q))
+
+
+def populate(index_store, count):
+    """
+    count associations between count / 10 resources
+    """
+    resources = ['resource%d' % i for i in xrange(max(2, count / 10))]
+
+    for i, resource in enumerate(resources):
+        index_store.put('commit_%s' % resource, 'value', {REPOSITORY_KEY:resource, BRANCH_NAME:'master',
+                                                         RESOURCE_OBJECT_TYPE:TYPES[i % len(TYPES)],
+                                                         RESOURCE_LIFE_CYCLE_STATE:STATES[i % len(STATES)]})
+
+    triples = []
+    for i in xrange(count):
+        triple = (random.choice(resources), random.choice(PREDICATES), random.choice(resources))
+        triples.append(triple)
+        index_store.put('commit_assoc%d' % i, 'value', {REPOSITORY_KEY:'assoc%d' % i, BRANCH_NAME:'master',
+                                                        SUBJECT_KEY:triple[0], SUBJECT_BRANCH:'master',
+                                                        PREDICATE_KEY:triple[1],
+                                                        OBJECT_KEY:triple[2], OBJECT_BRANCH:'master'})
+    return resources, triples
+
+
+def get_subjects(find, predicate, obj, resource_type, state):
+    """
+    The searches of op_get_subjects for one predicate object pair, a type and a life cycle state
+    """
+    subjects = set()
+    for key, row in find({PREDICATE_KEY:predicate, OBJECT_KEY:obj}).items():
+        for commit_key, commit_row in find({REPOSITORY_KEY:row[SUBJECT_KEY]}).items():
+            if commit_row[BRANCH_NAME] == row[SUBJECT_BRANCH]:
+                subjects.add((row[SUBJECT_KEY], row[SUBJECT_BRANCH]))
+
+    result = set()
+    for subject in subjects:
+        rows = find({REPOSITORY_KEY:subject[0], RESOURCE_OBJECT_TYPE:resource_type,
+                     RESOURCE_LIFE_CYCLE_STATE:state})
+        for key, row in rows.items():
+            result.add((row[REPOSITORY_KEY], row[BRANCH_NAME]))
+    return result
+
+
+def association_exists(find, triple):
+    return len(find({SUBJECT_KEY:triple[0], PREDICATE_KEY:triple[1], OBJECT_KEY:triple[2]})) == 1
+
+
+def run(name, find, calls, searches, triples):
+    start_calls = calls()
+
+    t1 = time.time()
+    subject_results = [get_subjects(find, *search) for search in searches]
+    t2 = time.time()
+    report('%s get_subjects' % name, len(searches), t2 - t1, unit='searches')
+    print '    store queries: %d, mean latency: %.3f msec' % (calls() - start_calls, (t2 - t1) / len(searches) * 1000)
+
+    start_calls = calls()
+    t1 = time.time()
+    exists_results = [association_exists(find, triple) for triple in triples]
+    t2 = time.time()
+    report('%s association_exists' % name, len(triples), t2 - t1, unit='searches')
+    print '    store queries: %d, mean latency: %.3f msec' % (calls() - start_calls, (t2 - t1) / len(triples) * 1000)
+
+    return subject_results, exists_results
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=100000, help="The number of associations")
+    parser.add_option("-s", "--searches", dest="searches", default=200, help="The number of searches of each kind")
+    parser.add_option("-l", "--latency", dest="latency", default=0.0, help="Seconds added to each store query")
+    opts, args = parser.parse_args()
+
+    count, nsearches, latency = int(opts.number), int(opts.searches), float(opts.latency)
+
+    random.seed(1)
+    index_store = store.create_local_store(store.IndexStore, 'commits', indices=COMMIT_INDEXED_COLUMNS)
+
+    t1 = time.time()
+    resources, triples = populate(index_store, count)
+    t2 = time.time()
+    report('populate store', count, t2 - t1, unit='associations')
+    print '    rss: %d KB' % current_rss_kb()
+
+    searches = [(random.choice(PREDICATES), random.choice(resources), random.choice(TYPES), random.choice(STATES))
+                for i in xrange(nsearches)]
+    exists = random.sample(triples, nsearches)
+
+    finder = StoreFinder(index_store, latency)
+    expected = run('store', finder.find, lambda: finder.calls, searches, exists)
+
+    rss = current_rss_kb()
+    index = AssociationIndex()
+    index_store.add_listener(index.update)
+
+    t1 = time.time()
+    q = store.Query()
+    q.add_predicate_gt(BRANCH_NAME, '')
+    index.load(sync_result(index_store.query(q)))
+    t2 = time.time()
+    report('load index', len(index), t2 - t1, unit='rows')
+    print '    rss: +%d KB' % (current_rss_kb() - rss)
+
+    result = run('index', index.find, lambda: 0, searches, exists)
+    assert result == expected
+
+    # Incremental upkeep - the cost the index adds to each write
+    t1 = time.time()
+    for i in xrange(nsearches):
+        index_store.update_index('commit_assoc%d' % i, {BRANCH_NAME:''})
+    t2 = time.time()
+    report('update_index with index', nsearches, t2 - t1, unit='rows')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/benchutil.py
+@brief Small helpers shared by the stand alone benchmark scripts in this package
+"""
+
+import resource
+
+from twisted.python import failure
+
+
+def max_rss_kb():
+    """
+    Return the peak resident set size of this process in KB (as reported by getrusage on linux)
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def current_rss_kb():
+    """
+    Return the current resident set size of this process in KB. Falls back to the peak value where /proc is not
+    available.
+    """
+    try:
+        f = open('/proc/self/statm')
+        try:
+            pages = int(f.read().split()[1])
+        finally:
+            f.close()
+        return pages * resource.getpagesize() / 1024
+    except (IOError, ValueError, IndexError):
+        return max_rss_kb()
+
+
+def report(name, count, elapsed, unit='ops'):
+    """
+    Print a one line rate summary
+    """
+    rate = 0.0
+    if elapsed > 0:
+        rate = count / elapsed
+    print '%-40s %10d %s in %8.3f sec: %12.1f %s/sec' % (name, count, unit, elapsed, rate, unit)
+    return rate
+
+
+def sync_result(d):
+    """
+    Get the result of a deferred which has already fired - as those of the in memory stores and loopback
+    connections do - or raise its failure
+    """
+    out = []
+    d.addBoth(out.append)
+    if isinstance(out[0], failure.Failure):
+        out[0].raiseException()
+    return out[0]
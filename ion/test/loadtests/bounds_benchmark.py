@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/bounds_benchmark.py
+@brief findDataResources bounds filtering over a synthetic catalog - a test of every dataset with isInBounds against
+the bounds index of the metadata cache
+
+Each dataset covers a few degrees of latitude and longitude, some depth range and a year or so of time. The queries
+are regional boxes, some with a depth or time range. Both sides finish with isInBounds on the datasets they select,
+so they find the same datasets.
+
+Run it like this:
+bin/python ion/test/loadtests/bounds_benchmark.py -n 50000 -q 200
+"""
+
+import random
+import time
+from decimal import Decimal
+from optparse import OptionParser
+
+from ion.integration.ais.common.bounds_index import BoundsIndex
+from ion.integration.ais.common.spatial_temporal_bounds import SpatialTemporalBounds
+
+from ion.test.loadtests.benchutil import report, current_rss_kb
+
+
+class BoundsMsg(object):
+    """
+    Stands in for the bounds fields of a findDataResources request
+    """
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def IsFieldSet(self, name):
+        return name in self.__dict__
+
+
+def make_catalog(count):
+    catalog = {}
+    for i in xrange(count):
+        lat = random.uniform(-90, 85)
+        lon = random.uniform(-180, 175)
+        vert = random.uniform(0, 4000)
+        year = random.randint(1990, 2010)
+        catalog['dataset%d' % i] = {'ion_geospatial_lat_min':Decimal(str(lat)),
+                                    'ion_geospatial_lat_max':Decimal(str(lat + random.uniform(0, 5))),
+                                    'ion_geospatial_lon_min':Decimal(str(lon)),
+                                    'ion_geospatial_lon_max':Decimal(str(lon + random.uniform(0, 5))),
+                                    'ion_geospatial_vertical_min':Decimal(str(vert)),
+                                    'ion_geospatial_vertical_max':Decimal(str(vert + random.uniform(0, 500))),
+                                    'ion_time_coverage_start':'%d-01-01T00:00:00Z' % year,
+                                    'ion_time_coverage_end':'%d-12-31T00:00:00Z' % min(2011, year + random.randint(0, 2))}
+    return catalog
+
+
+def make_queries(count):
+    queries = []
+    for i in xrange(count):
+        lat = random.uniform(-90, 70)
+        lon = random.uniform(-180, 160)
+        fields = {'minLatitude':lat, 'maxLatitude':lat + random.uniform(2, 20),
+                  'minLongitude':lon, 'maxLongitude':lon + random.uniform(2, 20)}
+        if i % 2:
+            vert = random.uniform(0, 3000)
+            fields.update({'minVertical':vert, 'maxVertical':vert + 1000, 'posVertical':'down'})
+        if i % 3 == 0:
+            year = random.randint(1990, 2010)
+            fields.update({'minTime':'%d-01-01T00:00:00Z' % year, 'maxTime':'%d-06-01T00:00:00Z' % year})
+
+        bounds = SpatialTemporalBounds()
+        bounds.loadBounds(BoundsMsg(**fields))
+        queries.append(bounds)
+    return queries
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=50000, help="The number of datasets")
+    parser.add_option("-q", "--queries", dest="queries", default=200, help="The number of queries")
+    opts, args = parser.parse_args()
+
+    count, nqueries = int(opts.number), int(opts.queries)
+
+    random.seed(1)
+    catalog = make_catalog(count)
+    queries = make_queries(nqueries)
+
+    # The old loop - every dataset is tested
+    t1 = time.time()
+    expected = []
+    for bounds in queries:
+        expected.append(set([dSetID for dSetID, md in catalog.iteritems() if bounds.isInBounds(md)]))
+    t2 = time.time()
+    report('scan isInBounds', nqueries, t2 - t1, unit='queries')
+    print '    mean latency: %.3f msec' % ((t2 - t1) / nqueries * 1000)
+
+    rss = current_rss_kb()
+    index = BoundsIndex()
+    t1 = time.time()
+    for dSetID, md in catalog.iteritems():
+        index.putDSet(dSetID, md)
+    index.findDSets(queries[0].getIndexQuery())
+    t2 = time.time()
+    report('load and build index', count, t2 - t1, unit='datasets')
+    print '    rss: +%d KB' % (current_rss_kb() - rss)
+
+    t1 = time.time()
+    candidates = 0
+    for bounds, result in zip(queries, expected):
+        found = index.findDSets(bounds.getIndexQuery())
+        candidates += len(found)
+        assert set([dSetID for dSetID in found if bounds.isInBounds(catalog[dSetID])]) == result
+    t2 = time.time()
+    report('index + isInBounds', nqueries, t2 - t1, unit='queries')
+    print '    mean latency: %.3f msec, mean datasets tested: %.1f of %d, mean in bounds: %.1f' % \
+          ((t2 - t1) / nqueries * 1000, float(candidates) / nqueries, count,
+           float(sum([len(result) for result in expected])) / nqueries)
+
+    # Incremental upkeep - datasets updated between queries
+    t1 = time.time()
+    for i in xrange(nqueries):
+        dSetID = 'dataset%d' % random.randrange(count)
+        index.putDSet(dSetID, make_catalog(1)['dataset0'])
+        index.findDSets(queries[i].getIndexQuery())
+    t2 = time.time()
+    report('update + query', nqueries, t2 - t1, unit='queries')
+
+
+if __name__ == "__main__":
+    main()
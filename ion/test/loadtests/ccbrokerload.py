@@ -103,6 +103,8 @@ class CCBrokerTestOptions(LoadTestOptions):
 
         , ['procs', None, 1, 'Number of capability container service processes to run.']
         , ['clients', None, 1, 'Number of capability container service clients to run.']
+        , ['coalesce', None, 0, 'Frame coalescing window of the broker connection [seconds]; 0 for off.']
+        , ['coalesce-bytes', None, 65536, 'Bytes of frames held before a coalesced write.']
     ]
     optFlags = [
     ]
@@ -215,6 +217,13 @@ class CCBrokerTest(LoadTest):
 
         yield self._start_container()
 
+        self.coalescing = None
+        coalesce = float(opts['coalesce'])
+        if coalesce > 0:
+            client = ioninit.container_instance.exchange_manager.message_space.client
+            client.set_coalescing(coalesce, int(opts['coalesce-bytes']))
+            self.coalescing = client.transport
+
         self._enable_monitor(self.monitor_rate)
 
     def guid(self):
@@ -284,6 +293,7 @@ class CCBrokerTest(LoadTest):
             if rates['connects']: pieces.append('made %.2f connects/sec' % rates['connects'])
             if rates['msgsend']: pieces.append('sent %.2f msgs/sec' % rates['msgsend'])
             if rates['msgrecv']: pieces.append('received %.2f msgs/sec' % rates['msgrecv'])
+            if self.coalescing: pieces.append('%d frames in %d writes' % (self.coalescing.frames, self.coalescing.writes))
             print '#%s] (%s) %s' % (self.load_id, time.strftime('%H:%M:%S'), ', '.join(pieces))
 
 
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/chunk_benchmark.py
+@brief Streaming an extraction to a consumer - fixed element count chunks sent one at a time, against byte budget
+chunks sent through a window
+
+The consumer is in process: it takes each chunk after a fixed latency, standing in for the round trip of a message.
+The chunk size in bytes is estimated as the datastore does - the item size plus the encoding overhead.
+
+Run it like this:
+bin/python ion/test/loadtests/chunk_benchmark.py -n 2000000 -l 0.002 -b 122880 -w 4
+"""
+
+import time
+from optparse import OptionParser
+
+import numpy
+
+from twisted.internet import defer, reactor, task
+
+from ion.services.coi.array_extraction import ExtractionPlan, SendWindow, chunk_elements, ELEMENT_OVERHEAD
+
+from ion.test.loadtests.benchutil import report, current_rss_kb
+
+
+class Consumer(object):
+    """
+    Receives chunks after a delay
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.elements = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.max_chunk_bytes = 0
+
+    def receive(self, values, nbytes):
+        def arrived():
+            self.elements += len(values)
+            self.bytes += nbytes
+            self.chunks += 1
+            self.max_chunk_bytes = max(self.max_chunk_bytes, nbytes)
+        return task.deferLater(reactor, self.latency, arrived)
+
+
+def make_variable(count, kind):
+    if kind == 'string':
+        return numpy.array(['value %d' % i for i in xrange(count)], dtype=object)
+    return numpy.arange(count, dtype=kind)
+
+
+def item_bytes(variable):
+    if variable.dtype == object:
+        return lambda values: sum([len(value) + ELEMENT_OVERHEAD for value in values])
+    size = variable.dtype.itemsize + ELEMENT_OVERHEAD
+    return lambda values: len(values) * size
+
+
+@defer.inlineCallbacks
+def stream(variable, elements, window_size, latency):
+    plan = ExtractionPlan([0], [variable.size], [1])
+    measure = item_bytes(variable)
+    consumer = Consumer(latency)
+    window = SendWindow(window_size)
+
+    for region, start, count in plan.chunks(elements):
+        target = plan.chunk_array(region, variable.dtype)
+        plan.copy(target, region, [(0, variable.size)], [0], variable)
+        values = target.ravel().tolist()
+        yield window.send(consumer.receive, values, measure(values))
+
+    yield window.flush()
+    defer.returnValue((consumer, window))
+
+
+@defer.inlineCallbacks
+def run(count, latency, budget, window_size, fixed):
+    for kind in ('float64', 'int32', 'string'):
+        variable = make_variable(count, kind)
+        if variable.dtype == object:
+            # Sampled from the start, as the datastore does - the strings grow longer further on
+            budget_elements = chunk_elements(budget, object, variable[:1000])
+        else:
+            budget_elements = chunk_elements(budget, variable.dtype.type)
+
+        for name, elements, size in (('fixed %d x1' % fixed, fixed, 1),
+                                     ('budget %d x%d' % (budget, window_size), budget_elements, window_size)):
+            t1 = time.time()
+            consumer, window = yield stream(variable, elements, size, latency)
+            t2 = time.time()
+
+            assert consumer.elements == count
+            report('%s %s' % (kind, name), count, t2 - t1, unit='elements')
+            print '    %.1f MB/s, %d chunks of %d elements, max chunk %d bytes, max in flight %d, rss %d KB' % (
+                consumer.bytes / (t2 - t1) / 2**20, consumer.chunks, elements, consumer.max_chunk_bytes,
+                window.max_in_flight, current_rss_kb())
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=2000000, help="The number of elements in the variable")
+    parser.add_option("-l", "--latency", dest="latency", default=0.002, help="Seconds for a chunk to reach the consumer")
+    parser.add_option("-b", "--budget", dest="budget", default=120 * 1024, help="The byte budget of a chunk")
+    parser.add_option("-w", "--window", dest="window", default=4, help="The number of chunks in flight")
+    parser.add_option("-f", "--fixed", dest="fixed", default=15000, help="The number of elements in a fixed chunk")
+    opts, args = parser.parse_args()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    d = defer.maybeDeferred(run, int(opts.number), float(opts.latency), int(opts.budget), int(opts.window),
+                            int(opts.fixed))
+    d.addBoth(done)
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/coalesce_benchmark.py
+@brief Send rate and writes of small messages over a loopback TCP connection,
+one transport write per frame against a CoalescingTransport
+
+Each message is written as the three frames of a basic.publish - method,
+content header and body - and the sender yields to the reactor after each
+message, as a sender does while txamqp queues its frames. The receiving end
+only counts bytes. For a run against a real broker, use the --coalesce
+option of ion/test/loadtests/ccbrokerload.py.
+
+Run it like this:
+bin/python ion/test/loadtests/coalesce_benchmark.py -n 20000 -s 200 -w 0.0002,0.001
+"""
+
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer, protocol, reactor, task
+
+from ion.core.messaging.amqp import CoalescingTransport
+
+from ion.test.loadtests.benchutil import report
+
+METHOD_FRAME = 'M' * 40
+HEADER_FRAME = 'H' * 30
+
+
+class CountingReceiver(protocol.Protocol):
+    def connectionMade(self):
+        self.factory.receiver = self
+        self.bytes = 0
+        self.reads = 0
+        self.waiting = None
+
+    def dataReceived(self, data):
+        self.bytes += len(data)
+        self.reads += 1
+        if self.waiting and self.bytes >= self.waiting[0]:
+            d, self.waiting = self.waiting[1], None
+            d.callback(None)
+
+    def wait_for(self, count):
+        if self.bytes >= count:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self.waiting = (count, d)
+        return d
+
+
+@defer.inlineCallbacks
+def send(count, size, window, max_bytes):
+    factory = protocol.ServerFactory()
+    factory.protocol = CountingReceiver
+    port = reactor.listenTCP(0, factory, interface='127.0.0.1')
+
+    client = yield protocol.ClientCreator(reactor, protocol.Protocol).connectTCP('127.0.0.1', port.getHost().port)
+    while not getattr(factory, 'receiver', None):
+        yield task.deferLater(reactor, 0, lambda: None)
+    receiver = factory.receiver
+
+    transport = client.transport
+    if window:
+        transport = CoalescingTransport(transport, window, max_bytes)
+
+    body = 'B' * size
+    total = count * (len(METHOD_FRAME) + len(HEADER_FRAME) + size)
+
+    t1 = time.time()
+    for i in xrange(count):
+        transport.write(METHOD_FRAME)
+        transport.write(HEADER_FRAME)
+        transport.write(body)
+        yield task.deferLater(reactor, 0, lambda: None)
+    if window:
+        transport.flush()
+    yield receiver.wait_for(total)
+    t2 = time.time()
+
+    writes = transport.writes if window else count * 3
+    client.transport.loseConnection()
+    yield port.stopListening()
+    defer.returnValue((t2 - t1, writes, receiver.reads))
+
+
+@defer.inlineCallbacks
+def run(count, size, windows, max_bytes):
+    for window in [0.0] + windows:
+        elapsed, writes, reads = yield send(count, size, window, max_bytes)
+        label = 'coalesce window %.4f sec' % window if window else 'no coalescing'
+        report(label, count, elapsed, unit='messages')
+        print '    transport writes: %d, reads at the receiver: %d' % (writes, reads)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=20000, help="The number of messages")
+    parser.add_option("-s", "--size", dest="size", default=200, help="Bytes in each message body")
+    parser.add_option("-w", "--windows", dest="windows", default='0.0002,0.001',
+                      help="Comma separated coalescing windows in seconds")
+    parser.add_option("-b", "--bytes", dest="bytes", default=65536, help="Bytes held before a coalesced write")
+    opts, args = parser.parse_args()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    windows = [float(w) for w in opts.windows.split(',')]
+    d = defer.maybeDeferred(run, int(opts.number), int(opts.size), windows, int(opts.bytes))
+    d.addBoth(done)
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/codec_benchmark.py
+@brief Per message decode latency of the object codec - eager against lazy unpack_structure
+
+Two representative messages are used: a resource message (an address book holding many person objects) and a
+dataset message (the profile dataset used to bootstrap the datastore). Each is decoded eagerly, lazily, and lazily
+followed by the access of a single field - the common case for a message handler.
+
+Run it like this:
+bin/python ion/test/loadtests/codec_benchmark.py -n 1000
+"""
+
+import time
+from optparse import OptionParser
+
+from ion.core.object import workbench
+from ion.core.object import object_utils
+from ion.core.object import codec
+from ion.core.messaging.message_client import MessageInstance
+from ion.services.coi.datastore_bootstrap.dataset_bootstrap import bootstrap_profile_dataset
+
+from ion.test.loadtests.benchutil import report
+
+ION_MESSAGE_TYPE = object_utils.create_type_identifier(object_id=11, version=1)
+PERSON_TYPE = object_utils.create_type_identifier(object_id=20001, version=1)
+ADDRESSBOOK_TYPE = object_utils.create_type_identifier(object_id=20002, version=1)
+DATASET_TYPE = object_utils.create_type_identifier(object_id=10001, version=1)
+
+
+def _create_message(wb, content_type):
+    repo = wb.create_repository(ION_MESSAGE_TYPE)
+    repo.root_object.identity = repo.repository_key
+    repo.root_object.message_object = repo.create_object(content_type)
+    return repo
+
+
+def make_resource_message(wb, persons):
+    repo = _create_message(wb, ADDRESSBOOK_TYPE)
+    book = repo.root_object.message_object
+    book.title = 'Benchmark address book'
+
+    for i in xrange(persons):
+        p = repo.create_object(PERSON_TYPE)
+        p.name = 'Person %d' % i
+        p.id = i
+        p.email = 'person%d@example.com' % i
+        book.person.add()
+        book.person[i] = p
+
+    repo.commit('Resource message')
+    return codec.pack_structure(repo.root_object)
+
+
+def make_dataset_message(wb):
+    repo = _create_message(wb, DATASET_TYPE)
+    bootstrap_profile_dataset(MessageInstance(repo), random_initialization=True)
+    repo.commit('Dataset message')
+    return codec.pack_structure(repo.root_object)
+
+
+def time_decode(name, serialized, count, lazy, touch=None):
+    t1 = time.time()
+    for i in xrange(count):
+        root = codec.unpack_structure(serialized, lazy=lazy)
+        if touch is not None:
+            touch(root)
+    t2 = time.time()
+
+    report(name, count, t2 - t1, unit='msgs')
+    if count:
+        print '    mean decode latency: %.1f usec' % ((t2 - t1) / count * 10**6)
+
+
+def run(count, persons):
+    wb = workbench.WorkBench('No Process Benchmark')
+
+    messages = [('resource', make_resource_message(wb, persons), lambda root: root.message_object.title),
+                ('dataset', make_dataset_message(wb), lambda root: root.message_object.root_group.name)]
+
+    for name, serialized, touch in messages:
+        print '%s message: %d bytes' % (name, len(serialized))
+        time_decode('%s eager' % name, serialized, count, lazy=False)
+        time_decode('%s lazy' % name, serialized, count, lazy=True)
+        time_decode('%s lazy + one field' % name, serialized, count, lazy=True, touch=touch)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=1000, help="The number of messages to decode")
+    parser.add_option("-p", "--persons", dest="persons", default=100, help="The number of objects in the resource message")
+    opts, args = parser.parse_args()
+
+    run(int(opts.number), int(opts.persons))
+
+if __name__ == "__main__":
+    main()
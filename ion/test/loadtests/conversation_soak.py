@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/conversation_soak.py
+@brief Live conversations, tombstones and memory of a ProcessConversationManager
+over many RPCs, with and without collection of ended and idle conversations
+
+The manager is driven as Process drives it, on a simulated clock which moves
+on by the interval between RPCs. Of the RPCs sent, most are answered; some
+time out, and half of those get a late reply; a few are received and never
+answered. Each RPC also comes with a one-off generic message, as sent by
+Process.send without a conversation, which never reaches a final state.
+Without collection, as before tombstones, late replies and generic messages
+start conversations which are never dropped; that run is kept short, as its
+memory grows with every RPC.
+
+Run it like this:
+bin/python ion/test/loadtests/conversation_soak.py -n 1000000 -b 100000 -i 0.01
+"""
+
+import gc
+import time
+from optparse import OptionParser
+
+from ion.interact.conversation import ProcessConversationManager
+from ion.interact.rpc import RpcType
+
+from ion.test.loadtests.benchutil import report, current_rss_kb
+
+
+class StandInProcessId(object):
+    full = 'soak.1'
+
+
+class StandInProcess(object):
+    id = StandInProcessId()
+    proc_name = 'soak'
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+def received(conv_mgr, conv_id, protocol, performative):
+    message = {'headers':{'protocol':protocol, 'sender':'other', 'conv-id':conv_id,
+                          'performative':performative, 'op':'noop'}}
+    conv = conv_mgr.get_or_create_conversation(conv_id, message)
+    if conv is not None:
+        conv_mgr.log_conv_message(conv, message, msgtype='RECV')
+    return conv
+
+
+def soak(count, interval, collect):
+    clock = Clock()
+    proc = StandInProcess()
+    if collect:
+        conv_mgr = ProcessConversationManager(proc, clock=clock)
+    else:
+        conv_mgr = ProcessConversationManager(proc, idle_timeout=0, max_tombstones=0, clock=clock)
+
+    gc.collect()
+    rss = current_rss_kb()
+    late = []
+    step = max(count / 10, 1)
+
+    t1 = time.time()
+    for i in xrange(count):
+        clock.now += interval
+
+        # An RPC sent by the process
+        conv = conv_mgr.new_conversation(RpcType.CONV_TYPE_RPC)
+        conv.bind_role_local(RpcType.ROLE_INITIATOR.role_id, proc)
+        conv_mgr.log_conv_message(conv, {'headers':{'conv-id':conv.conv_id, 'op':'noop'}}, msgtype='SENT')
+        if i % 50 == 0:
+            conv.timeout = str(clock.now)
+            conv_mgr.end_conversation(conv, 'TIMEOUT')
+            if i % 100 == 0:
+                late.append(conv.conv_id)
+        else:
+            conv_mgr.log_conv_message(conv, {'headers':{'conv-id':conv.conv_id, 'status':'OK'}}, msgtype='RECV')
+            conv_mgr.check_conversation_state(conv)
+            conv_mgr.end_conversation(conv, 'DONE')
+
+        # A reply which comes after its RPC timed out
+        if len(late) > 10:
+            received(conv_mgr, late.pop(0), 'rpc', 'inform_result')
+
+        # A request received and never answered
+        if i % 100 == 1:
+            received(conv_mgr, 'other.1#%d' % i, 'rpc', 'request')
+
+        # A one-off generic message
+        received(conv_mgr, 'other.2#%d' % i, 'generic', 'request')
+
+        if (i + 1) % step == 0:
+            stats = conv_mgr.stats()
+            print '    %8d RPCs: %8d live, %6d tombstones, rss +%d KB' % (
+                i + 1, stats['live'], stats['tombstones'], current_rss_kb() - rss)
+    t2 = time.time()
+
+    report('%s collection' % ('with' if collect else 'without'), count, t2 - t1, unit='RPCs')
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=1000000, help="The number of RPCs")
+    parser.add_option("-b", "--baseline", dest="baseline", default=100000,
+                      help="The number of RPCs without collection")
+    parser.add_option("-i", "--interval", dest="interval", default=0.01, help="Simulated seconds between RPCs")
+    opts, args = parser.parse_args()
+
+    print 'Without collection of ended and idle conversations:'
+    soak(int(opts.baseline), float(opts.interval), False)
+    print 'With collection of ended and idle conversations:'
+    soak(int(opts.number), float(opts.interval), True)
+
+if __name__ == "__main__":
+    main()
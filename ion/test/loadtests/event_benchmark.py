@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/event_benchmark.py
+@brief Event publishing rate of an EventPublisher, one send at a time against batched sends
+
+The publish method of the publisher is replaced by a stand in for the broker which answers each send after a fixed
+latency. create_and_publish_event is called count times in a row, the way an instrument agent or ingestion process
+publishes a burst of events. create_event is timed on its own too, next to the create_instance of the message
+repository it starts with.
+
+Run it like this:
+bin/python ion/test/loadtests/event_benchmark.py -n 5000 -l 0.001 -b 1,16,64
+"""
+
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer, reactor
+
+from ion.core.object import workbench
+from ion.services.dm.distribution.events import EventPublisher, ResourceLifecycleEventPublisher, EVENT_MESSAGE_TYPE
+
+from ion.test.loadtests.benchutil import report, current_rss_kb
+
+
+class StandInProcess(object):
+    """
+    Just enough of a process for a publisher and its message client
+    """
+    def __init__(self):
+        self.workbench = workbench.WorkBench(self)
+        self.proc_name = 'event_benchmark'
+        self.id = None
+
+    def is_spawned(self):
+        return True
+
+    def get_scoped_name(self, scope, name):
+        return name
+
+
+class StandInBroker(object):
+    """
+    Stands in for Publisher.publish - each send answers after latency seconds
+    """
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+
+    def publish(self, data, routing_key=None):
+        self.sent += 1
+        d = defer.Deferred()
+        reactor.callLater(self.latency, d.callback, True)
+        return d
+
+
+@defer.inlineCallbacks
+def run(count, latency, batch_sizes):
+    proc = StandInProcess()
+
+    # create_event - the first event of a type works out its fields, the rest reuse them
+    pub = ResourceLifecycleEventPublisher(process=proc, origin='benchmark')
+    EventPublisher._templates.clear()
+    t1 = time.time()
+    for i in xrange(count):
+        yield pub.create_event(name='event%d' % i, state='ACTIVE')
+    t2 = time.time()
+    report('create_event', count, t2 - t1, unit='events')
+
+    # the message repository of each event, which create_event makes before it sets any field
+    t1 = time.time()
+    for i in xrange(count):
+        yield pub._mc.create_instance(EVENT_MESSAGE_TYPE)
+    t2 = time.time()
+    report('create_instance', count, t2 - t1, unit='events')
+
+    for batch_size in batch_sizes:
+        if batch_size > 1:
+            pub = ResourceLifecycleEventPublisher(process=proc, origin='benchmark', batch_size=batch_size)
+        else:
+            pub = ResourceLifecycleEventPublisher(process=proc, origin='benchmark')
+        broker = StandInBroker(latency)
+        pub.publish = broker.publish
+
+        t1 = time.time()
+        for i in xrange(count):
+            yield pub.create_and_publish_event(name='event%d' % i, state='ACTIVE')
+        yield pub.flush()
+        t2 = time.time()
+
+        report('publish with batch size %d' % batch_size, count, t2 - t1, unit='events')
+        print '    sent: %d, rss %d KB' % (broker.sent, current_rss_kb())
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=5000, help="The number of events")
+    parser.add_option("-l", "--latency", dest="latency", default=0.001, help="Seconds for each send to answer")
+    parser.add_option("-b", "--batch", dest="batch", default='1,16,64',
+                      help="Comma separated batch sizes, 1 for no batching")
+    opts, args = parser.parse_args()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    batch_sizes = [int(b) for b in opts.batch.split(',')]
+    d = defer.maybeDeferred(run, int(opts.number), float(opts.latency), batch_sizes)
+    d.addBoth(done)
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
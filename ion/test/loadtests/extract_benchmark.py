@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/extract_benchmark.py
+@brief Time to extract subsets of a large variable stored as bounded arrays - numpy plan against python lists
+
+The variable is a float64 array of rows x 100 x 1000 elements (10M by default), stored as bounded arrays of 10 rows
+each. The list extraction is what op_extract_data did before the extraction plan: one strip of the last dimension at a
+time, striding with a list comprehension into a [None] * n list which is then scanned for unfilled elements. The numpy extraction converts each bounded array once
+(timed separately, as the datastore keeps the converted arrays in its LRU cache) and then copies a strided box per
+chunk.
+
+Run it like this:
+bin/python ion/test/loadtests/extract_benchmark.py -r 100 -c 15000
+"""
+
+import itertools
+import time
+from optparse import OptionParser
+
+import numpy
+
+from ion.services.coi.array_extraction import ExtractionPlan
+
+from ion.test.loadtests.benchutil import report, current_rss_kb
+
+BA_ROWS = 10
+SHAPE = [100, 1000]
+
+
+def make_variable(rows):
+    """
+    @retval a list of (origins, sizes, python list of values) - one for each bounded array
+    """
+    bounded_arrays = []
+    rowsize = SHAPE[0] * SHAPE[1]
+    for row in xrange(0, rows, BA_ROWS):
+        n = min(BA_ROWS, rows - row)
+        values = numpy.arange(row * rowsize, (row + n) * rowsize, dtype=numpy.float64).tolist()
+        bounded_arrays.append(([row, 0, 0], [n] + SHAPE, values))
+    return bounded_arrays
+
+
+def list_extract(bounded_arrays, origins, sizes, strides):
+    """
+    The pure python extraction - one strip of the last dimension at a time
+    """
+    counts = [-(-size // stride) for size, stride in zip(sizes, strides)]
+    result = [None] * reduce(lambda x, y: x * y, counts)
+
+    index = 0
+    for outer in itertools.product(*[xrange(o, o + s, st) for o, s, st in zip(origins[:-1], sizes[:-1], strides[:-1])]):
+        for ba_origins, ba_sizes, values in bounded_arrays:
+            inside = True
+            for i, bo, bs in zip(outer, ba_origins, ba_sizes):
+                if i < bo or i >= bo + bs:
+                    inside = False
+                    break
+            if not inside:
+                continue
+
+            # index of the start of the strip in the bounded array
+            offset = 0
+            for i, bo, inner in zip(outer, ba_origins, ba_sizes[1:]):
+                offset = (offset + i - bo) * inner
+
+            strip = values[offset + origins[-1]:offset + origins[-1] + sizes[-1]]
+            if strides[-1] != 1:
+                strip = [d for i, d in enumerate(strip) if i % strides[-1] == 0]
+            result[index:index + len(strip)] = strip
+            index += len(strip)
+
+    # op_extract_data checked every chunk was filled
+    nonelist = [i for i, d in enumerate(result) if d is None]
+    assert not nonelist
+
+    return result
+
+
+def numpy_extract(arrays, origins, sizes, strides, chunk_elements):
+    plan = ExtractionPlan(origins, sizes, strides)
+
+    matches = []
+    for ba_origins, ba_sizes, array in arrays:
+        ranges = plan.match(ba_origins, ba_sizes)
+        if ranges is not None:
+            matches.append((ranges, ba_origins, array))
+
+    result = []
+    for region, start, count in plan.chunks(chunk_elements):
+        target = plan.chunk_array(region, numpy.float64)
+        for ranges, ba_origins, array in matches:
+            if plan.intersects(region, ranges):
+                plan.copy(target, region, ranges, ba_origins, array)
+        # What goes into the chunk message
+        result.extend(target.ravel().tolist())
+
+    return result
+
+
+def run(rows, chunk_elements):
+    t1 = time.time()
+    bounded_arrays = make_variable(rows)
+    t2 = time.time()
+    elements = rows * SHAPE[0] * SHAPE[1]
+    report('build variable', elements, t2 - t1, unit='elements')
+    print '    rss: %d KB' % current_rss_kb()
+
+    t1 = time.time()
+    arrays = [(o, s, numpy.fromiter(values, numpy.float64, len(values)).reshape(s)) for o, s, values in bounded_arrays]
+    t2 = time.time()
+    report('convert to ndarrays (once)', elements, t2 - t1, unit='elements')
+
+    subsets = [
+        ('1% box', [rows / 4, 25, 250], [max(1, rows / 10), 10, 100], [1, 1, 1]),
+        ('10% every 10th', [0, 0, 0], [rows, SHAPE[0], SHAPE[1]], [1, 1, 10]),
+        ('strided outer dims', [0, 0, 0], [rows, SHAPE[0], SHAPE[1]], [5, 5, 1]),
+        ('everything', [0, 0, 0], [rows, SHAPE[0], SHAPE[1]], [1, 1, 1]),
+    ]
+
+    for name, origins, sizes, strides in subsets:
+        t1 = time.time()
+        expected = list_extract(bounded_arrays, origins, sizes, strides)
+        t2 = time.time()
+        report('lists %s' % name, len(expected), t2 - t1, unit='elements')
+
+        t1 = time.time()
+        result = numpy_extract(arrays, origins, sizes, strides, chunk_elements)
+        t2 = time.time()
+        report('numpy %s' % name, len(result), t2 - t1, unit='elements')
+
+        assert result == expected
+        del expected, result
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-r", "--rows", dest="rows", default=100, help="The number of 100 x 1000 rows in the variable")
+    parser.add_option("-c", "--chunk", dest="chunk", default=15000, help="The number of elements in each chunk")
+    opts, args = parser.parse_args()
+
+    run(int(opts.rows), int(opts.chunk))
+
+if __name__ == "__main__":
+    main()
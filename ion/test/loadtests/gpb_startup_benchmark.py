@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/gpb_startup_benchmark.py
+@brief Startup cost of the Protocol Buffers type lookup: proto modules
+imported and wall clock time, importing them all as build_gpb_lookup does
+against importing the modules of the types looked up only, from the manifest
+
+Each startup runs in a new python process, which imports object_utils, looks
+up a few types as a short test or script does, and optionally loads the
+service modules as the container does on startup. The first, eager, run
+writes the manifest if there is none.
+
+Run it like this:
+bin/python ion/test/loadtests/gpb_startup_benchmark.py -n 5 -m
+"""
+
+import subprocess
+import sys
+from optparse import OptionParser
+
+from ion.test.loadtests.benchutil import report
+
+STARTUP = '''
+import sys, time
+t1 = time.time()
+from ion.core.object import object_utils
+if %(eager)r:
+    object_utils.gpb_id_to_class.load_all()
+for typeid in %(lookups)r:
+    object_utils.get_gpb_class_from_type_id(typeid)
+if %(modules)r:
+    from ion.core.cc.modloader import ModuleLoader
+    ModuleLoader().load_modules()
+t2 = time.time()
+protos = len([name for name, module in sys.modules.items() if name.startswith('net.') and module is not None])
+print protos, len(sys.modules), t2 - t1
+'''
+
+# Types of the CDM dataset, as used by most tests of the data services
+LOOKUPS = [10001, 10020, 10024, 10018, 10017, 10025, 10014]
+
+
+def startup(eager, modules):
+    code = STARTUP % {'eager':eager, 'lookups':LOOKUPS, 'modules':modules}
+    output = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE).communicate()[0]
+    protos, imported, secs = output.split()[-3:]
+    return int(protos), int(imported), float(secs)
+
+
+def run(count, modules):
+    for label, eager in (('all protos', True), ('protos used', False)):
+        results = [startup(eager, modules) for i in xrange(count)]
+        secs = sum([result[2] for result in results])
+        report('startup, %s' % label, count, secs, unit='startups')
+        print '    %.3f sec per startup, %d proto modules and %d modules imported' % (
+            secs / count, results[-1][0], results[-1][1])
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=5, help="The number of startups of each kind")
+    parser.add_option("-m", "--modules", dest="modules", action="store_true", default=False,
+                      help="Load the service modules as the container does")
+    opts, args = parser.parse_args()
+
+    run(int(opts.number), opts.modules)
+
+if __name__ == "__main__":
+    main()
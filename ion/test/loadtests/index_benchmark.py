@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/index_benchmark.py
+@brief Range query latency of the in memory IndexStore - sorted index against a scan of the index values
+
+Every row has a distinct timestamp and one of a few states. The scan is the range query the IndexStore used before the
+sorted index: collect the keys for every index value greater than the bound, anchored by an equal to predicate.
+
+Run it like this:
+bin/python ion/test/loadtests/index_benchmark.py -n 100000 -q 100
+"""
+
+import time
+from optparse import OptionParser
+
+from ion.core.data import store
+from ion.core.data.store import Query
+
+from ion.test.loadtests.benchutil import report
+
+STATES = ['UT', 'WI', 'CA', 'MA']
+
+
+def load(rows):
+    s = store.IndexStore(indices=['timestamp', 'state'])
+    for i in xrange(rows):
+        s.put('row%d' % i, 'value %d' % i, {'timestamp':'%010d' % i, 'state':STATES[i % len(STATES)]})
+    return s
+
+
+def scan_query(s, state, bound):
+    """
+    The old query - an equal to anchor and a scan of every value in the range index
+    """
+    keys = set(s.indices['state'].get(state, set()))
+
+    kindex = s.indices['timestamp']
+    matches = set()
+    for attr_val in kindex.keys():
+        if attr_val > bound:
+            matches.update(kindex.get(attr_val, set()))
+    keys.intersection_update(matches)
+
+    result = {}
+    for k in keys:
+        if s.kvs.has_key(k):
+            result[k] = s.kvs.get(k).copy()
+    return result
+
+
+def sorted_query(s, state, bound):
+    q = Query()
+    if state is not None:
+        q.add_predicate_eq('state', state)
+    q.add_predicate_gt('timestamp', bound)
+
+    out = []
+    s.query(q).addCallback(out.append)
+    return out[0]
+
+
+def run(rows, queries):
+    t1 = time.time()
+    s = load(rows)
+    t2 = time.time()
+    report('load', rows, t2 - t1, unit='rows')
+
+    # Build the sorted index before timing the queries
+    sorted_query(s, 'UT', '%010d' % rows)
+
+    for fraction in (0.0001, 0.01, 0.5):
+        bound = '%010d' % int(rows * (1 - fraction))
+
+        t1 = time.time()
+        for i in xrange(queries):
+            scan_result = scan_query(s, 'UT', bound)
+        t2 = time.time()
+        report('scan GT + EQ, %g of rows' % fraction, queries, t2 - t1, unit='queries')
+
+        t1 = time.time()
+        for i in xrange(queries):
+            result = sorted_query(s, 'UT', bound)
+        t2 = time.time()
+        report('sorted GT + EQ, %g of rows' % fraction, queries, t2 - t1, unit='queries')
+        assert sorted(result.keys()) == sorted(scan_result.keys())
+
+        t1 = time.time()
+        for i in xrange(queries):
+            sorted_query(s, None, bound)
+        t2 = time.time()
+        report('sorted GT only, %g of rows' % fraction, queries, t2 - t1, unit='queries')
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=100000, help="The number of rows in the store")
+    parser.add_option("-q", "--queries", dest="queries", default=100, help="The number of queries of each kind")
+    opts, args = parser.parse_args()
+
+    run(int(opts.number), int(opts.queries))
+
+if __name__ == "__main__":
+    main()
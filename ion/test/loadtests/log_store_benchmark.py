@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/log_store_benchmark.py
+@brief Throughput and latency of the log structured store against the in memory Store
+
+Blobs of a fixed size are put one at a time, put in batches, read back in random order and overwritten until the log
+compacts. The log store is then reopened to time the recovery of its index. Run it with and without fsync to see the
+cost of durable writes.
+
+Run it like this:
+bin/python ion/test/loadtests/log_store_benchmark.py -n 20000 -s 1024 -b 100
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+from optparse import OptionParser
+
+from ion.core.data import store
+from ion.core.data import log_store
+
+from ion.test.loadtests.benchutil import report, sync_result
+
+
+def timed(name, count, func, *args):
+    t1 = time.time()
+    func(*args)
+    t2 = time.time()
+    report(name, count, t2 - t1)
+    if count:
+        print '    mean latency: %.1f usec' % ((t2 - t1) / count * 10**6)
+
+
+def put_each(s, items):
+    for key, value in items:
+        sync_result(s.put(key, value))
+
+
+def put_batches(s, items, batch):
+    for i in xrange(0, len(items), batch):
+        sync_result(s.put_many(dict(items[i:i + batch])))
+
+
+def get_each(s, keys):
+    for key in keys:
+        sync_result(s.get(key))
+
+
+def run(name, s, count, size, batch):
+    value = os.urandom(size)
+    items = [('key%d' % i, value) for i in xrange(count)]
+    keys = [key for key, v in items]
+    random.shuffle(keys)
+
+    timed('%s put' % name, count, put_each, s, items)
+    timed('%s put_many x%d' % (name, batch), count, put_batches, s, items, batch)
+    timed('%s get' % name, count, get_each, s, keys)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=20000, help="The number of blobs")
+    parser.add_option("-s", "--size", dest="size", default=1024, help="The size of each blob in bytes")
+    parser.add_option("-b", "--batch", dest="batch", default=100, help="The number of blobs in a put_many")
+    opts, args = parser.parse_args()
+
+    count, size, batch = int(opts.number), int(opts.size), int(opts.batch)
+
+    store.Store.kvs.clear()
+    run('memory', store.Store(), count, size, batch)
+
+    directory = tempfile.mkdtemp()
+    try:
+        for fsync in (False, True):
+            filename = os.path.join(directory, 'blobs_%s.log' % fsync)
+            s = log_store.LogStore(filename=filename, fsync=fsync)
+            run('log%s' % (fsync and ' fsync' or ''), s, count, size, batch)
+
+            print '    file: %d bytes, live: %d bytes, compactions: %d' % (
+                s._log.size, s._log.live_bytes, s._log.compactions)
+            s.close()
+
+            t1 = time.time()
+            s = log_store.LogStore(filename=filename)
+            t2 = time.time()
+            report('log recovery', len(s._log.keys()), t2 - t1, unit='keys')
+            s.close()
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
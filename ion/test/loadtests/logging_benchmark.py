@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/logging_benchmark.py
+@brief Cost of the debug log statements of a message handler with debug off,
+formatting the message before the log call against passing the arguments to
+the logger, with a lazy argument and behind a level guard
+
+The handler logs what Receiver.receive logs for each message: a few short
+debug lines with the process name and message headers, and the state of the
+process, whose str() walks a table of conversations like the workbench of a
+process does.
+
+Run it like this:
+bin/python ion/test/loadtests/logging_benchmark.py -n 20000 -e 200
+"""
+
+import logging
+import time
+from optparse import OptionParser
+
+from ion.util.ionlog import lazy
+
+from ion.test.loadtests.benchutil import report
+
+log = logging.getLogger('ion.test.loadtests.logging_benchmark')
+
+
+class ProcessState(object):
+    """
+    A stand in for the workbench of a process
+    """
+    def __init__(self, entries):
+        self.entries = dict(('conv-%d' % i, {'state':'active', 'seq':i}) for i in xrange(entries))
+
+    def __str__(self):
+        return '\n'.join(['%s: %r' % item for item in sorted(self.entries.items())])
+
+
+def eager(name, headers, state):
+    log.debug('[%s] receive(): Message from [%s] ...' % (name, headers['sender']))
+    log.debug('[%s] BEFORE YIELD to op: %s' % (name, str(headers)))
+    log.debug('WORKBENCH STATE:\n%s' % str(state))
+    log.debug('[%s] AFTER YIELD to op: %s' % (name, str(headers)))
+
+
+def deferred(name, headers, state):
+    log.debug('[%s] receive(): Message from [%s] ...', name, headers['sender'])
+    log.debug('[%s] BEFORE YIELD to op: %s', name, headers)
+    log.debug('WORKBENCH STATE:\n%s', lazy(str, state))
+    log.debug('[%s] AFTER YIELD to op: %s', name, headers)
+
+
+def guarded(name, headers, state):
+    log.debug('[%s] receive(): Message from [%s] ...', name, headers['sender'])
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('[%s] BEFORE YIELD to op: %s', name, headers)
+        log.debug('WORKBENCH STATE:\n%s', state)
+        log.debug('[%s] AFTER YIELD to op: %s', name, headers)
+
+
+def run(count, entries):
+    logging.basicConfig(level=logging.WARNING)
+    state = ProcessState(entries)
+    headers = {'sender':'proc-1', 'receiver':'proc-2', 'op':'get', 'conv-id':'conv-1', 'conv-seq':1,
+               'protocol':'rpc', 'performative':'request', 'user-id':'ANONYMOUS', 'expiry':'0'}
+
+    for label, handler in (('format before the log call', eager), ('arguments to the logger', deferred),
+                           ('behind a level guard', guarded)):
+        t1 = time.time()
+        for i in xrange(count):
+            handler('proc-2', headers, state)
+        t2 = time.time()
+        report(label, count, t2 - t1, unit='messages')
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=20000, help="The number of messages")
+    parser.add_option("-e", "--entries", dest="entries", default=200, help="Conversations in the process state")
+    opts, args = parser.parse_args()
+
+    run(int(opts.number), int(opts.entries))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/policy_benchmark.py
+@brief Latency of the ownership check of PolicyInterceptor for a message which
+references many resources, without the decision cache and with it, for the
+owner of the resources and for a user who owns none of them. A denial ends the
+check, so the other user needs one query per message at most.
+
+The association service is a stand in which answers each association_exists
+query after a fixed latency, as one RPC round trip.
+
+Run it like this:
+bin/python ion/test/loadtests/policy_benchmark.py -n 200 -r 50 -l 0.002
+"""
+
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer, reactor
+
+from ion.core.intercept.policy import PolicyInterceptor
+from ion.core.process.cprocess import Invocation
+
+from ion.test.loadtests.benchutil import report
+
+
+class StandInPolicyInterceptor(PolicyInterceptor):
+    def __init__(self, latency, ttl):
+        PolicyInterceptor.__init__(self, 'policy')
+        self.latency = latency
+        self.owner = 'owner'
+        self.decision_cache.ttl = ttl
+        self.queries = 0
+
+    def query_owner(self, user_id, uuid, invocation):
+        self.queries += 1
+        d = defer.Deferred()
+        reactor.callLater(self.latency, d.callback, user_id == self.owner)
+        return d
+
+    def listen_for_ownership_changes(self):
+        return defer.succeed(None)
+
+
+@defer.inlineCallbacks
+def run(count, resources, latency):
+    uuids = ['resource-%d' % i for i in xrange(resources)]
+
+    for user_id, status in (('owner', Invocation.STATUS_PROCESS), ('other', Invocation.STATUS_DROP)):
+        for ttl in (0, 60.0):
+            interceptor = StandInPolicyInterceptor(latency, ttl)
+
+            t1 = time.time()
+            for i in xrange(count):
+                invocation = Invocation()
+                yield interceptor.check_owner(user_id, uuids, invocation)
+                assert invocation.status == status
+            t2 = time.time()
+
+            report('ownership check of %d resources by %s, %s' % (resources, user_id,
+                   'cached' if ttl else 'not cached'), count, t2 - t1, unit='messages')
+            stats = interceptor.decision_cache.stats()
+            print '    %.3f ms per message, %d association queries, cache hits %d misses %d' % (
+                (t2 - t1) * 1000.0 / count, interceptor.queries, stats['hits'], stats['misses'])
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=200, help="The number of messages")
+    parser.add_option("-r", "--resources", dest="resources", default=50, help="Resources referenced by each message")
+    parser.add_option("-l", "--latency", dest="latency", default=0.002, help="Seconds for each association query")
+    opts, args = parser.parse_args()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    d = defer.maybeDeferred(run, int(opts.number), int(opts.resources), float(opts.latency))
+    d.addBoth(done)
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/prefetch_benchmark.py
+@brief Deliveries held by a slow consumer under a fast producer, for several
+prefetch windows of the Consumer
+
+The broker is an in process stand in: a queue which delivers to the channel
+of the consumer as long as the number of unacked deliveries is below the
+prefetch_count of basic.qos (0 for no limit, as in AMQP). The producer puts
+all its messages on the queue at once; the consumer takes handle seconds per
+message and handles them one at a time, like a process which yields on each
+message.
+
+Run it like this:
+bin/python ion/test/loadtests/prefetch_benchmark.py -n 2000 -s 10000 -t 0.001 -p 0,1,10,100
+"""
+
+import gc
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer, reactor
+
+from ion.core.messaging.messaging import Consumer
+
+from ion.test.loadtests.benchutil import report, current_rss_kb
+
+
+class StandInContent(object):
+    def __init__(self, body):
+        self.body = body
+        self.properties = {}
+
+
+class StandInDelivery(object):
+    def __init__(self, tag, body):
+        self.delivery_tag = tag
+        self.content = StandInContent(body)
+
+
+class StandInBroker(object):
+    """
+    One queue and one consuming channel
+    """
+
+    def __init__(self):
+        self.queue = []
+        self.unacked = 0
+        self.prefetch_count = 0
+        self.deliver_callback = None
+        self.closed = False
+
+    # The channel of the consumer
+    def exchange_declare(self, **kwargs):
+        return defer.succeed(None)
+
+    def queue_declare(self, **kwargs):
+        return defer.succeed(None)
+
+    def queue_bind(self, **kwargs):
+        return defer.succeed(None)
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_=False):
+        self.prefetch_count = prefetch_count
+        return defer.succeed(None)
+
+    def set_consumer_callback(self, callback):
+        self.deliver_callback = callback
+
+    def basic_consume(self, **kwargs):
+        self.deliver()
+        return defer.succeed(None)
+
+    def basic_ack(self, delivery_tag):
+        self.unacked -= 1
+        reactor.callLater(0, self.deliver)
+        return defer.succeed(None)
+
+    def publish(self, body):
+        self.queue.append(body)
+        self.deliver()
+
+    def deliver(self):
+        while self.queue and self.deliver_callback and (not self.prefetch_count or
+                                                        self.unacked < self.prefetch_count):
+            self.unacked += 1
+            body = self.queue.pop(0)
+            self.deliver_callback(StandInDelivery(self.unacked, body))
+
+
+class SlowHandler(object):
+    """
+    Handles one message at a time, taking handle seconds for each; the rest wait in memory
+    """
+
+    def __init__(self, count, handle):
+        self.count = count
+        self.handle = handle
+        self.waiting = []
+        self.busy = False
+        self.max_waiting = 0
+        self.done = defer.Deferred()
+        self.handled = 0
+
+    def __call__(self, message):
+        self.waiting.append(message)
+        self.max_waiting = max(self.max_waiting, len(self.waiting))
+        if not self.busy:
+            self.next()
+
+    def next(self):
+        if not self.waiting:
+            self.busy = False
+            return
+        self.busy = True
+        reactor.callLater(self.handle, self.finish, self.waiting.pop(0))
+
+    def finish(self, message):
+        message.ack()
+        self.handled += 1
+        if self.handled == self.count:
+            self.done.callback(None)
+        self.next()
+
+
+@defer.inlineCallbacks
+def run(count, size, handle, prefetch_counts):
+    for prefetch_count in prefetch_counts:
+        gc.collect()
+        rss = current_rss_kb()
+
+        broker = StandInBroker()
+        consumer = Consumer(broker, queue='slow', exchange='magnet.topic', no_ack=False,
+                            prefetch_count=prefetch_count)
+        yield consumer.declare()
+        handler = SlowHandler(count, handle)
+
+        # The fast producer
+        for i in xrange(count):
+            broker.publish('%08d' % i + 'x' * (size - 8))
+
+        t1 = time.time()
+        yield consumer.consume(handler)
+        peak_rss = current_rss_kb()
+        yield handler.done
+        t2 = time.time()
+
+        stats = consumer.flow_stats()
+        report('prefetch_count %d' % prefetch_count, count, t2 - t1, unit='messages')
+        print '    max in flight: %d, max waiting in the consumer: %d (%d KB of bodies), rss +%d KB' % (
+            stats['max_in_flight'], handler.max_waiting, handler.max_waiting * size / 1024, peak_rss - rss)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=2000, help="The number of messages")
+    parser.add_option("-s", "--size", dest="size", default=10000, help="Bytes in each message")
+    parser.add_option("-t", "--handle", dest="handle", default=0.001, help="Seconds to handle each message")
+    parser.add_option("-p", "--prefetch", dest="prefetch", default='0,1,10,100',
+                      help="Comma separated prefetch counts, 0 for no limit")
+    opts, args = parser.parse_args()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    prefetch_counts = [int(p) for p in opts.prefetch.split(',')]
+    d = defer.maybeDeferred(run, int(opts.number), int(opts.size), float(opts.handle), prefetch_counts)
+    d.addBoth(done)
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/publisher_benchmark.py
+@brief Broker round trips and send rate of ProcessExchangeSpace.send, a new
+channel and exchange declare for every message against the ChannelPool of
+the connection
+
+The amqp client is a stand in which answers each method with a round trip,
+after a fixed latency; basic_publish has no reply and answers at once.
+
+Run it like this:
+bin/python ion/test/loadtests/publisher_benchmark.py -n 5000 -l 0.0005
+"""
+
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer, reactor
+
+from ion.core.messaging.messaging import ChannelPool, ProcessExchangeSpace
+
+from ion.test.loadtests.benchutil import report
+
+
+class StandInChannel(object):
+    def __init__(self, client):
+        self.client = client
+        self.closed = False
+
+    def _round_trip(self, method):
+        self.client.calls[method] = self.client.calls.get(method, 0) + 1
+        d = defer.Deferred()
+        reactor.callLater(self.client.latency, d.callback, None)
+        return d
+
+    def channel_open(self):
+        return self._round_trip('channel_open')
+
+    def channel_close(self):
+        self.closed = True
+        return self._round_trip('channel_close')
+
+    def exchange_declare(self, **kwargs):
+        return self._round_trip('exchange_declare')
+
+    def basic_publish(self, **kwargs):
+        self.client.calls['basic_publish'] = self.client.calls.get('basic_publish', 0) + 1
+        return defer.succeed(None)
+
+
+class StandInClient(object):
+    closed = False
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = {}
+
+    def channel(self):
+        return StandInChannel(self)
+
+
+class StandInMessageSpace(object):
+    def __init__(self, client, pooled):
+        self.client = client
+        self.channel_pool = ChannelPool(client) if pooled else None
+
+
+@defer.inlineCallbacks
+def run(count, latency, concurrency):
+    for pooled in (False, True):
+        client = StandInClient(latency)
+        exchange_space = ProcessExchangeSpace(StandInMessageSpace(client, pooled), 'magnet.topic')
+
+        def sender(n):
+            for i in xrange(n):
+                yield exchange_space.send('worker%d' % (i % 10), 'message %d' % i)
+        sender = defer.inlineCallbacks(sender)
+
+        t1 = time.time()
+        yield defer.DeferredList([sender(count / concurrency) for i in xrange(concurrency)])
+        t2 = time.time()
+
+        sent = client.calls.get('basic_publish', 0)
+        report('send %s' % ('with channel pool' if pooled else 'without channel pool'), sent, t2 - t1,
+               unit='messages')
+        print '    per 1000 messages: %.1f exchange declares, %.1f channel opens, %.1f channel closes' % tuple(
+            [client.calls.get(method, 0) * 1000.0 / sent
+             for method in ('exchange_declare', 'channel_open', 'channel_close')])
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=5000, help="The number of messages")
+    parser.add_option("-l", "--latency", dest="latency", default=0.0005, help="Seconds for each broker round trip")
+    parser.add_option("-c", "--concurrency", dest="concurrency", default=4, help="The number of senders at once")
+    opts, args = parser.parse_args()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    d = defer.maybeDeferred(run, int(opts.number), float(opts.latency), int(opts.concurrency))
+    d.addBoth(done)
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/pull_benchmark.py
+@brief Bytes exchanged and latency of an incremental workbench pull as the repository history grows
+
+Two workbenches are connected back to back in one process. The messages between them are packed and unpacked with
+the object codec, so the byte counts are those that would go over the wire. For each history length the puller clones
+the repository and then pulls again after every new commit. The negotiated pull (heads and checkpoints) is compared
+with the full list of known commits sent by earlier versions of the workbench.
+
+Run it like this:
+bin/python ion/test/loadtests/pull_benchmark.py -c 10,100,1000 -n 20
+"""
+
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer
+
+from ion.core.object import workbench
+from ion.core.object import object_utils
+from ion.core.object import codec
+from ion.core.messaging.message_client import MessageInstance
+
+from ion.test.loadtests.benchutil import report, sync_result
+
+ION_MESSAGE_TYPE = object_utils.create_type_identifier(object_id=11, version=1)
+ADDRESSBOOK_TYPE = object_utils.create_type_identifier(object_id=20002, version=1)
+
+
+class LoopbackProcess(object):
+    """
+    Just enough of a process for a workbench to pull from its peer
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.workbench = workbench.WorkBench(self)
+        self.message_client = self
+        self.peer = None
+        self.reply = None
+
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def get_scoped_name(self, scope, name):
+        return name
+
+    def create_instance(self, MessageContentTypeID):
+        msg_repo = self.workbench.create_repository(ION_MESSAGE_TYPE)
+        msg_repo.root_object.identity = msg_repo.repository_key
+        msg_repo.root_object.message_object = msg_repo.create_object(MessageContentTypeID)
+        msg_repo.commit('Message object instantiated')
+        return defer.succeed(MessageInstance(msg_repo))
+
+    def _transfer(self, content, receiver):
+        serialized = codec.pack_structure(content)
+        root = codec.unpack_structure(serialized)
+        receiver.workbench.put_repository(root.Repository)
+        return MessageInstance(root.Repository), len(serialized)
+
+    def rpc_send(self, recv, operation, content):
+        request, size = self._transfer(content, self.peer)
+        self.bytes_sent += size
+
+        d = getattr(self.peer.workbench, 'op_' + operation)(request, {}, {})
+        sync_result(d)
+
+        result, size = self._transfer(self.peer.reply, self)
+        self.bytes_received += size
+        result.MessageResponseCode = result.ResponseCodes.OK
+
+        return defer.succeed((result, {}, {}))
+
+    def reply_ok(self, msg, content=None):
+        self.reply = content
+        return defer.succeed(None)
+
+
+def make_history(repo, start, count):
+    for i in xrange(start, start + count):
+        repo.root_object.title = 'version %d' % i
+        repo.commit('Update %d' % i)
+
+
+def run(commits, pulls, negotiate):
+    server = LoopbackProcess('server')
+    puller = LoopbackProcess('puller')
+    puller.peer = server
+
+    if not negotiate:
+        # What the workbench sent before negotiation - every commit it knows
+        puller.workbench.list_commit_checkpoints = puller.workbench.list_repository_commits
+
+    repo = server.workbench.create_repository(ADDRESSBOOK_TYPE)
+    repo.persistent = True
+    make_history(repo, 0, commits)
+
+    sync_result(puller.workbench.pull('server', repo.repository_key, get_head_content=False))
+
+    puller.bytes_sent = 0
+    puller.bytes_received = 0
+
+    t1 = time.time()
+    for i in xrange(pulls):
+        make_history(repo, commits + i, 1)
+        sync_result(puller.workbench.pull('server', repo.repository_key, get_head_content=False))
+    t2 = time.time()
+
+    name = '%s pull, history %d' % (negotiate and 'negotiated' or 'full list', commits)
+    report(name, pulls, t2 - t1, unit='pulls')
+    if pulls:
+        print '    mean latency: %.2f msec, request: %d bytes, response: %d bytes' % (
+            (t2 - t1) / pulls * 10**3, puller.bytes_sent / pulls, puller.bytes_received / pulls)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-c", "--commits", dest="commits", default='10,100,1000',
+                      help="Comma separated list of history lengths")
+    parser.add_option("-n", "--number", dest="number", default=20, help="The number of incremental pulls")
+    opts, args = parser.parse_args()
+
+    for commits in [int(c) for c in opts.commits.split(',')]:
+        run(commits, int(opts.number), negotiate=False)
+        run(commits, int(opts.number), negotiate=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/scheduler_benchmark.py
+@brief Scheduling many periodic tasks with a delayed call of the reactor each,
+as the scheduler service did, against PeriodicTasks on a TimerWheel
+
+Each task fires at one of a few intervals, from one of a number of start
+times, as tasks added by the same kind of client do. Reports the time to add
+and to remove the tasks, the delayed calls the reactor has to keep, and the
+CPU time, lateness and calls of firing them for a while. Also reports the
+time to reload the tasks from the in memory index store, a page at a time, as
+the scheduler service does when it starts.
+
+Run it like this:
+bin/python ion/test/loadtests/scheduler_benchmark.py -n 100000 -d 20
+"""
+
+import random
+import resource
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer, reactor
+
+from ion.core.data.store import IndexStore, Query
+from ion.services.dm.scheduler.timer_wheel import TimerWheel, PeriodicTasks
+from ion.util.procutils import asleep
+
+from ion.test.loadtests.benchutil import report
+
+INTERVALS = [1, 2, 5, 10, 30, 60]
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Stats(object):
+    def __init__(self):
+        self.fired = 0
+        self.calls = 0
+        self.late = 0.0
+
+
+class DelayedCallTasks(object):
+    """
+    A delayed call of the reactor for each task, rescheduled when it fires
+    """
+    def __init__(self, stats):
+        self.stats = stats
+        self.calls = {}
+
+    def add(self, task_id, interval, seconds):
+        delay = max(seconds - time.time(), 0)
+        self.calls[task_id] = reactor.callLater(delay, self._fire, task_id, interval, seconds)
+
+    def remove(self, task_id):
+        self.calls.pop(task_id).cancel()
+
+    def stop(self):
+        for call in self.calls.itervalues():
+            call.cancel()
+
+    def _fire(self, task_id, interval, seconds):
+        self.stats.calls += 1
+        self.stats.fired += 1
+        self.stats.late += time.time() - seconds
+        self.add(task_id, interval, seconds + interval)
+
+
+class WheelTasks(PeriodicTasks):
+    def __init__(self, stats, tick):
+        PeriodicTasks.__init__(self, TimerWheel(tick=tick), self._fired)
+        self.stats = stats
+
+    def _fire(self, group):
+        self.stats.late += (time.time() - group.seconds) * len(group.task_ids)
+        PeriodicTasks._fire(self, group)
+
+    def _fired(self, task_ids):
+        self.stats.calls += 1
+        self.stats.fired += len(task_ids)
+
+
+@defer.inlineCallbacks
+def reload(tasks, page_size):
+    store = IndexStore(indices=['task_id', 'constant', 'start_time', 'interval_seconds'])
+    for task_id, interval, seconds in tasks:
+        yield store.put(task_id, task_id, index_attributes={'task_id': task_id, 'constant': '1',
+                                                            'start_time': str(int(seconds)),
+                                                            'interval_seconds': str(interval)})
+
+    query = Query()
+    query.add_predicate_eq('constant', '1')
+
+    t1 = time.time()
+    rows = yield store.query(query)
+    t2 = time.time()
+    report('reload, one query', len(rows), t2 - t1, unit='tasks')
+
+    t1 = time.time()
+    loaded, pages, cursor = 0, 0, None
+    while True:
+        rows, cursor = yield store.query_page(query, page_size, cursor)
+        loaded += len(rows)
+        pages += 1
+        if cursor is None:
+            break
+    t2 = time.time()
+    report('reload, pages of %d' % page_size, loaded, t2 - t1, unit='tasks')
+    print '    %d pages' % pages
+
+    for task_id, interval, seconds in tasks:
+        yield store.remove(task_id)
+
+
+@defer.inlineCallbacks
+def run(count, duration, phases, tick, page_size):
+    rnd = random.Random(1)
+    now = time.time()
+    tasks = [('task-%d' % i, INTERVALS[i % len(INTERVALS)], now + 1 + rnd.randrange(phases) * 0.5)
+             for i in xrange(count)]
+    removed = rnd.sample(tasks, count / 10)
+
+    yield reload(tasks, page_size)
+
+    for label, engine in (('delayed call each', lambda stats: DelayedCallTasks(stats)),
+                          ('timer wheel', lambda stats: WheelTasks(stats, tick))):
+        stats = Stats()
+        scheduler = engine(stats)
+        before = len(reactor.getDelayedCalls())
+
+        t1 = time.time()
+        for task_id, interval, seconds in tasks:
+            scheduler.add(task_id, interval, seconds + t1 - now)
+        t2 = time.time()
+        report('add, %s' % label, count, t2 - t1, unit='tasks')
+        print '    %d delayed calls in the reactor' % (len(reactor.getDelayedCalls()) - before)
+
+        t1 = time.time()
+        for task_id, interval, seconds in removed:
+            scheduler.remove(task_id)
+        t2 = time.time()
+        report('remove, %s' % label, len(removed), t2 - t1, unit='tasks')
+
+        c1 = cpu_time()
+        yield asleep(duration)
+        c2 = cpu_time()
+        scheduler.stop()
+        report('fire, cpu time, %s' % label, stats.fired, c2 - c1, unit='firings')
+        print '    %.3f cpu sec in %d sec, %d calls to fire, %.1f ms late on average' % (
+            c2 - c1, duration, stats.calls, stats.late * 1000.0 / max(stats.fired, 1))
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=100000, help="The number of tasks")
+    parser.add_option("-d", "--duration", dest="duration", default=20, help="Seconds to fire the tasks for")
+    parser.add_option("-p", "--phases", dest="phases", default=100, help="Distinct start times of the tasks")
+    parser.add_option("-t", "--tick", dest="tick", default=0.1, help="Seconds between ticks of the timer wheel")
+    parser.add_option("-s", "--page-size", dest="page_size", default=1000, help="Tasks in each page of the reload")
+    opts, args = parser.parse_args()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    d = defer.maybeDeferred(run, int(opts.number), int(opts.duration), int(opts.phases), float(opts.tick),
+                          int(opts.page_size))
+    d.addBoth(done)
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/spawn_benchmark.py
+@brief Startup time of a release worth of services spawned by ProcessManager,
+in turn as before and concurrently in dependency order
+
+The supervisor is a stand in whose spawn_child takes the init and activate
+time of each service, as a fixed latency scaled from the slowest services of
+a local container; most of it is waiting on the broker and on RPCs to other
+services, which is what makes concurrent spawning pay off.
+
+Run it like this:
+bin/python ion/test/loadtests/spawn_benchmark.py -c 8 -s 1.0
+"""
+
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer, reactor
+
+from ion.core.process.process import ProcessDesc
+from ion.core.process.proc_manager import ProcessManager, spawn_dependencies
+
+from ion.test.loadtests.benchutil import report
+
+# name, seconds to spawn, dependencies
+SERVICES = [
+    ('datastore', 0.40, []),
+    ('association_service', 0.30, ['datastore']),
+    ('resource_registry', 0.35, ['datastore']),
+    ('exchange_management', 0.25, ['resource_registry']),
+    ('preservation_manager', 0.20, ['resource_registry']),
+    ('attribute_store', 0.10, []),
+    ('identity_registry', 0.30, ['resource_registry', 'attribute_store']),
+    ('pubsub', 0.30, ['resource_registry', 'exchange_management']),
+    ('scheduler', 0.15, ['attribute_store']),
+    ('dataset_controller', 0.25, ['resource_registry', 'association_service']),
+    ('ingestion', 0.20, ['pubsub', 'resource_registry']),
+    ('notification_alert', 0.20, ['pubsub', 'identity_registry']),
+    ('store_service', 0.10, []),
+    ('cdm_validation_service', 0.10, []),
+    ('instrument_integration_service', 0.15, ['resource_registry']),
+    ('app_integration', 0.30, ['resource_registry', 'association_service', 'identity_registry']),
+    ('eventmonitor', 0.10, ['pubsub']),
+    ('instrument_web_monitor', 0.10, ['pubsub']),
+]
+
+
+class StandInSupervisor(object):
+    proc_name = 'bootstrap'
+
+    def __init__(self, latency, scale):
+        self.latency = latency
+        self.scale = scale
+
+    def spawn_child(self, child):
+        d = defer.Deferred()
+        reactor.callLater(self.latency[child.proc_name] * self.scale, d.callback, child.proc_name)
+        return d
+
+
+@defer.inlineCallbacks
+def run(concurrency, scale):
+    procs = [{'name':name, 'dependencies':deps} for name, secs, deps in SERVICES]
+    latency = dict([(name, secs) for name, secs, deps in SERVICES])
+    sup = StandInSupervisor(latency, scale)
+
+    for label, conc in (('in turn', 1), ('%d at once' % concurrency, concurrency)):
+        pm = ProcessManager(None)
+        children = [ProcessDesc(**procDef) for procDef in procs]
+
+        t1 = time.time()
+        if conc == 1:
+            for child in children:
+                yield pm._spawn_child_timed(sup, child)
+        else:
+            depends = spawn_dependencies(procs, children)
+            yield pm._spawn_concurrently(sup, children, depends, conc)
+        t2 = time.time()
+
+        report('spawn %s' % label, len(children), t2 - t1, unit='processes')
+        print '    startup %.3f sec, %.3f sec of spawn time' % (t2 - t1, sum(pm.spawn_timings.values()))
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-c", "--concurrency", dest="concurrency", default=8, help="Processes spawned at once")
+    parser.add_option("-s", "--scale", dest="scale", default=1.0, help="Factor on the spawn time of each service")
+    opts, args = parser.parse_args()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    d = defer.maybeDeferred(run, int(opts.concurrency), float(opts.scale))
+    d.addBoth(done)
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
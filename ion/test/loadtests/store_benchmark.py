@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/store_benchmark.py
+@brief Backend call count and time of the datastore flush and fetch paths - batched against single key operations
+
+A repository holding an address book with many person objects is flushed to in memory blob and commit stores and then
+fetched back into an empty repository. The stores count every call. In single key mode the batch operations are
+broken up into one call per key, as the datastore did before get_many/put_many/has_keys.
+
+Run it like this:
+bin/python ion/test/loadtests/store_benchmark.py -n 10000
+"""
+
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer
+
+from ion.core.data import store
+from ion.core.data.storage_configuration_utility import COMMIT_INDEXED_COLUMNS
+from ion.core.object import object_utils
+from ion.core.object import repository
+from ion.services.coi.datastore import DataStoreWorkbench
+
+from ion.test.loadtests.benchutil import report, sync_result
+
+PERSON_TYPE = object_utils.create_type_identifier(object_id=20001, version=1)
+ADDRESSBOOK_TYPE = object_utils.create_type_identifier(object_id=20002, version=1)
+
+
+class CallCounter(object):
+    """
+    Mixin which counts the calls to a store and optionally splits the batch operations into single key calls
+    """
+
+    calls = 0
+    batched = True
+
+    def get_many(self, keys):
+        if self.batched:
+            self.calls += 1
+            return self._store_cls.get_many(self, keys)
+
+        result = {}
+        for key in keys:
+            self.calls += 1
+            result[key] = sync_result(self._store_cls.get(self, key))
+        return defer.succeed(result)
+
+    def has_keys(self, keys):
+        if self.batched:
+            self.calls += 1
+            return self._store_cls.has_keys(self, keys)
+
+        result = {}
+        for key in keys:
+            self.calls += 1
+            result[key] = sync_result(self._store_cls.has_key(self, key))
+        return defer.succeed(result)
+
+
+class CountingStore(CallCounter, store.Store):
+    _store_cls = store.Store
+
+    def __init__(self, batched):
+        self.kvs = {}
+        self.batched = batched
+
+    def put_many(self, items):
+        if self.batched:
+            self.calls += 1
+            return store.Store.put_many(self, items)
+
+        for key, value in items.iteritems():
+            self.calls += 1
+            store.Store.put(self, key, value)
+        return defer.succeed(None)
+
+
+class CountingIndexStore(CallCounter, store.IndexStore):
+    _store_cls = store.IndexStore
+
+    def __init__(self, batched):
+        self.kvs = {}
+        self.indices = {}
+        self.batched = batched
+        store.IndexStore.__init__(self, indices=COMMIT_INDEXED_COLUMNS)
+
+    def put_many(self, items, index_attributes=None):
+        if self.batched:
+            self.calls += 1
+            return store.IndexStore.put_many(self, items, index_attributes)
+
+        for key, value in items.iteritems():
+            self.calls += 1
+            store.IndexStore.put(self, key, value, (index_attributes or {}).get(key))
+        return defer.succeed(None)
+
+
+def make_repository(wb, persons):
+    repo = wb.create_repository(ADDRESSBOOK_TYPE)
+    book = repo.root_object
+    book.title = 'Benchmark address book'
+
+    for i in xrange(persons):
+        p = repo.create_object(PERSON_TYPE)
+        p.name = 'Person %d' % i
+        p.id = i
+        p.email = 'person%d@example.com' % i
+        book.person.add()
+        book.person[i] = p
+
+    repo.commit('Benchmark repository')
+    return repo
+
+
+def run(persons, batched):
+    mode = batched and 'batched' or 'single key'
+
+    blob_store = CountingStore(batched)
+    commit_store = CountingIndexStore(batched)
+
+    wb = DataStoreWorkbench(None, blob_store, commit_store)
+    repo = make_repository(wb, persons)
+    root_key = repo.root_object.MyId
+    elements = len(repo.index_hash)
+
+    t1 = time.time()
+    sync_result(wb.flush_repo_to_backend(repo))
+    t2 = time.time()
+
+    report('%s flush' % mode, elements, t2 - t1, unit='elements')
+    print '    backend calls: %d' % (blob_store.calls + commit_store.calls)
+
+    blob_store.calls = 0
+    commit_store.calls = 0
+
+    wb = DataStoreWorkbench(None, blob_store, commit_store)
+    new_repo = repository.Repository(repository_key=repo.repository_key)
+    wb.put_repository(new_repo)
+
+    t1 = time.time()
+    blobs = sync_result(wb._get_blobs(new_repo, [root_key]))
+    t2 = time.time()
+
+    report('%s fetch' % mode, len(blobs), t2 - t1, unit='elements')
+    print '    backend calls: %d' % (blob_store.calls + commit_store.calls)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=10000, help="The number of objects in the repository")
+    opts, args = parser.parse_args()
+
+    run(int(opts.number), batched=False)
+    run(int(opts.number), batched=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/traversal_benchmark.py
+@brief Throughput and memory of the iterative DAG walk used by commit, load and copy, against plain recursion
+
+Synthetic DAGs are built as a chain of the given depth where every node also links to a shared leaf, so each walk
+sees both deep structure and shared children.
+
+Run it like this:
+bin/python ion/test/loadtests/traversal_benchmark.py -d 10,100,1000,10000,100000
+"""
+
+import gc
+import sys
+import time
+from optparse import OptionParser
+
+from ion.core.object import traversal
+
+from ion.test.loadtests.benchutil import current_rss_kb, max_rss_kb, report
+
+
+class Node(object):
+    __slots__ = ['children']
+
+    def __init__(self, children):
+        self.children = children
+
+
+def make_dag(depth):
+    leaf = Node([])
+    node = Node([leaf])
+    for i in xrange(depth - 1):
+        node = Node([node, leaf])
+    return node
+
+
+def get_children(node):
+    return node.children
+
+
+def recursive_walk(node, visited):
+    for child in node.children:
+        if id(child) not in visited:
+            visited.add(id(child))
+            recursive_walk(child, visited)
+
+
+def run(depths, repeat):
+
+    for depth in depths:
+        root = make_dag(depth)
+        gc.collect()
+        rss_before = current_rss_kb()
+
+        t1 = time.time()
+        for i in xrange(repeat):
+            stats = traversal.walk([root], get_children)
+        t2 = time.time()
+
+        report('iterative walk depth %d' % depth, stats.visited * repeat, t2 - t1, unit='nodes')
+        print '    max stack depth: %d, RSS growth: %d KB, peak RSS: %d KB' % (stats.max_depth,
+                                                                             current_rss_kb() - rss_before, max_rss_kb())
+
+        t1 = time.time()
+        try:
+            for i in xrange(repeat):
+                recursive_walk(root, set([id(root)]))
+        except RuntimeError, re:
+            print '    recursive walk depth %d: failed - %s' % (depth, re)
+        else:
+            t2 = time.time()
+            report('recursive walk depth %d' % depth, stats.visited * repeat, t2 - t1, unit='nodes')
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-d", "--depths", dest="depths", default='10,100,1000,10000,100000',
+                      help="Comma separated list of DAG depths")
+    parser.add_option("-r", "--repeat", dest="repeat", default=5, help="Number of walks of each DAG")
+    opts, args = parser.parse_args()
+
+    run([int(d) for d in opts.depths.split(',')], int(opts.repeat))
+
+if __name__ == "__main__":
+    main()
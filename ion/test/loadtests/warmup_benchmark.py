@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/warmup_benchmark.py
+@brief Load time of the AIS metadata cache against an in process stand in for the resource registry and association
+service, one fetch at a time against bounded concurrency
+
+Every call to the stand in answers after a fixed latency, standing in for the round trip of a message. One fetch at a
+time is how the cache loaded before the warm up engine. While the cache loads, a reader asks for the metadata of a
+dataset every few milliseconds; its longest wait shows how long the cache lock is held.
+
+Run it like this:
+bin/python ion/test/loadtests/warmup_benchmark.py -n 2000 -l 0.002 -c 1,8,32
+"""
+
+import time
+from optparse import OptionParser
+
+from twisted.internet import defer, reactor, task
+
+from ion.integration.ais.common.metadata_cache import MetadataCache
+from ion.services.coi.datastore_bootstrap.ion_preload_config import DATASET_RESOURCE_TYPE_ID
+
+from ion.test.loadtests.benchutil import report, current_rss_kb
+
+ACTIVE = 'Active'
+COMMISSIONED = 'Commissioned'
+
+
+class Obj(object):
+    """
+    A bag of attributes
+    """
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Attribute(object):
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def GetValue(self):
+        return self.value
+
+
+class Pairs(list):
+    def add(self):
+        pair = Obj()
+        self.append(pair)
+        return pair
+
+
+class Request(object):
+    """
+    Stands in for a predicate object or subject predicate query message
+    """
+    def __init__(self):
+        self.pairs = Pairs()
+
+    def CreateObject(self, type):
+        return Obj()
+
+
+class StandInProcess(object):
+    """
+    Just enough of a process to create the clients of the cache, which are then replaced
+    """
+    def __init__(self):
+        self.workbench = Obj(op_fetch_blobs=None)
+
+    def get_scoped_name(self, scope, name):
+        return name
+
+
+class StandInRegistry(object):
+    """
+    The resource client, association client, association service client and message client of the cache, holding
+    count datasets and one data source for each of them. Each call answers after latency seconds.
+    """
+
+    def __init__(self, count, latency):
+        self.latency = latency
+        self.calls = 0
+        self.resources = {}
+        self.dSetIDs = []
+        self.dSourceIDs = []
+
+        for i in xrange(count):
+            dSetID, dSourceID = 'dataset%d' % i, 'datasource%d' % i
+            self.dSetIDs.append(dSetID)
+            self.dSourceIDs.append(dSourceID)
+
+            lat, lon = -80 + (i * 7) % 160, -170 + (i * 13) % 340
+            attributes = [Attribute('title', 'Dataset %d' % i),
+                          Attribute('ion_geospatial_lat_min', float(lat)),
+                          Attribute('ion_geospatial_lat_max', float(lat + 5)),
+                          Attribute('ion_geospatial_lon_min', float(lon)),
+                          Attribute('ion_geospatial_lon_max', float(lon + 5)),
+                          Attribute('ion_time_coverage_start', '2010-01-01T00:00:00Z'),
+                          Attribute('ion_time_coverage_end', '2010-12-31T00:00:00Z')]
+            self.resources[dSetID] = Obj(ResourceIdentity=dSetID, ResourceLifeCycleState=ACTIVE, ACTIVE=ACTIVE,
+                                         COMMISSIONED=COMMISSIONED, Repository=Obj(persistent=False),
+                                         root_group=Obj(attributes=attributes), source=dSourceID)
+            self.resources[dSourceID] = Obj(ResourceIdentity=dSourceID, ResourceLifeCycleState=COMMISSIONED,
+                                            ACTIVE=ACTIVE, COMMISSIONED=COMMISSIONED,
+                                            Repository=Obj(persistent=False), property=['sea_water_temperature'],
+                                            station_id=['station%d' % i], registration_datetime_millis=i,
+                                            request_type=0, base_url='http://example.org/%d' % i,
+                                            max_ingest_millis=10000, ion_title='Source %d' % i,
+                                            update_interval_seconds=3600, visualization_url='')
+
+    def _later(self, value):
+        self.calls += 1
+        d = defer.Deferred()
+        reactor.callLater(self.latency, d.callback, value)
+        return d
+
+    # The message client
+    def create_instance(self, type):
+        return defer.succeed(Request())
+
+    # The resource client
+    def get_instance(self, resID):
+        return self._later(self.resources[resID])
+
+    # The association client
+    def find_associations(self, obj=None, predicate_or_predicates=None):
+        association = Obj(SubjectReference=Obj(key=obj.source), ObjectReference=Obj(key=obj.ResourceIdentity))
+        return self._later([association])
+
+    # The association service client
+    def get_subjects(self, request):
+        if request.pairs[0].object.key == DATASET_RESOURCE_TYPE_ID:
+            keys = self.dSetIDs
+        else:
+            keys = self.dSourceIDs
+        return self._later(Obj(idrefs=[Obj(key=key) for key in keys]))
+
+    def get_objects(self, request):
+        return self._later(Obj(idrefs=[Obj(key='owner')]))
+
+
+def make_cache(registry, concurrency):
+    cache = MetadataCache(StandInProcess())
+    cache.rc = cache.ac = cache.asc = cache.mc = registry
+    cache.warmUpConcurrency = concurrency
+    cache.warmUpProgressInterval = len(registry.dSetIDs) + 1
+    return cache
+
+
+class Reader(object):
+    """
+    Reads the metadata of a dataset from the cache every interval seconds and keeps the longest wait
+    """
+
+    def __init__(self, cache, dSetID, interval=0.005):
+        self.cache = cache
+        self.dSetID = dSetID
+        self.max_wait = 0.0
+        self.reads = 0
+        self.loop = task.LoopingCall(self.read)
+        self.loop.start(interval, now=False)
+
+    @defer.inlineCallbacks
+    def read(self):
+        t1 = time.time()
+        yield self.cache.getDSetMetadata(self.dSetID)
+        self.max_wait = max(self.max_wait, time.time() - t1)
+        self.reads += 1
+
+    def stop(self):
+        self.loop.stop()
+
+
+@defer.inlineCallbacks
+def run(count, latency, concurrencies):
+    registry = StandInRegistry(count, latency)
+
+    for concurrency in concurrencies:
+        cache = make_cache(registry, concurrency)
+        reader = Reader(cache, registry.dSetIDs[0])
+
+        registry.calls = 0
+        t1 = time.time()
+        yield cache.loadDataSets()
+        yield cache.loadDataSources()
+        t2 = time.time()
+        reader.stop()
+
+        report('load with concurrency %d' % concurrency, count * 2, t2 - t1, unit='resources')
+        for name in ('datasets', 'datasources'):
+            print '    %s' % cache.warmUpProgress[name]
+        print '    calls: %d, reads during load: %d, longest read: %.1f msec, rss %d KB' % (
+            registry.calls, reader.reads, reader.max_wait * 1000, current_rss_kb())
+
+    # Incremental refresh - update events for datasets, some of them repeated while they are refreshed
+    cache = make_cache(registry, concurrencies[-1])
+    registry.calls = 0
+    t1 = time.time()
+    yield defer.DeferredList([cache.refreshDSet(registry.dSetIDs[i % 100]) for i in xrange(1000)])
+    t2 = time.time()
+    report('refresh events', 1000, t2 - t1, unit='events')
+    print '    calls: %d' % registry.calls
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=2000, help="The number of datasets")
+    parser.add_option("-l", "--latency", dest="latency", default=0.002, help="Seconds for each call to answer")
+    parser.add_option("-c", "--concurrency", dest="concurrency", default='1,8,32',
+                      help="Comma separated numbers of fetches at once")
+    opts, args = parser.parse_args()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    concurrencies = [int(c) for c in opts.concurrency.split(',')]
+    d = defer.maybeDeferred(run, int(opts.number), float(opts.latency), concurrencies)
+    d.addBoth(done)
+    reactor.run()
+
+if __name__ == "__main__":
+    main()
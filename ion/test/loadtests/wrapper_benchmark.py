@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/loadtests/wrapper_benchmark.py
+@brief Measure the allocation rate and memory cost of creating GPB object Wrappers
+
+Run it like this:
+bin/python ion/test/loadtests/wrapper_benchmark.py -n 1000000
+"""
+
+import gc
+import sys
+import time
+from optparse import OptionParser
+
+from ion.core.object import gpb_wrapper
+from ion.core.object import object_utils
+
+from ion.test.loadtests.benchutil import current_rss_kb, max_rss_kb, report
+
+ADDRESSBOOK_TYPE = object_utils.create_type_identifier(object_id=20002, version=1)
+
+
+def run(count, keep=True):
+
+    gpb_class = object_utils.get_gpb_class_from_type_id(ADDRESSBOOK_TYPE)
+    msg = gpb_class()
+
+    # Build the generated wrapper class before timing anything
+    sample = gpb_wrapper.Wrapper(msg)
+
+    gc.collect()
+    rss_before = current_rss_kb()
+
+    wrappers = []
+    append = wrappers.append
+    t1 = time.time()
+    for i in xrange(count):
+        w = gpb_wrapper.Wrapper(msg)
+        if keep:
+            append(w)
+    t2 = time.time()
+
+    rss_after = current_rss_kb()
+
+    report('Wrapper allocation', count, t2 - t1, unit='wrappers')
+    print 'Bytes per wrapper (sys.getsizeof): %d (budget %d)' % (sys.getsizeof(sample), gpb_wrapper.WRAPPER_BYTE_BUDGET)
+    print 'Has instance __dict__: %s' % hasattr(sample, '__dict__')
+    print 'RSS before: %d KB, after: %d KB, peak: %d KB' % (rss_before, rss_after, max_rss_kb())
+    if keep and count:
+        print 'RSS growth per retained wrapper: %.1f bytes' % ((rss_after - rss_before) * 1024.0 / count)
+
+    return wrappers
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", default=1000000, help="The number of wrappers to create")
+    parser.add_option("-d", "--discard", action="store_true", dest="discard", default=False,
+                      help="Do not retain the wrappers - measures allocation rate only")
+    opts, args = parser.parse_args()
+
+    run(int(opts.number), keep=not opts.discard)
+
+if __name__ == "__main__":
+    main()
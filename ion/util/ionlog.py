@@ -62,6 +62,64 @@ def getLogger(loggername=__name__):
     return log_factory.get_logger(loggername)
 
 import logging
+
+class lazy(object):
+    """
+    A log argument which is worked out only if the record is emitted.
+
+    Arguments of a log call are formatted only when the record is emitted,
+    so log.debug("state: %s", obj) costs nothing but the call when debug is
+    off, whereas log.debug("state: %s" % obj) formats obj every time. Wrap an
+    argument which needs more work than str() in lazy:
+
+        log.debug("payload:\n%s", lazy(pu.pprint_to_string, payload))
+    """
+    __slots__ = ('func', 'args', 'kwargs')
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.func(*self.args, **self.kwargs))
+
+    def __repr__(self):
+        return repr(self.func(*self.args, **self.kwargs))
+
+# Levels which are normally off, so that eager formatting for them is waste
+QUIET_LEVELS = ('debug', 'info')
+
+def find_eager_logging(source, filename='<source>', levels=QUIET_LEVELS):
+    """
+    Finds the log calls in source at the given levels which format their
+    message before the call - with %, + or str() on the message - rather than
+    passing the arguments to the logger.
+
+    @retval list of (line number, level) of each such call
+    """
+    import ast
+
+    def is_eager(node):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Mod, ast.Add)):
+            return True
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'str':
+            return True
+        return False
+
+    found = []
+    for node in ast.walk(ast.parse(source, filename)):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+            continue
+        if node.func.attr not in levels or not isinstance(node.func.value, ast.Name):
+            continue
+        if node.func.value.id != 'log' or not node.args:
+            continue
+        if is_eager(node.args[0]):
+            found.append((node.lineno, node.func.attr))
+    found.sort()
+    return found
+
 class IonLogger(object):
     """
     Simple wrapper around a python logger.
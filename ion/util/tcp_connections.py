@@ -50,6 +50,45 @@ class TCPConnection(BasicLifecycleObject):
         self._connector.disconnect()
         log.info('on_error')
 
+class TCPConnectionPool(TCPConnection):
+    """
+    A TCPConnection which opens several connections for one pool factory. Each connector gets a factory of its own
+    from factory.connection_factory(), so that reconnecting one connection does not disturb the others. How requests
+    are spread over the connections is up to the pool factory and its protocol.
+    """
+
+    def __init__(self, host, port, factory, size=1, timeout=30, bindAddress=None):
+        TCPConnection.__init__(self, host, port, factory, timeout, bindAddress)
+        self._size = size
+        self._connectors = []
+
+    def on_activate(self, *args, **kwargs):
+        for i in range(self._size):
+            factory = self._factory.connection_factory()
+            self._connectors.append(reactor.connectTCP(self._host, self._port, factory, self._timeout, self._bindAddress))
+
+        # The first connection, for code which expects a single connector
+        self._connector = self._connectors[0]
+        log.info('on_activate: connected TCP pool of %d' % self._size)
+
+    def disconnect(self):
+        for connector in self._connectors:
+            connector.disconnect()
+        self._connectors = []
+
+    def on_deactivate(self, *args, **kwargs):
+        self.disconnect()
+        log.info('on_deactivate: disconnected TCP pool')
+
+    def on_terminate(self, *args, **kwargs):
+        self.disconnect()
+        log.info('on_terminate: disconnected TCP pool')
+
+    def on_error(self, *args, **kwargs):
+        self.disconnect()
+        log.info('on_error')
+
+
 class TCPListen(BasicLifecycleObject):
     
     def __init__(self, port, factory, backlog=50, interface=''):
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""
+@file ion/util/test/test_ionlog.py
+@test ion.util.ionlog lazy log arguments and the check for eager formatting
+of log messages in the message path
+"""
+
+import logging
+import os
+
+from twisted.trial import unittest
+
+import ion
+from ion.util.ionlog import lazy, find_eager_logging
+
+# Modules on the path of every message, which must not format debug and info
+# messages before the log call
+HOT_PATH = ['ion/core/messaging/receiver.py',
+            'ion/core/process/process.py',
+            'ion/interact/conversation.py',
+            'ion/interact/request.py',
+            'ion/interact/rpc.py']
+
+
+class CountingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class LazyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('ion.util.test.test_ionlog.lazy')
+        self.logger.propagate = False
+        self.handler = CountingHandler()
+        self.logger.addHandler(self.handler)
+        self.calls = []
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def _state(self, name):
+        self.calls.append(name)
+        return 'state of %s' % name
+
+    def test_not_emitted(self):
+        self.logger.setLevel(logging.WARNING)
+        self.logger.debug('state: %s', lazy(self._state, 'proc'))
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.handler.messages, [])
+
+    def test_emitted(self):
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.debug('state: %s', lazy(self._state, name='proc'))
+        self.assertEqual(self.calls, ['proc'])
+        self.assertEqual(self.handler.messages, ['state: state of proc'])
+
+
+class EagerLoggingTest(unittest.TestCase):
+
+    def test_find(self):
+        source = '\n'.join([
+            "log.debug('a %s' % x)",
+            "log.debug('a %s', x)",
+            "log.info('a ' + str(x))",
+            "log.info(str(x))",
+            "log.warn('a %s' % x)",
+            "log.debug('a')",
+            "other.debug('a %s' % x)",
+            ])
+        self.assertEqual(find_eager_logging(source), [(1, 'debug'), (3, 'info'), (4, 'info')])
+        self.assertEqual(find_eager_logging(source, levels=('warn',)), [(5, 'warn')])
+
+    def test_hot_path(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(ion.__file__)))
+        for path in HOT_PATH:
+            f = open(os.path.join(root, path))
+            try:
+                found = find_eager_logging(f.read(), path)
+            finally:
+                f.close()
+            self.assertEqual(found, [], 'eager log formatting in %s at lines %s' % (
+                path, ', '.join([str(line) for line, level in found])))
@@ -56,6 +56,7 @@ setup( name = 'ioncore',
            'ply==3.4',
            'pysnmp==4.1.16a',
            'pyserial==2.5',
+           'numpy>=1.3',
            'ionproto>=0.3.27',
                           ],
        entry_points = {